@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import threading
+from typing import AsyncIterator, Awaitable, TypeVar
+
+from starlette.requests import Request
+
+from .metrics import REGISTRY
+
+T = TypeVar("T")
+
+# How often (seconds) a running request checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+
+RUNS_CANCELLED = REGISTRY.counter(
+    "agent_runs_cancelled_total",
+    "Agent runs cancelled before completion.",
+    ("reason",),
+)
+TOKENS_SAVED = REGISTRY.counter(
+    "agent_tokens_saved_total",
+    "Estimated LLM tokens not spent thanks to cancelled runs "
+    "(mean tokens of a completed run minus tokens already spent by the cancelled run).",
+)
+RUN_TOKENS = REGISTRY.counter(
+    "agent_run_tokens_total",
+    "LLM tokens (prompt + completion) spent by agent runs.",
+    ("outcome",),
+)
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client went away while its agent run was still in flight."""
+
+
+class _RunTokenStats:
+    """Running mean of tokens per completed run, used to estimate tokens saved by cancellation."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._completed_runs = 0
+        self._completed_tokens = 0
+
+    def record_completed(self, tokens: int) -> None:
+        with self._lock:
+            self._completed_runs += 1
+            self._completed_tokens += tokens
+
+    def mean(self) -> float:
+        with self._lock:
+            if not self._completed_runs:
+                return 0.0
+            return self._completed_tokens / self._completed_runs
+
+
+_token_stats = _RunTokenStats()
+
+# Strong references to stream clean-up tasks so they are not garbage collected mid-way
+_cleanup_tasks: set[asyncio.Task] = set()
+
+
+def record_completed_run(tokens: int) -> None:
+    """Account the tokens of a run that finished normally."""
+    _token_stats.record_completed(tokens)
+    RUN_TOKENS.inc(tokens, outcome="completed")
+
+
+def record_cancelled_run(tokens: int, reason: str = "client_disconnect") -> None:
+    """Count a cancelled run and the tokens it is estimated to have saved.
+
+    Args:
+        tokens: Tokens the run had already spent when it was cancelled.
+        reason: Label describing why the run was cancelled.
+    """
+    RUNS_CANCELLED.inc(reason=reason)
+    RUN_TOKENS.inc(tokens, outcome="cancelled")
+    TOKENS_SAVED.inc(max(_token_stats.mean() - tokens, 0.0))
+
+
+async def run_until_disconnect(
+    request: Request,
+    awaitable: Awaitable[T],
+    poll_interval: float = DISCONNECT_POLL_INTERVAL,
+) -> T:
+    """Await an agent run, cancelling it as soon as the HTTP client disconnects.
+
+    The run is executed as a task; cancelling it propagates into the pending LLM
+    HTTP request and any async tool call, so no more model or tool work is done
+    for an answer nobody will read.
+
+    Args:
+        request: The incoming Starlette/FastAPI request.
+        awaitable: The agent run (e.g. ``graph.ainvoke(...)`` or ``agent.run(...)``).
+        poll_interval: Seconds between disconnect checks.
+
+    Returns:
+        The result of the run.
+
+    Raises:
+        ClientDisconnected: If the client disconnected before the run finished.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+
+
+async def _close_stream(iterator: AsyncIterator, pending: asyncio.Future | None) -> None:
+    """Cancel a pending ``__anext__`` and close the stream, which cancels the run behind it."""
+    if pending is not None and not pending.done():
+        pending.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await pending
+    if hasattr(iterator, "aclose"):
+        with contextlib.suppress(Exception):
+            await iterator.aclose()
+
+
+async def stream_until_disconnect(
+    request: Request,
+    stream: AsyncIterator[T],
+    poll_interval: float = DISCONNECT_POLL_INTERVAL,
+) -> AsyncIterator[T]:
+    """Re-yield an agent event stream, cancelling it as soon as the HTTP client disconnects.
+
+    Streaming responses only notice a disconnect when the next chunk is written,
+    which may be a long tool or LLM call away. This wrapper also checks while it is
+    waiting for the next item.
+
+    Raises:
+        ClientDisconnected: If the client disconnected before the stream finished.
+    """
+    iterator = stream.__aiter__()
+    next_item = None
+    try:
+        while True:
+            next_item = asyncio.ensure_future(iterator.__anext__())
+            while True:
+                done, _ = await asyncio.wait({next_item}, timeout=poll_interval)
+                if done:
+                    break
+                if await request.is_disconnected():
+                    raise ClientDisconnected()
+
+            try:
+                item = next_item.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # Close the stream in its own task: when the server cancels the response
+        # (it noticed the disconnect first), awaits in this frame are interrupted
+        # and the run behind the stream would keep going.
+        cleanup = asyncio.ensure_future(_close_stream(iterator, next_item))
+        _cleanup_tasks.add(cleanup)
+        cleanup.add_done_callback(_cleanup_tasks.discard)
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.shield(cleanup)
@@ -0,0 +1,206 @@
+"""Model cascade: a small, fast model answers first and a router escalates to MODEL_ID.
+
+Most traffic (greetings, single lookups) does not need the large model. With
+CASCADE_MODEL_ID set, every LLM call of a run goes through ModelCascade:
+
+- before the call, a classifier scores the user's request; at or above
+  CASCADE_ESCALATE_SCORE it goes straight to the large model;
+- otherwise the small model answers, and its answer is escalated (the call is
+  made again with the large model) when it asks for more than
+  CASCADE_MAX_TOOL_CALLS tool calls at once, when a tool call does not parse or
+  validate, or when its mean token probability is below CASCADE_MIN_CONFIDENCE.
+
+Each decision is counted in ``agent_cascade_decisions_total``, by route and reason.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from importlib import import_module
+from typing import Any, Awaitable, Callable, Sequence
+
+from .metrics import REGISTRY
+from .settings import Settings
+from .tool_registry import ToolArgumentsError, ToolRegistry
+
+# Routes: answered by the small model, sent to the large one up front, or retried on it
+SMALL = "small"
+LARGE = "large"
+ESCALATED = "escalated"
+
+# Escalation reasons
+CLASSIFIER = "classifier"
+TOOL_CALLS = "tool_calls"
+TOOL_PARSE = "tool_parse"
+LOW_CONFIDENCE = "low_confidence"
+
+CASCADE_DECISIONS = REGISTRY.counter(
+    "agent_cascade_decisions_total",
+    "LLM calls of cascade mode by route (small: answered by the small model; large: "
+    "sent to the large model by the classifier; escalated: small answer rejected) and reason.",
+    ("route", "reason"),
+)
+
+# Words asking for reasoning rather than a lookup
+_REASONING_WORDS = re.compile(
+    r"\b(why|explain|compare|analy[sz]e|difference|step[- ]by[- ]step|prove|derive|plan|"
+    r"design|implement|debug|refactor|trade-?offs?|pros and cons|versus|vs)\b",
+    re.IGNORECASE,
+)
+
+
+def complexity_score(text: str) -> float:
+    """Cheap estimate (0 to 1) of how much a request needs the large model.
+
+    Long requests, reasoning words, several questions and code score high;
+    greetings and short lookups ("Hi! How are you?", "what is redhat") score low.
+    """
+    score = min(len(text.split()) / 100, 0.4)
+    score += 0.2 * min(len(_REASONING_WORDS.findall(text)), 2)
+    score += 0.1 * min(max(text.count("?") - 1, 0), 2)
+    if "```" in text:
+        score += 0.3
+    return min(score, 1.0)
+
+
+def mean_token_probability(logprobs: Sequence[float]) -> float | None:
+    """Geometric mean of the token probabilities of an answer (None without tokens)."""
+    if not logprobs:
+        return None
+    return math.exp(sum(logprobs) / len(logprobs))
+
+
+def _load_classifier(path: str) -> Callable[[str], float]:
+    module_name, _, attribute = path.partition(":")
+    if not attribute:
+        raise ValueError(f"CASCADE_CLASSIFIER {path!r} must have the form 'module:function'")
+    return getattr(import_module(module_name), attribute)
+
+
+@dataclass(frozen=True)
+class ModelCascade:
+    """Routing policy between the small and the large model.
+
+    Frameworks call ``run``/``arun`` with two callables making the same LLM call on
+    either model and an ``inspect`` function extracting what the checks need from a
+    response: its tool calls as ``(name, arguments)`` pairs (arguments None when
+    they do not parse) and its token log-probabilities (None when not reported).
+    """
+
+    small_model: str
+    small_base_url: str | None = None
+    escalate_score: float = 0.5
+    max_tool_calls: int = 2
+    min_confidence: float = 0.0
+    classifier: Callable[[str], float] = complexity_score
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ModelCascade | None":
+        """Cascade configured by the CASCADE_* settings; None when CASCADE_MODEL_ID is unset."""
+        if not settings.cascade_model_id:
+            return None
+        return cls(
+            small_model=settings.cascade_model_id,
+            small_base_url=settings.cascade_base_url,
+            escalate_score=settings.cascade_escalate_score,
+            max_tool_calls=settings.cascade_max_tool_calls,
+            min_confidence=settings.cascade_min_confidence,
+            classifier=(
+                _load_classifier(settings.cascade_classifier)
+                if settings.cascade_classifier
+                else complexity_score
+            ),
+        )
+
+    @property
+    def needs_logprobs(self) -> bool:
+        """Whether the small model must report token log-probabilities."""
+        return self.min_confidence > 0
+
+    def route(self, text: str) -> str | None:
+        """CLASSIFIER if the request should skip the small model, else None."""
+        return CLASSIFIER if self.classifier(text) >= self.escalate_score else None
+
+    def check(
+        self,
+        tool_calls: Sequence[tuple[str, dict | None]],
+        logprobs: Sequence[float] | None = None,
+        registry: ToolRegistry | None = None,
+    ) -> str | None:
+        """Reason to escalate a small-model response, or None to accept it.
+
+        Args:
+            tool_calls: ``(name, arguments)`` of each tool call; arguments None if unparseable.
+            logprobs: Log-probabilities of the answer tokens, if reported.
+            registry: Tools the model may call; calls of other tools or with arguments
+                failing their schema count as parse failures.
+        """
+        if len(tool_calls) > self.max_tool_calls:
+            return TOOL_CALLS
+        for name, arguments in tool_calls:
+            if arguments is None:
+                return TOOL_PARSE
+            if registry is not None:
+                spec = registry.get(name)
+                if spec is None:
+                    return TOOL_PARSE
+                try:
+                    spec.validate(arguments)
+                except ToolArgumentsError:
+                    return TOOL_PARSE
+        if self.min_confidence > 0 and not tool_calls:
+            confidence = mean_token_probability(logprobs or [])
+            if confidence is not None and confidence < self.min_confidence:
+                return LOW_CONFIDENCE
+        return None
+
+    def _escalation(self, response: Any, inspect: Callable, registry: ToolRegistry | None) -> str | None:
+        tool_calls, logprobs = inspect(response)
+        reason = self.check(tool_calls, logprobs, registry)
+        CASCADE_DECISIONS.inc(route=ESCALATED if reason else SMALL, reason=reason or "none")
+        return reason
+
+    def run(
+        self,
+        text: str,
+        call_small: Callable[[], Any],
+        call_large: Callable[[], Any],
+        inspect: Callable[[Any], tuple[list, list[float] | None]],
+        registry: ToolRegistry | None = None,
+    ) -> Any:
+        """Make one LLM call through the cascade.
+
+        Args:
+            text: The user's request, scored by the classifier.
+            call_small: Makes the call on the small model.
+            call_large: Makes the same call on the large model.
+            inspect: Tool calls and log-probabilities of a small-model response.
+            registry: Tools the model may call, to validate its tool calls.
+
+        Returns:
+            The accepted small-model response, or the large-model one.
+        """
+        if self.route(text):
+            CASCADE_DECISIONS.inc(route=LARGE, reason=CLASSIFIER)
+            return call_large()
+        response = call_small()
+        if self._escalation(response, inspect, registry) is None:
+            return response
+        return call_large()
+
+    async def arun(
+        self,
+        text: str,
+        call_small: Callable[[], Awaitable[Any]],
+        call_large: Callable[[], Awaitable[Any]],
+        inspect: Callable[[Any], tuple[list, list[float] | None]],
+        registry: ToolRegistry | None = None,
+    ) -> Any:
+        """Async variant of run."""
+        if self.route(text):
+            CASCADE_DECISIONS.inc(route=LARGE, reason=CLASSIFIER)
+            return await call_large()
+        response = await call_small()
+        if self._escalation(response, inspect, registry) is None:
+            return response
+        return await call_large()
@@ -0,0 +1,527 @@
+"""Record and replay the LLM and tool traffic of agent runs.
+
+In record mode every LLM HTTP exchange (request body, response status and body, the
+time to the response headers and the arrival time of each streamed chunk) and every
+tool call (name, arguments, output, duration) is appended to a cassette: JSON Lines,
+gzip-compressed when the path ends with ``.gz``. In replay mode the cassette answers
+instead of the model and the tools, with the recorded timings (``original``) or none
+(``zero``). Runs are then deterministic, so CI can replay production traces, framework
+changes can be bisected for performance regressions and throughput can be measured
+without a model.
+
+Requests are matched by content (method, URL path and canonical JSON body for LLM
+calls; name and arguments for tools); identical requests get their recorded answers
+in order. A request without a recording fails the run with a message showing the
+difference to the closest recorded request.
+
+Enable it with CASSETTE_MODE=record|replay and CASSETTE_PATH; CASSETTE_LATENCY=zero
+replays without delays. One process records a cassette at a time.
+
+Usage:
+    python -m agent_commons.cassette show CASSETTE_PATH
+"""
+
+import argparse
+import asyncio
+import base64
+import difflib
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterator
+
+import httpx
+
+from .metrics import REGISTRY
+from .settings import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MODES = ("record", "replay")
+LATENCIES = ("original", "zero")
+MAX_DIFF_LINES = 60
+MAX_DIFF_CANDIDATES = 50
+
+CASSETTE_MISMATCHES = REGISTRY.counter(
+    "agent_cassette_mismatches_total",
+    "Requests in cassette replay mode that had no matching recording.",
+    ("kind",),
+)
+
+
+class CassetteMismatch(Exception):
+    """Raised when a replayed request has no matching recording."""
+
+
+@dataclass(frozen=True)
+class ToolRecord:
+    """Recorded output of a tool call."""
+
+    content: str
+    is_error: bool = False
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _parse_body(body: bytes) -> Any:
+    """Request body as JSON when it is JSON, else as text."""
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
+
+
+def _key(*parts: Any) -> str:
+    return hashlib.sha256(_canonical(parts).encode()).hexdigest()[:32]
+
+
+def _encode_body(body: bytes) -> dict:
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body": base64.b64encode(body).decode(), "body_encoding": "base64"}
+
+
+def _decode_body(entry: dict) -> bytes:
+    if entry.get("body_encoding") == "base64":
+        return base64.b64decode(entry["body"])
+    return entry["body"].encode("utf-8")
+
+
+class _RecordingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Pass a response body through, noting the arrival time of each chunk."""
+
+    def __init__(self, stream: Any, on_complete: Callable[[bytes, list], None]) -> None:
+        self._stream = stream
+        self._on_complete = on_complete
+        self._start = time.perf_counter()
+        self._body = bytearray()
+        self._chunks: list[list[float]] = []
+        self._recorded = False
+
+    def _add(self, chunk: bytes) -> None:
+        self._body += chunk
+        self._chunks.append([round(time.perf_counter() - self._start, 4), len(self._body)])
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._add(chunk)
+            yield chunk
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            self._add(chunk)
+            yield chunk
+
+    def _finish(self) -> None:
+        # Recorded as far as the client read it: SDKs stop reading streams at their
+        # end marker, and replaying the same bytes reproduces what the client saw
+        if not self._recorded:
+            self._recorded = True
+            self._on_complete(bytes(self._body), self._chunks)
+
+    def close(self) -> None:
+        self._stream.close()
+        self._finish()
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+        self._finish()
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Serve a recorded body, chunk by chunk, optionally at the recorded times."""
+
+    def __init__(self, body: bytes, chunks: list[list[float]], delay: bool) -> None:
+        self._body = body
+        self._chunks = chunks or [[0.0, len(body)]]
+        self._delay = delay
+
+    def _parts(self) -> Iterator[tuple[float, bytes]]:
+        start = 0
+        for offset, end in self._chunks:
+            yield offset, self._body[start : int(end)]
+            start = int(end)
+
+    def __iter__(self) -> Iterator[bytes]:
+        begin = time.perf_counter()
+        for offset, part in self._parts():
+            if self._delay:
+                time.sleep(max(0.0, offset - (time.perf_counter() - begin)))
+            yield part
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        begin = time.perf_counter()
+        for offset, part in self._parts():
+            if self._delay:
+                await asyncio.sleep(max(0.0, offset - (time.perf_counter() - begin)))
+            yield part
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport recording to or replaying from a cassette (sync and async)."""
+
+    def __init__(self, cassette: "Cassette", upstream: Any = None) -> None:
+        """Wrap the transport that records reach.
+
+        Args:
+            cassette: Cassette to record to or replay from.
+            upstream: Transport used when recording; plain HTTP(S) by default.
+        """
+        self.cassette = cassette
+        self._sync = upstream
+        self._async = upstream
+
+    def _record_request(self, request: httpx.Request) -> dict:
+        # Uncompressed responses, so the cassette stores readable text
+        request.headers["Accept-Encoding"] = "identity"
+        return {
+            "method": request.method,
+            "path": request.url.raw_path.decode(),
+            "request": _parse_body(request.content),
+        }
+
+    def _recorded_response(
+        self, response: httpx.Response, stream: _RecordingStream
+    ) -> httpx.Response:
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=stream,
+            extensions=response.extensions,
+        )
+
+    def _replay(self, request: httpx.Request) -> tuple[dict | None, httpx.Response]:
+        try:
+            entry = self.cassette.replay_llm(
+                request.method, request.url.raw_path.decode(), request.content
+            )
+        except CassetteMismatch as e:
+            error = {"error": {"message": str(e), "type": "cassette_mismatch"}}
+            return None, httpx.Response(400, json=error, request=request)
+
+        delay = self.cassette.latency == "original"
+        return entry, httpx.Response(
+            status_code=entry["status"],
+            headers={"content-type": entry.get("content_type", "application/json")},
+            stream=_ReplayStream(_decode_body(entry), entry.get("chunks"), delay),
+            request=request,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        if self.cassette.mode == "replay":
+            entry, response = self._replay(request)
+            if entry is not None and self.cassette.latency == "original":
+                time.sleep(entry.get("latency", 0.0))
+            return response
+
+        self._sync = self._sync or httpx.HTTPTransport()
+        recorded = self._record_request(request)
+        start = time.perf_counter()
+        response = self._sync.handle_request(request)
+        latency = time.perf_counter() - start
+        stream = _RecordingStream(
+            response.stream,
+            lambda body, chunks: self.cassette.record_llm(recorded, response, latency, body, chunks),
+        )
+        return self._recorded_response(response, stream)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        if self.cassette.mode == "replay":
+            entry, response = self._replay(request)
+            if entry is not None and self.cassette.latency == "original":
+                await asyncio.sleep(entry.get("latency", 0.0))
+            return response
+
+        self._async = self._async or httpx.AsyncHTTPTransport()
+        recorded = self._record_request(request)
+        start = time.perf_counter()
+        response = await self._async.handle_async_request(request)
+        latency = time.perf_counter() - start
+        stream = _RecordingStream(
+            response.stream,
+            lambda body, chunks: self.cassette.record_llm(recorded, response, latency, body, chunks),
+        )
+        return self._recorded_response(response, stream)
+
+    def close(self) -> None:
+        if self._sync is not None:
+            self._sync.close()
+
+    async def aclose(self) -> None:
+        if self._async is not None:
+            await self._async.aclose()
+
+
+class Cassette:
+    """A cassette file in record or replay mode (see the module docstring)."""
+
+    def __init__(self, path: str, mode: str, latency: str = "original") -> None:
+        """Open a cassette.
+
+        Args:
+            path: Cassette file; gzip-compressed when it ends with ``.gz``. Recording appends.
+            mode: ``record`` or ``replay``.
+            latency: Replay timing, ``original`` (recorded delays) or ``zero``.
+
+        Raises:
+            ValueError: For an unknown mode or latency.
+            FileNotFoundError: In replay mode, if the cassette does not exist.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {', '.join(MODES)}, not {mode!r}")
+        if latency not in LATENCIES:
+            raise ValueError(f"Cassette latency must be one of {', '.join(LATENCIES)}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.mismatches: list[str] = []
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries: list[dict] = []
+        self._queues: dict[str, deque[dict]] = defaultdict(deque)
+
+        if mode == "replay":
+            self._entries = list(read_cassette(path))
+            for entry in self._entries:
+                self._queues[entry["key"]].append(entry)
+        else:
+            self._file = gzip.open(path, "at") if path.endswith(".gz") else open(path, "a")
+            self._write({"cassette": FORMAT_VERSION, "recorded_at": time.time()})
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "Cassette | None":
+        """Cassette configured by CASSETTE_MODE, CASSETTE_PATH and CASSETTE_LATENCY; None when off.
+
+        The settings come from ``settings`` (get_settings() when omitted).
+        """
+        settings = settings or get_settings()
+        if not settings.cassette_mode:
+            return None
+        return cls(settings.cassette_path, settings.cassette_mode, settings.cassette_latency)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def http_client(self) -> httpx.Client:
+        """Sync HTTP client for the LLM SDK, routed through the cassette."""
+        return httpx.Client(transport=CassetteTransport(self), timeout=None)
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        """Async HTTP client for the LLM SDK, routed through the cassette."""
+        return httpx.AsyncClient(transport=CassetteTransport(self), timeout=None)
+
+    # Recording
+
+    def _write(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def record_llm(
+        self,
+        request: dict,
+        response: httpx.Response,
+        latency: float,
+        body: bytes,
+        chunks: list[list[float]],
+    ) -> None:
+        """Append a completed LLM exchange."""
+        self._write(
+            {
+                "type": "llm",
+                "key": _key("llm", request["method"], request["path"], request["request"]),
+                **request,
+                "status": response.status_code,
+                "content_type": response.headers.get("content-type", ""),
+                "latency": round(latency, 4),
+                "chunks": chunks,
+                **_encode_body(body),
+            }
+        )
+
+    def record_tool(
+        self, name: str, arguments: dict, content: Any, is_error: bool, duration: float
+    ) -> None:
+        """Append a completed tool call."""
+        self._write(
+            {
+                "type": "tool",
+                "key": _key("tool", name, arguments),
+                "name": name,
+                "arguments": arguments,
+                "content": content if isinstance(content, str) else _canonical(content),
+                "is_error": is_error,
+                "latency": round(duration, 4),
+            }
+        )
+
+    # Replaying
+
+    def _take(self, key: str) -> dict | None:
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                return None
+            self.replayed += 1
+            return queue.popleft()
+
+    def _mismatch(self, kind: str, description: str, request: Any, candidates: list[dict]) -> None:
+        """Record and raise a mismatch, showing the diff to the closest unused recording."""
+        wanted = json.dumps(request, indent=1, sort_keys=True, default=str).splitlines()
+        message = f"No recorded {kind} call matches {description}"
+        closest, best_ratio = None, -1.0
+        for candidate in candidates[:MAX_DIFF_CANDIDATES]:
+            lines = json.dumps(
+                candidate["request" if kind == "llm" else "arguments"],
+                indent=1,
+                sort_keys=True,
+                default=str,
+            ).splitlines()
+            ratio = difflib.SequenceMatcher(None, lines, wanted).ratio()
+            if ratio > best_ratio:
+                closest, best_ratio = lines, ratio
+        if closest is None:
+            message += " (the cassette has no unused recording of this kind)"
+        else:
+            diff = list(difflib.unified_diff(closest, wanted, "recorded", "requested", lineterm=""))
+            if len(diff) > MAX_DIFF_LINES:
+                diff = diff[:MAX_DIFF_LINES] + [f"... {len(diff) - MAX_DIFF_LINES} more lines"]
+            message += ". Closest recording, as a diff:\n" + "\n".join(diff)
+
+        with self._lock:
+            self.mismatches.append(message)
+        CASSETTE_MISMATCHES.inc(kind=kind)
+        logger.error(message)
+        raise CassetteMismatch(message)
+
+    def _unused(self, predicate: Any) -> list[dict]:
+        with self._lock:
+            return [entry for queue in self._queues.values() for entry in queue if predicate(entry)]
+
+    def replay_llm(self, method: str, path: str, body: bytes) -> dict:
+        """Recorded exchange for an LLM request.
+
+        Raises:
+            CassetteMismatch: If no unused recording matches the request.
+        """
+        request = _parse_body(body)
+        entry = self._take(_key("llm", method, path, request))
+        if entry is None:
+            self._mismatch(
+                "llm",
+                f"{method} {path}",
+                request,
+                self._unused(lambda e: e["type"] == "llm" and e["path"] == path),
+            )
+        return entry
+
+    def _replay_tool_entry(self, name: str, arguments: dict) -> dict:
+        entry = self._take(_key("tool", name, arguments))
+        if entry is None:
+            self._mismatch(
+                "tool",
+                f"tool {name!r}",
+                arguments,
+                self._unused(lambda e: e["type"] == "tool" and e["name"] == name),
+            )
+        return entry
+
+    def replay_tool(self, name: str, arguments: dict) -> ToolRecord:
+        """Recorded output of a tool call (blocking for the recorded duration if requested)."""
+        entry = self._replay_tool_entry(name, arguments)
+        if self.latency == "original":
+            time.sleep(entry["latency"])
+        return ToolRecord(entry["content"], entry["is_error"])
+
+    async def areplay_tool(self, name: str, arguments: dict) -> ToolRecord:
+        """Async variant of replay_tool."""
+        entry = self._replay_tool_entry(name, arguments)
+        if self.latency == "original":
+            await asyncio.sleep(entry["latency"])
+        return ToolRecord(entry["content"], entry["is_error"])
+
+    def summary(self) -> dict:
+        """Counts of replayed, unused and mismatched interactions (replay mode)."""
+        return {
+            "replayed": self.replayed,
+            "unused": len(self._unused(lambda entry: True)),
+            "mismatches": len(self.mismatches),
+        }
+
+    def close(self) -> None:
+        """Flush and close a recording; log the summary of a replay."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self.replaying:
+            logger.info("Cassette %s: %s", self.path, self.summary())
+
+
+def read_cassette(path: str) -> Iterator[dict]:
+    """Interactions of a cassette file, in recording order."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if "type" in entry:  # skip the header line of each recording session
+                    yield entry
+
+
+_cassette: Cassette | None = None
+_cassette_loaded = False
+
+
+def get_cassette() -> Cassette | None:
+    """Process-wide cassette built from the settings (None when CASSETTE_MODE is unset)."""
+    global _cassette, _cassette_loaded
+    if not _cassette_loaded:
+        _cassette = Cassette.from_env()
+        _cassette_loaded = True
+    return _cassette
+
+
+def close_cassette() -> None:
+    """Close the process-wide cassette, if any; call on app shutdown."""
+    if _cassette is not None:
+        _cassette.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect agent cassettes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="list the recorded interactions")
+    show.add_argument("path")
+    args = parser.parse_args()
+
+    print(f"{'#':>4} | {'type':<4} | {'call':<40} | {'latency':>8} | {'bytes':>8}")
+    for number, entry in enumerate(read_cassette(args.path)):
+        if entry["type"] == "llm":
+            call = f"{entry['method']} {entry['path']} -> {entry['status']}"
+            latency = entry["latency"] + (entry["chunks"][-1][0] if entry["chunks"] else 0.0)
+            size = len(entry["body"])
+        else:
+            call = f"{entry['name']}({_canonical(entry['arguments'])})"
+            latency = entry["latency"]
+            size = len(entry["content"])
+        print(f"{number:>4} | {entry['type']:<4} | {call[:40]:<40} | {latency:>8.3f} | {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
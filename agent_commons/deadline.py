@@ -0,0 +1,106 @@
+import math
+import time
+from dataclasses import dataclass, field
+
+# Header carrying the client's time budget for the request, in seconds
+DEADLINE_HEADER = "X-Request-Timeout"
+
+# Appended to the system prompt once the remaining budget drops below the margin
+ANSWER_NOW_PROMPT = (
+    "You are running out of time. Do NOT call any more tools. "
+    "Answer the user now, using only the information you already have."
+)
+
+# Returned when the budget is gone before the model could produce an answer
+DEADLINE_EXCEEDED_ANSWER = (
+    "I could not finish answering within the time limit of this request. "
+    "Please try again or ask a narrower question."
+)
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """Absolute point in time (monotonic clock) by which a request must be answered.
+
+    A single Deadline is created per request and handed to every step of the agent
+    run (graph node, workflow step, LLM call, tool call). Each step asks it for the
+    remaining budget instead of using its own hard-coded timeout.
+    """
+
+    expires_at: float
+    answer_now_margin: float = field(default=10.0)
+
+    @classmethod
+    def after(cls, seconds: float, answer_now_margin: float = 10.0) -> "Deadline":
+        """Create a deadline that expires ``seconds`` from now.
+
+        The answer-now margin is capped at a third of the budget, so short budgets
+        still leave room for at least one tool round.
+        """
+        return cls(
+            expires_at=time.monotonic() + seconds,
+            answer_now_margin=min(answer_now_margin, seconds / 3),
+        )
+
+    @classmethod
+    def from_request(
+        cls,
+        header_value: str | None = None,
+        field_value: float | None = None,
+        default: float = 120.0,
+        maximum: float = 600.0,
+        answer_now_margin: float = 10.0,
+    ) -> "Deadline":
+        """Build the request deadline from the request body field or the header.
+
+        The body field wins over the header. Missing, malformed, non-finite or
+        non-positive values fall back to ``default``; anything above ``maximum`` is clamped.
+
+        Args:
+            header_value: Raw value of the DEADLINE_HEADER header (seconds).
+            field_value: ``timeout`` field from the request body (seconds).
+            default: Budget used when the client did not send one.
+            maximum: Upper bound for client-provided budgets.
+            answer_now_margin: Remaining time below which the agent must answer directly.
+
+        Returns:
+            A Deadline starting now.
+        """
+        seconds = field_value
+        if seconds is None and header_value:
+            try:
+                seconds = float(header_value)
+            except ValueError:
+                seconds = None
+        if seconds is None or not math.isfinite(seconds) or seconds <= 0:
+            seconds = default
+
+        return cls.after(min(seconds, maximum), answer_now_margin=answer_now_margin)
+
+    def remaining(self) -> float:
+        """Seconds left until the deadline (never negative)."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        """Whether the budget is fully spent."""
+        return self.remaining() <= 0
+
+    @property
+    def answer_now(self) -> bool:
+        """Whether the agent should stop using tools and answer with what it has."""
+        return self.remaining() <= self.answer_now_margin
+
+    def timeout(self, cap: float | None = None) -> float:
+        """Timeout for the final answer: the whole remaining budget, optionally capped."""
+        remaining = self.remaining()
+        return remaining if cap is None else min(remaining, cap)
+
+    def step_timeout(self, cap: float | None = None) -> float:
+        """Timeout for a regular ReAct step (LLM or tool call).
+
+        Keeps the answer-now margin in reserve, so a step that runs into its timeout
+        still leaves time for a final "answer with what you have" LLM call.
+        """
+        remaining = max(self.remaining() - self.answer_now_margin, 0.0)
+        return remaining if cap is None else min(remaining, cap)
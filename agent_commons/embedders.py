@@ -0,0 +1,122 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from importlib import import_module
+from typing import Sequence
+
+import numpy as np
+
+from .settings import get_settings
+
+DEFAULT_HASHING_DIM = 512
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(ABC):
+    """Turns texts into fixed-size float32 vectors, locally and in-process.
+
+    ``name`` identifies the model (and its settings) in the index metadata, so an
+    index is never queried with vectors from a different embedder. Subclass it and
+    point EMBEDDER at the class ("module:Class") to plug in another model.
+    """
+
+    name: str
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed.
+
+        Returns:
+            A (len(texts), dim) float32 array.
+        """
+
+
+class HashingEmbedder(Embedder):
+    """Dependency-free embedder hashing word unigrams and bigrams into a fixed vector.
+
+    Lexical rather than semantic, but deterministic across processes and machines
+    (blake2b, not Python's randomized ``hash``), so it suits tests, fixtures and
+    small keyword-heavy corpora.
+    """
+
+    def __init__(self, dim: int = DEFAULT_HASHING_DIM) -> None:
+        """Set the vector size.
+
+        Args:
+            dim: Number of hash buckets (vector dimensions).
+        """
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                bucket, sign = self._bucket(feature)
+                vectors[row, bucket] += sign
+        return vectors
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Embedder running a sentence-transformers model locally (optional dependency)."""
+
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2") -> None:
+        """Load the model.
+
+        Args:
+            model_name: Hugging Face model id or local path.
+
+        Raises:
+            ImportError: If sentence-transformers is not installed.
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "SentenceTransformerEmbedder needs sentence-transformers "
+                "(pip install sentence-transformers)"
+            ) from e
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts)), dtype=np.float32)
+
+
+def load_embedder(spec: str | None = None) -> Embedder:
+    """Build an embedder from its spec.
+
+    Args:
+        spec: ``hashing`` or ``hashing-<dim>``, ``sentence-transformers:<model>``, or a
+            "module:Class" path of an Embedder subclass taking no arguments.
+            Defaults to the EMBEDDER setting, then ``hashing``.
+
+    Returns:
+        The embedder.
+    """
+    spec = spec or get_settings().embedder or "hashing"
+    if spec == "hashing":
+        return HashingEmbedder()
+    if spec.startswith("hashing-"):
+        return HashingEmbedder(int(spec.removeprefix("hashing-")))
+    if spec.startswith("sentence-transformers:"):
+        return SentenceTransformerEmbedder(spec.partition(":")[2])
+
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown embedder {spec!r}")
+    return getattr(import_module(module_name), class_name)()
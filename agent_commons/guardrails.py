@@ -0,0 +1,569 @@
+"""Safety guardrail screening agent runs, concurrently with the runs.
+
+Screening a request before its run and the answer after it puts two safety model
+calls (e.g. Llama Guard) on the critical path of every request. The guardrail keeps
+them off it:
+
+- The input is screened while the run starts, so the screen and the first LLM step
+  run concurrently. Tools wait for the input to pass (agents call
+  ``input_screened`` before running one, speculative calls included), so no tool
+  runs for a flagged input. Nothing the run produces reaches the client before
+  the input passed, and a flagged input cancels the run at once.
+- Streamed output is screened incrementally. The text sent to the client (answer
+  tokens and tool outputs, which may be the answer of a return_direct tool) is held
+  back in windows of SAFETY_OUTPUT_WINDOW characters. Each window is screened (after
+  the text before it) while the model keeps generating, and released once it passed;
+  tool calls are released in order with the text around them. Answers that are not
+  streamed are screened once the run is done.
+- A flagged input or output ends the run with a refusal and the ``content_filter``
+  finish reason. The flagged text never reaches the client, and the answer is
+  neither cached nor kept in the conversation.
+- When the classifier fails or takes longer than SAFETY_TIMEOUT, the text counts as
+  flagged (fail closed), or as passed with SAFETY_FAIL_OPEN set.
+
+SAFETY_CLASSIFIER picks the classifier:
+
+- ``llama-guard`` calls the shield SAFETY_SHIELD_ID of a Llama Stack server (the
+  ``llama-guard`` safety provider of ollama-config.yaml) at SAFETY_BASE_URL, or
+  BASE_URL when that is unset.
+- ``keywords`` is a local stand-in for development and tests. It flags messages
+  containing one of the comma separated SAFETY_BLOCKED_TERMS.
+- A "module:Class" path names a SafetyClassifier subclass taking no arguments.
+
+/metrics exports the screens by stage and outcome, and their duration.
+"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from dataclasses import dataclass
+from importlib import import_module
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Sequence, TypeVar
+
+import httpx
+
+from .metrics import REGISTRY
+from .settings import (
+    DEFAULT_SAFETY_OUTPUT_WINDOW,
+    DEFAULT_SAFETY_SHIELD_ID,
+    DEFAULT_SAFETY_TIMEOUT,
+    Settings,
+    SettingsError,
+    get_settings,
+    on_reload,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Screening stages
+INPUT = "input"
+OUTPUT = "output"
+
+# Finish reason of runs ended by the guardrail (as OpenAI's content filter reports it)
+CONTENT_FILTER = "content_filter"
+# Answer of runs ended by the guardrail
+REFUSAL = "I can't help with that request."
+
+# Input screen of the screened run in progress, awaited by its tools (see input_screened)
+_input_screen: ContextVar[asyncio.Future | None] = ContextVar("input_screen", default=None)
+
+SCREENS = REGISTRY.counter(
+    "agent_guardrail_screens_total",
+    "Safety screens by stage (input, output) and outcome (passed, flagged, error).",
+    ("stage", "outcome"),
+)
+SCREEN_SECONDS = REGISTRY.histogram(
+    "agent_guardrail_screen_seconds", "Duration of the safety screens, by stage.", ("stage",)
+)
+
+
+@dataclass(frozen=True)
+class Verdict:
+    """Outcome of a safety screen.
+
+    Attributes:
+        flagged: Whether the screened message is unsafe.
+        category: What it violates (e.g. a Llama Guard category), when known.
+    """
+
+    flagged: bool
+    category: str | None = None
+
+
+PASSED = Verdict(False)
+
+
+class GuardrailTripped(Exception):
+    """Raised when the guardrail withholds the answer of a run.
+
+    Attributes:
+        stage: INPUT or OUTPUT.
+        verdict: The verdict flagging it.
+    """
+
+    def __init__(self, stage: str, verdict: Verdict) -> None:
+        category = f" ({verdict.category})" if verdict.category else ""
+        super().__init__(f"The {stage} of the run was flagged by the safety classifier{category}")
+        self.stage = stage
+        self.verdict = verdict
+
+
+class SafetyClassifier(ABC):
+    """Tells whether the last message of a conversation is unsafe.
+
+    Subclass it and point SAFETY_CLASSIFIER at the class ("module:Class") to plug in
+    another classifier.
+    """
+
+    @abstractmethod
+    async def classify(self, messages: Sequence[dict]) -> Verdict:
+        """Screen the last message, in the context of the ones before it.
+
+        Args:
+            messages: OpenAI-style ``role``/``content`` dicts: the user input, followed
+                by the assistant's answer so far when the output is screened.
+
+        Returns:
+            The verdict on the last message.
+        """
+
+    async def aclose(self) -> None:
+        """Release the classifier's resources; called at shutdown."""
+
+
+class KeywordClassifier(SafetyClassifier):
+    """Local stand-in for a safety model: flags messages containing a blocked term.
+
+    Terms match whole words, case-insensitively.
+    """
+
+    def __init__(self, terms: Iterable[str], delay: float = 0.0) -> None:
+        """Configure the classifier.
+
+        Args:
+            terms: Blocked words or phrases.
+            delay: Seconds each screen takes, to stand in for a model call.
+        """
+        self.terms = [term.strip() for term in terms if term.strip()]
+        self.delay = delay
+        alternatives = "|".join(re.escape(term) for term in self.terms)
+        self._pattern = re.compile(rf"\b(?:{alternatives})\b", re.IGNORECASE) if self.terms else None
+
+    async def classify(self, messages: Sequence[dict]) -> Verdict:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        content = messages[-1].get("content") if messages else None
+        if self._pattern is None or not isinstance(content, str):
+            return PASSED
+        match = self._pattern.search(content)
+        return Verdict(True, f"blocked term {match.group(0).lower()!r}") if match else PASSED
+
+
+class LlamaGuardShield(SafetyClassifier):
+    """Llama Guard behind the safety API of a Llama Stack server (``POST /v1/safety/run-shield``).
+
+    A violation at level ``error`` flags the message; ``warn`` and ``info`` pass. Use it
+    from one event loop; its connection pool is created on first use.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        shield_id: str = DEFAULT_SAFETY_SHIELD_ID,
+        api_key: str | None = None,
+        client: httpx.AsyncClient | None = None,
+    ) -> None:
+        """Configure the shield.
+
+        Args:
+            base_url: Llama Stack API base URL, ending with ``/v1``.
+            shield_id: Shield registered on the server for the llama-guard provider.
+            api_key: Bearer token of the server, if it needs one.
+            client: HTTP client to send the requests with; one is created by default.
+        """
+        self.url = base_url.rstrip("/") + "/safety/run-shield"
+        self.shield_id = shield_id
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = client
+
+    async def classify(self, messages: Sequence[dict]) -> Verdict:
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+        response = await self._client.post(
+            self.url,
+            json={"shield_id": self.shield_id, "messages": [_shield_message(m) for m in messages], "params": {}},
+            headers=self.headers,
+        )
+        response.raise_for_status()
+        violation = response.json().get("violation")
+        if not violation or violation.get("violation_level") != "error":
+            return PASSED
+        return Verdict(True, (violation.get("metadata") or {}).get("violation_type"))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+def _shield_message(message: dict) -> dict:
+    shield_message = {"role": message["role"], "content": message.get("content") or ""}
+    if message["role"] == "assistant":
+        shield_message["stop_reason"] = "end_of_turn"  # required on Llama Stack completion messages
+    return shield_message
+
+
+def load_classifier(settings: Settings) -> SafetyClassifier:
+    """Build the classifier named by SAFETY_CLASSIFIER (see the module docstring).
+
+    Raises:
+        SettingsError: If the classifier is unknown or misses its settings.
+    """
+    spec = settings.safety_classifier
+    if spec == "llama-guard":
+        if settings.safety_base_url:
+            return LlamaGuardShield(settings.safety_base_url, settings.safety_shield_id)
+        if not settings.base_url:
+            raise SettingsError("SAFETY_CLASSIFIER=llama-guard needs SAFETY_BASE_URL or BASE_URL")
+        # The LLM's own Llama Stack server, with its API key
+        return LlamaGuardShield(settings.base_url, settings.safety_shield_id, settings.api_key)
+    if spec == "keywords":
+        return KeywordClassifier((settings.safety_blocked_terms or "").split(","))
+    module_name, _, class_name = (spec or "").partition(":")
+    if not class_name:
+        raise SettingsError(f"SAFETY_CLASSIFIER {spec!r} is not llama-guard, keywords or 'module:Class'")
+    return getattr(import_module(module_name), class_name)()
+
+
+class Guardrail:
+    """Screens the input and output of agent runs with a safety classifier.
+
+    ``check`` makes one screen; ``Screening`` screens a whole run (see the module docstring).
+    """
+
+    def __init__(
+        self,
+        classifier: SafetyClassifier,
+        fail_open: bool = False,
+        timeout: float = DEFAULT_SAFETY_TIMEOUT,
+        output_window: int = DEFAULT_SAFETY_OUTPUT_WINDOW,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Configure the guardrail.
+
+        Args:
+            classifier: Classifier making the screens.
+            fail_open: Let text through when the classifier fails or times out.
+            timeout: Seconds a screen may take.
+            output_window: Characters of streamed output screened at a time; 0 leaves
+                the output unscreened.
+            clock: Monotonic clock timing the screens.
+        """
+        self.classifier = classifier
+        self.fail_open = fail_open
+        self.timeout = timeout
+        self.output_window = output_window
+        self.clock = clock
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "Guardrail | None":
+        """Guardrail configured by the SAFETY_* settings; None while SAFETY_CLASSIFIER is unset.
+
+        Raises:
+            SettingsError: If the classifier is unknown or misses its settings.
+        """
+        settings = settings or get_settings()
+        if not settings.safety_classifier:
+            return None
+        guardrail = cls(load_classifier(settings))
+        guardrail.configure(settings)
+        return guardrail
+
+    def configure(self, settings: Settings) -> None:
+        """Apply reloaded settings; the classifier only changes on restart."""
+        self.fail_open = settings.safety_fail_open
+        self.timeout = settings.safety_timeout
+        self.output_window = settings.safety_output_window
+
+    async def check(self, stage: str, messages: Sequence[dict]) -> Verdict:
+        """Screen the last of ``messages``; a failed screen gives the fail-open or fail-closed verdict.
+
+        Args:
+            stage: INPUT or OUTPUT, for the metrics.
+            messages: The messages to screen (see SafetyClassifier.classify).
+        """
+        started = self.clock()
+        try:
+            verdict = await asyncio.wait_for(self.classifier.classify(messages), self.timeout)
+        except Exception as e:
+            SCREENS.inc(stage=stage, outcome="error")
+            logger.warning(
+                "Safety screen of the %s failed, failing %s: %s",
+                stage,
+                "open" if self.fail_open else "closed",
+                str(e) or type(e).__name__,
+            )
+            return PASSED if self.fail_open else Verdict(True, "safety classifier unavailable")
+        finally:
+            SCREEN_SECONDS.observe(self.clock() - started, stage=stage)
+        SCREENS.inc(stage=stage, outcome="flagged" if verdict.flagged else "passed")
+        return verdict
+
+    async def aclose(self) -> None:
+        await self.classifier.aclose()
+
+
+async def input_screened() -> None:
+    """Wait until the input of the screened run in progress passed its screen.
+
+    Agents call it before running a tool, so only the first LLM step overlaps the
+    input screen. For a flagged input it never returns: the screening cancels the
+    run instead. Outside a screened run it returns at once.
+    """
+    screen = _input_screen.get()
+    if screen is None:
+        return
+    verdict = await asyncio.shield(screen)
+    if verdict.flagged:
+        await asyncio.get_running_loop().create_future()
+
+
+def _output_text(delta: dict) -> str:
+    content = delta.get("content")
+    return content if delta.get("role") in ("assistant", "tool") and isinstance(content, str) else ""
+
+
+def _flagged(screen: asyncio.Future) -> bool:
+    return screen.done() and not screen.cancelled() and screen.result().flagged
+
+
+class Screening:
+    """Screening of one run by the guardrail; without one (None) the run is not screened.
+
+    After the run, ``tripped`` tells whether the guardrail withheld its answer.
+    """
+
+    def __init__(self, guardrail: Guardrail | None, messages: Sequence[dict]) -> None:
+        """Prepare the screening; it starts with the run.
+
+        Args:
+            guardrail: The guardrail, or None when SAFETY_CLASSIFIER is unset.
+            messages: The input of the run, as OpenAI-style ``role``/``content`` dicts.
+        """
+        self.guardrail = guardrail
+        self.messages = list(messages)
+        self.tripped: GuardrailTripped | None = None
+        self._input_screen: asyncio.Future | None = None
+
+    def _trip(self, stage: str, verdict: Verdict) -> GuardrailTripped:
+        self.tripped = GuardrailTripped(stage, verdict)
+        logger.info("Guardrail withheld the answer of a run: %s", self.tripped)
+        return self.tripped
+
+    def _screen_input(self) -> asyncio.Future:
+        """The input screen, started on first use and shared by input_passed and the run."""
+        if self._input_screen is None:
+            self._input_screen = asyncio.ensure_future(self.guardrail.check(INPUT, self.messages))
+        return self._input_screen
+
+    async def input_passed(self) -> bool:
+        """Screen the input ahead of the run, e.g. before answering it from a cache.
+
+        The verdict is reused by ``run`` or ``stream``, so a flagged input gets its
+        refusal from them without a second screen.
+
+        Returns:
+            Whether the input passed; always True without a guardrail.
+        """
+        if self.guardrail is None:
+            return True
+        return not (await self._screen_input()).flagged
+
+    def _check_output(self, answer: str) -> Awaitable[Verdict]:
+        return self.guardrail.check(OUTPUT, [*self.messages, {"role": "assistant", "content": answer}])
+
+    async def run(self, awaitable: Awaitable[T], answer: Callable[[T], str]) -> T:
+        """Await a run while its input is screened, then screen its answer.
+
+        Args:
+            awaitable: The run.
+            answer: Final answer of the run, from its result.
+
+        Returns:
+            The result of the run.
+
+        Raises:
+            GuardrailTripped: If the input or the answer was flagged; a run still going
+                when its input is flagged is cancelled.
+        """
+        if self.guardrail is None:
+            return await awaitable
+        screen = self._screen_input()
+        # The run's task inherits the screen, for its tools to wait for
+        token = _input_screen.set(screen)
+        try:
+            run = asyncio.ensure_future(awaitable)
+        finally:
+            _input_screen.reset(token)
+        try:
+            await asyncio.wait((screen, run), return_when=asyncio.FIRST_COMPLETED)
+            if run.done() and (run.cancelled() or run.exception() is not None):
+                return run.result()  # raises the run's error
+            verdict = await screen
+            if verdict.flagged:
+                run.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await run
+                raise self._trip(INPUT, verdict)
+            result = await run
+        finally:
+            screen.cancel()
+            run.cancel()
+        if self.guardrail.output_window:
+            verdict = await self._check_output(answer(result))
+            if verdict.flagged:
+                raise self._trip(OUTPUT, verdict)
+        return result
+
+    async def stream(
+        self, deltas: AsyncIterator[tuple[dict, str | None]]
+    ) -> AsyncIterator[tuple[dict, str | None]]:
+        """Re-yield the choice deltas of a run as they pass the screens (see the module docstring).
+
+        A flagged input or output ends the stream with a refusal delta (finish reason
+        ``content_filter``) and closes ``deltas``, which cancels the run. Closing the
+        returned stream closes ``deltas``.
+        """
+        if self.guardrail is None:
+            async with contextlib.aclosing(deltas):
+                async for delta in deltas:
+                    yield delta
+            return
+
+        window = self.guardrail.output_window
+        consumer = asyncio.current_task()
+        reading = interrupted = False
+
+        def on_input_screen(screen: asyncio.Future) -> None:
+            nonlocal interrupted
+            if reading and _flagged(screen):
+                # Stop waiting for the run, which is cancelled as the stream closes
+                interrupted = True
+                consumer.cancel()
+
+        input_screen = self._screen_input()
+        input_screen.add_done_callback(on_input_screen)
+        # The run starts as ``deltas`` is first read, in this context: its tools wait for the screen
+        outer_screen = _input_screen.get()
+        _input_screen.set(input_screen)
+        # Deltas waiting for their screen, in order: (screen or None, stage, deltas)
+        held = collections.deque([(input_screen, INPUT, [])])
+        batch, output, screened = [], "", 0
+
+        def close_batch(screen_text: bool) -> None:
+            nonlocal batch, screened
+            screen = asyncio.ensure_future(self._check_output(output)) if screen_text else None
+            held.append((screen, OUTPUT, batch))
+            batch, screened = [], len(output)
+
+        try:
+            async with contextlib.aclosing(deltas):
+                ended = False
+                while not ended:
+                    async for delta in self._release(held, wait=False):
+                        yield delta
+                    if self.tripped is not None:
+                        break
+                    reading = True
+                    try:
+                        delta = await anext(deltas)
+                    except StopAsyncIteration:
+                        ended = True
+                        continue
+                    except asyncio.CancelledError:
+                        # Python 3.11+ counts cancellations: take back ours, not the caller's
+                        if not interrupted or (hasattr(consumer, "uncancel") and consumer.uncancel()):
+                            raise
+                        break
+                    finally:
+                        reading = False
+
+                    text = _output_text(delta[0]) if window else ""
+                    output += text
+                    batch.append(delta)
+                    if len(output) - screened >= window > 0:
+                        close_batch(screen_text=True)
+                    elif not text:
+                        # Text before a tool call or the end of the run is screened before it
+                        close_batch(screen_text=len(output) > screened)
+                if ended:
+                    if batch:
+                        close_batch(screen_text=len(output) > screened)
+                    async for delta in self._release(held, wait=True):
+                        yield delta
+                elif self.tripped is None:
+                    self._trip(INPUT, input_screen.result())  # it interrupted the run
+        finally:
+            _input_screen.set(outer_screen)
+            for screen, _, _ in held:
+                if screen is not None:
+                    screen.cancel()
+        if self.tripped is not None:
+            yield {"role": "assistant", "content": REFUSAL}, CONTENT_FILTER
+
+    async def _release(self, held: collections.deque, wait: bool) -> AsyncIterator[tuple[dict, str | None]]:
+        """Yield the held deltas whose screens passed, in order; stop at a pending screen unless ``wait``."""
+        while held:
+            screen, stage, deltas = held[0]
+            if screen is not None:
+                if not (wait or screen.done()):
+                    return
+                verdict = await screen
+                if verdict.flagged:
+                    self._trip(stage, verdict)
+                    return
+            held.popleft()
+            for delta in deltas:
+                yield delta
+
+
+def refusal(query: str) -> dict:
+    """/chat response of a run whose input or answer the guardrail flagged."""
+    return {
+        "messages": [{"role": "user", "content": query}, {"role": "assistant", "content": REFUSAL}],
+        "finish_reason": CONTENT_FILTER,
+    }
+
+
+_guardrail: Guardrail | None = None
+_guardrail_lock = threading.Lock()
+
+
+def get_guardrail() -> Guardrail | None:
+    """Process-wide guardrail; None while SAFETY_CLASSIFIER is unset. Follows settings reloads.
+
+    Raises:
+        SettingsError: If the classifier is unknown or misses its settings.
+    """
+    global _guardrail
+    if not get_settings().safety_classifier:
+        return None
+    if _guardrail is None:
+        with _guardrail_lock:
+            if _guardrail is None:
+                _guardrail = Guardrail.from_env()
+                on_reload(_guardrail.configure)
+    return _guardrail
+
+
+async def close_guardrail() -> None:
+    """Close the process-wide guardrail's classifier, if any; call on app shutdown."""
+    if _guardrail is not None:
+        await _guardrail.aclose()
@@ -0,0 +1,456 @@
+"""Asynchronous agent runs: submit a job, poll it, follow its progress, cancel it.
+
+A ReAct run may take minutes, longer than gateways and routes keep a request open;
+clients that retry a timed-out /chat start the run over and double the load. With
+the job API the client submits the run (``POST /jobs``) and gets an id at once. A
+pool of in-process workers runs the queued jobs; the client polls
+``GET /jobs/{id}`` for the status and, once it is done, the /chat response, follows
+``GET /jobs/{id}/events`` (Server-Sent Events with the /chat stream chunks) or
+cancels it with ``DELETE /jobs/{id}``.
+
+The number of queued jobs is bounded, and finished jobs are forgotten
+``result_ttl`` seconds after they end. With a store path the jobs are also kept in
+a SQLite file, so queued jobs and results survive a restart; jobs interrupted by a
+shutdown are queued again and rerun from the start. Progress events are only kept
+in memory.
+"""
+
+import asyncio
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from .cancellation import record_cancelled_run, record_completed_run
+from .deadline import Deadline
+from .metrics import REGISTRY
+from .settings import (
+    DEFAULT_JOB_MAX_QUEUED,
+    DEFAULT_JOB_RESULT_TTL,
+    DEFAULT_JOB_WORKERS,
+    Settings,
+    get_settings,
+)
+from .timing import RequestTimer
+from .websocket_chat import TokenUsage
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Reason of cancelled jobs, as counted in agent_runs_cancelled_total
+JOB_CANCEL = "job_cancel"
+
+JOBS_QUEUED = REGISTRY.gauge("agent_jobs_queued", "Jobs waiting for a worker.")
+JOBS_RUNNING = REGISTRY.gauge("agent_jobs_running", "Jobs being run by a worker.")
+JOBS_FINISHED = REGISTRY.counter(
+    "agent_jobs_finished_total", "Jobs finished, by status.", ("status",)
+)
+JOBS_REJECTED = REGISTRY.counter(
+    "agent_jobs_rejected_total", "Jobs refused because the queue was full."
+)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the most jobs allowed are queued."""
+
+
+class _NoUsage:
+    total_tokens = 0
+
+
+@dataclass
+class Job:
+    """A submitted agent run and, once it is finished, its outcome."""
+
+    id: str
+    request: dict[str, Any]
+    created_at: float
+    status: str = QUEUED
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: dict | None = None  # the /chat response, when the job succeeded
+    error: str | None = None
+    timing: str | None = None  # Server-Timing breakdown of the run
+    # (delta, finish_reason) of the run so far
+    events: list[tuple[dict, str | None]] = field(default_factory=list, repr=False)
+    _updated: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: asyncio.Task | None = field(default=None, repr=False)
+    _cancel_requested: bool = field(default=False, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> dict[str, Any]:
+        """The job as returned by the API (without its progress events)."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "timing": self.timing,
+        }
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+
+@dataclass
+class JobRun:
+    """One run of a job, handed to the JobRunner.
+
+    The runner sets ``usage`` to what counts the run's tokens as soon as it has one,
+    and ``result`` to the /chat response once the run completed.
+    """
+
+    request: dict[str, Any]
+    deadline: Deadline
+    timer: RequestTimer
+    usage: TokenUsage = field(default_factory=_NoUsage)
+    result: dict | None = None
+
+
+# Runs a job: yields the (delta, finish_reason) of the run, as /chat streams them,
+# and sets run.result at the end. Closing or cancelling the stream must cancel the run.
+JobRunner = Callable[[JobRun], AsyncIterator[tuple[dict, str | None]]]
+
+
+class _JobFile:
+    """SQLite table of the jobs, for a queue that survives restarts."""
+
+    _COLUMNS = (
+        "id", "request", "created_at", "status", "started_at", "finished_at", "result", "error", "timing"
+    )
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, request TEXT NOT NULL, "
+            "created_at REAL NOT NULL, status TEXT NOT NULL, started_at REAL, finished_at REAL, "
+            "result TEXT, error TEXT, timing TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+
+    def put(self, job: Job) -> None:
+        row = (
+            job.id,
+            json.dumps(job.request),
+            job.created_at,
+            job.status,
+            job.started_at,
+            job.finished_at,
+            json.dumps(job.result) if job.result is not None else None,
+            job.error,
+            job.timing,
+        )
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO jobs VALUES ({', '.join('?' * len(row))})", row)
+
+    def load(self) -> list[Job]:
+        """All stored jobs, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs ORDER BY created_at"
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            values = dict(zip(self._COLUMNS, row))
+            values["request"] = json.loads(values["request"])
+            if values["result"] is not None:
+                values["result"] = json.loads(values["result"])
+            jobs.append(Job(**values))
+        return jobs
+
+    def purge(self, finished_before: float) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (finished_before,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _timeout(request: dict) -> float | None:
+    timeout = request.get("timeout")
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+        return None
+    return float(timeout)
+
+
+class JobQueue:
+    """Bounded queue of agent runs, worked off by a pool of in-process workers.
+
+    At most ``max_queued`` jobs wait for a worker; ``submit`` raises JobQueueFull
+    beyond that. Finished jobs are kept ``result_ttl`` seconds. With ``store_path``
+    every job is written to that SQLite file and loaded back by ``start``. Use it
+    from one event loop.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        workers: int = DEFAULT_JOB_WORKERS,
+        max_queued: int = DEFAULT_JOB_MAX_QUEUED,
+        result_ttl: float = DEFAULT_JOB_RESULT_TTL,
+        store_path: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Configure the queue; call ``start`` to load the stored jobs and start the workers.
+
+        Args:
+            runner: Runs a job.
+            workers: Jobs run at the same time.
+            max_queued: Most jobs waiting for a worker.
+            result_ttl: Seconds a finished job is kept.
+            store_path: SQLite file keeping the jobs over restarts.
+            clock: Wall clock; stored jobs outlive the process.
+        """
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.clock = clock
+        self._jobs: dict[str, Job] = {}
+        self._finished: OrderedDict[str, float] = OrderedDict()  # finish time, oldest first
+        self._pending: asyncio.Queue[Job] = asyncio.Queue()
+        self._queued = 0
+        self._running = 0
+        self._workers: list[asyncio.Task] = []
+        self._store = _JobFile(store_path) if store_path else None
+
+    @classmethod
+    def from_env(cls, runner: JobRunner, settings: Settings | None = None) -> "JobQueue":
+        """Queue configured by the JOB_WORKERS, JOB_MAX_QUEUED, JOB_RESULT_TTL and
+        JOB_STORE_PATH settings (get_settings() when ``settings`` is omitted)."""
+        settings = settings or get_settings()
+        return cls(
+            runner,
+            workers=settings.job_workers,
+            max_queued=settings.job_max_queued,
+            result_ttl=settings.job_result_ttl,
+            store_path=settings.job_store_path,
+        )
+
+    def configure(self, settings: Settings) -> None:
+        """Apply a reloaded queue bound and result TTL; the number of workers and the
+        store path only change with a restart."""
+        self.max_queued = settings.job_max_queued
+        self.result_ttl = settings.job_result_ttl
+        self._purge()
+
+    def _update_gauges(self) -> None:
+        JOBS_QUEUED.set(self._queued)
+        JOBS_RUNNING.set(self._running)
+
+    def _save(self, job: Job) -> None:
+        if self._store is not None:
+            self._store.put(job)
+
+    def _enqueue(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        self._queued += 1
+        self._pending.put_nowait(job)
+
+    async def start(self) -> None:
+        """Load the stored jobs (queuing again the unfinished ones) and start the workers."""
+        if self._store is not None:
+            for job in self._store.load():
+                if job.finished:
+                    self._jobs[job.id] = job
+                    self._finished[job.id] = job.finished_at
+                else:
+                    job.status, job.started_at = QUEUED, None
+                    self._enqueue(job)
+            self._finished = OrderedDict(sorted(self._finished.items(), key=lambda item: item[1]))
+            self._purge()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._update_gauges()
+
+    async def close(self) -> None:
+        """Stop the workers, cancelling the running jobs, and close the store.
+
+        With a store, the interrupted jobs stay queued there and run again after a
+        restart; without one they are lost with the process.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def submit(self, request: dict[str, Any]) -> Job:
+        """Queue a run of ``request`` (the /chat request body).
+
+        Raises:
+            JobQueueFull: If ``max_queued`` jobs are waiting already.
+        """
+        self._purge()
+        if self._queued >= self.max_queued:
+            JOBS_REJECTED.inc()
+            raise JobQueueFull(f"{self._queued} jobs are queued already; retry later")
+        job = Job(id=uuid.uuid4().hex, request=request, created_at=self.clock())
+        self._enqueue(job)
+        self._save(job)
+        self._update_gauges()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """The job with this id; None when unknown or forgotten."""
+        self._purge()
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Job | None:
+        """Cancel a queued or running job and wait until it stopped (a finished job
+        stays as it is).
+
+        Returns:
+            The job, or None when unknown or forgotten.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job.status == QUEUED:
+            self._queued -= 1
+            self._finish(job, CANCELLED)
+            return job
+        job._cancel_requested = True  # the job, not the worker, is being cancelled
+        job._task.cancel()
+        async for _ in self.events(job, after=len(job.events)):
+            pass
+        return job
+
+    async def events(self, job: Job, after: int = 0) -> AsyncIterator[tuple[int, dict, str | None]]:
+        """Follow a job's progress: its (number, delta, finish_reason) from event ``after``
+        on, until it is finished."""
+        sent = after
+        while True:
+            updated = job._updated
+            for number in range(sent, len(job.events)):
+                delta, finish_reason = job.events[number]
+                yield number + 1, delta, finish_reason
+            sent = max(sent, len(job.events))
+            if job.finished:
+                return
+            await updated.wait()
+
+    def _finish(self, job: Job, status: str, **outcome: Any) -> None:
+        job.status = status
+        job.finished_at = self.clock()
+        for name, value in outcome.items():
+            setattr(job, name, value)
+        self._finished[job.id] = job.finished_at
+        self._save(job)
+        JOBS_FINISHED.inc(status=status)
+        self._update_gauges()
+        job._notify()
+
+    def _purge(self) -> None:
+        cutoff = self.clock() - self.result_ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at >= cutoff:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+        if self._store is not None:
+            self._store.purge(finished_before=cutoff)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._pending.get()
+            if job.status != QUEUED:
+                continue  # cancelled while queued
+            self._queued -= 1
+            self._running += 1
+            try:
+                await self._run(job)
+            finally:
+                self._running -= 1
+                self._update_gauges()
+
+    async def _run(self, job: Job) -> None:
+        settings = get_settings()
+        job.status, job.started_at = RUNNING, self.clock()
+        self._save(job)
+        self._update_gauges()
+        job._notify()
+
+        # The budget starts when a worker picks the job up; the wait counts as queue time
+        timer = RequestTimer(queued=max(job.started_at - job.created_at, 0.0))
+        deadline = Deadline.from_request(
+            field_value=_timeout(job.request),
+            default=settings.request_timeout,
+            maximum=settings.max_request_timeout,
+        )
+        run = JobRun(job.request, deadline, timer)
+
+        async def forward() -> None:
+            deltas = self.runner(run)
+            async with contextlib.aclosing(deltas):
+                async for delta in deltas:
+                    job.events.append(delta)
+                    job._notify()
+
+        async def run_until_deadline() -> None:
+            await asyncio.wait_for(forward(), timeout=deadline.remaining() + settings.deadline_grace)
+
+        job._task = asyncio.ensure_future(run_until_deadline())
+        try:
+            await job._task
+        except asyncio.CancelledError:
+            if not job._cancel_requested:
+                # The worker is stopping: keep the job queued in the store for the next start
+                job.status, job.started_at = QUEUED, None
+                self._save(job)
+                raise
+            record_cancelled_run(run.usage.total_tokens, reason=JOB_CANCEL)
+            self._finish(job, CANCELLED)
+        except asyncio.TimeoutError:
+            self._finish(job, FAILED, error="Request deadline exceeded")
+        except Exception as e:
+            self._finish(job, FAILED, error=f"Error processing request: {e}")
+        else:
+            record_completed_run(run.usage.total_tokens)
+            self._finish(job, SUCCEEDED, result=run.result, timing=timer.header_value())
+        finally:
+            job._task = None
+
+
+async def job_event_stream(queue: JobQueue, job: Job, last_event_id: str | None = None) -> AsyncIterator[str]:
+    """Server-Sent Events of ``GET /jobs/{id}/events``.
+
+    Each delta is sent as a /chat stream chunk with its event number as the SSE id,
+    so a client reconnecting with the Last-Event-ID header only gets what it missed.
+    The stream ends with a ``job`` event carrying the finished job, then ``[DONE]``.
+
+    Args:
+        queue: The queue running the job.
+        job: The job to follow.
+        last_event_id: Value of the Last-Event-ID header.
+    """
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    async for number, delta, finish_reason in queue.events(job, after):
+        chunk = {"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        yield f"id: {number}\ndata: {json.dumps(chunk)}\n\n"
+    yield f"event: job\ndata: {json.dumps(job.to_dict())}\n\n"
+    yield "data: [DONE]\n\n"
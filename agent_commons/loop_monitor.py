@@ -0,0 +1,174 @@
+"""Event loop lag monitor and blocking call detector.
+
+Each service runs every request on one asyncio event loop, so synchronous code
+called from a coroutine (a blocking HTTP client, file I/O, a CPU-heavy parse) stalls
+all the other requests until it returns. The monitor sleeps ``interval`` seconds in
+a loop and records how late it wakes up as ``agent_event_loop_lag_seconds``: near
+zero on a healthy loop, and about the duration of the blocking call otherwise.
+
+With LOOP_DEBUG set, a watchdog thread also pings the loop every half
+LOOP_BLOCK_THRESHOLD. When the loop does not answer within the threshold, the
+watchdog logs the stack of the loop thread, which is the stack of the blocking call
+while it runs. It logs each stall once and counts it in
+``agent_event_loop_blocked_total``. Run it under real load to find blocking calls,
+then move them to ``asyncio.to_thread`` or an async client.
+"""
+
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Callable
+
+from .metrics import REGISTRY
+from .settings import (
+    DEFAULT_LOOP_BLOCK_THRESHOLD,
+    DEFAULT_LOOP_LAG_INTERVAL,
+    Settings,
+    get_settings,
+    on_reload,
+)
+
+logger = logging.getLogger(__name__)
+
+# Stalls kept in LoopMonitor.blocked
+MAX_BLOCKED_KEPT = 20
+
+LOOP_LAG = REGISTRY.histogram(
+    "agent_event_loop_lag_seconds",
+    "How late the event loop ran a timer; high values mean a callback blocked the loop.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_BLOCKED = REGISTRY.counter(
+    "agent_event_loop_blocked_total",
+    "Times the event loop was blocked longer than LOOP_BLOCK_THRESHOLD (counted with LOOP_DEBUG only).",
+)
+
+
+@dataclass(frozen=True)
+class BlockedLoop:
+    """A stall of the event loop, as seen by the watchdog.
+
+    Attributes:
+        blocked_for: Seconds the loop had been blocked when the stack was taken.
+        stack: Stack of the loop thread at that time.
+    """
+
+    blocked_for: float
+    stack: str
+
+
+class LoopMonitor:
+    """Measures the lag of the event loop it runs on and, in debug mode, reports stalls.
+
+    Run ``run()`` as a task on the loop to watch.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_LOOP_LAG_INTERVAL,
+        debug: bool = False,
+        block_threshold: float = DEFAULT_LOOP_BLOCK_THRESHOLD,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Configure the monitor.
+
+        Args:
+            interval: Seconds between two lag measurements.
+            debug: Take the stack of the loop thread when the loop is blocked.
+            block_threshold: Seconds the loop may be blocked before its stack is taken.
+            clock: Monotonic clock, shared with the watchdog thread.
+        """
+        self.interval = interval
+        self.debug = debug
+        self.block_threshold = block_threshold
+        self.clock = clock
+        # Stalls seen by the watchdog, latest last
+        self.blocked: collections.deque[BlockedLoop] = collections.deque(maxlen=MAX_BLOCKED_KEPT)
+        # Loop being watched; None while the monitor is not running
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "LoopMonitor":
+        """Monitor configured by the LOOP_LAG_INTERVAL, LOOP_DEBUG and LOOP_BLOCK_THRESHOLD settings."""
+        monitor = cls()
+        monitor.configure(settings or get_settings())
+        return monitor
+
+    def configure(self, settings: Settings) -> None:
+        """Apply (reloaded) settings; turning LOOP_DEBUG on starts the watchdog."""
+        self.interval = settings.loop_lag_interval
+        self.debug = settings.loop_debug
+        self.block_threshold = settings.loop_block_threshold
+        if self._loop is not None:
+            self._start_watchdog()
+
+    async def run(self) -> None:
+        """Measure the loop lag until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._start_watchdog()
+        try:
+            while True:
+                due = self.clock() + self.interval
+                await asyncio.sleep(self.interval)
+                LOOP_LAG.observe(max(self.clock() - due, 0.0))
+        finally:
+            self._loop = None
+            self._stopped.set()
+
+    def _start_watchdog(self) -> None:
+        if self.debug and (self._watchdog is None or not self._watchdog.is_alive()):
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def _watch(self) -> None:
+        """Watchdog thread: ping the loop and take its thread's stack once per stall, while debug is on."""
+        while self.debug and not self._stopped.wait(self.block_threshold / 2):
+            loop = self._loop
+            if loop is None:
+                continue
+            answered = threading.Event()
+            pinged = self.clock()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return  # the loop is closed
+            if answered.wait(self.block_threshold):
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                stall = BlockedLoop(self.clock() - pinged, "".join(traceback.format_stack(frame)))
+                self.blocked.append(stall)
+                LOOP_BLOCKED.inc()
+                logger.warning(
+                    "Event loop blocked for %.3fs (LOOP_BLOCK_THRESHOLD=%s), in:\n%s",
+                    stall.blocked_for,
+                    self.block_threshold,
+                    stall.stack,
+                )
+            # Report the next stall, not this one again
+            while not answered.wait(self.block_threshold) and not self._stopped.is_set():
+                pass
+
+
+async def watch_event_loop(monitor: LoopMonitor | None = None) -> None:
+    """Monitor the running event loop, following settings reloads; run it as a task.
+
+    Args:
+        monitor: Monitor to run; one configured from the settings by default.
+    """
+    monitor = monitor or LoopMonitor.from_env()
+    remove_listener = on_reload(monitor.configure)
+    try:
+        await monitor.run()
+    finally:
+        remove_listener()
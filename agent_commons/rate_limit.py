@@ -0,0 +1,494 @@
+"""Client-side rate limiting of the LLM backends, paced with token buckets.
+
+Hosted model endpoints limit requests and tokens per minute, and answer past their
+limits with ``429``. The SDKs retry those with backoff, so every pod keeps sending
+requests that are refused. The limiter keeps each backend (the host of a base URL)
+within its limits before the requests are sent instead:
+
+- Each backend has a bucket of requests and one of tokens, refilled continuously at
+  RATE_LIMIT_RPM / 60 and RATE_LIMIT_TPM / 60 per second and holding at most
+  RATE_LIMIT_BURST seconds of them (at least one request). A request takes one request
+  and its estimated tokens: the characters of its body over CHARS_PER_TOKEN, plus its
+  ``max_tokens`` (COMPLETION_TOKENS when unset). When the buckets run dry, requests
+  wait in turn for their share to be refilled, so they are spaced evenly rather than
+  sent in bursts. The estimate is corrected with the ``usage`` of the response when
+  it has one.
+- The limits of the server come first. A ``Retry-After`` (or ``retry-after-ms``)
+  header pauses the backend for that long, and the ``x-ratelimit-remaining-*`` headers
+  lower the buckets to what the server says is left (other pods share it). When one
+  of them reaches zero, the backend pauses until its ``x-ratelimit-reset-*`` time.
+
+RATE_LIMIT_RPM and RATE_LIMIT_TPM apply to every backend (0, the default, is no
+limit); RATE_LIMIT_BACKENDS overrides them per backend. The limiter wraps the HTTP
+transport of the LLM clients, like the cassette, and is left out while a cassette
+answers the requests. /metrics exports the time requests waited, by backend and by
+the limit they waited for, and the ``429`` answers.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Iterator
+from urllib.parse import urlsplit
+
+import httpx
+
+from .metrics import REGISTRY
+from .settings import Settings, SettingsError, get_settings, on_reload
+
+logger = logging.getLogger(__name__)
+
+# Characters of a request body counted as one token
+CHARS_PER_TOKEN = 4
+# Tokens assumed for the completion of a request without max_tokens
+COMPLETION_TOKENS = 512
+# Bytes of a streamed response kept to find its usage, sent in the last chunk
+_USAGE_TAIL = 4096
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+WAIT_SECONDS = REGISTRY.histogram(
+    "agent_llm_rate_limit_wait_seconds",
+    "Time LLM requests waited for the client-side rate limiter, by backend and limit.",
+    ("backend", "limit"),
+)
+RATE_LIMITED = REGISTRY.counter(
+    "agent_llm_rate_limited_total",
+    "LLM responses refused by the backend with 429, by backend.",
+    ("backend",),
+)
+
+
+def parse_duration(raw: str | None) -> float | None:
+    """Seconds of a rate limit reset header: ``1.5``, ``20ms``, ``6m0s`` or ``1h2m3.5s``."""
+    if not raw:
+        return None
+    raw = raw.strip()
+    try:
+        return float(raw)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(raw)
+    if not parts or "".join(value + unit for value, unit in parts) != raw:
+        return None
+    return sum(float(value) * _DURATION_UNITS[unit] for value, unit in parts)
+
+
+def retry_after(headers: httpx.Headers) -> float | None:
+    """Seconds to wait according to ``retry-after-ms`` or ``Retry-After`` (seconds or date)."""
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(raw).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Tokens a request will count for: its prompt characters, plus the completion allowed.
+
+    Requests that are not completions (no ``messages`` or ``prompt``) count for none.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return 0
+    if not isinstance(payload, dict) or not ("messages" in payload or "prompt" in payload):
+        return 0
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens")
+    if not isinstance(completion, int):
+        completion = COMPLETION_TOKENS
+    return len(body) // CHARS_PER_TOKEN + completion
+
+
+def parse_backend_limits(raw: str | None) -> dict[str, tuple[int, int]]:
+    """Parse RATE_LIMIT_BACKENDS (``backend=rpm/tpm,...``) into limits by backend.
+
+    A backend is a host (``host:port``) or a base URL; a limit of 0 is no limit.
+
+    Raises:
+        SettingsError: If an entry is not ``backend=rpm/tpm`` with non-negative integers.
+    """
+    limits = {}
+    for entry in (raw or "").split(","):
+        if not entry.strip():
+            continue
+        backend, separator, value = entry.partition("=")
+        rpm, slash, tpm = value.partition("/")
+        try:
+            if not separator or not slash or not backend.strip():
+                raise ValueError
+            limit = int(rpm.strip()), int(tpm.strip())
+        except ValueError:
+            raise SettingsError(
+                f"RATE_LIMIT_BACKENDS entry {entry.strip()!r} is not backend=rpm/tpm"
+            ) from None
+        if min(limit) < 0:
+            raise SettingsError(f"RATE_LIMIT_BACKENDS limits must not be negative, got {entry.strip()!r}")
+        limits[backend_of(backend.strip())] = limit
+    return limits
+
+
+def backend_of(base_url: str) -> str:
+    """Backend of a base URL: its host and port (a bare host is its own backend)."""
+    return urlsplit(base_url).netloc or urlsplit("//" + base_url).netloc or base_url
+
+
+class TokenBucket:
+    """Tokens refilled at ``rate`` per second, up to ``capacity``.
+
+    Takers are never refused: the level goes below zero, and each taker waits until the
+    tokens it took (and those taken before) have been refilled. A rate of 0 is no limit.
+    Not thread-safe; RateLimiter serializes the calls.
+    """
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._updated = now
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def configure(self, rate: float, capacity: float, now: float) -> None:
+        """Change the rate and capacity, keeping the tokens taken so far (full when it had no limit)."""
+        self._refill(now)
+        self.level = min(self.level, capacity) if self.rate > 0 else capacity
+        self.rate = rate
+        self.capacity = capacity
+
+    def take(self, amount: float, now: float) -> float:
+        """Take ``amount`` tokens; returns the seconds until they are refilled."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def give(self, amount: float, now: float) -> None:
+        """Put back ``amount`` tokens (negative to take more, e.g. after an underestimate)."""
+        if self.rate > 0:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, until: float, now: float) -> None:
+        """Empty the bucket so that it refills from ``until`` on."""
+        if self.rate > 0:
+            self._refill(now)
+            self.level = min(self.level, -(until - now) * self.rate)
+
+    def lower(self, level: float, now: float) -> None:
+        """Hold at most ``level`` tokens."""
+        if self.rate > 0:
+            self._refill(now)
+            self.level = min(self.level, level)
+
+
+class RateLimiter:
+    """Request and token buckets of one backend, with the pause asked for by the backend."""
+
+    def __init__(
+        self,
+        backend: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        burst: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Limit a backend.
+
+        Args:
+            backend: Name of the backend in the metrics (its host).
+            rpm: Requests per minute; 0 is no limit.
+            tpm: Estimated tokens per minute; 0 is no limit.
+            burst: Seconds of the rates the buckets hold (at least one request).
+            clock: Monotonic clock (seconds).
+        """
+        self.backend = backend
+        self.clock = clock
+        self._lock = threading.Lock()
+        now = clock()
+        self.requests = TokenBucket(0.0, 0.0, now)
+        self.tokens = TokenBucket(0.0, 0.0, now)
+        self._paused_until = now
+        self.configure(rpm, tpm, burst)
+
+    def configure(self, rpm: int, tpm: int, burst: float) -> None:
+        """Apply new limits; requests already waiting keep their turn."""
+        with self._lock:
+            now = self.clock()
+            self.requests.configure(rpm / 60, max(1.0, rpm / 60 * burst), now)
+            self.tokens.configure(tpm / 60, tpm / 60 * burst, now)
+            self.rpm, self.tpm = rpm, tpm
+
+    @property
+    def limited(self) -> bool:
+        """Whether the backend has a request or token limit."""
+        return self.rpm > 0 or self.tpm > 0
+
+    def reserve(self, tokens: int) -> tuple[float, str]:
+        """Take a request and ``tokens`` tokens.
+
+        Returns:
+            Seconds to wait before sending the request, and the limit waited for
+            (``requests``, ``tokens``, ``retry_after``, or ``none``).
+        """
+        with self._lock:
+            now = self.clock()
+            waits = {
+                "requests": self.requests.take(1, now),
+                "tokens": self.tokens.take(tokens, now),
+                "retry_after": self._paused_until - now,
+            }
+        limit = max(waits, key=waits.get)
+        return (waits[limit], limit) if waits[limit] > 0 else (0.0, "none")
+
+    def cancel(self, tokens: int) -> None:
+        """Give back a reservation whose request was not sent."""
+        with self._lock:
+            now = self.clock()
+            self.requests.give(1, now)
+            self.tokens.give(tokens, now)
+
+    def paused_for(self) -> float:
+        """Seconds left of a pause asked for by the backend."""
+        return max(0.0, self._paused_until - self.clock())
+
+    def pause(self, seconds: float) -> None:
+        """Send nothing for ``seconds``, then resume at the configured pace."""
+        with self._lock:
+            now = self.clock()
+            until = now + seconds
+            self._paused_until = max(self._paused_until, until)
+            self.requests.drain(until, now)
+            self.tokens.drain(until, now)
+
+    def settle(self, estimated: int, used: int) -> None:
+        """Correct the token bucket with the tokens a request actually used."""
+        with self._lock:
+            self.tokens.give(estimated - used, self.clock())
+
+    def observe(self, response: httpx.Response) -> None:
+        """Follow the rate limit headers of a response of the backend."""
+        headers = response.headers
+        if response.status_code == 429:
+            RATE_LIMITED.inc(backend=self.backend)
+        delay = retry_after(headers)
+        if delay is not None and delay > 0 and response.status_code in (429, 503):
+            logger.info("Backend %s asked to retry after %.2fs", self.backend, delay)
+            self.pause(delay)
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            try:
+                remaining = float(headers[f"x-ratelimit-remaining-{kind}"])
+            except (KeyError, ValueError):
+                continue
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining <= 0 and reset:
+                self.pause(reset)
+            else:
+                with self._lock:
+                    bucket.lower(remaining, self.clock())
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait for the turn of a request of ``tokens`` estimated tokens."""
+        delay, limit = self.reserve(tokens)
+        waited = 0.0
+        try:
+            while delay > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+                # The backend may have asked for a pause in the meantime
+                delay = self.paused_for()
+        except asyncio.CancelledError:
+            self.cancel(tokens)
+            raise
+        WAIT_SECONDS.observe(waited, backend=self.backend, limit=limit)
+
+    def acquire_sync(self, tokens: int) -> None:
+        """acquire() for the sync clients."""
+        delay, limit = self.reserve(tokens)
+        waited = 0.0
+        while delay > 0:
+            time.sleep(delay)
+            waited += delay
+            delay = self.paused_for()
+        WAIT_SECONDS.observe(waited, backend=self.backend, limit=limit)
+
+    def http_client(self) -> httpx.Client:
+        """Sync HTTP client for the LLM SDK, paced by this limiter."""
+        return httpx.Client(transport=RateLimitedTransport(self), timeout=None)
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        """Async HTTP client for the LLM SDK, paced by this limiter."""
+        return httpx.AsyncClient(transport=RateLimitedTransport(self), timeout=None)
+
+
+def _usage(body: bytes, streamed: bool) -> int | None:
+    """Total tokens of the ``usage`` of a response body (JSON, or the last SSE events)."""
+    if not streamed:
+        documents = [body]
+    else:
+        lines = body.decode("utf-8", "replace").splitlines()
+        documents = [line[5:].strip() for line in reversed(lines) if line.startswith("data:")]
+    for document in documents:
+        try:
+            usage = json.loads(document).get("usage")
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), int):
+            return usage["total_tokens"]
+    return None
+
+
+class _UsageStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Pass a response body through, then report the tokens its ``usage`` says were used."""
+
+    def __init__(self, stream: Any, streamed: bool, on_usage: Callable[[int], None]) -> None:
+        self._stream = stream
+        self._streamed = streamed
+        self._on_usage = on_usage
+        self._body = bytearray()
+        self._done = False
+
+    def _add(self, chunk: bytes) -> None:
+        self._body += chunk
+        if self._streamed and len(self._body) > 2 * _USAGE_TAIL:
+            del self._body[:-_USAGE_TAIL]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._add(chunk)
+            yield chunk
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            self._add(chunk)
+            yield chunk
+
+    def _finish(self) -> None:
+        if not self._done:
+            self._done = True
+            used = _usage(bytes(self._body), self._streamed)
+            if used is not None:
+                self._on_usage(used)
+
+    def close(self) -> None:
+        self._stream.close()
+        self._finish()
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+        self._finish()
+
+
+class RateLimitedTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport sending requests at the pace of a RateLimiter (sync and async)."""
+
+    def __init__(self, limiter: RateLimiter, upstream: Any = None) -> None:
+        """Wrap the transport requests are sent with.
+
+        Args:
+            limiter: Limiter of the backend the requests go to.
+            upstream: Transport sending the requests; plain HTTP(S) by default.
+        """
+        self.limiter = limiter
+        self._sync = upstream
+        self._async = upstream
+
+    def _response(self, response: httpx.Response, tokens: int) -> httpx.Response:
+        self.limiter.observe(response)
+        if tokens and response.status_code == 200:
+            streamed = response.headers.get("content-type", "").startswith("text/event-stream")
+            settle = lambda used: self.limiter.settle(tokens, used)  # noqa: E731
+            response.stream = _UsageStream(response.stream, streamed, settle)
+        return response
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_tokens(request.read())
+        self.limiter.acquire_sync(tokens)
+        self._sync = self._sync or httpx.HTTPTransport()
+        return self._response(self._sync.handle_request(request), tokens)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_tokens(await request.aread())
+        await self.limiter.acquire(tokens)
+        self._async = self._async or httpx.AsyncHTTPTransport()
+        return self._response(await self._async.handle_async_request(request), tokens)
+
+    def close(self) -> None:
+        if self._sync is not None:
+            self._sync.close()
+
+    async def aclose(self) -> None:
+        if self._async is not None:
+            await self._async.aclose()
+
+
+class RateLimiters:
+    """Limiters by backend, following the settings."""
+
+    def __init__(self, settings: Settings) -> None:
+        self._limiters: dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+        self.configure(settings)
+
+    def configure(self, settings: Settings) -> None:
+        """Apply the RATE_LIMIT_* settings to every backend (see parse_backend_limits)."""
+        overrides = parse_backend_limits(settings.rate_limit_backends)
+        with self._lock:
+            self._defaults = (settings.rate_limit_rpm, settings.rate_limit_tpm)
+            self._overrides = overrides
+            self._burst = settings.rate_limit_burst
+            for backend, limiter in self._limiters.items():
+                limiter.configure(*self.limits(backend), self._burst)
+
+    def limits(self, backend: str) -> tuple[int, int]:
+        """Requests and tokens per minute of a backend."""
+        return self._overrides.get(backend, self._defaults)
+
+    def get(self, base_url: str) -> RateLimiter | None:
+        """Limiter of the backend serving ``base_url``; None when it has no limits."""
+        backend = backend_of(base_url)
+        with self._lock:
+            limiter = self._limiters.get(backend)
+            if limiter is None:
+                if not any(self.limits(backend)):
+                    return None
+                limiter = RateLimiter(backend, *self.limits(backend), burst=self._burst)
+                self._limiters[backend] = limiter
+        return limiter if limiter.limited else None
+
+
+_limiters: RateLimiters | None = None
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(base_url: str) -> RateLimiter | None:
+    """Process-wide limiter of the backend at ``base_url``; None when it has no limits.
+
+    Limiters are shared by all the clients of a backend and follow settings reloads.
+    """
+    global _limiters
+    if _limiters is None:
+        with _limiters_lock:
+            if _limiters is None:
+                _limiters = RateLimiters(get_settings())
+                on_reload(_limiters.configure)
+    return _limiters.get(base_url)
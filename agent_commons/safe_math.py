@@ -0,0 +1,335 @@
+import ast
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Mapping
+
+import numpy as np
+
+# Limits; the expression language has no loops, so they bound CPU time and memory
+MAX_EXPRESSION_LENGTH = 2000
+MAX_NODES = 300
+MAX_ARRAY_SIZE = 1_000_000
+MAX_WORK = 50_000_000  # AST nodes x array elements
+MAX_INT_BITS = 10_000  # exact integer results beyond this are refused
+MAX_LISTED_VALUES = 20  # longer array results are summarized
+MAX_ROUND_DIGITS = 308  # round() computes 10**ndigits; float64 has no more decimal places
+
+COMPILE_CACHE_SIZE = 1024
+
+
+class SafeMathError(ValueError):
+    """Raised for expressions that are invalid, unsupported or exceed the limits."""
+
+
+def _scalar_or_array(scalar_fn: Callable, array_fn: Callable) -> Callable:
+    """Function using ``math`` (exact, raises on domain errors) for scalars and NumPy for arrays."""
+
+    def apply(*args: Any) -> Any:
+        if any(isinstance(arg, np.ndarray) for arg in args):
+            return array_fn(*args)
+        return scalar_fn(*args)
+
+    return apply
+
+
+def _reduction(array_fn: Callable) -> Callable:
+    """Aggregate over an array; a scalar is its own aggregate."""
+
+    def apply(value: Any) -> Any:
+        return array_fn(value) if isinstance(value, np.ndarray) else value
+
+    return apply
+
+
+def _min_max(pairwise: Callable, array_fn: Callable, builtin: Callable) -> Callable:
+    """min/max: one argument aggregates an array, several compare element-wise."""
+
+    def apply(*args: Any) -> Any:
+        if len(args) == 1:
+            return _reduction(array_fn)(args[0])
+        if any(isinstance(arg, np.ndarray) for arg in args):
+            result = args[0]
+            for arg in args[1:]:
+                result = pairwise(result, arg)
+            return result
+        return builtin(*args)
+
+    return apply
+
+
+def _round(value: Any, ndigits: Any = None) -> Any:
+    """round() with ``ndigits`` limited to an integer of at most MAX_ROUND_DIGITS."""
+    if ndigits is not None:
+        if isinstance(ndigits, np.ndarray) or isinstance(ndigits, bool) or not isinstance(ndigits, int):
+            raise SafeMathError("round() needs an integer number of digits")
+        if abs(ndigits) > MAX_ROUND_DIGITS:
+            raise SafeMathError(f"round() digits must be between -{MAX_ROUND_DIGITS} and {MAX_ROUND_DIGITS}")
+    if isinstance(value, np.ndarray):
+        return np.round(value, ndigits or 0)
+    return round(value) if ndigits is None else round(value, ndigits)
+
+
+def _log(value: Any, base: Any = None) -> Any:
+    if isinstance(value, np.ndarray) or isinstance(base, np.ndarray):
+        return np.log(value) if base is None else np.log(value) / np.log(base)
+    return math.log(value) if base is None else math.log(value, base)
+
+
+FUNCTIONS: dict[str, Callable] = {
+    "sqrt": _scalar_or_array(math.sqrt, np.sqrt),
+    "exp": _scalar_or_array(math.exp, np.exp),
+    "log": _log,
+    "log10": _scalar_or_array(math.log10, np.log10),
+    "log2": _scalar_or_array(math.log2, np.log2),
+    "sin": _scalar_or_array(math.sin, np.sin),
+    "cos": _scalar_or_array(math.cos, np.cos),
+    "tan": _scalar_or_array(math.tan, np.tan),
+    "asin": _scalar_or_array(math.asin, np.arcsin),
+    "acos": _scalar_or_array(math.acos, np.arccos),
+    "atan": _scalar_or_array(math.atan, np.arctan),
+    "atan2": _scalar_or_array(math.atan2, np.arctan2),
+    "sinh": _scalar_or_array(math.sinh, np.sinh),
+    "cosh": _scalar_or_array(math.cosh, np.cosh),
+    "tanh": _scalar_or_array(math.tanh, np.tanh),
+    "hypot": _scalar_or_array(math.hypot, np.hypot),
+    "abs": _scalar_or_array(abs, np.abs),
+    "floor": _scalar_or_array(math.floor, np.floor),
+    "ceil": _scalar_or_array(math.ceil, np.ceil),
+    "round": _round,
+    "min": _min_max(np.minimum, np.min, min),
+    "max": _min_max(np.maximum, np.max, max),
+    "sum": _reduction(np.sum),
+    "mean": _reduction(np.mean),
+    "prod": _reduction(np.prod),
+    "std": _reduction(np.std),
+    "var": _reduction(np.var),
+}
+
+CONSTANTS: dict[str, float] = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+def _pow(base: Any, exponent: Any) -> Any:
+    """``**`` that refuses exact integer results with more than MAX_INT_BITS bits."""
+    if isinstance(base, np.ndarray) or isinstance(exponent, np.ndarray):
+        return np.power(np.asarray(base, dtype=float), exponent)
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if exponent * math.log2(abs(base)) > MAX_INT_BITS:
+            raise SafeMathError(f"Result of {base}**{exponent} is too large")
+    return _bounded(base**exponent)
+
+
+def _bounded(value: Any) -> Any:
+    """Refuse exact integers with more than MAX_INT_BITS bits (``*`` and ``+`` chains too)."""
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise SafeMathError(f"Result has more than {MAX_INT_BITS} bits")
+    return value
+
+
+class _Validator(ast.NodeVisitor):
+    """Reject every construct except numbers, names, arithmetic and whitelisted calls."""
+
+    def __init__(self) -> None:
+        self.nodes = 0
+        self.names: set[str] = set()
+
+    def generic_visit(self, node: ast.AST) -> None:
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise SafeMathError(f"Expression has more than {MAX_NODES} elements")
+
+        if isinstance(node, ast.Expression):
+            pass
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise SafeMathError(f"Unsupported constant {node.value!r}")
+        elif isinstance(node, ast.Name):
+            if node.id.startswith("_") or node.id in FUNCTIONS:
+                raise SafeMathError(f"Invalid name {node.id!r}")
+            if node.id not in CONSTANTS:
+                self.names.add(node.id)
+        elif isinstance(node, ast.BinOp):
+            if not isinstance(node.op, _BINARY_OPERATORS):
+                raise SafeMathError(f"Unsupported operator {type(node.op).__name__}")
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, _UNARY_OPERATORS):
+                raise SafeMathError(f"Unsupported operator {type(node.op).__name__}")
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise SafeMathError(f"Unsupported function {ast.unparse(node.func)!r}")
+            if node.keywords:
+                raise SafeMathError("Keyword arguments are not supported")
+            for arg in node.args:
+                self.visit(arg)
+            self.nodes += 1  # the function name
+            return
+        elif not isinstance(node, (ast.operator, ast.unaryop, ast.Load)):
+            raise SafeMathError(f"Unsupported syntax: {type(node).__name__}")
+
+        super().generic_visit(node)
+
+
+class _IntBoundRewriter(ast.NodeTransformer):
+    """Route ``a ** b`` through _pow and other arithmetic through _bounded, so exact integers stay bounded."""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            call = ast.Call(func=ast.Name("_pow", ast.Load()), args=[node.left, node.right], keywords=[])
+        else:
+            call = ast.Call(func=ast.Name("_bounded", ast.Load()), args=[node], keywords=[])
+        return ast.copy_location(call, node)
+
+
+@dataclass(frozen=True)
+class CompiledExpression:
+    """A validated expression compiled to a code object."""
+
+    source: str
+    code: Any
+    variables: frozenset[str]
+    nodes: int
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Parse, validate and compile an expression (cached by source text).
+
+    Args:
+        expression: Arithmetic expression, e.g. ``"sqrt(x**2 + 1) / 2"``.
+
+    Returns:
+        The compiled expression.
+
+    Raises:
+        SafeMathError: If the expression is too long, invalid or uses unsupported syntax.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise SafeMathError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, RecursionError, MemoryError) as e:
+        raise SafeMathError(f"Invalid expression: {e}") from e
+
+    validator = _Validator()
+    validator.visit(tree)
+    tree = ast.fix_missing_locations(_IntBoundRewriter().visit(tree))
+    return CompiledExpression(
+        source=expression,
+        code=compile(tree, "<expression>", "eval"),
+        variables=frozenset(validator.names),
+        nodes=validator.nodes,
+    )
+
+
+def _to_value(name: str, value: Any) -> Any:
+    """Turn a variable value (number, list of numbers or range mapping) into a number or array."""
+    if isinstance(value, bool):
+        raise SafeMathError(f"Variable {name!r} must be numeric")
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, Mapping):
+        try:
+            start = float(value.get("start", 0))
+            stop = float(value["stop"])
+            step = float(value.get("step", 1))
+        except (KeyError, TypeError, ValueError) as e:
+            raise SafeMathError(f"Range {name!r} needs numeric start, stop and step") from e
+        if step == 0:
+            raise SafeMathError(f"Range {name!r} has a zero step")
+        size = max(math.ceil((stop - start) / step), 0)
+        if size > MAX_ARRAY_SIZE:
+            raise SafeMathError(f"Range {name!r} has {size} values, the limit is {MAX_ARRAY_SIZE}")
+        return np.arange(start, stop, step, dtype=float)
+    try:
+        array = np.asarray(value, dtype=float)
+    except (TypeError, ValueError) as e:
+        raise SafeMathError(f"Variable {name!r} must be numeric") from e
+    if array.ndim != 1:
+        raise SafeMathError(f"Variable {name!r} must be a number or a flat list of numbers")
+    if array.size > MAX_ARRAY_SIZE:
+        raise SafeMathError(f"Variable {name!r} has {array.size} values, the limit is {MAX_ARRAY_SIZE}")
+    return array
+
+
+def evaluate(expression: str, variables: Mapping[str, Any] | None = None) -> Any:
+    """Evaluate an expression, vectorized over array and range variables.
+
+    Scalars are computed exactly with Python numbers; array variables (lists or
+    ``{"start", "stop", "step"}`` ranges) are float64 NumPy arrays, so one call
+    evaluates the expression over every element without Python loops.
+
+    Args:
+        expression: Arithmetic expression.
+        variables: Values of the names used in the expression.
+
+    Returns:
+        A number, or a NumPy array when a variable is an array.
+
+    Raises:
+        SafeMathError: If the expression is invalid, exceeds the limits or fails to evaluate.
+    """
+    compiled = compile_expression(expression)
+    variables = variables or {}
+
+    missing = compiled.variables - set(variables)
+    if missing:
+        raise SafeMathError(f"Unknown names: {', '.join(sorted(missing))}")
+
+    namespace: dict[str, Any] = {"__builtins__": {}, "_pow": _pow, "_bounded": _bounded, **FUNCTIONS, **CONSTANTS}
+    size = 1
+    for name in compiled.variables:
+        value = _to_value(name, variables[name])
+        if isinstance(value, np.ndarray):
+            if size > 1 and value.size not in (1, size):
+                raise SafeMathError("Array variables must all have the same length")
+            size = max(size, value.size)
+        namespace[name] = value
+
+    if compiled.nodes * size > MAX_WORK:
+        raise SafeMathError("Expression is too expensive to evaluate over arrays this large")
+
+    try:
+        with np.errstate(all="ignore"):
+            return eval(compiled.code, namespace)  # noqa: S307 - validated AST, no builtins
+    except SafeMathError:
+        raise
+    except (ArithmeticError, ValueError, TypeError) as e:
+        raise SafeMathError(f"{type(e).__name__}: {e}") from e
+
+
+def _format_number(value: Any) -> str:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return f"{value:.15g}"
+    return str(value)
+
+
+def format_result(value: Any) -> str:
+    """Text form of an evaluation result; long arrays are summarized."""
+    if not isinstance(value, np.ndarray):
+        return _format_number(value)
+    if value.size <= MAX_LISTED_VALUES:
+        return "[" + ", ".join(_format_number(item) for item in value) + "]"
+    head = ", ".join(_format_number(item) for item in value[:5])
+    return (
+        f"{value.size} values: [{head}, ...]; min={_format_number(value.min())}, "
+        f"max={_format_number(value.max())}, mean={_format_number(value.mean())}, "
+        f"sum={_format_number(value.sum())}"
+    )
+
+
+def calculate(expression: str, variables: Mapping[str, Any] | None = None) -> str:
+    """Body of the calculator tool: the formatted result, or the error for the model to fix."""
+    try:
+        value = evaluate(expression, variables)
+        try:
+            return format_result(value)
+        except (ArithmeticError, ValueError) as e:
+            raise SafeMathError(f"Result cannot be shown: {e}") from e
+    except SafeMathError as e:
+        return f"Error: {e}"
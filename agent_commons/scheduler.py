@@ -0,0 +1,324 @@
+"""Weighted fair scheduling of agent runs across tenants.
+
+Teams sharing a deployment share its model backend. Without a scheduler the runs
+start first-come, first-served, so one team's batch script can fill the backend and
+make everyone else wait. The scheduler admits at most ``max_concurrency`` runs at
+a time and picks the next one by tenant, not by arrival:
+
+- Two priority lanes: interactive runs (``/chat``, ``/ws/chat``) always go before
+  batch runs (``/jobs``, or requests sent with ``X-Priority: batch``).
+- Within a lane, tenants are served by start-time fair queueing: each waiting run
+  gets a virtual start time, ``max(lane clock, tenant's last finish)``, and finishes
+  ``1 / weight`` later. A tenant with weight 2 gets twice the runs of a tenant with
+  weight 1 when both have runs waiting, and a tenant that sent a burst only delays
+  its own runs.
+- Each tenant runs at most its concurrency quota at a time; its other runs wait
+  even when the backend has room.
+
+A request's tenant is the one its API key (``Authorization: Bearer`` or
+``X-API-Key``) maps to in TENANT_API_KEYS, else its X-Tenant-Id header, else a hash
+of its API key, else ``default``.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Mapping, TypeVar
+
+from .metrics import REGISTRY
+from .settings import (
+    DEFAULT_SCHEDULER_MAX_CONCURRENCY,
+    DEFAULT_TENANT_MAX_CONCURRENCY,
+    Settings,
+    SettingsError,
+    get_settings,
+    on_reload,
+)
+from .timing import QUEUE, RequestTimer
+
+T = TypeVar("T")
+
+TENANT_HEADER = "X-Tenant-Id"
+PRIORITY_HEADER = "X-Priority"
+API_KEY_HEADER = "X-API-Key"
+DEFAULT_TENANT = "default"
+
+# Priority lanes, served in this order
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+# Longest tenant id taken from a header
+MAX_TENANT_LENGTH = 64
+# Distinct tenants labelled in the metrics; the others are counted as "other"
+MAX_TENANT_LABELS = 100
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "agent_scheduler_queue_wait_seconds",
+    "Time agent runs waited for the scheduler to start them, by tenant and lane.",
+    ("tenant", "lane"),
+)
+RUNS_WAITING = REGISTRY.gauge(
+    "agent_scheduler_waiting", "Agent runs waiting to start, by tenant and lane.", ("tenant", "lane")
+)
+RUNS_RUNNING = REGISTRY.gauge(
+    "agent_scheduler_running", "Agent runs started by the scheduler and not finished, by tenant.", ("tenant",)
+)
+
+
+def parse_tenant_values(name: str, raw: str | None, kind: type) -> dict[str, float]:
+    """Parse a ``tenant=value,tenant=value`` setting.
+
+    Raises:
+        SettingsError: If an entry is not ``tenant=value`` or its value not positive.
+    """
+    values = {}
+    for entry in (raw or "").split(","):
+        if not entry.strip():
+            continue
+        tenant, separator, value = entry.partition("=")
+        try:
+            if not separator or not tenant.strip():
+                raise ValueError
+            values[tenant.strip()] = kind(value.strip())
+        except ValueError:
+            raise SettingsError(f"{name.upper()} entry {entry.strip()!r} is not tenant=value") from None
+        if values[tenant.strip()] <= 0:
+            raise SettingsError(f"{name.upper()} values must be positive, got {entry.strip()!r}")
+    return values
+
+
+def parse_api_keys(raw: str | None) -> dict[str, str]:
+    """Parse TENANT_API_KEYS (``key=tenant,key=tenant``) into tenant by API key.
+
+    Raises:
+        SettingsError: If an entry is not ``key=tenant``.
+    """
+    keys = {}
+    for entry in (raw or "").split(","):
+        if not entry.strip():
+            continue
+        key, separator, tenant = entry.partition("=")
+        if not separator or not key.strip() or not tenant.strip():
+            raise SettingsError("TENANT_API_KEYS entries must be key=tenant")
+        keys[key.strip()] = tenant.strip()
+    return keys
+
+
+def _api_key(headers: Mapping[str, str]) -> str | None:
+    authorization = headers.get("authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return token.strip()
+    return (headers.get(API_KEY_HEADER) or "").strip() or None
+
+
+def request_lane(headers: Mapping[str, str], default: str = INTERACTIVE) -> str:
+    """Lane of a request: its X-Priority header when it names one, else ``default``."""
+    lane = (headers.get(PRIORITY_HEADER) or "").strip().lower()
+    return lane if lane in LANES else default
+
+
+@dataclass(order=True)
+class _Waiter:
+    start: float  # virtual start time
+    seq: int
+    tenant: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class FairScheduler:
+    """Admits agent runs by lane, then weighted fair share across tenants, within quotas.
+
+    Use it from the event loop running the requests; ``slot`` waits for a run's turn.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_SCHEDULER_MAX_CONCURRENCY,
+        tenant_max_concurrency: int = DEFAULT_TENANT_MAX_CONCURRENCY,
+        weights: Mapping[str, float] | None = None,
+        quotas: Mapping[str, int] | None = None,
+        api_keys: Mapping[str, str] | None = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Configure the scheduler.
+
+        Args:
+            max_concurrency: Most runs at a time, over all tenants.
+            tenant_max_concurrency: Most runs at a time of a tenant without a quota of its own.
+            weights: Share of the tenants relative to each other (1 when not listed).
+            quotas: Most runs at a time, by tenant.
+            api_keys: Tenant by API key.
+            clock: Monotonic clock used to measure waits.
+        """
+        self.max_concurrency = max_concurrency
+        self.tenant_max_concurrency = tenant_max_concurrency
+        self.weights = dict(weights or {})
+        self.quotas = dict(quotas or {})
+        self.api_keys = dict(api_keys or {})
+        self.clock = clock
+        self._waiting: dict[str, list[_Waiter]] = {lane: [] for lane in LANES}
+        self._virtual_time = {lane: 0.0 for lane in LANES}
+        self._last_finish: dict[tuple[str, str], float] = {}
+        self._running: dict[str, int] = {}
+        self._total_running = 0
+        self._seq = itertools.count()
+        self._labels: set[str] = set()
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "FairScheduler":
+        """Scheduler configured by the SCHEDULER_MAX_CONCURRENCY, TENANT_MAX_CONCURRENCY,
+        TENANT_WEIGHTS, TENANT_QUOTAS and TENANT_API_KEYS settings.
+
+        Raises:
+            SettingsError: If one of the tenant lists is malformed.
+        """
+        scheduler = cls()
+        scheduler.configure(settings or get_settings())
+        return scheduler
+
+    def configure(self, settings: Settings) -> None:
+        """Apply (reloaded) limits, weights and API keys; runs already started keep going.
+
+        Raises:
+            SettingsError: If one of the tenant lists is malformed.
+        """
+        weights = parse_tenant_values("tenant_weights", settings.tenant_weights, float)
+        quotas = parse_tenant_values("tenant_quotas", settings.tenant_quotas, int)
+        api_keys = parse_api_keys(settings.tenant_api_keys)
+        self.max_concurrency = settings.scheduler_max_concurrency
+        self.tenant_max_concurrency = settings.tenant_max_concurrency
+        self.weights, self.quotas, self.api_keys = weights, quotas, api_keys
+        self._dispatch()
+
+    def tenant(self, headers: Mapping[str, str]) -> str:
+        """Tenant of a request, from its API key or X-Tenant-Id header (see the module docstring).
+
+        Args:
+            headers: The request headers (case-insensitive, as Starlette's).
+        """
+        key = _api_key(headers)
+        if key is not None and key in self.api_keys:
+            return self.api_keys[key]
+        tenant = (headers.get(TENANT_HEADER) or "").strip()[:MAX_TENANT_LENGTH]
+        if tenant:
+            return tenant
+        if key is not None:
+            return "key-" + hashlib.sha256(key.encode()).hexdigest()[:12]
+        return DEFAULT_TENANT
+
+    def _label(self, tenant: str) -> str:
+        if tenant in self._labels or len(self._labels) < MAX_TENANT_LABELS:
+            self._labels.add(tenant)
+            return tenant
+        return "other"
+
+    def _quota(self, tenant: str) -> int:
+        return self.quotas.get(tenant, self.tenant_max_concurrency)
+
+    def _dispatch(self) -> None:
+        """Start waiting runs while there is room: interactive lane first, lowest start time first."""
+        for lane in LANES:
+            waiting = self._waiting[lane]
+            skipped = []  # runs of tenants at their quota
+            while waiting and self._total_running < self.max_concurrency:
+                waiter = heapq.heappop(waiting)
+                if waiter.future.done():
+                    continue  # cancelled while waiting
+                if self._running.get(waiter.tenant, 0) >= self._quota(waiter.tenant):
+                    skipped.append(waiter)
+                    continue
+                self._virtual_time[lane] = max(self._virtual_time[lane], waiter.start)
+                self._running[waiter.tenant] = self._running.get(waiter.tenant, 0) + 1
+                self._total_running += 1
+                waiter.future.set_result(None)
+            for waiter in skipped:
+                heapq.heappush(waiting, waiter)
+
+    def _release(self, tenant: str, lane: str) -> None:
+        self._total_running -= 1
+        self._running[tenant] -= 1
+        if not self._running[tenant]:
+            del self._running[tenant]
+        if self._last_finish.get((lane, tenant), 0.0) <= self._virtual_time[lane]:
+            # No longer ahead of the lane clock: the tenant's next run starts at the clock
+            self._last_finish.pop((lane, tenant), None)
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self, tenant: str, lane: str = INTERACTIVE, timer: RequestTimer | None = None
+    ) -> AsyncIterator[None]:
+        """Wait for the turn of a run of ``tenant`` and hold its slot while the block runs.
+
+        Args:
+            tenant: Tenant of the run (see ``tenant``).
+            lane: INTERACTIVE or BATCH.
+            timer: Timer of the request; the wait is timed as queue time.
+        """
+        weight = self.weights.get(tenant, 1.0)
+        start = max(self._virtual_time[lane], self._last_finish.get((lane, tenant), 0.0))
+        self._last_finish[(lane, tenant)] = start + 1.0 / weight
+        waiter = _Waiter(start, next(self._seq), tenant, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiting[lane], waiter)
+        self._dispatch()
+
+        label = self._label(tenant)
+        waited_from = self.clock()
+        RUNS_WAITING.inc(tenant=label, lane=lane)
+        try:
+            with timer.span(QUEUE) if timer is not None else contextlib.nullcontext():
+                await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(tenant, lane)  # started just as the wait was cancelled
+            else:
+                waiter.future.cancel()
+            raise
+        finally:
+            RUNS_WAITING.inc(-1, tenant=label, lane=lane)
+        QUEUE_WAIT.observe(self.clock() - waited_from, tenant=label, lane=lane)
+
+        RUNS_RUNNING.inc(tenant=label)
+        try:
+            yield
+        finally:
+            RUNS_RUNNING.inc(-1, tenant=label)
+            self._release(tenant, lane)
+
+    async def stream_in_slot(
+        self,
+        tenant: str,
+        lane: str,
+        timer: RequestTimer | None,
+        stream: AsyncIterator[T],
+    ) -> AsyncIterator[T]:
+        """Re-yield ``stream`` once the run has its slot, holding the slot until the stream ends.
+
+        Closing the returned stream closes ``stream``.
+        """
+        async with self.slot(tenant, lane, timer):
+            async with contextlib.aclosing(stream):
+                async for item in stream:
+                    yield item
+
+
+_scheduler: FairScheduler | None = None
+
+
+def get_scheduler() -> FairScheduler:
+    """Process-wide scheduler built from the settings; it follows settings reloads.
+
+    Raises:
+        SettingsError: If one of the tenant lists is malformed.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler.from_env()
+        on_reload(_scheduler.configure)
+    return _scheduler
@@ -0,0 +1,129 @@
+"""Local SearxNG-compatible search server with deterministic results.
+
+Used to test and benchmark the web search tool offline. Run it standalone with:
+
+    python -m agent_commons.search_fixture --port 8089 --latency 0.05
+
+and point the agents at it with ``SEARCH_BASE_URL=http://localhost:8089``.
+"""
+
+import argparse
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+CORPUS = (
+    (
+        "Red Hat OpenShift AI",
+        "https://www.redhat.com/en/technologies/cloud-computing/openshift/openshift-ai",
+        "Red Hat OpenShift AI is a platform for building, training, serving and monitoring "
+        "AI models and applications on hybrid cloud infrastructure.",
+    ),
+    (
+        "LangGraph documentation",
+        "https://langchain-ai.github.io/langgraph/",
+        "LangGraph is a library for building stateful, multi-actor applications with LLMs, "
+        "used to create agent and multi-agent workflows.",
+    ),
+    (
+        "LlamaIndex Workflows",
+        "https://docs.llamaindex.ai/en/stable/module_guides/workflow/",
+        "Workflows are an event-driven abstraction used to chain together several events. "
+        "Steps are decorated with @step and receive and emit events.",
+    ),
+    (
+        "vLLM",
+        "https://docs.vllm.ai/",
+        "vLLM is a fast and easy-to-use library for LLM inference and serving with "
+        "PagedAttention and continuous batching.",
+    ),
+    (
+        "Ollama",
+        "https://ollama.com/",
+        "Ollama runs large language models locally and exposes an OpenAI-compatible API.",
+    ),
+)
+
+
+@dataclass
+class FixtureStats:
+    """Request counters of a fixture server, for assertions in tests and benchmarks."""
+
+    requests: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+def create_app(
+    latency: float = 0.0,
+    results: int = 5,
+    content_repeat: int = 1,
+) -> Starlette:
+    """Build the fixture app.
+
+    Every query gets ``results`` hits from the corpus, rotated by a hash of the query
+    so different queries get different (but stable) result orders.
+
+    Args:
+        latency: Seconds each search waits before answering.
+        results: Number of hits per query.
+        content_repeat: Repeat each snippet this many times, to produce large responses.
+
+    Returns:
+        The Starlette app; its counters are in ``app.state.stats``.
+    """
+    stats = FixtureStats()
+
+    async def search(request: Request) -> JSONResponse:
+        query = request.query_params.get("q", "")
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            if latency:
+                await asyncio.sleep(latency)
+            offset = int(hashlib.sha256(query.encode()).hexdigest(), 16) % len(CORPUS)
+            hits = []
+            for index in range(results):
+                title, url, content = CORPUS[(offset + index) % len(CORPUS)]
+                hits.append(
+                    {
+                        "title": f"{title} ({query})",
+                        "url": f"{url}?rank={index}",
+                        "content": " ".join([content] * content_repeat),
+                    }
+                )
+            return JSONResponse({"query": query, "results": hits})
+        finally:
+            stats.in_flight -= 1
+
+    app = Starlette(routes=[Route("/search", search)])
+    app.state.stats = stats
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local SearxNG-compatible search fixture")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per search")
+    parser.add_argument("--results", type=int, default=5, help="hits per query")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(latency=args.latency, results=args.results),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
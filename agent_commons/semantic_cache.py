@@ -0,0 +1,437 @@
+"""Semantic cache of final answers, in front of the /chat agent runs.
+
+Users ask the same things in different words ("what does print() do in python",
+"explain python print()"), so an exact-match cache rarely hits. This cache embeds
+the normalized question with a local embedder (see agent_commons.embedders) and
+keeps the vectors of past questions in a NumPy matrix; a question whose cosine
+similarity to a cached one reaches SEMANTIC_CACHE_THRESHOLD, within
+SEMANTIC_CACHE_TTL, is answered with the cached answer, without a model call.
+
+Matching paraphrases like the two above takes a semantic embedder: set
+SEMANTIC_CACHE_EMBEDDER to ``sentence-transformers:<model>`` (or a "module:Class"
+Embedder). The dependency-free ``hashing`` default is lexical; it only matches
+rewordings sharing most of their words (case, spacing, punctuation), and scores
+the pair above at about 0.27.
+
+- Only stateless questions are cached (no conversation history).
+- Entries belong to the tenant whose run stored them; other tenants never get them.
+- Questions are answered from the cache only once they passed the input screen of
+  the guardrail (see agent_commons.guardrails).
+- Answers of runs that called a tool listed in SIDE_EFFECT_TOOLS are never stored,
+  so those runs always happen.
+- At most SEMANTIC_CACHE_SIZE answers are kept; expired entries are replaced first,
+  then the least recently used ones.
+- With SEMANTIC_CACHE_PATH set, the matrix is memory-mapped from that directory and
+  the cache survives restarts.
+- SEMANTIC_CACHE_AUDIT_RATE of the hits still run the agent, and the fresh answer
+  is compared with the cached one (by embedding similarity). The agreement rate is
+  the cache's precision; a disagreeing entry is replaced by the fresh answer.
+
+/metrics exports lookups by result (hit rate), audits by outcome (precision),
+the similarity of hits, evictions and the number of entries.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from .embedders import Embedder, load_embedder
+from .metrics import REGISTRY
+from .scheduler import DEFAULT_TENANT
+from .settings import (
+    DEFAULT_SEMANTIC_CACHE_SIZE,
+    DEFAULT_SEMANTIC_CACHE_THRESHOLD,
+    DEFAULT_SEMANTIC_CACHE_TTL,
+    Settings,
+    get_settings,
+    on_reload,
+    parse_tool_names,
+)
+from .timing import SERIALIZE, RequestTimer, timed_json_response
+from .vector_index import normalize
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Response header telling whether the answer came from the cache ("hit") or a run ("miss")
+CACHE_HEADER = "X-Semantic-Cache"
+HIT = "hit"
+MISS = "miss"
+
+ENTRIES_FILE = "entries.json"
+VECTORS_FILE = "vectors.npy"
+
+_SPACES_RE = re.compile(r"\s+")
+
+LOOKUPS = REGISTRY.counter(
+    "agent_semantic_cache_lookups_total",
+    "Semantic cache lookups by result (hit or miss).",
+    ("result",),
+)
+AUDITS = REGISTRY.counter(
+    "agent_semantic_cache_audits_total",
+    "Audited semantic cache hits by outcome (agree or disagree with a fresh run).",
+    ("outcome",),
+)
+HIT_SIMILARITY = REGISTRY.histogram(
+    "agent_semantic_cache_hit_similarity",
+    "Cosine similarity between questions answered from the semantic cache and the cached ones.",
+    buckets=(0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0),
+)
+NOT_STORED = REGISTRY.counter(
+    "agent_semantic_cache_side_effect_runs_total",
+    "Answers not cached because the run called a tool with side effects.",
+)
+EVICTIONS = REGISTRY.counter(
+    "agent_semantic_cache_evictions_total",
+    "Semantic cache entries replaced, by reason (expired, capacity or disagreed).",
+    ("reason",),
+)
+ENTRIES = REGISTRY.gauge("agent_semantic_cache_entries", "Answers held by the semantic cache.")
+
+
+def normalize_query(text: str) -> str:
+    """Question as embedded: Unicode-normalized, lower-cased, single-spaced, without end punctuation."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _SPACES_RE.sub(" ", text).strip().rstrip("?!.").strip()
+
+
+@dataclass(frozen=True)
+class CacheHit:
+    """A cached answer found for a question.
+
+    Attributes:
+        answer: The cached final answer.
+        similarity: Cosine similarity between the question and the cached one.
+        row: Row of the entry in the cache matrix.
+        audit: Whether to run the agent anyway and check the cached answer against it.
+    """
+
+    answer: str
+    similarity: float
+    row: int
+    audit: bool = False
+
+
+class SemanticCache:
+    """Capacity-bounded cache of answers, looked up by question similarity.
+
+    Entries are rows of an L2-normalized (size, dim) float32 matrix, so one matrix
+    product scores every cached question. Each entry is kept for one tenant and
+    only scored for its lookups. Safe to use from several threads; the async
+    methods embed in a worker thread, so slow embedders do not block the event loop.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        size: int = DEFAULT_SEMANTIC_CACHE_SIZE,
+        threshold: float = DEFAULT_SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = DEFAULT_SEMANTIC_CACHE_TTL,
+        audit_rate: float = 0.0,
+        side_effect_tools: Iterable[str] = (),
+        path: str | None = None,
+        clock: Callable[[], float] = time.time,
+        sample: Callable[[], float] = random.random,
+    ) -> None:
+        """Create the cache, loading it from ``path`` when one was saved there.
+
+        Args:
+            embedder: Embeds the normalized questions and answers.
+            size: Most answers kept.
+            threshold: Least cosine similarity of a hit.
+            ttl: Seconds an answer is served after it was stored.
+            audit_rate: Fraction of the hits checked against a fresh run.
+            side_effect_tools: Tools whose runs are never cached.
+            path: Directory to memory-map the matrix from and keep the entries in.
+            clock: Wall clock (entries outlive the process when saved).
+            sample: Uniform [0, 1) random source deciding which hits are audited.
+        """
+        self.embedder = embedder
+        self.size = size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self.side_effect_tools = frozenset(side_effect_tools)
+        self.path = Path(path) if path else None
+        self.clock = clock
+        self.sample = sample
+        self._lock = threading.Lock()
+        self._vectors = self._open_vectors()
+        self._queries: list[str | None] = [None] * size
+        self._answers: list[str | None] = [None] * size
+        self._tenants = np.full(size, None, dtype=object)
+        self._stored_at = np.full(size, -np.inf)
+        self._used_at = np.full(size, -np.inf)
+        self._load_entries()
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "SemanticCache | None":
+        """Cache configured by the SEMANTIC_CACHE_* and SIDE_EFFECT_TOOLS settings; None when SEMANTIC_CACHE is off."""
+        settings = settings or get_settings()
+        if not settings.semantic_cache:
+            return None
+        return cls(
+            load_embedder(settings.semantic_cache_embedder),
+            size=settings.semantic_cache_size,
+            threshold=settings.semantic_cache_threshold,
+            ttl=settings.semantic_cache_ttl,
+            audit_rate=settings.semantic_cache_audit_rate,
+            side_effect_tools=parse_tool_names(settings.side_effect_tools),
+            path=settings.semantic_cache_path,
+        )
+
+    def configure(self, settings: Settings) -> None:
+        """Apply reloaded settings; the size, path and embedder only change on restart."""
+        self.threshold = settings.semantic_cache_threshold
+        self.ttl = settings.semantic_cache_ttl
+        self.audit_rate = settings.semantic_cache_audit_rate
+        self.side_effect_tools = parse_tool_names(settings.side_effect_tools)
+
+    def _open_vectors(self) -> np.ndarray:
+        shape = (self.size, self.embedder.dim)
+        if self.path is None:
+            return np.zeros(shape, dtype=np.float32)
+        self.path.mkdir(parents=True, exist_ok=True)
+        vectors_path = self.path / VECTORS_FILE
+        if vectors_path.exists():
+            vectors = np.load(vectors_path, mmap_mode="r+")
+            if vectors.shape == shape and vectors.dtype == np.float32:
+                return vectors
+            del vectors
+            logger.warning("Semantic cache at %s has another size or dimension; starting empty", self.path)
+        return np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=shape)
+
+    def _load_entries(self) -> None:
+        if self.path is None or not (self.path / ENTRIES_FILE).exists():
+            return
+        with open(self.path / ENTRIES_FILE, encoding="utf-8") as f:
+            saved = json.load(f)
+        if (
+            saved.get("embedder") != self.embedder.name
+            or saved.get("size") != self.size
+            or not saved.get("tenants")
+        ):
+            logger.warning("Semantic cache at %s was built differently; starting empty", self.path)
+            return
+        for row, query, answer, stored_at, tenant in saved["entries"]:
+            self._queries[row], self._answers[row], self._tenants[row] = query, answer, tenant
+            self._stored_at[row] = self._used_at[row] = stored_at
+        ENTRIES.set(len(saved["entries"]))
+
+    def save(self) -> None:
+        """Write the entries next to the memory-mapped matrix (no-op without a path)."""
+        if self.path is None:
+            return
+        with self._lock:
+            self._vectors.flush()
+            entries = [
+                [row, query, self._answers[row], float(self._stored_at[row]), self._tenants[row]]
+                for row, query in enumerate(self._queries)
+                if query is not None
+            ]
+        tmp_path = self.path / (ENTRIES_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"embedder": self.embedder.name, "size": self.size, "tenants": True, "entries": entries}, f
+            )
+        os.replace(tmp_path, self.path / ENTRIES_FILE)
+
+    def _embed(self, text: str) -> np.ndarray:
+        return normalize(self.embedder.embed([normalize_query(text)]))[0]
+
+    def _best(self, vector: np.ndarray, now: float, tenant: str) -> tuple[int, float]:
+        """Row and similarity of the tenant's live entry closest to ``vector`` (-1 when none); holds the lock."""
+        live = (self._stored_at > now - self.ttl) & (self._tenants == tenant)
+        if not live.any():
+            return -1, 0.0
+        scores = self._vectors @ vector
+        scores[~live] = -np.inf
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def lookup_sync(self, query: str, tenant: str = DEFAULT_TENANT) -> CacheHit | None:
+        """Cached answer of the tenant's closest question, if it is similar enough and fresh."""
+        vector = self._embed(query)
+        now = self.clock()
+        with self._lock:
+            row, similarity = self._best(vector, now, tenant)
+            if row < 0 or similarity < self.threshold:
+                LOOKUPS.inc(result=MISS)
+                return None
+            self._used_at[row] = now
+            answer = self._answers[row]
+        LOOKUPS.inc(result=HIT)
+        HIT_SIMILARITY.observe(similarity)
+        return CacheHit(answer, similarity, row, audit=self.sample() < self.audit_rate)
+
+    async def lookup(self, query: str, tenant: str = DEFAULT_TENANT) -> CacheHit | None:
+        """Async variant of lookup_sync; the question is embedded in a worker thread."""
+        return await asyncio.to_thread(self.lookup_sync, query, tenant)
+
+    def _free_row(self, now: float) -> int:
+        """Row for a new entry: an empty one, else an expired one, else the least recently used; holds the lock."""
+        row = int(np.argmin(self._stored_at))
+        if self._queries[row] is None:
+            return row
+        if self._stored_at[row] <= now - self.ttl:
+            EVICTIONS.inc(reason="expired")
+            return row
+        EVICTIONS.inc(reason="capacity")
+        return int(np.argmin(self._used_at))
+
+    def store_sync(
+        self,
+        query: str,
+        answer: str,
+        tools: Iterable[str] = (),
+        audited: CacheHit | None = None,
+        tenant: str = DEFAULT_TENANT,
+    ) -> bool:
+        """Cache the answer of a finished run.
+
+        Args:
+            query: The question of the run.
+            answer: Its final answer.
+            tools: Names of the tools the run called.
+            audited: The hit this run was made to audit, if any.
+            tenant: Tenant of the run; only its lookups get the answer.
+
+        Returns:
+            Whether the answer was stored; runs that called a tool with side effects,
+            or gave no answer, are not.
+        """
+        if audited is not None:
+            agreed = float(self._embed(audited.answer) @ self._embed(answer)) >= self.threshold
+            AUDITS.inc(outcome="agree" if agreed else "disagree")
+            if not agreed:
+                with self._lock:
+                    if self._answers[audited.row] == audited.answer:
+                        self._queries[audited.row] = self._answers[audited.row] = None
+                        self._tenants[audited.row] = None
+                        self._stored_at[audited.row] = self._used_at[audited.row] = -np.inf
+                        EVICTIONS.inc(reason="disagreed")
+        if not answer.strip():
+            return False
+        if self.side_effect_tools.intersection(tools):
+            NOT_STORED.inc()
+            return False
+
+        vector = self._embed(query)
+        now = self.clock()
+        with self._lock:
+            row, similarity = self._best(vector, now, tenant)
+            if row < 0 or similarity < self.threshold:
+                # Not a paraphrase of a cached question of the tenant: take a row of its own
+                row = self._free_row(now)
+            self._vectors[row] = vector
+            self._queries[row], self._answers[row], self._tenants[row] = query, answer, tenant
+            self._stored_at[row] = self._used_at[row] = now
+            entries = sum(query is not None for query in self._queries)
+        ENTRIES.set(entries)
+        return True
+
+    async def store(
+        self,
+        query: str,
+        answer: str,
+        tools: Iterable[str] = (),
+        audited: CacheHit | None = None,
+        tenant: str = DEFAULT_TENANT,
+    ) -> bool:
+        """Async variant of store_sync; embedding runs in a worker thread."""
+        return await asyncio.to_thread(self.store_sync, query, answer, tools, audited, tenant)
+
+
+async def store_when_done(
+    cache: SemanticCache,
+    query: str,
+    stream: AsyncIterator[T],
+    result: Callable[[], tuple[str, list[str]] | None],
+    audited: CacheHit | None = None,
+    tenant: str = DEFAULT_TENANT,
+) -> AsyncIterator[T]:
+    """Re-yield ``stream``; once it ends without error, cache the run's answer.
+
+    Closing the returned stream closes ``stream``.
+
+    Args:
+        cache: The cache.
+        query: The question of the run.
+        stream: The run's stream.
+        result: Returns the final answer and the names of the tools called, once
+            the stream ended; or None when the answer must not be cached (e.g. it
+            was withheld by the guardrail).
+        audited: The hit this run audits, if any.
+        tenant: Tenant of the run.
+    """
+    async with contextlib.aclosing(stream):
+        async for item in stream:
+            yield item
+    answer = result()
+    if answer is not None:
+        await cache.store(query, *answer, audited, tenant)
+
+
+def cached_response(query: str, hit: CacheHit, timer: RequestTimer) -> JSONResponse:
+    """/chat response answering ``query`` from the cache."""
+    response = timed_json_response(
+        {
+            "messages": [{"role": "user", "content": query}, {"role": "assistant", "content": hit.answer}],
+            "finish_reason": "stop",
+        },
+        timer,
+    )
+    response.headers[CACHE_HEADER] = HIT
+    return response
+
+
+async def cached_event_stream(hit: CacheHit, timer: RequestTimer) -> AsyncIterator[str]:
+    """Streamed /chat response from the cache: the answer in one chunk, then ``[DONE]``."""
+    with timer.span(SERIALIZE):
+        chunks = [
+            {"choices": [{"index": 0, "delta": {"role": "assistant", "content": hit.answer}, "finish_reason": None}]},
+            {"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": "stop"}]},
+        ]
+        data = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+    for item in data:
+        yield item
+    yield f": server-timing {timer.header_value()}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+_cache: SemanticCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache | None:
+    """Process-wide semantic cache; None while SEMANTIC_CACHE is off. Follows settings reloads."""
+    global _cache
+    if not get_settings().semantic_cache:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache.from_env()
+                on_reload(_cache.configure)
+    return _cache
+
+
+def close_semantic_cache() -> None:
+    """Save the process-wide cache, if there is one (call at shutdown)."""
+    if _cache is not None:
+        _cache.save()
@@ -0,0 +1,274 @@
+import asyncio
+import contextlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Generic, TypeVar
+
+from .metrics import REGISTRY
+from .settings import (
+    DEFAULT_SESSION_IDLE_TTL as DEFAULT_IDLE_TTL,
+    DEFAULT_SESSION_MAX_BYTES as DEFAULT_MAX_BYTES,
+    DEFAULT_SESSION_MAX_SESSIONS as DEFAULT_MAX_SESSIONS,
+    Settings,
+    get_settings,
+)
+
+T = TypeVar("T")
+
+SESSIONS_IN_MEMORY = REGISTRY.gauge(
+    "agent_sessions_in_memory", "Conversation sessions held in process memory."
+)
+SESSION_BYTES = REGISTRY.gauge(
+    "agent_session_bytes", "Estimated size of the conversation sessions held in memory."
+)
+SESSION_EVICTIONS = REGISTRY.counter(
+    "agent_session_evictions_total",
+    "Sessions removed from memory (idle: TTL expired and dropped; capacity: "
+    "least recently used, spilled to disk when configured).",
+    ("reason",),
+)
+SESSION_SPILL_LOADS = REGISTRY.counter(
+    "agent_session_spill_loads_total", "Sessions loaded back from the spill file."
+)
+
+
+@dataclass
+class Session(Generic[T]):
+    """A checked-out session; set ``value`` to what the store keeps for the next turn."""
+
+    id: str
+    value: T | None = None
+
+
+@dataclass
+class _Entry(Generic[T]):
+    value: T
+    size: int
+    last_used: float
+
+
+class _SpillFile:
+    """SQLite table of sessions evicted from memory for lack of room."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+
+    def put(self, session_id: str, data: str, last_used: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, data, last_used)
+            )
+
+    def pop(self, session_id: str, not_before: float) -> str | None:
+        """Remove and return a session's data, unless it was idle since ``not_before``."""
+        with self._lock:
+            row = self._db.execute(
+                "DELETE FROM sessions WHERE id = ? RETURNING data, last_used", (session_id,)
+            ).fetchone()
+        if row is None or row[1] < not_before:
+            return None
+        return row[0]
+
+    def purge(self, not_before: float) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE last_used < ?", (not_before,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class SessionStore(Generic[T]):
+    """In-process store of per-conversation state, keyed by conversation id.
+
+    Sessions idle for longer than ``idle_ttl`` are dropped. When there are more than
+    ``max_sessions`` or their estimated size exceeds ``max_bytes``, the least recently
+    used ones are evicted: written to the SQLite ``spill_path`` when one is set (and
+    loaded back on their next turn), dropped otherwise. Checked-out sessions are never
+    evicted; turns of the same conversation run one at a time.
+
+    Values are opaque to the store: ``size_of`` estimates their size, ``dump`` and
+    ``load`` convert them to and from text for the spill file. Use it from one event loop.
+    """
+
+    def __init__(
+        self,
+        size_of: Callable[[T], int],
+        dump: Callable[[T], str] | None = None,
+        load: Callable[[str], T] | None = None,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        idle_ttl: float = DEFAULT_IDLE_TTL,
+        spill_path: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Configure the store.
+
+        Args:
+            size_of: Estimated size of a value in bytes.
+            dump: Serializer used to spill values; required with ``spill_path``.
+            load: Inverse of ``dump``.
+            max_sessions: Most sessions kept in memory.
+            max_bytes: Most total estimated bytes kept in memory.
+            idle_ttl: Seconds after its last turn a session is forgotten.
+            spill_path: SQLite file for sessions evicted for lack of room.
+            clock: Wall clock; spilled sessions outlive the process.
+        """
+        if spill_path and (dump is None or load is None):
+            raise ValueError("spill_path needs dump and load")
+        self.size_of = size_of
+        self.dump = dump
+        self.load = load
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self.total_bytes = 0
+        self._entries: OrderedDict[str, _Entry[T]] = OrderedDict()  # least recently used first
+        self._locks: dict[str, tuple[asyncio.Lock, int]] = {}  # lock and number of users
+        self._spill = _SpillFile(spill_path) if spill_path else None
+
+    @classmethod
+    def from_env(
+        cls,
+        size_of: Callable[[T], int],
+        dump: Callable[[T], str] | None = None,
+        load: Callable[[str], T] | None = None,
+        settings: Settings | None = None,
+    ) -> "SessionStore[T]":
+        """Store configured by the SESSION_MAX_SESSIONS, SESSION_MAX_BYTES, SESSION_IDLE_TTL
+        and SESSION_SPILL_PATH settings (get_settings() when ``settings`` is omitted)."""
+        settings = settings or get_settings()
+        return cls(
+            size_of,
+            dump,
+            load,
+            max_sessions=settings.session_max_sessions,
+            max_bytes=settings.session_max_bytes,
+            idle_ttl=settings.session_idle_ttl,
+            spill_path=settings.session_spill_path,
+        )
+
+    def configure(self, settings: Settings) -> None:
+        """Apply reloaded session limits, evicting what no longer fits; the spill path only
+        changes with a restart."""
+        self.max_sessions = settings.session_max_sessions
+        self.max_bytes = settings.session_max_bytes
+        self.idle_ttl = settings.session_idle_ttl
+        self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def _update_gauges(self) -> None:
+        SESSIONS_IN_MEMORY.set(len(self._entries))
+        SESSION_BYTES.set(self.total_bytes)
+
+    def _take(self, session_id: str) -> T | None:
+        """Remove a session from memory (or the spill file) for a turn; None if unknown."""
+        now = self.clock()
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            if entry.last_used >= now - self.idle_ttl:
+                return entry.value
+            SESSION_EVICTIONS.inc(reason="idle")
+            return None
+        if self._spill is not None:
+            data = self._spill.pop(session_id, not_before=now - self.idle_ttl)
+            if data is not None:
+                SESSION_SPILL_LOADS.inc()
+                return self.load(data)
+        return None
+
+    def _put(self, session_id: str, value: T) -> None:
+        entry = _Entry(value, self.size_of(value), self.clock())
+        self._entries[session_id] = entry
+        self.total_bytes += entry.size
+        self._evict()
+
+    def _evict(self) -> None:
+        cutoff = self.clock() - self.idle_ttl
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry.last_used < cutoff:
+                reason = "idle"
+            elif len(self._entries) > self.max_sessions or self.total_bytes > self.max_bytes:
+                reason = "capacity"
+            else:
+                break
+            del self._entries[session_id]
+            self.total_bytes -= entry.size
+            SESSION_EVICTIONS.inc(reason=reason)
+            if reason == "capacity" and self._spill is not None:
+                self._spill.put(session_id, self.dump(entry.value), entry.last_used)
+        if self._spill is not None:
+            self._spill.purge(not_before=cutoff)
+        self._update_gauges()
+
+    @contextlib.asynccontextmanager
+    async def checkout(self, session_id: str) -> AsyncIterator[Session[T]]:
+        """Take a session for one conversation turn and keep its new value afterwards.
+
+        Waits while another turn of the same conversation is running. The session's
+        ``value`` is None for a new (or expired) conversation; whatever ``value`` holds
+        when the block exits is stored, so leave it unchanged to discard a failed turn.
+
+        Args:
+            session_id: Conversation id.
+
+        Yields:
+            The session.
+        """
+        lock, users = self._locks.get(session_id, (asyncio.Lock(), 0))
+        self._locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                session = Session(session_id, self._take(session_id))
+                try:
+                    yield session
+                finally:
+                    if session.value is not None:
+                        self._put(session_id, session.value)
+                    else:
+                        self._update_gauges()
+        finally:
+            lock, users = self._locks[session_id]
+            if users == 1:
+                del self._locks[session_id]
+            else:
+                self._locks[session_id] = (lock, users - 1)
+
+    def discard(self, session_id: str) -> None:
+        """Forget a conversation (memory and spill file)."""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            self._update_gauges()
+        if self._spill is not None:
+            self._spill.pop(session_id, not_before=0)
+
+    def close(self) -> None:
+        """Spill the sessions held in memory (when a spill file is set) and close it."""
+        if self._spill is None:
+            return
+        for session_id, entry in self._entries.items():
+            self._spill.put(session_id, self.dump(entry.value), entry.last_used)
+        self._entries.clear()
+        self.total_bytes = 0
+        self._update_gauges()
+        self._spill.close()
+        self._spill = None
@@ -0,0 +1,451 @@
+"""Typed settings of the agents, loaded once and reloaded atomically.
+
+Values come from, by increasing precedence: the ``.env`` file (looked up from the
+working directory upwards), the process environment, and the optional file named
+by SETTINGS_FILE (same ``KEY=value`` format, e.g. a mounted ConfigMap). They are
+parsed and validated once into a frozen Settings; code reads the current one with
+get_settings() and keeps that snapshot for the rest of the request.
+
+reload_settings() builds a new Settings and swaps it in with one assignment, then
+tells the listeners registered with on_reload(); when the new values are invalid,
+the current settings stay. watch_settings() reloads on SIGHUP and whenever one of
+the files changes.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import os
+import signal
+import threading
+from dataclasses import dataclass
+from typing import Callable, Mapping
+
+from dotenv import dotenv_values, find_dotenv, load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Environment variable naming the settings file that overrides the environment
+SETTINGS_FILE_ENV_VAR = "SETTINGS_FILE"
+# Seconds between two checks of the settings files for changes
+DEFAULT_WATCH_INTERVAL = 2.0
+
+DEFAULT_REQUEST_TIMEOUT = 120.0
+DEFAULT_MAX_REQUEST_TIMEOUT = 600.0
+DEFAULT_DEADLINE_GRACE = 5.0
+
+DEFAULT_SEARCH_MAX_RESULTS = 5
+DEFAULT_SEARCH_TOKEN_BUDGET = 1000
+DEFAULT_SEARCH_MAX_RESPONSE_BYTES = 1024 * 1024
+DEFAULT_SEARCH_MAX_CONCURRENCY = 4
+DEFAULT_SEARCH_TIMEOUT = 10.0
+DEFAULT_SEARCH_CACHE_TTL = 300.0
+DEFAULT_SEARCH_CACHE_SIZE = 256
+DEFAULT_SEARCH_POOL_SIZE = 20
+
+DEFAULT_VECTOR_INDEX_TOP_K = 4
+DEFAULT_VECTOR_INDEX_NPROBE = 8
+DEFAULT_VECTOR_INDEX_TOKEN_BUDGET = 1000
+
+DEFAULT_SESSION_MAX_SESSIONS = 1000
+DEFAULT_SESSION_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SESSION_IDLE_TTL = 3600.0
+
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_JOB_MAX_QUEUED = 100
+DEFAULT_JOB_RESULT_TTL = 3600.0
+
+DEFAULT_SCHEDULER_MAX_CONCURRENCY = 32
+DEFAULT_TENANT_MAX_CONCURRENCY = 8
+
+DEFAULT_LOOP_LAG_INTERVAL = 0.1
+DEFAULT_LOOP_BLOCK_THRESHOLD = 0.1
+
+DEFAULT_SEMANTIC_CACHE_SIZE = 1024
+DEFAULT_SEMANTIC_CACHE_THRESHOLD = 0.9
+DEFAULT_SEMANTIC_CACHE_TTL = 3600.0
+
+DEFAULT_SAFETY_SHIELD_ID = "llama-guard"
+DEFAULT_SAFETY_TIMEOUT = 5.0
+DEFAULT_SAFETY_OUTPUT_WINDOW = 400
+
+DEFAULT_RATE_LIMIT_BURST = 1.0
+
+DEFAULT_CASSETTE_LATENCY = "original"
+
+DEFAULT_CASCADE_ESCALATE_SCORE = 0.5
+DEFAULT_CASCADE_MAX_TOOL_CALLS = 2
+DEFAULT_CASCADE_MIN_CONFIDENCE = 0.0
+
+# Settings the agent is built with; a reload changing one of them rebuilds the agent
+LLM_SETTINGS = (
+    "base_url",
+    "model_id",
+    "api_key",
+    "cascade_model_id",
+    "cascade_base_url",
+    "cascade_escalate_score",
+    "cascade_max_tool_calls",
+    "cascade_min_confidence",
+    "cascade_classifier",
+    "speculative_tools",
+    "side_effect_tools",
+    "tools",
+    "tool_modules",
+    "rate_limit_rpm",
+    "rate_limit_tpm",
+    "rate_limit_backends",
+)
+
+# Fields that may be zero (a zero cache TTL or size disables the cache, a zero
+# escalation score sends everything to the large model, a zero confidence disables
+# the confidence check, a zero audit rate audits no semantic cache hit, a zero
+# output window leaves the output unscreened, a zero rate limit is no limit)
+_MAY_BE_ZERO = {
+    "search_cache_ttl",
+    "search_cache_size",
+    "semantic_cache_audit_rate",
+    "safety_output_window",
+    "rate_limit_rpm",
+    "rate_limit_tpm",
+    "cascade_escalate_score",
+    "cascade_max_tool_calls",
+    "cascade_min_confidence",
+}
+
+
+class SettingsError(ValueError):
+    """Raised when a setting is missing or has an invalid value."""
+
+
+def normalize_base_url(base_url: str | None) -> str | None:
+    """OpenAI-compatible base URL ending with ``/v1`` (None stays None)."""
+    if not base_url:
+        return None
+    base_url = base_url.rstrip("/")
+    return base_url if base_url.endswith("/v1") else base_url + "/v1"
+
+
+def parse_tool_names(raw: str | None) -> frozenset[str]:
+    """Tool names of a comma separated setting (SIDE_EFFECT_TOOLS)."""
+    return frozenset(name.strip() for name in (raw or "").split(",") if name.strip())
+
+
+def _parse_bool(name: str, raw: str) -> bool:
+    value = raw.lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise SettingsError(f"{name.upper()}={raw!r} is not a flag (true/false)")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Settings shared by both agents; each field is read from its upper-cased name.
+
+    Attributes:
+        base_url: OpenAI-compatible API base URL, normalized to end with ``/v1``.
+        model_id: Model served at base_url.
+        api_key: API key of the LLM; may be unset for local base URLs.
+        request_timeout: Request budget (seconds) when the client sends none.
+        max_request_timeout: Most a client may ask for.
+        deadline_grace: Time given to a run on top of its deadline before it is aborted.
+        search_*: Provider and limits of the web_search tool (see
+            agent_commons.web_search); the provider only changes on restart.
+        embedder: Default embedder spec (see agent_commons.embedders.load_embedder).
+        vector_index_*: Local document index and its search limits (see
+            agent_commons.vector_index); the index path only changes on restart.
+        session_*: Limits of the conversation sessions (see agent_commons.session_store).
+        job_*: Worker pool, queue bound, result retention and store of the /jobs
+            runs (see agent_commons.jobs).
+        scheduler_max_concurrency, tenant_*: Agent runs at a time, overall and per
+            tenant, tenant weights and API keys (see agent_commons.scheduler).
+        loop_*: Event loop lag measurement, and stack traces of calls blocking the
+            loop in debug mode (see agent_commons.loop_monitor).
+        semantic_cache*: Opt-in cache of /chat answers looked up by question
+            similarity (see agent_commons.semantic_cache).
+        side_effect_tools: Comma separated tools with side effects; runs calling
+            them are never answered from a cache, and they are never speculated.
+        safety_*: Guardrail screening the input and output of runs with a safety
+            classifier (see agent_commons.guardrails); off while SAFETY_CLASSIFIER is unset.
+        cascade_*: Small model tried before MODEL_ID, and when to escalate (see
+            agent_commons.cascade); no cascade when CASCADE_MODEL_ID is unset.
+        speculative_tools: Start tool calls while the LLM is still streaming them
+            (see agent_commons.speculation); off by default.
+        rate_limit_*: Requests and tokens per minute the LLM backends are paced to,
+            overall and per backend (see agent_commons.rate_limit); 0 is no limit.
+        tools, tool_modules: Comma separated tool names to enable (all when unset) and
+            "module:attribute" paths of extra tools (see agent_commons.tool_registry).
+        cassette_*: Recording or replay of the LLM and tool traffic (see
+            agent_commons.cassette); only read on startup.
+        profile_token: Admin token allowing POST /chat?profile=1; profiling is off when unset.
+    """
+
+    base_url: str | None = None
+    model_id: str | None = None
+    api_key: str | None = None
+
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT
+    max_request_timeout: float = DEFAULT_MAX_REQUEST_TIMEOUT
+    deadline_grace: float = DEFAULT_DEADLINE_GRACE
+
+    search_max_results: int = DEFAULT_SEARCH_MAX_RESULTS
+    search_token_budget: int = DEFAULT_SEARCH_TOKEN_BUDGET
+    search_max_response_bytes: int = DEFAULT_SEARCH_MAX_RESPONSE_BYTES
+    search_max_concurrency: int = DEFAULT_SEARCH_MAX_CONCURRENCY
+    search_timeout: float = DEFAULT_SEARCH_TIMEOUT
+    search_cache_ttl: float = DEFAULT_SEARCH_CACHE_TTL
+    search_cache_size: int = DEFAULT_SEARCH_CACHE_SIZE
+    search_pool_size: int = DEFAULT_SEARCH_POOL_SIZE
+    search_provider: str | None = None
+    search_base_url: str | None = None
+    search_api_key: str | None = None
+
+    embedder: str | None = None
+    vector_index_path: str | None = None
+    vector_index_top_k: int = DEFAULT_VECTOR_INDEX_TOP_K
+    vector_index_nprobe: int = DEFAULT_VECTOR_INDEX_NPROBE
+    vector_index_token_budget: int = DEFAULT_VECTOR_INDEX_TOKEN_BUDGET
+
+    session_max_sessions: int = DEFAULT_SESSION_MAX_SESSIONS
+    session_max_bytes: int = DEFAULT_SESSION_MAX_BYTES
+    session_idle_ttl: float = DEFAULT_SESSION_IDLE_TTL
+    session_spill_path: str | None = None
+
+    job_workers: int = DEFAULT_JOB_WORKERS
+    job_max_queued: int = DEFAULT_JOB_MAX_QUEUED
+    job_result_ttl: float = DEFAULT_JOB_RESULT_TTL
+    job_store_path: str | None = None
+
+    scheduler_max_concurrency: int = DEFAULT_SCHEDULER_MAX_CONCURRENCY
+    tenant_max_concurrency: int = DEFAULT_TENANT_MAX_CONCURRENCY
+    tenant_weights: str | None = None
+    tenant_quotas: str | None = None
+    tenant_api_keys: str | None = None
+
+    loop_lag_interval: float = DEFAULT_LOOP_LAG_INTERVAL
+    loop_debug: bool = False
+    loop_block_threshold: float = DEFAULT_LOOP_BLOCK_THRESHOLD
+
+    semantic_cache: bool = False
+    semantic_cache_size: int = DEFAULT_SEMANTIC_CACHE_SIZE
+    semantic_cache_threshold: float = DEFAULT_SEMANTIC_CACHE_THRESHOLD
+    semantic_cache_ttl: float = DEFAULT_SEMANTIC_CACHE_TTL
+    semantic_cache_audit_rate: float = 0.0
+    semantic_cache_path: str | None = None
+    semantic_cache_embedder: str | None = None
+    side_effect_tools: str | None = None
+
+    safety_classifier: str | None = None
+    safety_base_url: str | None = None
+    safety_shield_id: str = DEFAULT_SAFETY_SHIELD_ID
+    safety_blocked_terms: str | None = None
+    safety_fail_open: bool = False
+    safety_timeout: float = DEFAULT_SAFETY_TIMEOUT
+    safety_output_window: int = DEFAULT_SAFETY_OUTPUT_WINDOW
+
+    cascade_model_id: str | None = None
+    cascade_base_url: str | None = None
+    cascade_escalate_score: float = DEFAULT_CASCADE_ESCALATE_SCORE
+    cascade_max_tool_calls: int = DEFAULT_CASCADE_MAX_TOOL_CALLS
+    cascade_min_confidence: float = DEFAULT_CASCADE_MIN_CONFIDENCE
+    cascade_classifier: str | None = None
+
+    speculative_tools: bool = False
+
+    rate_limit_rpm: int = 0
+    rate_limit_tpm: int = 0
+    rate_limit_burst: float = DEFAULT_RATE_LIMIT_BURST
+    rate_limit_backends: str | None = None
+
+    tools: str | None = None
+    tool_modules: str | None = None
+
+    cassette_mode: str | None = None
+    cassette_path: str | None = None
+    cassette_latency: str = DEFAULT_CASSETTE_LATENCY
+
+    profile_token: str | None = None
+
+    def __post_init__(self) -> None:
+        for field in dataclasses.fields(self):
+            value = getattr(self, field.name)
+            if field.type in (int, float) and (
+                value < 0 or (value == 0 and field.name not in _MAY_BE_ZERO)
+            ):
+                raise SettingsError(f"{field.name.upper()} must be positive, got {value}")
+        if self.max_request_timeout < self.request_timeout:
+            raise SettingsError("MAX_REQUEST_TIMEOUT must not be below REQUEST_TIMEOUT")
+        if self.cascade_min_confidence >= 1:
+            raise SettingsError("CASCADE_MIN_CONFIDENCE must be below 1")
+        if self.semantic_cache_threshold > 1:
+            raise SettingsError("SEMANTIC_CACHE_THRESHOLD must not be above 1")
+        if self.semantic_cache_audit_rate > 1:
+            raise SettingsError("SEMANTIC_CACHE_AUDIT_RATE must not be above 1")
+        if self.cassette_mode and not self.cassette_path:
+            raise SettingsError("CASSETTE_PATH must be set with CASSETTE_MODE")
+
+    @classmethod
+    def from_values(cls, values: Mapping[str, str | None]) -> "Settings":
+        """Parse settings from raw ``KEY=value`` strings; missing or empty keys keep their default.
+
+        Raises:
+            SettingsError: If a value is not a valid number or flag, or out of range.
+        """
+        parsed = {}
+        for field in dataclasses.fields(cls):
+            raw = values.get(field.name.upper())
+            if raw is None or not raw.strip():
+                continue
+            raw = raw.strip()
+            if field.type is bool:
+                parsed[field.name] = _parse_bool(field.name, raw)
+                continue
+            try:
+                parsed[field.name] = field.type(raw) if field.type in (int, float) else raw
+            except ValueError:
+                kind = "an integer" if field.type is int else "a number"
+                raise SettingsError(f"{field.name.upper()}={raw!r} is not {kind}") from None
+        parsed["base_url"] = normalize_base_url(parsed.get("base_url"))
+        parsed["cascade_base_url"] = normalize_base_url(parsed.get("cascade_base_url"))
+        parsed["safety_base_url"] = normalize_base_url(parsed.get("safety_base_url"))
+        return cls(**parsed)
+
+
+_settings: Settings | None = None
+_settings_lock = threading.Lock()
+_listeners: list[Callable[[Settings], None]] = []
+# os.environ before .env was loaded into it, so .env edits are not shadowed on reload
+_process_env: dict[str, str] | None = None
+
+
+def _environment() -> dict[str, str]:
+    """The process environment, without the values loaded from .env.
+
+    The .env file is loaded into os.environ once, on first use, for the modules
+    that read their options from there directly.
+    """
+    global _process_env
+    if _process_env is None:
+        _process_env = dict(os.environ)
+        dotenv_path = find_dotenv(usecwd=True)
+        if dotenv_path:
+            load_dotenv(dotenv_path)
+    return _process_env
+
+
+def _read_file(path: str | None) -> dict[str, str]:
+    if not path or not os.path.exists(path):
+        return {}
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
+def _settings_file() -> str | None:
+    _environment()  # SETTINGS_FILE may come from .env
+    return os.getenv(SETTINGS_FILE_ENV_VAR) or None
+
+
+def settings_files() -> list[str]:
+    """Files the settings are read from: .env and SETTINGS_FILE, when set."""
+    return [path for path in (find_dotenv(usecwd=True), _settings_file()) if path]
+
+
+def load_settings() -> Settings:
+    """Read and validate the settings from .env, the environment and SETTINGS_FILE.
+
+    Raises:
+        SettingsError: If a value is invalid.
+    """
+    values = {
+        **_read_file(find_dotenv(usecwd=True)),
+        **_environment(),
+        **_read_file(_settings_file()),
+    }
+    return Settings.from_values(values)
+
+
+def get_settings() -> Settings:
+    """Current settings, loaded on first use; keep the returned snapshot for a whole request."""
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = load_settings()
+            settings = _settings
+    return settings
+
+
+def on_reload(listener: Callable[[Settings], None]) -> Callable[[], None]:
+    """Call ``listener(settings)`` after every reload that changed the settings.
+
+    Returns:
+        A function unregistering the listener.
+    """
+    _listeners.append(listener)
+    return lambda: _listeners.remove(listener) if listener in _listeners else None
+
+
+def reload_settings() -> Settings:
+    """Re-read the settings and swap them in; invalid values keep the current ones.
+
+    Returns:
+        The settings in effect after the reload.
+    """
+    global _settings
+    with _settings_lock:
+        try:
+            settings = load_settings()
+        except SettingsError as e:
+            logger.error("Settings not reloaded, keeping the current ones: %s", e)
+            return _settings or Settings()
+        if settings == _settings:
+            return settings
+        _settings = settings
+
+    logger.info("Settings reloaded")
+    for listener in list(_listeners):
+        try:
+            listener(settings)
+        except Exception:
+            logger.exception("Settings listener %r failed", listener)
+    return settings
+
+
+def _file_stamps() -> tuple:
+    stamps = []
+    for path in settings_files():
+        with contextlib.suppress(OSError):
+            stat = os.stat(path)
+            stamps.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(stamps)
+
+
+async def watch_settings(interval: float = DEFAULT_WATCH_INTERVAL) -> None:
+    """Reload the settings on SIGHUP and when a settings file changes; run it as a task.
+
+    Args:
+        interval: Seconds between two checks of the files' modification times.
+    """
+    loop = asyncio.get_running_loop()
+    sighup = getattr(signal, "SIGHUP", None)
+    handles_sighup = False
+    if sighup is not None:
+        # Not available on Windows nor outside the main thread
+        with contextlib.suppress(NotImplementedError, RuntimeError, ValueError):
+            loop.add_signal_handler(sighup, reload_settings)
+            handles_sighup = True
+
+    stamps = _file_stamps()
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            current = _file_stamps()
+            if current != stamps:
+                stamps = current
+                reload_settings()
+    finally:
+        if handles_sighup:
+            loop.remove_signal_handler(sighup)
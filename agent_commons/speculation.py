@@ -0,0 +1,163 @@
+"""Speculative tool execution: start tool calls while the model is still streaming.
+
+A tool-calling LLM response is streamed as slices of each call's JSON arguments.
+ToolSpeculator rebuilds the calls from those slices and, as soon as one call's
+arguments form a complete JSON object that passes the tool's schema, starts the
+tool, even though the model may still be emitting more calls or text. Once the
+response is complete, ``settle`` matches the final tool calls against the started
+ones by tool name and arguments: matches are handed to the tool step, which only
+waits for what is left of them, and the others are cancelled.
+
+Speculation runs a tool before the model has committed to the call, so only use
+it with tools that are safe to run and then discard (read-only lookups). It is off
+unless SPECULATIVE_TOOLS is set, and never starts the SIDE_EFFECT_TOOLS.
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+from .metrics import REGISTRY
+from .settings import Settings, parse_tool_names
+from .tool_registry import ToolArgumentsError, ToolRegistry
+
+# Outcomes of a speculatively started tool call
+USED = "used"
+WASTED = "wasted"
+
+SPECULATIVE_TOOL_CALLS = REGISTRY.counter(
+    "agent_speculative_tool_calls_total",
+    "Tool calls started while the model was streaming, by outcome (used: in the final "
+    "message; wasted: not in it, cancelled).",
+    ("outcome",),
+)
+
+
+def speculative_tool_names(tool_names: Iterable[str], settings: Settings) -> frozenset[str]:
+    """Tools that may be started speculatively: none while SPECULATIVE_TOOLS is off, never the SIDE_EFFECT_TOOLS."""
+    if not settings.speculative_tools:
+        return frozenset()
+    return frozenset(tool_names) - parse_tool_names(settings.side_effect_tools)
+
+
+def _call_key(name: str, arguments: dict) -> tuple[str, str]:
+    return name, json.dumps(arguments, sort_keys=True, default=str)
+
+
+def _retrieve_exception(task: asyncio.Future) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+@dataclass
+class _PartialCall:
+    name: str | None = None
+    slices: list[str] = field(default_factory=list)
+    done: bool = False  # started, or found invalid
+
+
+class ToolSpeculator:
+    """Starts the tool calls of streamed LLM responses as soon as their arguments are complete.
+
+    One speculator serves one LLM call (possibly several streamed attempts, e.g. a
+    cascade's small and large model, told apart by their ``stream`` key). Use it
+    from the event loop running the request.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[str, dict], Awaitable[Any]],
+        tool_names: Iterable[str],
+        registry: ToolRegistry | None = None,
+    ) -> None:
+        """Configure the speculator.
+
+        Args:
+            execute: Runs a tool call given the tool name and its arguments.
+            tool_names: Tools that may be started speculatively.
+            registry: Validates arguments before a call is started.
+        """
+        self.execute = execute
+        self.tool_names = set(tool_names)
+        self.registry = registry
+        self._calls: dict[tuple[Hashable, int], _PartialCall] = {}
+        self._started: dict[tuple[str, str], asyncio.Future] = {}
+
+    def feed(self, stream: Hashable, index: int, name: str | None, arguments_delta: str) -> None:
+        """Add a streamed slice of tool call ``index``.
+
+        Args:
+            stream: Identifies the streamed response the slice belongs to.
+            index: Position of the tool call in the response.
+            name: Tool name, when the slice carries it (usually only the first one).
+            arguments_delta: Next characters of the JSON arguments.
+        """
+        call = self._calls.setdefault((stream, index), _PartialCall())
+        if call.done:
+            return
+        if name:
+            call.name = name
+        if arguments_delta:
+            call.slices.append(arguments_delta)
+            # A complete argument object ends with a brace; skip parsing otherwise
+            if arguments_delta.rstrip().endswith("}"):
+                self._try_start(call, "".join(call.slices))
+
+    def update(self, stream: Hashable, index: int, name: str | None, arguments: str) -> None:
+        """Set the arguments of tool call ``index`` streamed so far (for clients accumulating them)."""
+        call = self._calls.setdefault((stream, index), _PartialCall())
+        if call.done:
+            return
+        if name:
+            call.name = name
+        if arguments and arguments.rstrip().endswith("}"):
+            self._try_start(call, arguments)
+
+    def _try_start(self, call: _PartialCall, arguments: str) -> None:
+        if call.name is None:
+            return
+        try:
+            parsed = json.loads(arguments)
+        except ValueError:
+            return  # not complete yet
+        call.done = True
+        if not isinstance(parsed, dict) or call.name not in self.tool_names:
+            return
+        spec = self.registry.get(call.name) if self.registry is not None else None
+        if spec is not None:
+            try:
+                spec.validate(parsed)
+            except ToolArgumentsError:
+                return
+        key = _call_key(call.name, parsed)
+        if key not in self._started:
+            task = asyncio.ensure_future(self.execute(call.name, parsed))
+            task.add_done_callback(_retrieve_exception)
+            self._started[key] = task
+
+    def settle(self, tool_calls: Iterable[tuple[Any, str, dict]]) -> dict[Any, asyncio.Future]:
+        """Match the final tool calls of the response against the started ones.
+
+        Args:
+            tool_calls: ``(call id, tool name, arguments)`` of the final message.
+
+        Returns:
+            The started calls that are in the final message, by call id. The others
+            are cancelled.
+        """
+        matched = {}
+        for call_id, name, arguments in tool_calls:
+            task = self._started.pop(_call_key(name, arguments), None)
+            if task is not None:
+                matched[call_id] = task
+                SPECULATIVE_TOOL_CALLS.inc(outcome=USED)
+        self.cancel()
+        return matched
+
+    def cancel(self) -> None:
+        """Cancel the started calls that were not handed out."""
+        for task in self._started.values():
+            task.cancel()
+            SPECULATIVE_TOOL_CALLS.inc(outcome=WASTED)
+        self._started.clear()
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from agent_commons.cancellation import (
+    RUNS_CANCELLED,
+    ClientDisconnected,
+    run_until_disconnect,
+    stream_until_disconnect,
+)
+from agent_commons.metrics import MetricsRegistry
+
+
+class _DisconnectingRequest:
+    """Stand-in for a Starlette request whose client leaves after ``connected_for`` seconds."""
+
+    def __init__(self, connected_for: float) -> None:
+        self.connected_for = connected_for
+        self.started = None
+
+    async def is_disconnected(self) -> bool:
+        loop = asyncio.get_running_loop()
+        if self.started is None:
+            self.started = loop.time()
+        return loop.time() - self.started >= self.connected_for
+
+
+class TestCancellation:
+    def test_run_is_cancelled_when_client_disconnects(self):
+        cancelled = asyncio.Event()
+
+        async def slow_run():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def main():
+            request = _DisconnectingRequest(connected_for=0.05)
+            with pytest.raises(ClientDisconnected):
+                await run_until_disconnect(request, slow_run(), poll_interval=0.01)
+            return cancelled.is_set()
+
+        assert asyncio.run(main())
+
+    def test_stream_is_closed_when_client_disconnects(self):
+        closed = asyncio.Event()
+
+        async def slow_stream():
+            try:
+                yield "first"
+                await asyncio.sleep(5)
+                yield "second"
+            finally:
+                closed.set()
+
+        async def main():
+            request = _DisconnectingRequest(connected_for=0.05)
+            items = []
+            with pytest.raises(ClientDisconnected):
+                async for item in stream_until_disconnect(request, slow_stream(), poll_interval=0.01):
+                    items.append(item)
+            return items, closed.is_set()
+
+        assert asyncio.run(main()) == (["first"], True)
+
+    def test_cancelled_runs_are_exported(self):
+        registry = MetricsRegistry()
+        counter = registry.counter(RUNS_CANCELLED.name, RUNS_CANCELLED.documentation, ("reason",))
+        counter.inc(reason="client_disconnect")
+        assert 'agent_runs_cancelled_total{reason="client_disconnect"} 1.0' in registry.render()
@@ -0,0 +1,82 @@
+import asyncio
+import math
+
+from pydantic import BaseModel
+
+from agent_commons.cascade import (
+    CASCADE_DECISIONS,
+    CLASSIFIER,
+    LOW_CONFIDENCE,
+    TOOL_CALLS,
+    TOOL_PARSE,
+    ModelCascade,
+    complexity_score,
+)
+from agent_commons.settings import Settings
+from agent_commons.tool_registry import ToolRegistry, make_tool_spec
+
+
+class LookupInput(BaseModel):
+    query: str
+
+
+def lookup(query: str) -> str:
+    return query
+
+
+def lookup_spec(fn):
+    return make_tool_spec(
+        fn,
+        name=fn.__name__,
+        description="Look something up.",
+        parameters=LookupInput.model_json_schema(),
+        args_schema=LookupInput,
+    )
+
+
+class TestModelCascade:
+    def test_classifier_keeps_small_talk_on_the_small_model(self):
+        cascade = ModelCascade(small_model="small")
+
+        assert complexity_score("Hi! How are you?") < 0.5
+        assert cascade.route("what is redhat") is None
+        assert (
+            cascade.route("Compare A versus B and explain why, step by step, with the trade-offs")
+            == CLASSIFIER
+        )
+        assert ModelCascade.from_settings(Settings()) is None
+        assert ModelCascade.from_settings(Settings(cascade_model_id="small")).small_model == "small"
+
+    def test_escalation_signals(self):
+        registry = ToolRegistry(lookup_spec)
+        registry.register(lookup)
+        cascade = ModelCascade(small_model="small", max_tool_calls=1, min_confidence=0.5)
+
+        assert cascade.check([("lookup", {"query": "x"})], registry=registry) is None
+        assert cascade.check([("lookup", {"query": "x"})] * 2, registry=registry) == TOOL_CALLS
+        assert cascade.check([("lookup", None)], registry=registry) == TOOL_PARSE
+        assert cascade.check([("unknown", {})], registry=registry) == TOOL_PARSE
+        assert cascade.check([("lookup", {"q": 1})], registry=registry) == TOOL_PARSE
+        assert cascade.check([], logprobs=[math.log(0.9)] * 3) is None
+        assert cascade.check([], logprobs=[math.log(0.2)] * 3) == LOW_CONFIDENCE
+
+    def test_escalated_call_goes_to_the_large_model(self):
+        cascade = ModelCascade(small_model="small", max_tool_calls=0)
+        calls = []
+
+        async def call(model: str, tool_calls: list):
+            calls.append(model)
+            return tool_calls
+
+        before = CASCADE_DECISIONS.value(route="escalated", reason=TOOL_CALLS)
+        answer = asyncio.run(
+            cascade.arun(
+                "what is redhat",
+                lambda: call("small", [("lookup", {"query": "redhat"})]),
+                lambda: call("large", []),
+                lambda response: (response, None),
+            )
+        )
+
+        assert (answer, calls) == ([], ["small", "large"])
+        assert CASCADE_DECISIONS.value(route="escalated", reason=TOOL_CALLS) == before + 1
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agent_commons.cassette import Cassette, CassetteMismatch, CassetteTransport, read_cassette
+
+URL = "http://llm.test/v1/chat/completions"
+
+
+def upstream(calls: list) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        question = calls[-1]["messages"][-1]["content"]
+        return httpx.Response(200, json={"answer": question.upper()})
+
+    return httpx.MockTransport(handler)
+
+
+def record(path: str, questions: list[str]) -> list:
+    calls: list = []
+    cassette = Cassette(path, "record")
+    with httpx.Client(transport=CassetteTransport(cassette, upstream(calls))) as client:
+        for question in questions:
+            client.post(URL, json={"messages": [{"role": "user", "content": question}]})
+    cassette.record_tool("search", {"query": "a"}, "result a", False, 0.01)
+    cassette.close()
+    return calls
+
+
+class TestCassette:
+    def test_replay_answers_without_the_upstream(self, tmp_path):
+        path = str(tmp_path / "run.jsonl.gz")
+        record(path, ["first", "second", "first"])
+
+        cassette = Cassette(path, "replay", latency="zero")
+
+        async def replay() -> list[str]:
+            async with cassette.async_http_client() as client:
+                answers = []
+                for question in ["first", "first", "second"]:
+                    body = {"messages": [{"role": "user", "content": question}]}
+                    answers.append((await client.post(URL, json=body)).json()["answer"])
+                return answers
+
+        assert asyncio.run(replay()) == ["FIRST", "FIRST", "SECOND"]
+        assert cassette.replay_tool("search", {"query": "a"}).content == "result a"
+        assert cassette.summary() == {"replayed": 4, "unused": 0, "mismatches": 0}
+
+    def test_mismatch_shows_diff_to_closest_recording(self, tmp_path):
+        path = str(tmp_path / "run.jsonl")
+        record(path, ["what is redhat"])
+        cassette = Cassette(path, "replay", latency="zero")
+
+        with cassette.http_client() as client:
+            body = {"messages": [{"role": "user", "content": "what is fedora"}]}
+            response = client.post(URL, json=body)
+
+        assert response.status_code == 400
+        assert response.json()["error"]["type"] == "cassette_mismatch"
+        assert '-   "content": "what is redhat",' in cassette.mismatches[0]
+        assert '+   "content": "what is fedora",' in cassette.mismatches[0]
+        with pytest.raises(CassetteMismatch, match="tool 'search'"):
+            cassette.replay_tool("search", {"query": "b"})
+
+    def test_recording_appends_sessions(self, tmp_path):
+        path = str(tmp_path / "run.jsonl")
+        record(path, ["one"])
+        record(path, ["two"])
+
+        entries = list(read_cassette(path))
+
+        assert [entry["type"] for entry in entries] == ["llm", "tool", "llm", "tool"]
+        assert entries[0]["status"] == 200 and entries[0]["chunks"]
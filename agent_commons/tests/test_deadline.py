@@ -0,0 +1,28 @@
+from agent_commons.deadline import Deadline
+
+
+class TestDeadline:
+    def test_from_request_prefers_body_field(self):
+        deadline = Deadline.from_request(header_value="5", field_value=30, default=120)
+        assert 29 < deadline.remaining() <= 30
+
+    def test_from_request_falls_back_to_default(self):
+        deadline = Deadline.from_request(header_value="not-a-number", default=60)
+        assert 59 < deadline.remaining() <= 60
+        deadline = Deadline.from_request(header_value="nan", default=60)
+        assert 59 < deadline.remaining() <= 60
+
+    def test_from_request_clamps_to_maximum(self):
+        deadline = Deadline.from_request(field_value=10_000, maximum=600)
+        assert deadline.remaining() <= 600
+
+    def test_step_timeout_keeps_answer_now_margin(self):
+        deadline = Deadline.after(30, answer_now_margin=10)
+        assert deadline.step_timeout() <= 20
+        assert not deadline.answer_now
+
+    def test_answer_now_when_budget_is_spent(self):
+        deadline = Deadline(expires_at=0.0)
+        assert deadline.expired
+        assert deadline.answer_now
+        assert deadline.step_timeout() == 0
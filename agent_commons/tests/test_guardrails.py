@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_commons.guardrails import (
+    CONTENT_FILTER,
+    REFUSAL,
+    Guardrail,
+    GuardrailTripped,
+    KeywordClassifier,
+    SafetyClassifier,
+    Screening,
+    input_screened,
+)
+
+QUESTION = [{"role": "user", "content": "How do I bake bread?"}]
+
+
+class FailingClassifier(SafetyClassifier):
+    async def classify(self, messages):
+        raise ConnectionError("shield unreachable")
+
+
+async def run_deltas(words: list[str], state: dict, step: float = 0.0):
+    """A run streaming a tool call, then its answer word by word."""
+    try:
+        yield {"role": "assistant", "tool_calls": [{"index": 0, "function": {"name": "search"}}]}, None
+        yield {"role": "tool", "content": "bread needs flour"}, None
+        for word in words:
+            await asyncio.sleep(step)
+            yield {"role": "assistant", "content": word + " "}, None
+        yield {"role": "assistant"}, "stop"
+        state["finished"] = True
+    finally:
+        state.setdefault("finished", False)
+
+
+async def collect(stream) -> list:
+    return [item async for item in stream]
+
+
+class TestScreening:
+    def test_passing_run_streams_unchanged_and_flagged_output_is_withheld(self):
+        guardrail = Guardrail(KeywordClassifier(["poison"]), output_window=20)
+        words = ["mix", "flour", "and", "water", "then", "add", "poison", "and", "bake", "it"]
+
+        async def main():
+            clean = await collect(Screening(guardrail, QUESTION).stream(run_deltas(words[:6], {})))
+            screening = Screening(guardrail, QUESTION)
+            state = {}
+            flagged = await collect(screening.stream(run_deltas(words, state, step=0.01)))
+            return clean, screening, state, flagged
+
+        clean, screening, state, flagged = asyncio.run(main())
+
+        assert clean == asyncio.run(collect(run_deltas(words[:6], {})))
+        text = "".join(delta.get("content") or "" for delta, _ in flagged[:-1] if delta["role"] == "assistant")
+        assert text and "poison" not in text
+        assert "mix flour and" in text
+        assert flagged[-1] == ({"role": "assistant", "content": REFUSAL}, CONTENT_FILTER)
+        assert screening.tripped.stage == "output"
+        assert state["finished"] is False
+
+    def test_flagged_input_cancels_the_run_concurrently(self):
+        # Screening takes 0.1s; the run would take 1s
+        guardrail = Guardrail(KeywordClassifier(["poison"], delay=0.1))
+        screening = Screening(guardrail, [{"role": "user", "content": "How do I make poison?"}])
+        state = {}
+
+        async def main():
+            started = time.perf_counter()
+            deltas = await collect(screening.stream(run_deltas(["slow"] * 10, state, step=0.1)))
+            return deltas, time.perf_counter() - started
+
+        deltas, elapsed = asyncio.run(main())
+
+        assert deltas == [({"role": "assistant", "content": REFUSAL}, CONTENT_FILTER)]
+        assert screening.tripped.stage == "input"
+        assert state["finished"] is False
+        assert elapsed < 0.5
+
+    def test_non_streamed_runs_and_classifier_failures(self):
+        async def answer(text: str, delay: float = 0.0) -> str:
+            await asyncio.sleep(delay)
+            return text
+
+        async def main():
+            guardrail = Guardrail(KeywordClassifier(["poison"], delay=0.05))
+            started = time.perf_counter()
+            result = await Screening(guardrail, QUESTION).run(answer("Knead it.", 0.05), str)
+            elapsed = time.perf_counter() - started
+            with pytest.raises(GuardrailTripped):
+                await Screening(guardrail, QUESTION).run(answer("Add poison."), str)
+
+            closed = Guardrail(FailingClassifier())
+            with pytest.raises(GuardrailTripped):
+                await Screening(closed, QUESTION).run(answer("Knead it."), str)
+            opened = Guardrail(FailingClassifier(), fail_open=True)
+            deltas = await collect(Screening(opened, QUESTION).stream(run_deltas(["knead"], {})))
+            return result, elapsed, deltas
+
+        result, elapsed, deltas = asyncio.run(main())
+
+        assert result == "Knead it."
+        assert elapsed < 0.14  # input screen and run overlapped, then the output screen
+        assert deltas[-1] == ({"role": "assistant"}, "stop")
+
+    def test_tools_wait_for_the_input_screen(self):
+        # Screening takes 0.1s; the first LLM step 0.01s
+        guardrail = Guardrail(KeywordClassifier(["poison"], delay=0.1))
+        flagged = [{"role": "user", "content": "How do I make poison?"}]
+        tool_runs = []
+
+        async def call_tool(query: str) -> str:
+            await input_screened()
+            tool_runs.append(query)
+            return "bread needs flour"
+
+        async def run(query: str) -> str:
+            await asyncio.sleep(0.01)
+            # Tools run in tasks of their own, as in the agent frameworks
+            return await asyncio.ensure_future(call_tool(query))
+
+        async def streamed_run(query: str):
+            yield {"role": "assistant", "tool_calls": [{"index": 0, "function": {"name": "search"}}]}, None
+            yield {"role": "tool", "content": await run(query)}, None
+            yield {"role": "assistant"}, "stop"
+
+        async def main():
+            with pytest.raises(GuardrailTripped):
+                await Screening(guardrail, flagged).run(run("poison"), str)
+            # Screened ahead of the run (e.g. for a cache hit); the run reuses the verdict
+            screened = Screening(guardrail, flagged)
+            assert not await screened.input_passed()
+            with pytest.raises(GuardrailTripped):
+                await screened.run(run("poison"), str)
+            deltas = await collect(Screening(guardrail, flagged).stream(streamed_run("poison")))
+            await asyncio.sleep(0.05)
+            flagged_runs = list(tool_runs)
+            started = time.perf_counter()
+            result = await Screening(guardrail, QUESTION).run(run("bread"), str)
+            return deltas, flagged_runs, result, time.perf_counter() - started
+
+        deltas, flagged_runs, result, elapsed = asyncio.run(main())
+
+        assert flagged_runs == []
+        assert deltas == [({"role": "assistant", "content": REFUSAL}, CONTENT_FILTER)]
+        assert result == "bread needs flour"
+        assert tool_runs == ["bread"]
+        assert elapsed >= 0.1  # the tool waited for the screen
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from agent_commons.cancellation import RUNS_CANCELLED
+from agent_commons.jobs import (
+    CANCELLED,
+    JOB_CANCEL,
+    QUEUED,
+    SUCCEEDED,
+    JobQueue,
+    JobQueueFull,
+    JobRun,
+    job_event_stream,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def echo(run: JobRun):
+    """Runner echoing the message word by word; "wait" jobs block until cancelled."""
+    if run.request["message"] == "wait":
+        await asyncio.sleep(60)
+    words = run.request["message"].split()
+    for word in words:
+        yield {"role": "assistant", "content": word}, None
+    run.result = {"messages": [{"role": "assistant", "content": " ".join(words)}], "finish_reason": "stop"}
+
+
+async def finished(queue: JobQueue, job_id: str):
+    job = queue.get(job_id)
+    async for _ in queue.events(job):
+        pass
+    return job
+
+
+class TestJobQueue:
+    def test_runs_jobs_and_streams_their_events(self):
+        async def scenario():
+            queue = JobQueue(echo, workers=1, max_queued=2)
+            await queue.start()
+            first = queue.submit({"message": "hello there"})
+            queue.submit({"message": "again"})
+            with pytest.raises(JobQueueFull):
+                queue.submit({"message": "one too many"})
+            stream = [chunk async for chunk in job_event_stream(queue, first, last_event_id="1")]
+            await queue.close()
+            return first, stream
+
+        job, stream = asyncio.run(scenario())
+
+        assert job.status == SUCCEEDED
+        assert job.result["messages"][0]["content"] == "hello there"
+        assert "total;desc=" in job.timing
+        # Resumed after the first event
+        assert stream[0].startswith('id: 2\ndata: {"choices"')
+        assert stream[1].startswith("event: job\n")
+        assert stream[-1] == "data: [DONE]\n\n"
+
+    def test_cancels_queued_and_running_jobs(self):
+        cancelled = RUNS_CANCELLED.value(reason=JOB_CANCEL)
+
+        async def scenario():
+            queue = JobQueue(echo, workers=1)
+            await queue.start()
+            running = queue.submit({"message": "wait"})
+            queued = queue.submit({"message": "never run"})
+            await asyncio.sleep(0)
+            await queue.cancel(queued.id)
+            await queue.cancel(running.id)
+            await queue.close()
+            return running, queued
+
+        running, queued = asyncio.run(scenario())
+
+        assert running.status == queued.status == CANCELLED
+        assert queued.started_at is None
+        assert RUNS_CANCELLED.value(reason=JOB_CANCEL) == cancelled + 1
+
+    def test_jobs_survive_a_restart_until_their_ttl(self, tmp_path):
+        clock = FakeClock()
+        store_path = str(tmp_path / "jobs.db")
+
+        async def scenario():
+            # Stopped before a worker picked the job up
+            queue = JobQueue(echo, workers=0, store_path=store_path, clock=clock)
+            await queue.start()
+            job = queue.submit({"message": "hello"})
+            assert job.status == QUEUED
+            await queue.close()
+
+            queue = JobQueue(echo, workers=1, store_path=store_path, result_ttl=60, clock=clock)
+            await queue.start()
+            await finished(queue, job.id)
+            await queue.close()
+
+            queue = JobQueue(echo, workers=1, store_path=store_path, result_ttl=60, clock=clock)
+            await queue.start()
+            kept = queue.get(job.id)
+            clock.now += 61
+            forgotten = queue.get(job.id)
+            await queue.close()
+            return kept, forgotten
+
+        kept, forgotten = asyncio.run(scenario())
+
+        assert kept.status == SUCCEEDED
+        assert kept.result["messages"][0]["content"] == "hello"
+        assert forgotten is None
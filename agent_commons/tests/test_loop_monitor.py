@@ -0,0 +1,43 @@
+import asyncio
+import contextlib
+import time
+
+from agent_commons.loop_monitor import LOOP_BLOCKED, LOOP_LAG, LoopMonitor
+
+
+def blocking_parse() -> None:
+    time.sleep(0.3)
+
+
+async def run_with_monitor(monitor: LoopMonitor, work) -> None:
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+    await work()
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+class TestLoopMonitor:
+    def test_reports_the_stack_of_a_blocking_call(self):
+        monitor = LoopMonitor(interval=0.01, debug=True, block_threshold=0.05)
+        lags, blocked = LOOP_LAG.count(), LOOP_BLOCKED.value()
+
+        async def work():
+            blocking_parse()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run_with_monitor(monitor, work))
+
+        assert LOOP_LAG.count() > lags
+        assert LOOP_BLOCKED.value() == blocked + 1
+        (stall,) = monitor.blocked
+        assert stall.blocked_for > 0.05
+        assert "in blocking_parse" in stall.stack
+
+    def test_idle_loop_reports_nothing(self):
+        monitor = LoopMonitor(interval=0.01, debug=True, block_threshold=0.05)
+
+        asyncio.run(run_with_monitor(monitor, lambda: asyncio.sleep(0.2)))
+
+        assert not monitor.blocked
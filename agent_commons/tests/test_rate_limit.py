@@ -0,0 +1,122 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from agent_commons.rate_limit import (
+    COMPLETION_TOKENS,
+    RateLimiter,
+    RateLimiters,
+    RateLimitedTransport,
+    estimate_tokens,
+    parse_duration,
+)
+from agent_commons.settings import Settings, SettingsError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def completion_request(content: str = "x" * 400, max_tokens: int | None = 100) -> bytes:
+    payload = {"model": "m", "messages": [{"role": "user", "content": content}]}
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    return json.dumps(payload).encode()
+
+
+class TestRateLimiter:
+    def test_requests_and_tokens_are_paced_not_burst(self):
+        clock = FakeClock()
+        # One request a second; 100 tokens a second, holding one second of them
+        limiter = RateLimiter("api", rpm=60, tpm=6000, clock=clock)
+
+        assert [limiter.reserve(0) for _ in range(3)] == [(0.0, "none"), (1.0, "requests"), (2.0, "requests")]
+        clock.now += 10
+        assert limiter.reserve(80) == (0.0, "none")
+        clock.now += 1
+        # The bucket is full again; 250 tokens leave it 150 short
+        assert limiter.reserve(250) == (1.5, "tokens")
+        # The response used 50 tokens, not 250: the next one does not wait for them
+        limiter.settle(250, 50)
+        clock.now += 1.5
+        assert limiter.reserve(100) == (0.0, "none")
+
+        body = completion_request()
+        assert estimate_tokens(body) == len(body) // 4 + 100
+        assert estimate_tokens(completion_request(max_tokens=None)) > COMPLETION_TOKENS
+        assert estimate_tokens(b'{"input": "embed me"}') == 0
+
+    def test_backend_headers_pause_and_lower_the_buckets(self):
+        clock = FakeClock()
+        limiter = RateLimiter("api", rpm=600, tpm=60000, clock=clock)
+
+        limiter.observe(httpx.Response(429, headers={"retry-after": "3"}))
+        assert limiter.paused_for() == 3
+        # Requests wait for the pause, then resume at the configured pace rather than all at once
+        assert [limiter.reserve(0)[0] for _ in range(2)] == [pytest.approx(3.1), pytest.approx(3.2)]
+
+        clock.now += 60
+        limiter.observe(
+            httpx.Response(200, headers={"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m30s"})
+        )
+        assert limiter.paused_for() == pytest.approx(90)
+        clock.now += 100
+        # Other pods used all but 20 tokens of the backend
+        limiter.observe(httpx.Response(200, headers={"x-ratelimit-remaining-tokens": "20"}))
+        assert limiter.reserve(520) == (pytest.approx(0.5), "tokens")
+
+        assert parse_duration("20ms") == pytest.approx(0.02)
+        assert parse_duration("1h2m3.5s") == pytest.approx(3723.5)
+        assert parse_duration("soon") is None
+
+    def test_transport_paces_requests_per_backend(self):
+        sent = []
+
+        def backend(request: httpx.Request) -> httpx.Response:
+            sent.append(time.perf_counter())
+            body = json.dumps({"choices": [], "usage": {"total_tokens": 10}}).encode()
+            # Streamed like a network response, not read already
+            return httpx.Response(200, headers={"content-type": "application/json"}, stream=httpx.ByteStream(body))
+
+        limiters = RateLimiters(
+            Settings(
+                rate_limit_rpm=1200,
+                rate_limit_burst=0.01,
+                rate_limit_backends="http://other:8000/v1=0/0,cascade:8000=0/60000",
+            )
+        )
+        assert limiters.get("http://other:8000/v1") is None
+        cascade = limiters.get("http://cascade:8000/v1")
+        assert (cascade.rpm, cascade.tpm) == (0, 60000)
+        limiter = limiters.get("http://llm:8000/v1")
+        assert limiter is limiters.get("http://llm:8000/v1/")
+        metered = RateLimiter("llm", tpm=60000, clock=FakeClock())
+
+        async def main():
+            transport = RateLimitedTransport(limiter, upstream=httpx.MockTransport(backend))
+            async with httpx.AsyncClient(transport=transport) as client:
+                responses = await asyncio.gather(
+                    *(client.post("http://llm:8000/v1/chat/completions", content=completion_request()) for _ in range(4))
+                )
+            transport = RateLimitedTransport(metered, upstream=httpx.MockTransport(backend))
+            async with httpx.AsyncClient(transport=transport) as client:
+                for _ in range(4):
+                    await client.post("http://llm:8000/v1/chat/completions", content=completion_request())
+            return responses
+
+        responses = asyncio.run(main())
+
+        assert all(response.status_code == 200 for response in responses)
+        # 20 requests a second, holding one: the first at once, then one every 0.05s
+        assert sent[-1] - sent[0] >= 0.14
+        # The responses said they used 10 tokens each, not the estimated ones
+        assert metered.tokens.level == pytest.approx(1000 - 4 * 10)
+        with pytest.raises(SettingsError):
+            RateLimiters(Settings(rate_limit_backends="llm:8000=60"))
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from agent_commons.safe_math import SafeMathError, calculate, compile_expression, evaluate
+
+
+class TestSafeMath:
+    def test_exact_integer_arithmetic(self):
+        assert evaluate("123456789 * 987654321") == 121932631112635269
+
+    def test_functions_and_constants(self):
+        assert evaluate("sqrt(16) + floor(7 / 2)") == 7
+        assert evaluate("round(2 * pi, 4)") == 6.2832
+
+    @pytest.mark.parametrize(
+        "expression",
+        ["__import__('os')", "(1).__class__", "[1, 2]", "lambda: 1", "'a' * 3", "x if 1 else 2"],
+    )
+    def test_rejects_unsupported_syntax(self, expression):
+        with pytest.raises(SafeMathError):
+            evaluate(expression, {"x": 1})
+
+    def test_limits(self):
+        with pytest.raises(SafeMathError, match="too large"):
+            evaluate("10**10**10")
+        with pytest.raises(SafeMathError, match="bits"):
+            evaluate("10**3000 * 10**3000")
+        with pytest.raises(SafeMathError, match="round"):
+            evaluate("round(1, -10000000)")
+        assert evaluate("round(x, 1)", {"x": [1.25, 2.04]}).tolist() == [1.2, 2.0]
+        with pytest.raises(SafeMathError, match="limit"):
+            evaluate("x", {"x": {"start": 0, "stop": 1e12}})
+
+    def test_vectorized_over_ranges(self):
+        result = evaluate("x**2", {"x": {"start": 1, "stop": 5}})
+        assert isinstance(result, np.ndarray)
+        assert result.tolist() == [1, 4, 9, 16]
+        assert evaluate("sum(x)", {"x": {"start": 1, "stop": 100_001}}) == 5_000_050_000
+
+    def test_compiled_expressions_are_cached(self):
+        assert compile_expression("1 + x") is compile_expression("1 + x")
+
+    def test_calculate_reports_errors(self):
+        assert calculate("1 / 0").startswith("Error: ZeroDivisionError")
+        assert calculate("y + 1").startswith("Error: Unknown names: y")
+        assert calculate("10**3000 + 10**3000 * 10**3000").startswith("Error: ")
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from starlette.datastructures import Headers
+
+from agent_commons.scheduler import BATCH, INTERACTIVE, QUEUE_WAIT, FairScheduler
+from agent_commons.settings import Settings, SettingsError
+
+
+async def run_all(scheduler: FairScheduler, runs: list[tuple[str, str]]) -> list[str]:
+    """Queue ``(tenant, lane)`` runs behind a blocking run; returns the tenants in start order."""
+    started = []
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.slot("blocker"):
+            await release.wait()
+
+    async def run(tenant: str, lane: str):
+        async with scheduler.slot(tenant, lane):
+            started.append(tenant)
+            await asyncio.sleep(0)
+
+    blocking = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(run(tenant, lane)) for tenant, lane in runs]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocking, *tasks)
+    return started
+
+
+class TestFairScheduler:
+    def test_weighted_share_and_priority_lanes(self):
+        scheduler = FairScheduler(max_concurrency=1, weights={"a": 2})
+        # "b" queued its batch first, then both tenants burst interactive runs
+        runs = [("b", BATCH)] * 2 + [("b", INTERACTIVE)] * 6 + [("a", INTERACTIVE)] * 6
+        waits = QUEUE_WAIT.count(tenant="a", lane=INTERACTIVE)
+
+        started = asyncio.run(run_all(scheduler, runs))
+
+        assert started[:6].count("a") == 4
+        assert started[-2:] == ["b", "b"]  # the batch runs go last
+        assert QUEUE_WAIT.count(tenant="a", lane=INTERACTIVE) == waits + 6
+
+    def test_tenant_quota(self):
+        scheduler = FairScheduler(max_concurrency=4, tenant_max_concurrency=1, quotas={"b": 2})
+        running = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+
+        async def run(tenant: str):
+            async with scheduler.slot(tenant):
+                running[tenant] += 1
+                peak[tenant] = max(peak[tenant], running[tenant])
+                await asyncio.sleep(0.001)
+                running[tenant] -= 1
+
+        async def main():
+            await asyncio.gather(*(run(tenant) for tenant in "aaabbb"))
+
+        asyncio.run(main())
+        assert peak == {"a": 1, "b": 2}
+
+    def test_tenant_of_a_request(self):
+        scheduler = FairScheduler.from_env(Settings(tenant_api_keys="k1=search-team"))
+
+        def tenant(**headers) -> str:
+            return scheduler.tenant(Headers({name.replace("_", "-"): value for name, value in headers.items()}))
+
+        assert tenant(authorization="Bearer k1", x_tenant_id="spoofed") == "search-team"
+        assert tenant(x_tenant_id="batch-team") == "batch-team"
+        assert tenant(x_api_key="other").startswith("key-")
+        assert tenant() == "default"
+        with pytest.raises(SettingsError):
+            FairScheduler.from_env(Settings(tenant_weights="a=2,b"))
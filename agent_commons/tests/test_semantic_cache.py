@@ -0,0 +1,108 @@
+import re
+
+import numpy as np
+
+from agent_commons.embedders import Embedder, HashingEmbedder
+from agent_commons.semantic_cache import AUDITS, NOT_STORED, SemanticCache
+from agent_commons.settings import Settings
+
+PARAPHRASES = ("What does print() do in Python?", "explain python print()")
+
+
+class ConceptEmbedder(Embedder):
+    """Stand-in for a semantic model: words meaning the same share a dimension, filler words are dropped."""
+
+    name = "concepts"
+    concepts = {"what": 0, "explain": 0, "describe": 0, "print": 1, "python": 2, "sort": 3, "order": 3, "list": 4}
+    dim = 5
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text):
+                if word in self.concepts:
+                    vectors[row, self.concepts[word]] = 1.0
+        return vectors
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(**kwargs) -> SemanticCache:
+    kwargs.setdefault("clock", FakeClock())
+    return SemanticCache(HashingEmbedder(), threshold=0.9, ttl=60, **kwargs)
+
+
+class TestSemanticCache:
+    def test_answers_paraphrases_until_the_ttl(self):
+        clock = FakeClock()
+        cache = make_cache(clock=clock)
+        cache.store_sync("What does print() do in Python?", "It writes to stdout.", tools=["web_search"])
+
+        hit = cache.lookup_sync("  what does PRINT do in python ")
+        other = cache.lookup_sync("How do I sort a list?")
+        clock.now += 61
+        expired = cache.lookup_sync("What does print() do in Python?")
+
+        assert hit.answer == "It writes to stdout."
+        assert hit.similarity > 0.99
+        assert other is None
+        assert expired is None
+
+    def test_skips_side_effects_and_evicts_the_least_recently_used(self):
+        clock = FakeClock()
+        cache = make_cache(size=2, side_effect_tools=["send_email"], clock=clock)
+        skipped = NOT_STORED.value()
+
+        assert not cache.store_sync("email the report to bob", "Sent.", tools=["send_email"])
+        cache.store_sync("first question", "first")
+        clock.now += 1
+        cache.store_sync("second question", "second")
+        clock.now += 1
+        cache.lookup_sync("first question")  # used more recently than the second
+        cache.store_sync("third question", "third")
+
+        assert NOT_STORED.value() == skipped + 1
+        assert cache.lookup_sync("email the report to bob") is None
+        assert cache.lookup_sync("first question").answer == "first"
+        assert cache.lookup_sync("second question") is None
+        assert cache.lookup_sync("third question").answer == "third"
+
+    def test_audits_hits_and_survives_a_restart(self, tmp_path):
+        cache = make_cache(audit_rate=1.0, path=str(tmp_path))
+        disagreed = AUDITS.value(outcome="disagree")
+        cache.store_sync("capital of france", "Lyon is the capital.")
+
+        hit = cache.lookup_sync("Capital of France?")
+        cache.store_sync("Capital of France?", "Paris is the capital of France.", audited=hit)
+        cache.save()
+        reopened = make_cache(path=str(tmp_path))
+
+        assert hit.audit
+        assert AUDITS.value(outcome="disagree") == disagreed + 1
+        assert reopened.lookup_sync("capital of france").answer == "Paris is the capital of France."
+
+    def test_semantic_embedder_matches_paraphrases_per_tenant(self):
+        settings = Settings(
+            semantic_cache=True,
+            semantic_cache_embedder="agent_commons.tests.test_semantic_cache:ConceptEmbedder",
+        )
+        cache = SemanticCache.from_env(settings)
+        lexical = make_cache()
+        for each in (cache, lexical):
+            each.store_sync(PARAPHRASES[0], "It writes to stdout.", tenant="team-a")
+
+        hit = cache.lookup_sync(PARAPHRASES[1], tenant="team-a")
+
+        assert hit.answer == "It writes to stdout."
+        assert hit.similarity >= settings.semantic_cache_threshold
+        assert cache.lookup_sync("how do I sort a list", tenant="team-a") is None
+        # Entries are only served to the tenant that stored them
+        assert cache.lookup_sync(PARAPHRASES[0], tenant="team-b") is None
+        # The lexical default does not match the paraphrase
+        assert lexical.lookup_sync(PARAPHRASES[1], tenant="team-a") is None
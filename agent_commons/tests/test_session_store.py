@@ -0,0 +1,85 @@
+import asyncio
+
+from agent_commons.session_store import SessionStore
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def list_store(**kwargs) -> SessionStore[list[str]]:
+    return SessionStore(
+        size_of=lambda value: sum(len(item) for item in value),
+        dump=lambda value: "\n".join(value),
+        load=lambda data: data.split("\n"),
+        **kwargs,
+    )
+
+
+async def turn(store: SessionStore, session_id: str, message: str) -> list[str]:
+    """Append a message to the session and return the history the turn started from."""
+    async with store.checkout(session_id) as session:
+        history = session.value or []
+        session.value = [*history, message]
+        return history
+
+
+class TestSessionStore:
+    def test_history_is_kept_between_turns(self):
+        store = list_store()
+
+        async def main():
+            await turn(store, "a", "first")
+            return await turn(store, "a", "second")
+
+        assert asyncio.run(main()) == ["first"]
+        assert store.total_bytes == len("firstsecond")
+
+    def test_least_recently_used_session_is_evicted(self):
+        store = list_store(max_sessions=2)
+
+        async def main():
+            for session_id in ("a", "b", "a", "c"):
+                await turn(store, session_id, "x")
+
+        asyncio.run(main())
+        assert "b" not in store
+        assert "a" in store and "c" in store
+
+    def test_memory_cap_spills_to_sqlite(self, tmp_path):
+        store = list_store(max_bytes=10, spill_path=str(tmp_path / "spill.db"))
+
+        async def main():
+            await turn(store, "a", "0123456789")
+            await turn(store, "b", "0123456789")
+            return await turn(store, "a", "more")
+
+        assert asyncio.run(main()) == ["0123456789"]
+        assert "b" not in store
+
+    def test_idle_sessions_expire(self):
+        clock = FakeClock()
+        store = list_store(idle_ttl=60, clock=clock)
+
+        asyncio.run(turn(store, "a", "hello"))
+        clock.now += 61
+
+        assert asyncio.run(turn(store, "a", "again")) == []
+
+    def test_turns_of_a_conversation_run_one_at_a_time(self):
+        store = list_store()
+
+        async def slow_turn(message: str) -> None:
+            async with store.checkout("a") as session:
+                await asyncio.sleep(0.01)
+                session.value = [*(session.value or []), message]
+
+        async def main():
+            await asyncio.gather(*(slow_turn(str(i)) for i in range(5)))
+            return await turn(store, "a", "last")
+
+        assert sorted(asyncio.run(main())) == ["0", "1", "2", "3", "4"]
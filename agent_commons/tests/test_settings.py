@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from agent_commons import settings as settings_module
+from agent_commons.settings import (
+    Settings,
+    SettingsError,
+    get_settings,
+    on_reload,
+    reload_settings,
+    watch_settings,
+)
+
+
+@pytest.fixture
+def settings_file(tmp_path, monkeypatch):
+    """An empty SETTINGS_FILE, no .env, and fresh module state."""
+    path = tmp_path / "settings.env"
+    path.write_text("")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings_module, "_process_env", {"SETTINGS_FILE": str(path), "MODEL_ID": "env-model"})
+    monkeypatch.setattr(settings_module, "_settings", None)
+    monkeypatch.setattr(settings_module, "_listeners", [])
+    monkeypatch.setenv("SETTINGS_FILE", str(path))
+    return path
+
+
+class TestSettings:
+    def test_parses_and_normalizes_values(self):
+        settings = Settings.from_values(
+            {"BASE_URL": " http://localhost:8321/ ", "REQUEST_TIMEOUT": "30", "SEARCH_CACHE_TTL": "0", "API_KEY": ""}
+        )
+
+        assert settings.base_url == "http://localhost:8321/v1"
+        assert settings.request_timeout == 30.0
+        assert settings.search_cache_ttl == 0.0
+        assert settings.api_key is None
+        assert Settings.from_values({"BASE_URL": "https://host/v1"}).base_url == "https://host/v1"
+        with pytest.raises(SettingsError, match="SEARCH_POOL_SIZE='ten' is not an integer"):
+            Settings.from_values({"SEARCH_POOL_SIZE": "ten"})
+        with pytest.raises(SettingsError, match="REQUEST_TIMEOUT must be positive"):
+            Settings.from_values({"REQUEST_TIMEOUT": "-1"})
+        with pytest.raises(SettingsError, match="MAX_REQUEST_TIMEOUT"):
+            Settings.from_values({"REQUEST_TIMEOUT": "60", "MAX_REQUEST_TIMEOUT": "30"})
+        assert Settings.from_values({"VECTOR_INDEX_TOP_K": "8"}).vector_index_top_k == 8
+        with pytest.raises(SettingsError, match="CASSETTE_PATH"):
+            Settings.from_values({"CASSETTE_MODE": "replay"})
+
+    def test_reload_swaps_valid_settings_only(self, settings_file):
+        reloaded = []
+        on_reload(reloaded.append)
+        first = get_settings()
+        assert get_settings() is first
+        assert first.model_id == "env-model"
+
+        settings_file.write_text("MODEL_ID=file-model\nREQUEST_TIMEOUT=30\n")
+        second = reload_settings()
+        assert get_settings() is second
+        assert (second.model_id, second.request_timeout) == ("file-model", 30.0)
+        assert first.model_id == "env-model"  # snapshots held by running requests are unchanged
+
+        settings_file.write_text("REQUEST_TIMEOUT=soon\n")
+        assert reload_settings() is second
+        assert get_settings() is second
+        assert reloaded == [second]
+
+    def test_watch_reloads_when_the_file_changes(self, settings_file):
+        async def scenario():
+            reloaded = asyncio.Event()
+            on_reload(lambda settings: reloaded.set())
+            get_settings()
+            watcher = asyncio.create_task(watch_settings(interval=0.01))
+            await asyncio.sleep(0.05)
+            settings_file.write_text("DEADLINE_GRACE=1\n")
+            await asyncio.wait_for(reloaded.wait(), timeout=5)
+            watcher.cancel()
+
+        asyncio.run(scenario())
+
+        assert get_settings().deadline_grace == 1.0
@@ -0,0 +1,84 @@
+import asyncio
+
+from pydantic import BaseModel
+
+from agent_commons.settings import Settings
+from agent_commons.speculation import SPECULATIVE_TOOL_CALLS, ToolSpeculator, speculative_tool_names
+from agent_commons.tool_registry import ToolRegistry, make_tool_spec
+
+
+class LookupInput(BaseModel):
+    query: str
+
+
+def lookup(query: str) -> str:
+    return query
+
+
+def lookup_spec(fn):
+    return make_tool_spec(
+        fn,
+        name=fn.__name__,
+        description="Look something up.",
+        parameters=LookupInput.model_json_schema(),
+        args_schema=LookupInput,
+    )
+
+
+class TestToolSpeculator:
+    def test_starts_calls_once_their_arguments_are_complete(self):
+        registry = ToolRegistry(lookup_spec)
+        registry.register(lookup)
+        started = []
+
+        async def execute(name: str, arguments: dict) -> str:
+            started.append(arguments)
+            await asyncio.sleep(0)
+            return f"result {arguments['query']}"
+
+        async def scenario():
+            speculator = ToolSpeculator(execute, ["lookup"], registry)
+            speculator.feed("run", 0, "lookup", '{"query": ')
+            speculator.feed("run", 0, None, '"a"}')
+            speculator.feed("run", 1, "lookup", '{"q": 1}')  # fails the schema
+            speculator.feed("run", 2, "lookup", '{"query": "b"}')
+            await asyncio.sleep(0)
+            assert started == [{"query": "a"}, {"query": "b"}]
+
+            # The final message dropped the call for "b"
+            matched = speculator.settle([("c1", "lookup", {"query": "a"})])
+            return started, await matched["c1"], matched
+
+        used = SPECULATIVE_TOOL_CALLS.value(outcome="used")
+        wasted = SPECULATIVE_TOOL_CALLS.value(outcome="wasted")
+        started, result, matched = asyncio.run(scenario())
+
+        assert result == "result a"
+        assert list(matched) == ["c1"]
+        assert SPECULATIVE_TOOL_CALLS.value(outcome="used") == used + 1
+        assert SPECULATIVE_TOOL_CALLS.value(outcome="wasted") == wasted + 1
+
+    def test_cancel_stops_started_calls(self):
+        async def execute(name: str, arguments: dict) -> None:
+            await asyncio.sleep(10)
+
+        async def scenario():
+            speculator = ToolSpeculator(execute, ["lookup"])
+            # Accumulated arguments, as some clients report them
+            speculator.update("run", 0, "lookup", '{"query": "a"')
+            speculator.update("run", 0, "lookup", '{"query": "a"}')
+            speculator.update("run", 1, "other", '{"query": "a"}')  # not a speculative tool
+            task = next(iter(speculator._started.values()))
+            assert len(speculator._started) == 1
+            speculator.cancel()
+            await asyncio.sleep(0)
+            return task
+
+        assert asyncio.run(scenario()).cancelled()
+
+    def test_speculation_is_opt_in_and_skips_side_effect_tools(self):
+        tools = ["lookup", "send_email", "search"]
+
+        assert speculative_tool_names(tools, Settings()) == frozenset()
+        settings = Settings(speculative_tools=True, side_effect_tools="send_email, book")
+        assert speculative_tool_names(tools, settings) == {"lookup", "search"}
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from agent_commons import settings as settings_module
+from agent_commons.settings import Settings
+from agent_commons.timing import (
+    LLM,
+    SERIALIZE,
+    TOOL,
+    ProfilerBusy,
+    RequestTimer,
+    profile_request,
+    profiling_allowed,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRequestTimer:
+    def test_breakdown_per_phase_and_iteration(self):
+        clock = FakeClock()
+        timer = RequestTimer(queued=0.5, clock=clock)
+        with timer.span(LLM):
+            clock.now += 2.0
+        # Two parallel tool calls of 1s, overlapping by half
+        first, second = timer.span(TOOL), timer.span(TOOL)
+        first.__enter__()
+        clock.now += 0.5
+        second.__enter__()
+        clock.now += 0.5
+        first.__exit__(None, None, None)
+        clock.now += 0.5
+        second.__exit__(None, None, None)
+        clock.now += 0.25  # framework
+        with timer.span(LLM):
+            clock.now += 1.0
+        with timer.span(SERIALIZE):
+            clock.now += 0.25
+
+        breakdown = timer.breakdown()
+
+        assert breakdown == {
+            "llm": 3.0,
+            "tool": 1.5,
+            "serialize": 0.25,
+            "queue": 0.5,
+            "framework": 0.25,
+            "total": 5.5,
+        }
+        assert timer.iterations == 2
+        header = timer.header_value()
+        assert 'llm-1;desc="iteration 1";dur=2000.0' in header
+        assert 'tool-1;desc="iteration 1";dur=1500.0' in header
+        assert "tool-2" not in header
+
+    def test_proxy_queue_time_from_request_start_header(self):
+        started = time.time() - 2
+        for value in (f"t={started}", f"t={int(started * 1000)}", f"{int(started * 1e6)}"):
+            timer = RequestTimer.from_headers({"X-Request-Start": value})
+            assert timer.queued == pytest.approx(2, abs=0.1)
+        assert RequestTimer.from_headers({"X-Request-Start": "garbage"}).queued == 0.0
+
+
+class TestProfiling:
+    def test_needs_the_configured_token(self, monkeypatch):
+        monkeypatch.setattr(settings_module, "_settings", Settings())
+        assert not profiling_allowed("anything")
+        monkeypatch.setattr(settings_module, "_settings", Settings(profile_token="secret"))
+        assert not profiling_allowed(None)
+        assert not profiling_allowed("wrong")
+        assert profiling_allowed("secret")
+
+    def test_one_profile_at_a_time(self):
+        with profile_request() as profile:
+            sorted(range(1000), key=str)
+            with pytest.raises(ProfilerBusy):
+                with profile_request():
+                    pass
+
+        assert "function calls" in profile.report
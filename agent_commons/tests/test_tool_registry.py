@@ -0,0 +1,64 @@
+import pytest
+from pydantic import BaseModel, Field
+
+from agent_commons.tool_registry import ToolArgumentsError, ToolRegistry, make_tool_spec
+
+
+class LookupInput(BaseModel):
+    query: str = Field(description="What to look up.")
+    limit: int = 10
+
+
+def lookup(query: str, limit: int = 10) -> str:
+    return query
+
+
+def lookup_spec(fn):
+    return make_tool_spec(
+        fn,
+        name=fn.__name__,
+        description="Look something up.",
+        parameters=LookupInput.model_json_schema(),
+        args_schema=LookupInput,
+    )
+
+
+def other(query: str) -> str:
+    return query
+
+
+class TestToolRegistry:
+    def test_specs_are_built_once_and_serialized(self):
+        registry = ToolRegistry(lookup_spec)
+        registry.register_all([lookup, other])
+        registry.freeze()
+
+        spec = registry.get("lookup")
+        assert spec.openai_tool["function"]["name"] == "lookup"
+        assert '"name":"lookup"' in spec.schema_json
+        assert registry.get("lookup") is spec
+
+    def test_subset_by_name(self):
+        registry = ToolRegistry(lookup_spec)
+        registry.register_all([lookup, other])
+
+        assert [spec.name for spec in registry.subset(["other"])] == ["other"]
+        assert len(registry.subset()) == 2
+        with pytest.raises(KeyError):
+            registry.subset(["missing"])
+
+    def test_frozen_registry_rejects_new_tools(self):
+        registry = ToolRegistry(lookup_spec).freeze()
+        with pytest.raises(RuntimeError):
+            registry.register(lookup)
+
+    def test_validate_arguments(self):
+        spec = lookup_spec(lookup)
+        spec.validate({"query": "RedHat", "limit": 3})
+        with pytest.raises(ToolArgumentsError, match="limit"):
+            spec.validate({"query": "RedHat", "limit": "many"})
+
+    def test_discover_from_module_path(self):
+        registry = ToolRegistry(lookup_spec)
+        registry.discover(paths=[f"{__name__}:lookup"])
+        assert "lookup" in registry
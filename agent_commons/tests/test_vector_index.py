@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from agent_commons.embedders import HashingEmbedder
+from agent_commons.vector_index import (
+    VECTORS_FILE,
+    VectorIndex,
+    VectorIndexError,
+    chunk_text,
+    normalize,
+)
+
+TEXTS = [f"document {i} about topic {i % 17} and subject {i % 5}" for i in range(500)]
+
+
+def build_index(path, dtype="float32", **kwargs) -> VectorIndex:
+    index = VectorIndex.create(path, HashingEmbedder(), dtype=dtype, block_rows=64, **kwargs)
+    index.add(TEXTS, [{"source": f"doc-{i}"} for i in range(len(TEXTS))])
+    return index
+
+
+class TestVectorIndex:
+    def test_blocked_search_matches_exact_search(self, tmp_path):
+        index = build_index(tmp_path / "index")
+        queries = ["topic 3 subject 1", "document 42"]
+
+        scores, ids = index.search_vectors(index.embedder.embed(queries), k=5)
+
+        vectors = normalize(index.embedder.embed(TEXTS))
+        expected = -np.sort(-(normalize(index.embedder.embed(queries)) @ vectors.T), axis=1)[:, :5]
+        np.testing.assert_allclose(scores, expected, atol=1e-5)
+        assert index.search("document 42", k=1)[0].metadata == {"source": "doc-42"}
+
+    def test_float16_index_is_half_the_size(self, tmp_path):
+        index = build_index(tmp_path / "f16", dtype="float16")
+        build_index(tmp_path / "f32")
+
+        assert index.search("document 42", k=1)[0].id == 42
+        assert os.path.getsize(tmp_path / "f16" / VECTORS_FILE) * 2 == os.path.getsize(
+            tmp_path / "f32" / VECTORS_FILE
+        )
+
+    def test_appends_are_visible_to_other_readers(self, tmp_path):
+        writer = build_index(tmp_path / "index")
+        writer.build_partitions(8)
+        reader = VectorIndex(tmp_path / "index")
+
+        [new_id] = writer.add(["zebra crossing manual"])
+
+        assert reader.search("zebra crossing manual", k=1, nprobe=8)[0].id == new_id
+        assert len(reader) == len(TEXTS) + 1
+
+    def test_refresh_survives_a_concurrent_rebuild(self, tmp_path, monkeypatch):
+        writer = build_index(tmp_path / "index")
+        writer.build_partitions(8)
+        reader = VectorIndex(tmp_path / "index")
+        writer.add(["zebra crossing manual"])
+        load, loaded = reader._load, []
+
+        def rebuild_then_load(meta):
+            # The partitions are rebuilt between reading index.json and loading its files
+            if not loaded:
+                writer.build_partitions(4)
+            loaded.append(meta["ivf"]["generation"])
+            return load(meta)
+
+        monkeypatch.setattr(reader, "_load", rebuild_then_load)
+
+        assert reader.refresh()
+        assert loaded == [1, 2]
+        assert reader.partitions == 4
+        assert reader.search("zebra crossing manual", k=1, nprobe=4)[0].id == len(TEXTS)
+
+    def test_ivf_search_finds_exact_match(self, tmp_path):
+        index = build_index(tmp_path / "index")
+        index.build_partitions(16)
+
+        hits = index.search(TEXTS[123], k=1, nprobe=2)
+
+        assert index.partitions == 16
+        assert hits[0].id == 123
+
+    def test_embedder_mismatch_is_rejected(self, tmp_path):
+        build_index(tmp_path / "index")
+
+        with pytest.raises(VectorIndexError, match="hashing-512"):
+            VectorIndex(tmp_path / "index", HashingEmbedder(dim=128))
+
+    def test_chunks_keep_paragraphs_together(self):
+        text = "first paragraph\n\nsecond one\n\n" + "x" * 25
+
+        assert chunk_text(text, 30) == ["first paragraph\n\nsecond one", "x" * 25]
@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+import pytest
+
+from agent_commons.search_fixture import create_app
+from agent_commons.web_search import (
+    SearchResult,
+    SearxNGProvider,
+    WebSearch,
+    WebSearchError,
+    truncate_results,
+)
+
+
+def fixture_search(app, **kwargs) -> WebSearch:
+    """WebSearch talking to the fixture app in-process."""
+    return WebSearch(
+        SearxNGProvider("http://fixture", max_concurrency=kwargs.pop("max_concurrency", 4)),
+        transport=httpx.ASGITransport(app=app),
+        **kwargs,
+    )
+
+
+class TestWebSearch:
+    def test_search_parses_fixture_results(self):
+        app = create_app(results=3)
+        search = fixture_search(app)
+
+        results = asyncio.run(search.search("openshift"))
+
+        assert len(results) == 3
+        assert all(result.url.startswith("https://") for result in results)
+
+    def test_results_are_cached(self):
+        app = create_app()
+        search = fixture_search(app)
+
+        async def main():
+            await asyncio.gather(*(search.search("same query") for _ in range(5)))
+            await search.search("same query")
+
+        asyncio.run(main())
+        assert app.state.stats.requests == 1
+
+    def test_concurrency_is_limited_per_provider(self):
+        app = create_app(latency=0.02)
+        search = fixture_search(app, max_concurrency=2, cache_ttl=0)
+
+        async def main():
+            await asyncio.gather(*(search.search(f"query {i}") for i in range(8)))
+
+        asyncio.run(main())
+        assert app.state.stats.requests == 8
+        assert app.state.stats.max_in_flight <= 2
+
+    def test_oversized_response_is_rejected(self):
+        app = create_app(content_repeat=200)
+        search = fixture_search(app, max_response_bytes=4096)
+
+        with pytest.raises(WebSearchError, match="byte limit"):
+            asyncio.run(search.search("large"))
+
+    def test_aclose_stops_the_sync_loop(self):
+        search = fixture_search(create_app(results=2))
+
+        text = search.search_text_sync("openshift")
+        loop, thread = search._sync_loop, search._sync_thread
+        client = search._states[loop].client
+        asyncio.run(search.aclose())
+
+        assert "https://" in text
+        assert client.is_closed
+        assert not thread.is_alive()
+        assert loop.is_closed()
+
+    def test_text_is_truncated_to_token_budget(self):
+        results = [SearchResult(f"title {i}", f"https://example.com/{i}", "word " * 500) for i in range(5)]
+
+        text = truncate_results(results, token_budget=200)
+
+        assert len(text) <= 200 * 4
+        assert text.count("https://example.com/") == 5
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from starlette.applications import Starlette
+from starlette.routing import WebSocketRoute
+from starlette.testclient import TestClient
+
+from agent_commons.cancellation import RUNS_CANCELLED
+from agent_commons.websocket_chat import CLIENT_CANCEL, encode_frame, serve_chat_socket
+
+
+class Usage:
+    total_tokens = 10
+
+
+def echo_app(history: list[str]) -> Starlette:
+    """App whose turns echo the message word by word; "wait" turns block until cancelled."""
+
+    def run_turn(message, deadline, timer):
+        async def deltas():
+            if message == "wait":
+                await asyncio.sleep(60)
+            for word in message.split():
+                yield {"role": "assistant", "content": word}, None
+            history.append(message)
+
+        return deltas(), Usage()
+
+    async def endpoint(websocket):
+        await serve_chat_socket(websocket, run_turn)
+
+    return Starlette(routes=[WebSocketRoute("/ws/chat", endpoint)])
+
+
+def receive_turn(websocket) -> list[dict]:
+    frames = []
+    while not frames or frames[-1]["t"] == "d":
+        frames.append(json.loads(websocket.receive_text()))
+    return frames
+
+
+class TestWebSocketChat:
+    def test_turns_share_the_connection(self):
+        history = []
+        with TestClient(echo_app(history)).websocket_connect("/ws/chat") as websocket:
+            websocket.send_text(json.dumps({"type": "chat", "message": "hello there"}))
+            first = receive_turn(websocket)
+            websocket.send_text(json.dumps({"type": "chat", "message": "again"}))
+            second = receive_turn(websocket)
+            websocket.send_text("{")
+            invalid = json.loads(websocket.receive_text())
+            websocket.send_bytes(b'{"type": "chat", "message": "binary"}')
+            binary = json.loads(websocket.receive_text())
+            websocket.send_text(json.dumps({"type": "chat", "message": "still open"}))
+            third = receive_turn(websocket)
+
+        assert [frame["d"]["content"] for frame in first[:-1]] == ["hello", "there"]
+        assert first[-1]["t"] == second[-1]["t"] == "done"
+        assert "total;desc=" in first[-1]["timing"]
+        assert invalid["t"] == binary["t"] == "error"
+        assert third[-1]["t"] == "done"
+        assert history == ["hello there", "again", "still open"]
+        assert encode_frame({"t": "d", "d": {"content": "x"}}) == '{"t":"d","d":{"content":"x"}}'
+
+    def test_cancel_frame_stops_the_running_turn(self):
+        history = []
+        cancelled = RUNS_CANCELLED.value(reason=CLIENT_CANCEL)
+        with TestClient(echo_app(history)).websocket_connect("/ws/chat") as websocket:
+            websocket.send_text(json.dumps({"type": "chat", "message": "wait"}))
+            websocket.send_text(json.dumps({"type": "chat", "message": "too soon"}))
+            busy = json.loads(websocket.receive_text())
+            websocket.send_text(json.dumps({"type": "cancel"}))
+            ended = json.loads(websocket.receive_text())
+            websocket.send_text(json.dumps({"type": "chat", "message": "next"}))
+            receive_turn(websocket)
+
+        assert busy["t"] == "error"
+        assert ended == {"t": "cancelled"}
+        assert history == ["next"]
+        assert RUNS_CANCELLED.value(reason=CLIENT_CANCEL) == cancelled + 1
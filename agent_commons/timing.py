@@ -0,0 +1,192 @@
+import contextlib
+import cProfile
+import io
+import pstats
+import secrets
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Iterator, Mapping
+
+from starlette.responses import JSONResponse
+
+from .settings import get_settings
+
+# Response header carrying the breakdown (https://www.w3.org/TR/server-timing/)
+SERVER_TIMING_HEADER = "Server-Timing"
+# Header set by proxies/load balancers to the time they received the request ("t=<epoch>")
+REQUEST_START_HEADER = "X-Request-Start"
+# Header carrying the admin token that allows ?profile=1
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+# Functions listed in a profile report
+PROFILE_TOP_FUNCTIONS = 40
+
+LLM = "llm"
+TOOL = "tool"
+SERIALIZE = "serialize"
+QUEUE = "queue"
+FRAMEWORK = "framework"
+
+_DESCRIPTIONS = {
+    QUEUE: "waiting to run",
+    LLM: "LLM calls",
+    TOOL: "tool calls",
+    SERIALIZE: "response serialization",
+    FRAMEWORK: "framework overhead",
+    "total": "whole request",
+}
+
+
+def _union(intervals: list[tuple[float, float]]) -> float:
+    """Total length covered by possibly overlapping (start, end) intervals."""
+    total, covered_until = 0.0, float("-inf")
+    for start, end in sorted(intervals):
+        if end > covered_until:
+            total += end - max(start, covered_until)
+            covered_until = end
+    return total
+
+
+def _request_start_age(value: str | None, now: float) -> float:
+    """Seconds since the time in an X-Request-Start header (``t=`` seconds, ms or µs)."""
+    if not value:
+        return 0.0
+    try:
+        started = float(value.strip().removeprefix("t="))
+    except ValueError:
+        return 0.0
+    if started > 1e14:  # microseconds
+        started /= 1e6
+    elif started > 1e11:  # milliseconds
+        started /= 1e3
+    return min(max(now - started, 0.0), 3600.0)
+
+
+class RequestTimer:
+    """Where the time of one request went, reported as a Server-Timing header.
+
+    Phases are timed with ``span``: LLM calls, tool calls, response serialization and
+    queue waits. Each LLM call starts a new ReAct iteration; tool calls count towards
+    the iteration of the LLM call that requested them. Overlapping spans (parallel
+    tool calls) are counted once. Whatever the spans do not cover is framework
+    overhead: graph or workflow steps, (de)serializing messages, validation.
+    """
+
+    def __init__(
+        self, queued: float = 0.0, clock: Callable[[], float] = time.perf_counter
+    ) -> None:
+        """Start timing.
+
+        Args:
+            queued: Seconds the request waited before reaching this process.
+            clock: Monotonic clock.
+        """
+        self.clock = clock
+        self.started = clock()
+        self.queued = queued
+        self._spans: dict[str, list[tuple[float, float]]] = defaultdict(list)
+        # Per ReAct iteration, the LLM and tool spans
+        self._iterations: list[dict[str, list[tuple[float, float]]]] = []
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str]) -> "RequestTimer":
+        """Timer that also accounts the proxy queue time from the X-Request-Start header."""
+        return cls(queued=_request_start_age(headers.get(REQUEST_START_HEADER), time.time()))
+
+    @property
+    def iterations(self) -> int:
+        return len(self._iterations)
+
+    @contextlib.contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        """Time the block as ``phase`` (LLM, TOOL, SERIALIZE or QUEUE)."""
+        if phase == LLM or (phase == TOOL and not self._iterations):
+            self._iterations.append(defaultdict(list))
+        iteration = self._iterations[-1] if phase in (LLM, TOOL) else None
+        start = self.clock()
+        try:
+            yield
+        finally:
+            interval = (start, self.clock())
+            self._spans[phase].append(interval)
+            if iteration is not None:
+                iteration[phase].append(interval)
+
+    def breakdown(self) -> dict[str, float]:
+        """Seconds per phase so far, plus ``total``."""
+        elapsed = self.clock() - self.started
+        phases = {phase: _union(self._spans[phase]) for phase in (LLM, TOOL, SERIALIZE)}
+        phases[QUEUE] = self.queued + _union(self._spans[QUEUE])
+        covered = _union([interval for spans in self._spans.values() for interval in spans])
+        phases[FRAMEWORK] = max(elapsed - covered, 0.0)
+        phases["total"] = self.queued + elapsed
+        return phases
+
+    def header_value(self) -> str:
+        """Server-Timing header value: the phases, then LLM and tool time per iteration."""
+        entries = [
+            f'{phase};desc="{_DESCRIPTIONS.get(phase, phase)}";dur={seconds * 1000:.1f}'
+            for phase, seconds in self.breakdown().items()
+        ]
+        for number, iteration in enumerate(self._iterations, start=1):
+            for phase in (LLM, TOOL):
+                if iteration[phase]:
+                    entries.append(
+                        f'{phase}-{number};desc="iteration {number}";'
+                        f"dur={_union(iteration[phase]) * 1000:.1f}"
+                    )
+        return ", ".join(entries)
+
+
+def timed_json_response(content: Any, timer: RequestTimer) -> JSONResponse:
+    """JSON response carrying the timer's Server-Timing header; encoding counts as serialization."""
+    with timer.span(SERIALIZE):
+        response = JSONResponse(content)
+    response.headers[SERVER_TIMING_HEADER] = timer.header_value()
+    return response
+
+
+def profiling_allowed(token: str | None) -> bool:
+    """Whether ``token`` matches the PROFILE_TOKEN setting (profiling is off when unset)."""
+    expected = get_settings().profile_token
+    return bool(expected and token and secrets.compare_digest(token, expected))
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another request is being profiled."""
+
+
+class RequestProfile:
+    """Result of ``profile_request``; ``report`` is set when the block exits."""
+
+    report: str = ""
+
+
+_profiler_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def profile_request(top: int = PROFILE_TOP_FUNCTIONS) -> Iterator[RequestProfile]:
+    """Profile the block with cProfile and summarize the most expensive functions.
+
+    The profiler sees everything the event loop thread runs meanwhile, including
+    other requests; profile on an otherwise idle instance for a clean picture.
+
+    Raises:
+        ProfilerBusy: If another request is being profiled.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        raise ProfilerBusy("Another request is being profiled")
+    result = RequestProfile()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+        result.report = output.getvalue()
+    finally:
+        _profiler_lock.release()
@@ -0,0 +1,211 @@
+import json
+from dataclasses import dataclass
+from importlib import import_module
+from importlib.metadata import entry_points
+from typing import Any, Callable, Generic, Iterable, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from .settings import Settings, get_settings
+
+ToolT = TypeVar("ToolT")
+
+# Setting with the comma separated tool names to enable (all registered tools when unset)
+TOOLS_ENV_VAR = "TOOLS"
+# Setting with the comma separated "module:attribute" paths of extra tools (or lists of tools)
+TOOL_MODULES_ENV_VAR = "TOOL_MODULES"
+
+
+class ToolArgumentsError(ValueError):
+    """Raised when the arguments of a tool call do not match the tool schema."""
+
+
+@dataclass(frozen=True)
+class ToolSpec(Generic[ToolT]):
+    """A tool together with everything derived from it once, at registration time.
+
+    ``openai_tool`` is the function-calling definition sent to the model and
+    ``schema_json`` its serialized form; neither is rebuilt per request. Arguments
+    are checked with the compiled pydantic validator of ``args_schema``.
+    """
+
+    name: str
+    description: str
+    openai_tool: dict
+    schema_json: str
+    tool: ToolT
+    args_schema: type[BaseModel] | None = None
+    return_direct: bool = False
+
+    def validate(self, arguments: dict[str, Any]) -> None:
+        """Check tool call arguments against the tool schema.
+
+        Args:
+            arguments: Arguments of the tool call, as parsed from the model output.
+
+        Raises:
+            ToolArgumentsError: If the arguments do not match the schema.
+        """
+        if self.args_schema is None:
+            return
+        try:
+            self.args_schema.__pydantic_validator__.validate_python(arguments)
+        except ValidationError as e:
+            errors = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'arguments'}: {error['msg']}"
+                for error in e.errors()
+            )
+            raise ToolArgumentsError(f"Invalid arguments for tool {self.name}: {errors}") from e
+
+
+def make_tool_spec(
+    tool: ToolT,
+    name: str,
+    description: str,
+    parameters: dict,
+    args_schema: type[BaseModel] | None = None,
+    return_direct: bool = False,
+) -> ToolSpec[ToolT]:
+    """Build a ToolSpec, serializing its OpenAI function definition once.
+
+    Args:
+        tool: Framework tool object (LangChain BaseTool, LlamaIndex FunctionTool, ...).
+        name: Tool name the model calls it by.
+        description: Tool description shown to the model.
+        parameters: JSON schema of the tool arguments.
+        args_schema: Pydantic model of the arguments, used for validation.
+        return_direct: Whether the tool output ends the run.
+
+    Returns:
+        The frozen tool spec.
+    """
+    openai_tool = {
+        "type": "function",
+        "function": {"name": name, "description": description, "parameters": parameters},
+    }
+    return ToolSpec(
+        name=name,
+        description=description,
+        openai_tool=openai_tool,
+        schema_json=json.dumps(openai_tool, separators=(",", ":"), sort_keys=True),
+        tool=tool,
+        args_schema=args_schema,
+        return_direct=return_direct,
+    )
+
+
+def _split_env_list(value: str | None) -> list[str]:
+    """Split a comma separated setting into its non-empty items."""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def tool_names_from_env(settings: Settings | None = None) -> list[str] | None:
+    """Tool names enabled by the TOOLS setting, or None for all tools."""
+    return _split_env_list((settings or get_settings()).tools) or None
+
+
+def tool_modules_from_env(settings: Settings | None = None) -> list[str]:
+    """Extra "module:attribute" tool paths from the TOOL_MODULES setting."""
+    return _split_env_list((settings or get_settings()).tool_modules)
+
+
+def _load_path(path: str) -> Any:
+    """Import the object referenced by a "module:attribute" path."""
+    module_name, _, attribute = path.partition(":")
+    if not attribute:
+        raise ValueError(f"Tool path {path!r} must have the form 'module:attribute'")
+    obj = import_module(module_name)
+    for part in attribute.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+class ToolRegistry(Generic[ToolT]):
+    """Name-indexed collection of tools with schemas built once at startup.
+
+    The registry is framework agnostic: ``to_spec`` turns a framework tool into a
+    ToolSpec. Tools come from explicit registration, an entry point group (for
+    tools shipped in separate packages) and "module:attribute" paths from config.
+    Once frozen, lookups are plain dict reads and the registry no longer changes.
+    """
+
+    def __init__(self, to_spec: Callable[[ToolT], ToolSpec[ToolT]]) -> None:
+        """Create an empty registry.
+
+        Args:
+            to_spec: Converts a framework tool into its ToolSpec.
+        """
+        self._to_spec = to_spec
+        self._specs: dict[str, ToolSpec[ToolT]] = {}
+        self._frozen = False
+
+    def register(self, tool: ToolT) -> ToolSpec[ToolT]:
+        """Register a tool, building its spec.
+
+        Raises:
+            RuntimeError: If the registry is frozen.
+            ValueError: If a tool with the same name is already registered.
+        """
+        if self._frozen:
+            raise RuntimeError("Cannot register tools in a frozen registry")
+        spec = self._to_spec(tool)
+        if spec.name in self._specs:
+            raise ValueError(f"Tool {spec.name!r} is already registered")
+        self._specs[spec.name] = spec
+        return spec
+
+    def register_all(self, tools: Iterable[ToolT] | ToolT) -> None:
+        """Register a single tool or every tool of an iterable."""
+        if isinstance(tools, (list, tuple)):
+            for tool in tools:
+                self.register(tool)
+        else:
+            self.register(tools)
+
+    def discover(self, group: str | None = None, paths: Iterable[str] = ()) -> None:
+        """Register tools from an entry point group and from "module:attribute" paths.
+
+        Each entry point or path may reference a tool or a list of tools.
+
+        Args:
+            group: Entry point group to load, e.g. ``agentic_starter_kits.langgraph_tools``.
+            paths: Extra "module:attribute" paths, typically from the TOOL_MODULES env var.
+        """
+        if group:
+            for entry_point in entry_points(group=group):
+                self.register_all(entry_point.load())
+        for path in paths:
+            self.register_all(_load_path(path))
+
+    def freeze(self) -> "ToolRegistry[ToolT]":
+        """Make the registry read-only; returns self for chaining."""
+        self._frozen = True
+        return self
+
+    def get(self, name: str) -> ToolSpec[ToolT] | None:
+        """Spec of the tool called ``name``, or None."""
+        return self._specs.get(name)
+
+    @property
+    def names(self) -> list[str]:
+        """Names of all registered tools, in registration order."""
+        return list(self._specs)
+
+    def subset(self, names: Iterable[str] | None = None) -> list[ToolSpec[ToolT]]:
+        """Specs of the named tools (all tools when ``names`` is None).
+
+        Raises:
+            KeyError: If a name is not registered.
+        """
+        if names is None:
+            return list(self._specs.values())
+        unknown = [name for name in names if name not in self._specs]
+        if unknown:
+            raise KeyError(f"Unknown tools {unknown}; available tools: {self.names}")
+        return [self._specs[name] for name in names]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._specs
+
+    def __len__(self) -> int:
+        return len(self._specs)
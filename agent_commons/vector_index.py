@@ -0,0 +1,714 @@
+"""On-disk vector index for local document retrieval.
+
+Layout of an index directory:
+- ``index.json``       metadata (dimension, dtype, embedder, row count, IVF generation);
+- ``vectors.bin``      row-major L2-normalized embeddings, float32 or float16;
+- ``documents.jsonl``  one ``{"text", "metadata"}`` record per row;
+- ``offsets.bin``      uint64 byte offset of every record (plus the end offset);
+- ``centroids-<g>.npy`` / ``assignments-<g>.bin``  optional IVF partitions.
+
+Readers memory-map the files read-only, so every worker process on a host shares the
+same page-cache pages instead of loading its own copy. Writers only append to the data
+files and publish new rows by atomically replacing ``index.json``; readers see them on
+their next search. Only one writer may run at a time.
+
+Usage:
+    python -m agent_commons.vector_index build INDEX_DIR docs/ [--dtype float16] [--partitions 256]
+    python -m agent_commons.vector_index append INDEX_DIR more_docs.jsonl
+    python -m agent_commons.vector_index partition INDEX_DIR --partitions 256
+    python -m agent_commons.vector_index search INDEX_DIR "query" [-k 4]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+import numpy as np
+
+from .embedders import Embedder, load_embedder
+from .settings import (
+    DEFAULT_VECTOR_INDEX_NPROBE as DEFAULT_NPROBE,
+    DEFAULT_VECTOR_INDEX_TOKEN_BUDGET as DEFAULT_TOKEN_BUDGET,
+    DEFAULT_VECTOR_INDEX_TOP_K as DEFAULT_TOP_K,
+    Settings,
+    get_settings,
+    on_reload,
+)
+from .web_search import SearchResult, truncate_results
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.bin"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "offsets.bin"
+FORMAT_VERSION = 1
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+DEFAULT_BLOCK_ROWS = 32768  # rows scored per matrix multiply; bounds temporary memory
+DEFAULT_CHUNK_CHARS = 1500
+EMBED_BATCH_SIZE = 256
+KMEANS_SAMPLE_PER_PARTITION = 256
+# Loads of a version whose partition files a rebuild removed, before giving up
+LOAD_ATTEMPTS = 3
+TEXT_SUFFIXES = {".txt", ".md", ".rst"}
+
+
+class VectorIndexError(Exception):
+    """Raised for missing, incompatible or inconsistent indexes."""
+
+
+@dataclass(frozen=True)
+class Hit:
+    """One retrieved document."""
+
+    id: int
+    score: float
+    text: str
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """Memory maps of one published version of the index; replaced, never mutated."""
+
+    meta: dict
+    vectors: np.ndarray
+    offsets: np.ndarray
+    documents: np.ndarray
+    centroids: np.ndarray | None = None
+    partition_rows: np.ndarray | None = None  # row ids grouped by partition
+    partition_bounds: np.ndarray | None = None  # partition p is rows[bounds[p]:bounds[p + 1]]
+
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero), so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Best ``k`` columns of every row of ``scores`` (unsorted), with their ids."""
+    if scores.shape[1] <= k:
+        return scores, ids
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, best, axis=1), np.take_along_axis(ids, best, axis=1)
+
+
+def _merge_top_k(
+    best: tuple[np.ndarray, np.ndarray], scores: np.ndarray, ids: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fold a scored block into the running top-k of every query."""
+    block_scores, block_ids = _top_k(scores, np.broadcast_to(ids, scores.shape), k)
+    return _top_k(
+        np.concatenate([best[0], block_scores], axis=1),
+        np.concatenate([best[1], block_ids], axis=1),
+        k,
+    )
+
+
+class VectorIndex:
+    """Read and append access to an on-disk index (see the module docstring for the layout).
+
+    Search embeds the query, then scores it against the memory-mapped matrix in blocks
+    of ``block_rows`` rows (one matrix multiply each, converted to float32 per block), or
+    only against the rows of the ``nprobe`` nearest partitions when IVF partitions are
+    built. Instances are safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        embedder: Embedder | None = None,
+        top_k: int = DEFAULT_TOP_K,
+        nprobe: int = DEFAULT_NPROBE,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        block_rows: int = DEFAULT_BLOCK_ROWS,
+    ) -> None:
+        """Open an existing index.
+
+        Args:
+            path: Index directory.
+            embedder: Embedder for queries and new documents. Defaults to the one the
+                index was built with (by name, see load_embedder).
+            top_k: Default number of hits per query.
+            nprobe: Partitions searched per query when IVF partitions are built.
+            token_budget: Maximum number of tokens of search_text results.
+            block_rows: Rows scored per matrix multiply.
+
+        Raises:
+            VectorIndexError: If there is no index at ``path`` or ``embedder`` does not match it.
+        """
+        self.path = Path(path)
+        self.top_k = top_k
+        self.nprobe = nprobe
+        self.token_budget = token_budget
+        self.block_rows = block_rows
+        self._write_lock = threading.Lock()
+        self._meta_mtime: int | None = None
+
+        meta = self._read_meta()
+        if embedder is None:
+            embedder = load_embedder(meta["embedder"])
+        if embedder.name != meta["embedder"] or embedder.dim != meta["dim"]:
+            raise VectorIndexError(
+                f"Index was built with {meta['embedder']} ({meta['dim']} dims), "
+                f"not {embedder.name} ({embedder.dim} dims)"
+            )
+        self.embedder = embedder
+        self._snapshot = self._load_published(meta)
+
+    @classmethod
+    def create(
+        cls, path: str | os.PathLike, embedder: Embedder, dtype: str = "float32", **kwargs: Any
+    ) -> "VectorIndex":
+        """Create an empty index and open it.
+
+        Args:
+            path: Index directory (created if missing; must not hold an index).
+            embedder: Embedder of the documents and queries.
+            dtype: Storage type of the vectors, ``float32`` or ``float16``. float16 halves
+                the size and the pages read, but the per-block conversion costs CPU; pair it
+                with IVF partitions on large corpora.
+            **kwargs: Passed to the constructor.
+
+        Returns:
+            The empty index.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+        path = Path(path)
+        if (path / INDEX_FILE).exists():
+            raise VectorIndexError(f"{path} already holds an index")
+        path.mkdir(parents=True, exist_ok=True)
+        for name in (VECTORS_FILE, DOCUMENTS_FILE):
+            (path / name).write_bytes(b"")
+        (path / OFFSETS_FILE).write_bytes(np.zeros(1, dtype=np.uint64).tobytes())
+
+        _write_meta(
+            path,
+            {
+                "version": FORMAT_VERSION,
+                "dim": embedder.dim,
+                "dtype": dtype,
+                "embedder": embedder.name,
+                "count": 0,
+                "ivf": None,
+            },
+        )
+        return cls(path, embedder, **kwargs)
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "VectorIndex | None":
+        """Open the index at VECTOR_INDEX_PATH; None if it is not set.
+
+        VECTOR_INDEX_TOP_K, VECTOR_INDEX_NPROBE and VECTOR_INDEX_TOKEN_BUDGET tune the
+        search; EMBEDDER overrides the embedder recorded in the index. The settings
+        come from ``settings`` (get_settings() when omitted).
+        """
+        settings = settings or get_settings()
+        if not settings.vector_index_path:
+            return None
+        return cls(
+            settings.vector_index_path,
+            embedder=load_embedder(settings.embedder) if settings.embedder else None,
+            top_k=settings.vector_index_top_k,
+            nprobe=settings.vector_index_nprobe,
+            token_budget=settings.vector_index_token_budget,
+        )
+
+    def configure(self, settings: Settings) -> None:
+        """Apply reloaded VECTOR_INDEX_* search limits; the path and embedder only change on restart."""
+        self.top_k = settings.vector_index_top_k
+        self.nprobe = settings.vector_index_nprobe
+        self.token_budget = settings.vector_index_token_budget
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    @property
+    def dtype(self) -> str:
+        return self._snapshot.meta["dtype"]
+
+    @property
+    def partitions(self) -> int:
+        ivf = self._snapshot.meta["ivf"]
+        return ivf["partitions"] if ivf else 0
+
+    # Files and snapshots
+
+    def _read_meta(self) -> dict:
+        meta_path = self.path / INDEX_FILE
+        try:
+            mtime = meta_path.stat().st_mtime_ns
+            meta = json.loads(meta_path.read_text())
+        except FileNotFoundError as e:
+            raise VectorIndexError(f"No vector index at {self.path}") from e
+        if meta.get("version") != FORMAT_VERSION:
+            raise VectorIndexError(f"Unsupported index format version {meta.get('version')}")
+        self._meta_mtime = mtime
+        return meta
+
+    def _map(self, name: str, dtype: Any, shape: tuple[int, ...]) -> np.ndarray:
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path / name, dtype=dtype, mode="r", shape=shape)
+
+    def _load(self, meta: dict) -> _Snapshot:
+        count, dim = meta["count"], meta["dim"]
+        offsets = self._map(OFFSETS_FILE, np.uint64, (count + 1,))
+        snapshot = _Snapshot(
+            meta=meta,
+            vectors=self._map(VECTORS_FILE, DTYPES[meta["dtype"]], (count, dim)),
+            offsets=offsets,
+            documents=self._map(DOCUMENTS_FILE, np.uint8, (int(offsets[count]),)),
+        )
+        ivf = meta["ivf"]
+        if not ivf:
+            return snapshot
+
+        centroids = np.load(self.path / _centroids_file(ivf["generation"]))
+        assignments = self._map(_assignments_file(ivf["generation"]), np.int32, (count,))
+        rows = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[rows], np.arange(ivf["partitions"] + 1))
+        return _Snapshot(
+            meta=meta,
+            vectors=snapshot.vectors,
+            offsets=offsets,
+            documents=snapshot.documents,
+            centroids=centroids,
+            partition_rows=rows,
+            partition_bounds=bounds,
+        )
+
+    def _load_published(self, meta: dict) -> _Snapshot:
+        """Snapshot of ``meta``, or of the version published after it when a rebuild of
+        the partitions removed the files of ``meta``'s generation in the meantime."""
+        for _ in range(LOAD_ATTEMPTS - 1):
+            try:
+                return self._load(meta)
+            except FileNotFoundError:
+                meta = self._read_meta()
+        return self._load(meta)
+
+    def refresh(self) -> bool:
+        """Switch to the latest published version of the index if it changed.
+
+        Returns:
+            True if a newer version was loaded.
+        """
+        try:
+            mtime = (self.path / INDEX_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._meta_mtime:
+            return False
+        self._snapshot = self._load_published(self._read_meta())
+        return True
+
+    # Writing
+
+    def _discard_unpublished(self, snapshot: _Snapshot) -> None:
+        """Truncate data an interrupted writer appended but never published."""
+        meta = snapshot.meta
+        count = meta["count"]
+        expected = {
+            VECTORS_FILE: count * meta["dim"] * np.dtype(DTYPES[meta["dtype"]]).itemsize,
+            OFFSETS_FILE: (count + 1) * 8,
+            DOCUMENTS_FILE: int(snapshot.offsets[count]),
+        }
+        if meta["ivf"]:
+            expected[_assignments_file(meta["ivf"]["generation"])] = count * 4
+        for name, size in expected.items():
+            if os.path.getsize(self.path / name) > size:
+                os.truncate(self.path / name, size)
+
+    def add(
+        self, texts: Sequence[str], metadata: Sequence[dict] | None = None
+    ) -> list[int]:
+        """Embed and append documents, then publish them; no existing row is rewritten.
+
+        New rows join the nearest existing IVF partition; rebuild the partitions with
+        build_partitions after large appends to keep them balanced.
+
+        Args:
+            texts: Document texts.
+            metadata: Per-document metadata (e.g. ``source``, ``title``), same length as texts.
+
+        Returns:
+            Row ids of the new documents.
+        """
+        metadata = list(metadata) if metadata is not None else [{} for _ in texts]
+        if len(metadata) != len(texts):
+            raise ValueError("texts and metadata must have the same length")
+
+        with self._write_lock:
+            self.refresh()
+            snapshot = self._snapshot
+            meta = dict(snapshot.meta)
+            dtype = DTYPES[meta["dtype"]]
+            self._discard_unpublished(snapshot)
+
+            assignments_path = None
+            if meta["ivf"]:
+                assignments_path = self.path / _assignments_file(meta["ivf"]["generation"])
+
+            for start in range(0, len(texts), EMBED_BATCH_SIZE):
+                batch = texts[start : start + EMBED_BATCH_SIZE]
+                vectors = normalize(self.embedder.embed(batch))
+                if vectors.shape != (len(batch), meta["dim"]):
+                    raise VectorIndexError(f"Embedder returned shape {vectors.shape}")
+
+                records = [
+                    json.dumps({"text": text, "metadata": data}, ensure_ascii=False).encode()
+                    + b"\n"
+                    for text, data in zip(batch, metadata[start : start + EMBED_BATCH_SIZE])
+                ]
+                base = os.path.getsize(self.path / DOCUMENTS_FILE)
+                ends = base + np.cumsum([len(record) for record in records], dtype=np.uint64)
+
+                with open(self.path / VECTORS_FILE, "ab") as f:
+                    f.write(vectors.astype(dtype).tobytes())
+                with open(self.path / DOCUMENTS_FILE, "ab") as f:
+                    f.write(b"".join(records))
+                with open(self.path / OFFSETS_FILE, "ab") as f:
+                    f.write(ends.astype(np.uint64).tobytes())
+                if assignments_path is not None:
+                    nearest = np.argmax(vectors @ snapshot.centroids.T, axis=1)
+                    with open(assignments_path, "ab") as f:
+                        f.write(nearest.astype(np.int32).tobytes())
+
+            first_id = meta["count"]
+            meta["count"] += len(texts)
+            _write_meta(self.path, meta)
+            self._snapshot = self._load(self._read_meta())
+            return list(range(first_id, meta["count"]))
+
+    def build_partitions(self, partitions: int, iterations: int = 10, seed: int = 0) -> None:
+        """Cluster the rows into IVF partitions (spherical k-means on a sample).
+
+        The new partitions are written under a new generation and published atomically;
+        readers keep using the previous ones until their next search.
+
+        Args:
+            partitions: Number of partitions; about sqrt(rows) is a good start.
+            iterations: k-means iterations.
+            seed: Seed of the sample and the initial centroids.
+        """
+        with self._write_lock:
+            self.refresh()
+            snapshot = self._snapshot
+            meta = dict(snapshot.meta)
+            count = meta["count"]
+            self._discard_unpublished(snapshot)
+            if partitions < 1 or partitions > count:
+                raise ValueError(f"partitions must be between 1 and the row count ({count})")
+
+            rng = np.random.default_rng(seed)
+            sample_size = min(count, partitions * KMEANS_SAMPLE_PER_PARTITION)
+            sample_rows = np.sort(rng.choice(count, sample_size, replace=False))
+            sample = np.asarray(snapshot.vectors[sample_rows], dtype=np.float32)
+            centroids = sample[rng.choice(sample_size, partitions, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                filled = np.bincount(labels, minlength=partitions) > 0
+                centroids[filled] = normalize(sums[filled])  # empty ones keep their centroid
+
+            generation = (meta["ivf"] or {}).get("generation", 0) + 1
+            with open(self.path / _centroids_file(generation), "wb") as f:
+                np.save(f, centroids)
+            with open(self.path / _assignments_file(generation), "wb") as f:
+                for start in range(0, count, self.block_rows):
+                    block = np.asarray(
+                        snapshot.vectors[start : start + self.block_rows], dtype=np.float32
+                    )
+                    f.write(np.argmax(block @ centroids.T, axis=1).astype(np.int32).tobytes())
+
+            previous = meta["ivf"]
+            meta["ivf"] = {"partitions": partitions, "generation": generation}
+            _write_meta(self.path, meta)
+            self._snapshot = self._load(self._read_meta())
+            if previous:
+                # Readers that mapped them keep their open copy until they refresh; readers
+                # loading them right now retry with the new generation (see _load_published)
+                (self.path / _centroids_file(previous["generation"])).unlink(missing_ok=True)
+                (self.path / _assignments_file(previous["generation"])).unlink(missing_ok=True)
+
+    # Searching
+
+    def _score_rows(
+        self, snapshot: _Snapshot, queries: np.ndarray, rows: np.ndarray | None, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k of ``queries`` over ``rows`` (all rows when None), one block at a time."""
+        best = (
+            np.empty((len(queries), 0), dtype=np.float32),
+            np.empty((len(queries), 0), dtype=np.int64),
+        )
+        total = snapshot.count if rows is None else len(rows)
+        for start in range(0, total, self.block_rows):
+            stop = min(start + self.block_rows, total)
+            if rows is None:
+                ids = np.arange(start, stop)
+                block = snapshot.vectors[start:stop]
+            else:
+                ids = rows[start:stop]
+                block = snapshot.vectors[ids]  # sorted ids: sequential page reads
+            scores = queries @ np.asarray(block, dtype=np.float32).T
+            best = _merge_top_k(best, scores, ids, k)
+        return best
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int | None = None, nprobe: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by cosine similarity for a batch of query embeddings.
+
+        Args:
+            queries: (n, dim) query embeddings (normalized here).
+            k: Hits per query. Defaults to ``top_k``.
+            nprobe: Partitions searched per query. Defaults to ``nprobe``; exhaustive
+                search when it covers every partition or no partitions are built.
+
+        Returns:
+            (scores, ids), both (n, min(k, rows)), best first; ids of missing hits are -1.
+        """
+        self.refresh()
+        snapshot = self._snapshot
+        k = k or self.top_k
+        nprobe = nprobe or self.nprobe
+        queries = normalize(np.atleast_2d(queries))
+
+        ivf = snapshot.meta["ivf"]
+        if not ivf or nprobe >= ivf["partitions"]:
+            scores, ids = self._score_rows(snapshot, queries, None, k)
+        else:
+            probes = np.argsort(-(queries @ snapshot.centroids.T), axis=1)[:, :nprobe]
+            # Queries whose probed partitions hold fewer than k rows are padded with id -1
+            scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+            ids = np.full((len(queries), k), -1, dtype=np.int64)
+            bounds = snapshot.partition_bounds
+            for n, (query, partitions) in enumerate(zip(queries, probes)):
+                rows = np.sort(
+                    np.concatenate(
+                        [snapshot.partition_rows[bounds[p] : bounds[p + 1]] for p in partitions]
+                    )
+                )
+                query_scores, query_ids = self._score_rows(snapshot, query[None, :], rows, k)
+                scores[n, : query_scores.shape[1]] = query_scores[0]
+                ids[n, : query_ids.shape[1]] = query_ids[0]
+
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def document(self, row: int) -> tuple[str, dict]:
+        """Text and metadata of a row."""
+        snapshot = self._snapshot
+        start, end = int(snapshot.offsets[row]), int(snapshot.offsets[row + 1])
+        record = json.loads(snapshot.documents[start:end].tobytes())
+        return record["text"], record["metadata"]
+
+    def search_batch(
+        self, queries: Sequence[str], k: int | None = None, nprobe: int | None = None
+    ) -> list[list[Hit]]:
+        """Top-k documents for each query text (one embedding batch, one scoring pass)."""
+        if not queries:
+            return []
+        scores, ids = self.search_vectors(self.embedder.embed(queries), k, nprobe)
+        return [
+            [
+                Hit(int(row), float(score), *self.document(int(row)))
+                for score, row in zip(query_scores, query_ids)
+                if row >= 0
+            ]
+            for query_scores, query_ids in zip(scores, ids)
+        ]
+
+    def search(self, query: str, k: int | None = None, nprobe: int | None = None) -> list[Hit]:
+        """Top-k documents for a query text.
+
+        Args:
+            query: Query text.
+            k: Hits to return. Defaults to ``top_k``.
+            nprobe: Partitions to search. Defaults to ``nprobe``.
+
+        Returns:
+            Hits, best first.
+        """
+        return self.search_batch([query], k, nprobe)[0]
+
+    def search_text(self, query: str) -> str:
+        """Search results as numbered text within ``token_budget`` tokens."""
+        hits = self.search(query)
+        return truncate_results(
+            [
+                SearchResult(
+                    title=hit.metadata.get("title") or f"Document {hit.id}",
+                    url=hit.metadata.get("source", ""),
+                    content=hit.text,
+                )
+                for hit in hits
+            ],
+            self.token_budget,
+        )
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    """Publish ``meta`` atomically; readers switch to it on their next search."""
+    tmp_path = path / f"{INDEX_FILE}.tmp"
+    tmp_path.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp_path, path / INDEX_FILE)
+
+
+def _centroids_file(generation: int) -> str:
+    return f"centroids-{generation}.npy"
+
+
+def _assignments_file(generation: int) -> str:
+    return f"assignments-{generation}.bin"
+
+
+_vector_index: VectorIndex | None = None
+_vector_index_loaded = False
+
+
+def get_vector_index() -> VectorIndex | None:
+    """Process-wide VectorIndex opened from the settings (None when VECTOR_INDEX_PATH is unset).
+
+    It follows settings reloads (see VectorIndex.configure).
+    """
+    global _vector_index, _vector_index_loaded
+    if not _vector_index_loaded:
+        _vector_index = VectorIndex.from_env()
+        if _vector_index is not None:
+            on_reload(_vector_index.configure)
+        _vector_index_loaded = True
+    return _vector_index
+
+
+def document_search_text_sync(query: str) -> str:
+    """Body of the agents' document search tools: results as text, or why there are none."""
+    index = get_vector_index()
+    if index is None:
+        return "Document search is not configured."
+    if not len(index):
+        return "The document index is empty."
+    return index.search_text(query)
+
+
+async def document_search_text(query: str) -> str:
+    """Async variant of document_search_text_sync; the search runs in a worker thread."""
+    return await asyncio.to_thread(document_search_text_sync, query)
+
+
+# Offline CLI
+
+
+def chunk_text(text: str, chunk_chars: int) -> list[str]:
+    """Split text into chunks of whole paragraphs of at most ``chunk_chars`` characters."""
+    chunks: list[str] = []
+    current = ""
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        if not paragraph:
+            continue
+        while len(paragraph) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_chars])
+            paragraph = paragraph[chunk_chars:].lstrip()
+        if current and len(current) + 2 + len(paragraph) > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def read_documents(paths: Iterable[str], chunk_chars: int) -> Iterator[tuple[str, dict]]:
+    """Documents from files and directories, as (text, metadata) pairs.
+
+    ``.jsonl`` files hold one ``{"text": ..., <metadata>...}`` object per line; text
+    files (.txt, .md, .rst) are split into paragraph chunks.
+    """
+    for path in map(Path, paths):
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            if file.suffix == ".jsonl":
+                with open(file, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            text = record.pop("text")
+                            yield text, {"source": str(file), **record}
+            elif file.suffix in TEXT_SUFFIXES:
+                text = file.read_text(encoding="utf-8")
+                for number, chunk in enumerate(chunk_text(text, chunk_chars)):
+                    yield chunk, {"source": str(file), "title": f"{file.name} #{number + 1}"}
+
+
+def _add_documents(index: VectorIndex, paths: list[str], chunk_chars: int) -> int:
+    documents = list(read_documents(paths, chunk_chars))
+    index.add([text for text, _ in documents], [data for _, data in documents])
+    return len(documents)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and query a local vector index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="create an index from documents")
+    build.add_argument("index")
+    build.add_argument("inputs", nargs="+", help=".jsonl, .txt, .md or .rst files or directories")
+    build.add_argument("--embedder", help="embedder spec (default: EMBEDDER env var or hashing)")
+    build.add_argument("--dtype", choices=sorted(DTYPES), default="float32")
+    build.add_argument("--partitions", type=int, default=0, help="IVF partitions (0: none)")
+    build.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS)
+
+    append = commands.add_parser("append", help="add documents to an existing index")
+    append.add_argument("index")
+    append.add_argument("inputs", nargs="+")
+    append.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS)
+
+    partition = commands.add_parser("partition", help="(re)build the IVF partitions")
+    partition.add_argument("index")
+    partition.add_argument("--partitions", type=int, required=True)
+
+    search = commands.add_parser("search", help="query an index")
+    search.add_argument("index")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=DEFAULT_TOP_K)
+    search.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        index = VectorIndex.create(args.index, load_embedder(args.embedder), dtype=args.dtype)
+        added = _add_documents(index, args.inputs, args.chunk_chars)
+        if args.partitions:
+            index.build_partitions(args.partitions)
+        print(f"Indexed {added} documents into {args.index}")
+    elif args.command == "append":
+        index = VectorIndex(args.index)
+        added = _add_documents(index, args.inputs, args.chunk_chars)
+        print(f"Appended {added} documents ({len(index)} in total)")
+    elif args.command == "partition":
+        VectorIndex(args.index).build_partitions(args.partitions)
+        print(f"Built {args.partitions} partitions")
+    else:
+        for hit in VectorIndex(args.index).search(args.query, args.k, args.nprobe):
+            print(f"{hit.score:.3f}  {hit.metadata.get('title') or hit.id}: {hit.text[:120]!r}")
+
+
+if __name__ == "__main__":
+    main()
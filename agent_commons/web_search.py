@@ -0,0 +1,489 @@
+import asyncio
+import json
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from importlib import import_module
+from typing import Any
+
+import httpx
+
+from .settings import (
+    DEFAULT_SEARCH_CACHE_SIZE as DEFAULT_CACHE_SIZE,
+    DEFAULT_SEARCH_CACHE_TTL as DEFAULT_CACHE_TTL,
+    DEFAULT_SEARCH_MAX_CONCURRENCY as DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_SEARCH_MAX_RESPONSE_BYTES as DEFAULT_MAX_RESPONSE_BYTES,
+    DEFAULT_SEARCH_MAX_RESULTS as DEFAULT_MAX_RESULTS,
+    DEFAULT_SEARCH_POOL_SIZE as DEFAULT_POOL_SIZE,
+    DEFAULT_SEARCH_TIMEOUT as DEFAULT_TIMEOUT,
+    DEFAULT_SEARCH_TOKEN_BUDGET as DEFAULT_TOKEN_BUDGET,
+    Settings,
+    SettingsError,
+    get_settings,
+    on_reload,
+)
+
+# Rough characters-per-token ratio used to turn the token budget into a character budget
+CHARS_PER_TOKEN = 4
+
+
+class WebSearchError(Exception):
+    """Raised when a search request fails (HTTP error, timeout, oversized or invalid response)."""
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """One search hit."""
+
+    title: str
+    url: str
+    content: str = ""
+
+
+class SearchProvider(ABC):
+    """A search backend: builds the HTTP request for a query and parses its response.
+
+    The WebSearch client does the I/O (shared connection pool, concurrency limit,
+    response size cap), so providers only deal with their API format. Subclass it
+    and point SEARCH_PROVIDER at the class ("module:Class") to plug in another API.
+    """
+
+    name = "provider"
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        """Set the provider limits.
+
+        Args:
+            max_concurrency: Maximum number of requests in flight to this provider.
+        """
+        self.max_concurrency = max_concurrency
+
+    @abstractmethod
+    def build_request(self, query: str, max_results: int) -> httpx.Request:
+        """HTTP request searching for ``query``."""
+
+    @abstractmethod
+    def parse(self, body: bytes, max_results: int) -> list[SearchResult]:
+        """Search results contained in a response body."""
+
+
+class SearxNGProvider(SearchProvider):
+    """Self-hosted SearxNG instance (JSON output format must be enabled)."""
+
+    name = "searxng"
+
+    def __init__(self, base_url: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        super().__init__(max_concurrency)
+        self.base_url = base_url.rstrip("/")
+
+    def build_request(self, query: str, max_results: int) -> httpx.Request:
+        return httpx.Request(
+            "GET", f"{self.base_url}/search", params={"q": query, "format": "json"}
+        )
+
+    def parse(self, body: bytes, max_results: int) -> list[SearchResult]:
+        payload = json.loads(body)
+        return [
+            SearchResult(
+                title=item.get("title", ""),
+                url=item.get("url", ""),
+                content=item.get("content", ""),
+            )
+            for item in payload.get("results", [])[:max_results]
+        ]
+
+
+class BraveSearchProvider(SearchProvider):
+    """Brave Search API (requires an API key)."""
+
+    name = "brave"
+    url = "https://api.search.brave.com/res/v1/web/search"
+
+    def __init__(self, api_key: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        super().__init__(max_concurrency)
+        self.api_key = api_key
+
+    def build_request(self, query: str, max_results: int) -> httpx.Request:
+        return httpx.Request(
+            "GET",
+            self.url,
+            params={"q": query, "count": max_results},
+            headers={"Accept": "application/json", "X-Subscription-Token": self.api_key},
+        )
+
+    def parse(self, body: bytes, max_results: int) -> list[SearchResult]:
+        payload = json.loads(body)
+        return [
+            SearchResult(
+                title=item.get("title", ""),
+                url=item.get("url", ""),
+                content=item.get("description", ""),
+            )
+            for item in payload.get("web", {}).get("results", [])[:max_results]
+        ]
+
+
+def truncate_results(results: list[SearchResult], token_budget: int) -> str:
+    """Render results as text that fits in ``token_budget`` (approximate) tokens.
+
+    The budget is shared fairly: each result may use an equal part of what is left,
+    so a short result leaves more room to the ones after it. When the budget is too
+    small for every result, the top results are kept and the rest dropped.
+
+    Args:
+        results: Search results, best first.
+        token_budget: Maximum number of tokens of the returned text.
+
+    Returns:
+        Numbered results (title, URL, content), content cut where the budget runs out.
+    """
+    if not results:
+        return "No results found."
+
+    separator = "\n\n"
+    remaining = token_budget * CHARS_PER_TOKEN + len(separator)
+    entries = []
+    for index, result in enumerate(results):
+        allowance = remaining // (len(results) - index) - len(separator)
+        header = f"[{index + 1}] {result.title}\n{result.url}\n"
+        if len(header) >= allowance:
+            # Too tight to share: this result takes what is left and ends the list
+            allowance = remaining - len(separator)
+            if len(header) >= allowance:
+                break
+        content = result.content
+        room = allowance - len(header)
+        if len(content) > room:
+            content = content[: max(room - 3, 0)].rstrip() + "..."
+        entry = header + content
+        entries.append(entry)
+        remaining -= len(entry) + len(separator)
+
+    return separator.join(entries) if entries else "No results fit in the token budget."
+
+
+class _TTLCache:
+    """Small LRU cache whose entries expire ``ttl`` seconds after insertion."""
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Any, value: Any) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+@dataclass
+class _LoopState:
+    """Connection pool and limits; asyncio objects are bound to one event loop."""
+
+    client: httpx.AsyncClient
+    semaphore: asyncio.Semaphore
+    in_flight: dict[Any, asyncio.Future] = field(default_factory=dict)
+
+
+class WebSearch:
+    """Async web search with a shared connection pool, caching and bounded output.
+
+    - one pooled ``httpx.AsyncClient`` per event loop, reused by every call;
+    - at most ``provider.max_concurrency`` requests in flight to the provider;
+    - responses larger than ``max_response_bytes`` are rejected while streaming;
+    - results are cached for ``cache_ttl`` seconds and identical concurrent
+      queries share one request;
+    - the text handed to the model is truncated to ``token_budget`` tokens.
+    """
+
+    def __init__(
+        self,
+        provider: SearchProvider,
+        max_results: int = DEFAULT_MAX_RESULTS,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        max_response_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        """Configure the search client.
+
+        Args:
+            provider: Search backend.
+            max_results: Results requested per query.
+            token_budget: Approximate token limit of the text returned by search_text.
+            max_response_bytes: Larger provider responses are rejected.
+            timeout: Timeout (seconds) of one provider request.
+            cache_ttl: Seconds a query result stays cached (0 disables the cache).
+            cache_size: Maximum number of cached queries.
+            pool_size: Maximum number of pooled connections.
+            transport: Custom httpx transport (e.g. ASGITransport in tests).
+        """
+        self.provider = provider
+        self.max_results = max_results
+        self.token_budget = token_budget
+        self.max_response_bytes = max_response_bytes
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.transport = transport
+        self._cache = _TTLCache(cache_ttl, cache_size)
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._sync_loop: asyncio.AbstractEventLoop | None = None
+        self._sync_thread: threading.Thread | None = None
+        self._sync_loop_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, settings: Settings | None = None) -> "WebSearch | None":
+        """Build the client from the SEARCH_* settings; None if no provider is set.
+
+        SEARCH_PROVIDER is ``searxng`` (default when SEARCH_BASE_URL is set), ``brave``
+        (with SEARCH_API_KEY) or a "module:Class" path of a SearchProvider subclass
+        taking ``**kwargs``. The settings come from ``settings`` (get_settings() when
+        omitted).
+
+        Raises:
+            SettingsError: If the provider is missing its SEARCH_BASE_URL or SEARCH_API_KEY.
+        """
+        settings = settings or get_settings()
+        provider_name = settings.search_provider or ("searxng" if settings.search_base_url else None)
+        if not provider_name:
+            return None
+
+        max_concurrency = settings.search_max_concurrency
+        if provider_name == "searxng":
+            if not settings.search_base_url:
+                raise SettingsError("SEARCH_BASE_URL must be set for the searxng provider")
+            provider = SearxNGProvider(settings.search_base_url, max_concurrency)
+        elif provider_name == "brave":
+            if not settings.search_api_key:
+                raise SettingsError("SEARCH_API_KEY must be set for the brave provider")
+            provider = BraveSearchProvider(settings.search_api_key, max_concurrency)
+        else:
+            module_name, _, class_name = provider_name.partition(":")
+            provider_cls = getattr(import_module(module_name), class_name)
+            provider = provider_cls(max_concurrency=max_concurrency)
+
+        return cls(
+            provider,
+            max_results=settings.search_max_results,
+            token_budget=settings.search_token_budget,
+            max_response_bytes=settings.search_max_response_bytes,
+            timeout=settings.search_timeout,
+            cache_ttl=settings.search_cache_ttl,
+            cache_size=settings.search_cache_size,
+            pool_size=settings.search_pool_size,
+        )
+
+    def configure(self, settings: Settings) -> None:
+        """Apply reloaded SEARCH_* limits; requests already running keep the old ones.
+
+        The connection pool size only changes with a restart.
+        """
+        self.max_results = settings.search_max_results
+        self.token_budget = settings.search_token_budget
+        self.max_response_bytes = settings.search_max_response_bytes
+        self.timeout = settings.search_timeout
+        self._cache.ttl = settings.search_cache_ttl
+        self._cache.max_size = settings.search_cache_size
+        if settings.search_max_concurrency != self.provider.max_concurrency:
+            self.provider.max_concurrency = settings.search_max_concurrency
+            # Holders of the old semaphore release it; new requests wait on the new one
+            for state in list(self._states.values()):
+                state.semaphore = asyncio.Semaphore(settings.search_max_concurrency)
+
+    def _state(self) -> _LoopState:
+        """Pool and semaphore of the running event loop, created on first use."""
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState(
+                client=httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                    transport=self.transport,
+                ),
+                semaphore=asyncio.Semaphore(self.provider.max_concurrency),
+            )
+            self._states[loop] = state
+        return state
+
+    async def _fetch(self, state: _LoopState, query: str) -> list[SearchResult]:
+        """Send one provider request, reading at most max_response_bytes of the body."""
+        request = self.provider.build_request(query, self.max_results)
+        request.extensions["timeout"] = httpx.Timeout(self.timeout).as_dict()
+        async with state.semaphore:
+            try:
+                response = await state.client.send(request, stream=True)
+                try:
+                    response.raise_for_status()
+                    declared = int(response.headers.get("content-length") or 0)
+                    if declared > self.max_response_bytes:
+                        raise WebSearchError(
+                            f"Search response of {declared} bytes exceeds the "
+                            f"{self.max_response_bytes} byte limit"
+                        )
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body += chunk
+                        if len(body) > self.max_response_bytes:
+                            raise WebSearchError(
+                                f"Search response exceeds the {self.max_response_bytes} byte limit"
+                            )
+                finally:
+                    await response.aclose()
+            except httpx.HTTPError as e:
+                raise WebSearchError(f"Search request failed: {e!r}") from e
+
+        try:
+            return self.provider.parse(bytes(body), self.max_results)
+        except ValueError as e:
+            raise WebSearchError(f"Invalid search response: {e}") from e
+
+    @staticmethod
+    def _forget(state: _LoopState, key: Any, pending: asyncio.Future) -> None:
+        """Drop a finished shared request (retrieving its error so it is not reported as lost)."""
+        state.in_flight.pop(key, None)
+        if not pending.cancelled():
+            pending.exception()
+
+    async def search(self, query: str) -> list[SearchResult]:
+        """Search results for ``query``, from the cache when possible.
+
+        Raises:
+            WebSearchError: If the provider request fails.
+        """
+        key = (self.provider.name, query, self.max_results)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        state = self._state()
+        pending = state.in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        pending = asyncio.ensure_future(self._fetch(state, query))
+        state.in_flight[key] = pending
+        try:
+            results = await asyncio.shield(pending)
+        finally:
+            if pending.done():
+                state.in_flight.pop(key, None)
+            else:
+                # Caller cancelled; let the request finish for the others sharing it
+                pending.add_done_callback(lambda _: self._forget(state, key, pending))
+        self._cache.put(key, results)
+        return results
+
+    async def search_text(self, query: str) -> str:
+        """Search results for ``query`` rendered within the token budget.
+
+        Raises:
+            WebSearchError: If the provider request fails.
+        """
+        return truncate_results(await self.search(query), self.token_budget)
+
+    def search_text_sync(self, query: str) -> str:
+        """Blocking variant of search_text for sync tool invocations.
+
+        Runs on a background event loop so sync callers share one connection pool.
+        """
+        with self._sync_loop_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                self._sync_thread = threading.Thread(
+                    target=self._sync_loop.run_forever, name="web-search", daemon=True
+                )
+                self._sync_thread.start()
+        return asyncio.run_coroutine_threadsafe(
+            self.search_text(query), self._sync_loop
+        ).result()
+
+    async def _close_pool(self) -> None:
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+    async def aclose(self) -> None:
+        """Close the connection pool of the running event loop, and that of the background
+        loop of search_text_sync (on that loop), then stop the loop and its thread."""
+        await self._close_pool()
+        with self._sync_loop_lock:
+            loop, thread = self._sync_loop, self._sync_thread
+            self._sync_loop = self._sync_thread = None
+        if loop is None:
+            return
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._close_pool(), loop))
+        loop.call_soon_threadsafe(loop.stop)
+        await asyncio.to_thread(thread.join)
+        loop.close()
+
+
+_web_search: WebSearch | None = None
+_web_search_loaded = False
+
+
+def get_web_search() -> WebSearch | None:
+    """Process-wide WebSearch built from the settings (None when no provider is configured).
+
+    It follows settings reloads (see WebSearch.configure).
+    """
+    global _web_search, _web_search_loaded
+    if not _web_search_loaded:
+        _web_search = WebSearch.from_env()
+        if _web_search is not None:
+            on_reload(_web_search.configure)
+        _web_search_loaded = True
+    return _web_search
+
+
+async def close_web_search() -> None:
+    """Close the process-wide WebSearch's connection pools and sync loop, if any; call on app shutdown."""
+    if _web_search is not None:
+        await _web_search.aclose()
+
+
+async def web_search_text(query: str) -> str:
+    """Body of the agents' web search tools: results as text, or why there are none."""
+    search = get_web_search()
+    if search is None:
+        return "Web search is not configured."
+    try:
+        return await search.search_text(query)
+    except WebSearchError as e:
+        return f"Web search failed: {e}"
+
+
+def web_search_text_sync(query: str) -> str:
+    """Blocking variant of web_search_text."""
+    search = get_web_search()
+    if search is None:
+        return "Web search is not configured."
+    try:
+        return search.search_text_sync(query)
+    except WebSearchError as e:
+        return f"Web search failed: {e}"
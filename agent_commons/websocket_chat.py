@@ -0,0 +1,182 @@
+"""Persistent WebSocket chat: many turns over one connection, with compact frames.
+
+``/chat`` costs one HTTP request per turn, and the client re-sends the transcript
+each time. Over ``/ws/chat`` the conversation stays with the connection, and each
+turn sends only its new message. Frames are JSON text without whitespace.
+
+Client frames:
+
+- ``{"type": "chat", "message": "...", "timeout": 30}`` starts a turn. ``timeout``
+  (seconds) is optional, as on /chat. One turn runs at a time.
+- ``{"type": "cancel"}`` cancels the running turn; the conversation stays as it
+  was before that turn.
+
+Server frames:
+
+- ``{"t": "d", "d": {...}, "f": "stop"}`` carries a delta: an LLM token, a tool
+  call (or a slice of its arguments) or a tool output. The delta is the one of the
+  /chat streaming chunks; ``f`` is the finish reason, sent only when there is one.
+- ``{"t": "done", "timing": "..."}`` ends a turn. ``timing`` is the turn's
+  Server-Timing breakdown.
+- ``{"t": "cancelled"}`` ends a cancelled turn.
+- ``{"t": "error", "detail": "..."}`` reports a failed turn or an invalid frame,
+  binary frames included. The connection stays open after an invalid frame.
+"""
+
+import asyncio
+import contextlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Protocol
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from .cancellation import record_cancelled_run, record_completed_run
+from .deadline import Deadline
+from .settings import get_settings
+from .timing import SERIALIZE, RequestTimer
+
+# Client frame types
+CHAT = "chat"
+CANCEL = "cancel"
+
+# Server frame types
+DELTA = "d"
+DONE = "done"
+CANCELLED = "cancelled"
+ERROR = "error"
+
+# Reasons of cancelled turns, as counted in agent_runs_cancelled_total
+CLIENT_CANCEL = "client_cancel"
+CLIENT_DISCONNECT = "client_disconnect"
+
+
+class TokenUsage(Protocol):
+    total_tokens: int
+
+
+# Starts a turn: given the user message, its deadline and timer, returns the stream
+# of (delta, finish_reason) of the run and what counts its tokens. The stream must
+# update the conversation only once the run completed; closing or cancelling it
+# must cancel the run.
+TurnRunner = Callable[
+    [str, Deadline, RequestTimer],
+    tuple[AsyncIterator[tuple[dict, str | None]], TokenUsage],
+]
+
+
+def encode_frame(frame: dict[str, Any]) -> str:
+    """JSON text of a frame, without whitespace."""
+    return json.dumps(frame, separators=(",", ":"))
+
+
+def _timeout(frame: dict) -> float | None:
+    timeout = frame.get("timeout")
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+        return None
+    return float(timeout)
+
+
+async def _run_turn(
+    websocket: WebSocket,
+    send_text: Callable[[str], Awaitable[None]],
+    run_turn: TurnRunner,
+    frame: dict,
+) -> None:
+    settings = get_settings()
+    timer = RequestTimer()
+    deadline = Deadline.from_request(
+        field_value=_timeout(frame),
+        default=settings.request_timeout,
+        maximum=settings.max_request_timeout,
+    )
+    deltas, usage = run_turn(frame["message"], deadline, timer)
+
+    async def send(frame: dict) -> None:
+        await send_text(encode_frame(frame))
+
+    async def forward() -> None:
+        async with contextlib.aclosing(deltas):
+            async for delta, finish_reason in deltas:
+                with timer.span(SERIALIZE):
+                    data = {"t": DELTA, "d": delta}
+                    if finish_reason:
+                        data["f"] = finish_reason
+                    text = encode_frame(data)
+                await send_text(text)
+
+    try:
+        await asyncio.wait_for(forward(), timeout=deadline.remaining() + settings.deadline_grace)
+    except asyncio.CancelledError:
+        disconnected = websocket.client_state == WebSocketState.DISCONNECTED
+        record_cancelled_run(
+            usage.total_tokens, reason=CLIENT_DISCONNECT if disconnected else CLIENT_CANCEL
+        )
+        if not disconnected:
+            await send({"t": CANCELLED})
+        return
+    except asyncio.TimeoutError:
+        await send({"t": ERROR, "detail": "Request deadline exceeded"})
+        return
+    except Exception as e:
+        await send({"t": ERROR, "detail": f"Error processing request: {e}"})
+        return
+
+    record_completed_run(usage.total_tokens)
+    await send({"t": DONE, "timing": timer.header_value()})
+
+
+async def serve_chat_socket(websocket: WebSocket, run_turn: TurnRunner) -> None:
+    """Serve one ``/ws/chat`` connection until the client closes it.
+
+    Turns run as tasks while the connection keeps reading frames, so a cancel
+    frame (or the client going away) stops the running turn with its pending LLM
+    and tool calls.
+
+    Args:
+        websocket: The connection, not accepted yet.
+        run_turn: Starts a turn of this connection's conversation.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send_text(text: str) -> None:
+        async with send_lock:
+            await websocket.send_text(text)
+
+    async def send(frame: dict) -> None:
+        await send_text(encode_frame(frame))
+
+    turn: asyncio.Task | None = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+            if message.get("text") is None:
+                # receive_text() would raise KeyError on a binary frame and drop the connection
+                await send({"t": ERROR, "detail": "Frames must be JSON text, not binary"})
+                continue
+            try:
+                frame = json.loads(message["text"])
+            except ValueError:
+                frame = None
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == CHAT:
+                if turn is not None and not turn.done():
+                    await send({"t": ERROR, "detail": "A turn is already running; cancel it first"})
+                elif not isinstance(frame.get("message"), str):
+                    await send({"t": ERROR, "detail": "Chat frames need a message"})
+                else:
+                    turn = asyncio.create_task(_run_turn(websocket, send_text, run_turn, frame))
+            elif kind == CANCEL:
+                if turn is not None and not turn.done():
+                    turn.cancel()
+            else:
+                await send({"t": ERROR, "detail": 'Frames must be JSON objects of type "chat" or "cancel"'})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if turn is not None:
+            turn.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await turn
@@ -60,6 +60,13 @@ class InteractiveChat:
             content = delta.get("content")
             if content:
                 print(content, flush=True, end="")
+
+            # Token streaming sends tool-call arguments in slices
+            for tool_call in delta.get("tool_calls", []):
+                function = tool_call.get("function", {})
+                if name := function.get("name"):
+                    print(f"\n🤔 I am calling tool '{name}' with args: ", flush=True, end="")
+                print(function.get("arguments", ""), flush=True, end="")
         else:
             # Non-streaming fallback
             msg = choice.get("message", {})
@@ -1,24 +1,31 @@
 from typing import Generator
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage, BaseMessage, ToolMessage
+from agent_commons.deadline import DEADLINE_HEADER, Deadline
 from agents.base.langgraph_react_agent.src.langgraph_react_agent_base.agent import get_graph_closure
+from agents.base.langgraph_react_agent.src.langgraph_react_agent_base.middleware import AgentContext
+from agents.base.langgraph_react_agent.src.langgraph_react_agent_base.streaming import format_message_chunk
 
 
 def ai_stream_service(
         context,
         base_url=None,
-        model_id=None
+        model_id=None,
+        stream_tokens=True
 ):
     """Create a deployable AI service that runs the ReAct agent and returns (generate, generate_stream).
 
     Builds the agent graph once, then returns two callables: one for a single
-    non-streaming response and one that streams agent updates (tool calls and
-    final answer). Both accept a context object whose get_json() returns the
+    non-streaming response and one that streams the agent run. With stream_tokens
+    the stream carries one delta per LLM token (including incremental tool-call
+    arguments) and tool outputs as they complete; otherwise it carries whole
+    node updates (tool calls and final answer). Both accept a context object whose get_json() returns the
     request payload (e.g. {"messages": [...]}).
 
     Args:
         context: Object with get_json() used to read the request payload (not used at setup).
         base_url: LLM API base URL; uses BASE_URL env if omitted.
         model_id: LLM model id; uses MODEL_ID env if omitted.
+        stream_tokens: Stream per-token deltas instead of per-node updates.
 
     Returns:
         Tuple (generate, generate_stream). Each takes context and returns a response
@@ -35,10 +42,12 @@ def ai_stream_service(
             }
 
         if hasattr(resp, "tool_calls") and resp.tool_calls:
-            tc = resp.tool_calls[0]
             return {
                 "role": "assistant",
-                "content": f"🤔 I am calling tool '{tc['name']}' with args: {tc['args']}"
+                "content": "\n".join(
+                    f"🤔 I am calling tool '{tc['name']}' with args: {tc['args']}"
+                    for tc in resp.tool_calls
+                )
             }
 
         if resp.content:
@@ -56,11 +65,19 @@ def ai_stream_service(
             return SystemMessage(content=content)
         return HumanMessage(content=content)
 
+    def get_agent_context(context) -> AgentContext:
+        """Build the run context with the request deadline (payload "timeout" or X-Request-Timeout header)."""
+        deadline = Deadline.from_request(
+            header_value=context.get_headers().get(DEADLINE_HEADER),
+            field_value=context.get_json().get("timeout"),
+        )
+        return AgentContext(deadline=deadline)
+
     def generate(context) -> dict:
         """Run the agent once on the context payload and return a single response dict (headers + body with choices)."""
         payload = context.get_json()
         messages = [convert_dict_to_message(m) for m in payload.get("messages", [])]
-        result = agent.invoke({"messages": messages})
+        result = agent.invoke({"messages": messages}, context=get_agent_context(context))
         final_msg = result["messages"][-1]
 
         return {
@@ -73,14 +90,44 @@ def ai_stream_service(
             }
         }
 
+    def generate_token_stream(
+            messages: list[BaseMessage],
+            agent_context: AgentContext
+    ) -> Generator[dict, None, None]:
+        """Stream one choice delta per LLM token, tool-call argument slice and finished tool output."""
+        response_stream = agent.stream(
+            {"messages": messages},
+            stream_mode="messages",
+            context=agent_context
+        )
+
+        for message_chunk, _metadata in response_stream:
+            delta, finish_reason = format_message_chunk(message_chunk)
+
+            if delta is not None:
+                yield {
+                    "choices": [{
+                        "index": 0,
+                        "delta": delta,
+                        "finish_reason": finish_reason
+                    }]
+                }
+
     def generate_stream(context) -> Generator[dict, None, None]:
-        """Stream agent updates (tool calls and final answer) as choice deltas from the context payload."""
+        """Stream the agent run as choice deltas (per token or per node update) from the context payload."""
         payload = context.get_json()
         messages = [convert_dict_to_message(m) for m in payload.get("messages", [])]
 
+        agent_context = get_agent_context(context)
+
+        if stream_tokens:
+            yield from generate_token_stream(messages, agent_context)
+            return
+
         response_stream = agent.stream(
             {"messages": messages},
-            stream_mode="updates"
+            stream_mode="updates",
+            context=agent_context
         )
 
         for update in response_stream:
@@ -1,14 +1,71 @@
+import asyncio
+import contextlib
 import json
 import os
 from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from pydantic import BaseModel
 
+from agent_commons.cancellation import (
+    ClientDisconnected,
+    record_cancelled_run,
+    record_completed_run,
+    run_until_disconnect,
+    stream_until_disconnect,
+)
+from agent_commons.cassette import close_cassette
+from agent_commons.deadline import DEADLINE_HEADER, Deadline
+from agent_commons.guardrails import GuardrailTripped, Screening, close_guardrail, get_guardrail, refusal
+from agent_commons.jobs import Job, JobQueue, JobQueueFull, JobRun, job_event_stream
+from agent_commons.loop_monitor import watch_event_loop
+from agent_commons.metrics import REGISTRY
+from agent_commons.scheduler import BATCH, DEFAULT_TENANT, get_scheduler, request_lane
+from agent_commons.semantic_cache import (
+    CACHE_HEADER,
+    HIT,
+    MISS,
+    CacheHit,
+    SemanticCache,
+    cached_event_stream,
+    cached_response,
+    close_semantic_cache,
+    get_semantic_cache,
+    store_when_done,
+)
+from agent_commons.settings import (
+    LLM_SETTINGS,
+    Settings,
+    get_settings,
+    on_reload,
+    watch_settings,
+)
+from agent_commons.timing import (
+    PROFILE_TOKEN_HEADER,
+    SERIALIZE,
+    ProfilerBusy,
+    RequestTimer,
+    profile_request,
+    profiling_allowed,
+    timed_json_response,
+)
+from agent_commons.web_search import close_web_search
+from agent_commons.websocket_chat import TurnRunner, serve_chat_socket
 from langgraph_react_agent_base.agent import get_graph_closure
-from langgraph_react_agent_base.utils import get_env_var
+from langgraph_react_agent_base.callbacks import TokenUsageCallbackHandler
+from langgraph_react_agent_base.middleware import (
+    CASCADE_ACCEPTED,
+    CASCADE_ATTEMPT_TAG,
+    CASCADE_EVENT,
+    AgentContext,
+)
+from langgraph_react_agent_base.streaming import format_message_chunk
+
+# Upper bound on graph steps (model + tool nodes) per request
+RECURSION_LIMIT = 10
 
 
 # Request/Response models
@@ -16,6 +73,15 @@ class ChatRequest(BaseModel):
     """Incoming chat request body for the /chat endpoint."""
 
     message: str
+    timeout: float | None = None  # request budget in seconds; overrides the X-Request-Timeout header
+    stream: bool = False  # stream the run as Server-Sent Events instead of one JSON response
+
+
+class JobRequest(BaseModel):
+    """Incoming body of POST /jobs: a chat request run in the background."""
+
+    message: str
+    timeout: float | None = None  # budget of the run in seconds, from when a worker starts it
 
 
 class ChatResponse(BaseModel):
@@ -27,32 +93,61 @@ class ChatResponse(BaseModel):
 
 # Global variable for agent graph
 agent_graph = None
+# Background runs of POST /jobs
+jobs: JobQueue | None = None
+
+
+def _llm_settings(settings: Settings) -> tuple:
+    return tuple(getattr(settings, name) for name in LLM_SETTINGS)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize the ReAct agent graph on startup and clear it on shutdown.
 
-    Reads BASE_URL and MODEL_ID from the environment, builds the graph via
-    get_graph_closure, and sets the global agent_graph for the /chat endpoint.
+    Builds the graph from the BASE_URL, MODEL_ID and API_KEY settings via
+    get_graph_closure and sets the global agent_graph for the /chat endpoint.
+    Settings are reloaded on SIGHUP and when .env or SETTINGS_FILE change; a
+    reload changing the LLM settings swaps in a new graph, while running
+    requests finish on the old one. The /jobs workers and the event loop
+    monitor start with the app and stop with it.
     """
-    global agent_graph
-
-    # Get environment variables
-    base_url = get_env_var("BASE_URL")
-    model_id = get_env_var("MODEL_ID")
-
-    # Ensure base_url ends with /v1 if provided
-    if base_url and not base_url.endswith("/v1"):
-        base_url = base_url.rstrip("/") + "/v1"
-
-    # Get graph closure and create agent graph
-    agent_graph = get_graph_closure(model_id=model_id, base_url=base_url)
+    global agent_graph, jobs
+
+    llm = _llm_settings(get_settings())
+    agent_graph = get_graph_closure()
+    get_scheduler()
+    get_guardrail()
+    jobs = JobQueue.from_env(run_job)
+    await jobs.start()
+
+    def rebuild_graph(settings: Settings) -> None:
+        global agent_graph
+        nonlocal llm
+        jobs.configure(settings)
+        if _llm_settings(settings) != llm:
+            agent_graph = get_graph_closure()
+            llm = _llm_settings(settings)
+
+    remove_listener = on_reload(rebuild_graph)
+    watcher = asyncio.create_task(watch_settings())
+    loop_monitor = asyncio.create_task(watch_event_loop())
 
     yield
 
     # Cleanup on shutdown (if needed)
+    for task in (watcher, loop_monitor):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    remove_listener()
+    await jobs.close()
+    jobs = None
     agent_graph = None
+    await close_web_search()
+    await close_guardrail()
+    close_cassette()
+    close_semantic_cache()
 
 
 # Create FastAPI app
@@ -63,88 +158,454 @@ app = FastAPI(
 )
 
 
+async def stream_deltas(
+    messages: list[BaseMessage],
+    config: dict,
+    agent_context: AgentContext,
+    final_state: dict | None = None,
+) -> AsyncIterator[tuple[dict, str | None]]:
+    """Stream the agent run as choice deltas (see format_message_chunk).
+
+    Each LLM token, tool-call argument slice and tool output is yielded as soon as it
+    is produced; in cascade mode, the small model's tokens are yielded once its answer
+    is accepted and dropped when the call escalates to the large model. Closing the
+    stream cancels the run.
+
+    Args:
+        messages: Input messages of the run.
+        config: Run config (recursion limit, callbacks).
+        agent_context: Deadline and timer of the run.
+        final_state: Updated with the graph state at the end of the run, when given.
+    """
+    timer = agent_context.timer
+    stream_mode = ["messages", "custom"] + (["values"] if final_state is not None else [])
+
+    def delta(message_chunk: BaseMessage) -> tuple[dict | None, str | None]:
+        with timer.span(SERIALIZE):
+            return format_message_chunk(message_chunk)
+
+    # Tokens of a cascade's small model, held until the attempt is accepted or discarded
+    attempt = []
+    chunks = agent_graph.astream(
+        {"messages": messages}, config=config, context=agent_context, stream_mode=stream_mode
+    )
+    async with contextlib.aclosing(chunks):
+        async for mode, item in chunks:
+            if mode == "values":
+                final_state.update(item)
+                continue
+            if mode == "custom":
+                if isinstance(item, dict) and CASCADE_EVENT in item:
+                    held, attempt = attempt, []
+                    if item[CASCADE_EVENT] == CASCADE_ACCEPTED:
+                        for message_chunk in held:
+                            data, finish_reason = delta(message_chunk)
+                            if data is not None:
+                                yield data, finish_reason
+                continue
+            message_chunk, metadata = item
+            if CASCADE_ATTEMPT_TAG in (metadata.get("tags") or ()):
+                attempt.append(message_chunk)
+                continue
+            data, finish_reason = delta(message_chunk)
+            if data is not None:
+                yield data, finish_reason
+
+
+async def stream_chat(
+    raw_request: Request,
+    messages: list[BaseMessage],
+    config: dict,
+    agent_context: AgentContext,
+    usage: TokenUsageCallbackHandler,
+    tenant: str,
+    lane: str,
+    screening: Screening,
+    cache: SemanticCache | None = None,
+    audited: CacheHit | None = None,
+) -> AsyncIterator[str]:
+    """Stream the agent run as Server-Sent Events carrying OpenAI-style chunks.
+
+    The chunks carry the deltas of stream_deltas; the run starts when the scheduler
+    gives the tenant a slot. The run is cancelled when the client disconnects. The
+    headers are gone by the end of the run, so its Server-Timing breakdown is sent
+    as an SSE comment before ``[DONE]``. With a cache, the answer of a completed
+    run is stored in it for the tenant (checked against ``audited``, the hit the run
+    audits). The deltas are screened by ``screening`` (see agent_commons.guardrails).
+    """
+    timer = agent_context.timer
+    final_state = {} if cache is not None else None
+    run = screening.stream(stream_deltas(messages, config, agent_context, final_state))
+    if cache is not None:
+        run = store_when_done(
+            cache,
+            messages[-1].content,
+            run,
+            lambda: None if screening.tripped else run_answer(final_state.get("messages", [])),
+            audited,
+            tenant,
+        )
+    deltas = get_scheduler().stream_in_slot(tenant, lane, timer, run)
+    try:
+        async for delta, finish_reason in stream_until_disconnect(raw_request, deltas):
+            with timer.span(SERIALIZE):
+                chunk = {"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                data = f"data: {json.dumps(chunk)}\n\n"
+            yield data
+    except ClientDisconnected:
+        record_cancelled_run(usage.total_tokens)
+        return
+    except (asyncio.CancelledError, GeneratorExit):
+        # The server noticed the disconnect first and closed the response
+        record_cancelled_run(usage.total_tokens)
+        raise
+
+    record_completed_run(usage.total_tokens)
+    yield f": server-timing {timer.header_value()}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def run_answer(messages: list[BaseMessage]) -> tuple[str, list[str]]:
+    """Final answer of a run (empty if it has none) and the names of the tools it called."""
+    tools = [message.name for message in messages if isinstance(message, ToolMessage)]
+    last = messages[-1] if messages else None
+    if isinstance(last, AIMessage) and not last.tool_calls and isinstance(last.content, str):
+        return last.content, tools
+    return "", tools
+
+
+def format_response_messages(messages: list[BaseMessage]) -> list[dict]:
+    """Map the messages of a run to the /chat response format (OpenAI-style dicts)."""
+    response_messages = []
+    for message in messages:
+        # 1. User message (HumanMessage)
+        if isinstance(message, HumanMessage):
+            response_messages.append(
+                {
+                    "role": "user",
+                    "content": message.content,
+                }
+            )
+
+        # 2. AI message (AIMessage)
+        elif isinstance(message, AIMessage):
+            msg_data = {
+                "role": "assistant",
+                "content": message.content or "",
+            }
+            if message.tool_calls:
+                msg_data["tool_calls"] = [
+                    {
+                        "id": tc["id"],
+                        "type": "function",
+                        "function": {
+                            "name": tc["name"],
+                            "arguments": json.dumps(tc["args"]),
+                        },
+                    }
+                    for tc in message.tool_calls
+                ]
+            response_messages.append(msg_data)
+
+        # 3. Tool response (ToolMessage)
+        elif isinstance(message, ToolMessage):
+            response_messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": message.tool_call_id,
+                    "name": message.name,
+                    "content": message.content,
+                }
+            )
+
+    return response_messages
+
+
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    raw_request: Request,
+    request_timeout: str | None = Header(default=None, alias=DEADLINE_HEADER),
+    profile: bool = Query(default=False),
+    profile_token: str | None = Header(default=None, alias=PROFILE_TOKEN_HEADER),
+):
     """
     Chat endpoint that accepts a message and returns the agent's response.
 
+    The request budget comes from ``request.timeout`` or the X-Request-Timeout
+    header and is propagated to every model and tool call of the run. The run
+    waits for its tenant's turn (X-Tenant-Id header or API key) in the interactive
+    lane, or the batch one with ``X-Priority: batch``; the wait counts towards the
+    budget. If the client disconnects, the run (with its pending LLM and tool
+    calls) is cancelled. With SEMANTIC_CACHE on, a question similar enough to
+    one answered before for the tenant gets the cached answer without a run
+    (X-Semantic-Cache: hit), once the message passed the guardrail; the answers of
+    other runs are cached. With SAFETY_CLASSIFIER set, the message is screened
+    while the run starts and the answer once it is done; a flagged one gets a
+    refusal with the ``content_filter`` finish reason.
+    The Server-Timing response header breaks the request down into queue, LLM,
+    tool, serialization and framework time, with LLM and tool time per iteration.
+
     Args:
         request: ChatRequest containing the user message
+        raw_request: The underlying HTTP request, used to detect client disconnects
+        request_timeout: Value of the X-Request-Timeout header (seconds)
+        profile: Add a cProfile report of the run to the response (``?profile=1``)
+        profile_token: Value of the X-Profile-Token header; must match PROFILE_TOKEN to profile
 
     Returns:
-        JSON response with full conversation history including tool calls
+        JSON response with full conversation history including tool calls,
+        or a text/event-stream of chunks when ``request.stream`` is set
     """
     global agent_graph
 
+    timer = RequestTimer.from_headers(raw_request.headers)
+
     if agent_graph is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
-
-    try:
-        messages = [HumanMessage(content=request.message)]
-
-        # Use invoke to get the agent's response
-        result = await agent_graph.ainvoke(
-            {"messages": messages}, config={"recursion_limit": 10}
+    if profile and not profiling_allowed(profile_token):
+        raise HTTPException(status_code=403, detail="Profiling needs a valid X-Profile-Token")
+    if profile and request.stream:
+        raise HTTPException(status_code=400, detail="Streamed requests cannot be profiled")
+
+    settings = get_settings()
+    deadline = Deadline.from_request(
+        header_value=request_timeout,
+        field_value=request.timeout,
+        default=settings.request_timeout,
+        maximum=settings.max_request_timeout,
+    )
+    messages = [HumanMessage(content=request.message)]
+    agent_context = AgentContext(deadline=deadline, timer=timer)
+    usage = TokenUsageCallbackHandler()
+    config = {"recursion_limit": RECURSION_LIMIT, "callbacks": [usage]}
+    tenant = get_scheduler().tenant(raw_request.headers)
+    lane = request_lane(raw_request.headers)
+
+    screening = Screening(get_guardrail(), [{"role": "user", "content": request.message}])
+    # Profiled requests always run, so that there is something to profile
+    cache = get_semantic_cache() if not profile else None
+    hit = await cache.lookup(request.message, tenant) if cache is not None else None
+    # A flagged message is refused by the run below, with the same screen
+    if hit is not None and not hit.audit and await screening.input_passed():
+        if request.stream:
+            return StreamingResponse(
+                cached_event_stream(hit, timer), media_type="text/event-stream", headers={CACHE_HEADER: HIT}
+            )
+        return cached_response(request.message, hit, timer)
+
+    if request.stream:
+        return StreamingResponse(
+            stream_chat(
+                raw_request, messages, config, agent_context, usage, tenant, lane, screening, cache, hit
+            ),
+            media_type="text/event-stream",
+            headers={CACHE_HEADER: MISS} if cache is not None else None,
         )
 
-        response_messages = []
-
-        if "messages" in result and len(result["messages"]) > 0:
-            for message in result["messages"]:
-                # 1. User message (HumanMessage)
-                if isinstance(message, HumanMessage):
-                    response_messages.append(
-                        {
-                            "role": "user",
-                            "content": message.content,
-                        }
-                    )
-
-                # 2. AI message (AIMessage)
-                elif isinstance(message, AIMessage):
-                    msg_data = {
-                        "role": "assistant",
-                        "content": message.content or "",
-                    }
-                    if message.tool_calls:
-                        msg_data["tool_calls"] = [
-                            {
-                                "id": tc["id"],
-                                "type": "function",
-                                "function": {
-                                    "name": tc["name"],
-                                    "arguments": json.dumps(tc["args"]),
-                                },
-                            }
-                            for tc in message.tool_calls
-                        ]
-                    response_messages.append(msg_data)
-
-                # 3. Tool response (ToolMessage)
-                elif isinstance(message, ToolMessage):
-                    response_messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": message.tool_call_id,
-                            "name": message.name,
-                            "content": message.content,
-                        }
-                    )
-
-        return {"messages": response_messages, "finish_reason": "stop"}
+    async def run_in_slot() -> dict:
+        async with get_scheduler().slot(tenant, lane, timer):
+            # Use invoke to get the agent's response
+            return await screening.run(
+                agent_graph.ainvoke({"messages": messages}, config=config, context=agent_context),
+                lambda result: run_answer(result.get("messages", []))[0],
+            )
 
+    try:
+        with profile_request() if profile else contextlib.nullcontext() as profiled:
+            result = await run_until_disconnect(
+                raw_request,
+                asyncio.wait_for(
+                    run_in_slot(), timeout=deadline.remaining() + settings.deadline_grace
+                ),
+            )
+        record_completed_run(usage.total_tokens)
+        if cache is not None:
+            await cache.store(
+                request.message, *run_answer(result.get("messages", [])), audited=hit, tenant=tenant
+            )
+
+        with timer.span(SERIALIZE):
+            response_messages = format_response_messages(result.get("messages", []))
+
+        response = {"messages": response_messages, "finish_reason": "stop"}
+        if profile:
+            response["profile"] = profiled.report
+        json_response = timed_json_response(response, timer)
+        if cache is not None:
+            json_response.headers[CACHE_HEADER] = MISS
+        return json_response
+
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except GuardrailTripped:
+        record_completed_run(usage.total_tokens)
+        return timed_json_response(refusal(request.message), timer)
+    except ClientDisconnected:
+        record_cancelled_run(usage.total_tokens)
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error processing request: {str(e)}"
         )
 
 
+def conversation_turns(tenant: str, lane: str) -> TurnRunner:
+    """Turn runner of one /ws/chat connection, which keeps the conversation's messages.
+
+    A turn continues the messages of the turns completed before it; a cancelled or
+    failed turn, or one withheld by the guardrail, leaves them unchanged. Turns are
+    scheduled as runs of ``tenant`` in ``lane``.
+    """
+    history: list[BaseMessage] = []
+
+    def run_turn(message: str, deadline: Deadline, timer: RequestTimer):
+        usage = TokenUsageCallbackHandler()
+        config = {"recursion_limit": RECURSION_LIMIT, "callbacks": [usage]}
+        agent_context = AgentContext(deadline=deadline, timer=timer)
+
+        async def deltas() -> AsyncIterator[tuple[dict, str | None]]:
+            final_state = {}
+            screening = Screening(get_guardrail(), [{"role": "user", "content": message}])
+            run = screening.stream(
+                stream_deltas([*history, HumanMessage(content=message)], config, agent_context, final_state)
+            )
+            async with contextlib.aclosing(run):
+                async for delta in run:
+                    yield delta
+            if screening.tripped is None:
+                history[:] = final_state.get("messages", history)
+
+        return get_scheduler().stream_in_slot(tenant, lane, timer, deltas()), usage
+
+    return run_turn
+
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    """
+    Chat over a persistent WebSocket; the conversation stays with the connection.
+
+    Each turn sends only its new message and gets the deltas of the run (LLM tokens,
+    tool calls, tool outputs) as compact JSON frames; a ``{"type": "cancel"}`` frame
+    cancels the running turn. See agent_commons.websocket_chat for the frames.
+    """
+    if agent_graph is None:
+        await websocket.close(code=1013, reason="Agent not initialized")
+        return
+    scheduler = get_scheduler()
+    await serve_chat_socket(
+        websocket, conversation_turns(scheduler.tenant(websocket.headers), request_lane(websocket.headers))
+    )
+
+
+async def run_job(run: JobRun) -> AsyncIterator[tuple[dict, str | None]]:
+    """Job runner of /jobs: streams the run as stream_deltas does; its result is the /chat response."""
+    usage = TokenUsageCallbackHandler()
+    run.usage = usage
+    config = {"recursion_limit": RECURSION_LIMIT, "callbacks": [usage]}
+    agent_context = AgentContext(deadline=run.deadline, timer=run.timer)
+    final_state = {}
+    screening = Screening(get_guardrail(), [{"role": "user", "content": run.request["message"]}])
+    deltas = get_scheduler().stream_in_slot(
+        run.request.get("tenant", DEFAULT_TENANT),
+        run.request.get("lane", BATCH),
+        run.timer,
+        screening.stream(
+            stream_deltas([HumanMessage(content=run.request["message"])], config, agent_context, final_state)
+        ),
+    )
+    async with contextlib.aclosing(deltas):
+        async for delta in deltas:
+            yield delta
+    if screening.tripped is not None:
+        run.result = refusal(run.request["message"])
+        return
+    with run.timer.span(SERIALIZE):
+        response_messages = format_response_messages(final_state.get("messages", []))
+    run.result = {"messages": response_messages, "finish_reason": "stop"}
+
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id) if jobs is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest, raw_request: Request):
+    """
+    Queue an agent run and return its job at once, for runs longer than a request may last.
+
+    Poll ``GET /jobs/{id}`` for the status and, once it succeeded, the /chat response;
+    follow ``GET /jobs/{id}/events`` or cancel it with ``DELETE /jobs/{id}``. Jobs run
+    in the scheduler's batch lane unless sent with ``X-Priority: interactive``.
+
+    Args:
+        request: JobRequest containing the user message
+        raw_request: The underlying HTTP request, whose headers tell the tenant
+
+    Returns:
+        The queued job (202, with its URL in the Location header), or 429 when the
+        queue is full
+    """
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    try:
+        job = jobs.submit(
+            {
+                **request.model_dump(),
+                "tenant": get_scheduler().tenant(raw_request.headers),
+                "lane": request_lane(raw_request.headers, default=BATCH),
+            }
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return a job's status and, once it succeeded, its result (the /chat response)."""
+    return _get_job(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str, last_event_id: str | None = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    Follow a job as Server-Sent Events: the /chat stream chunks of its run, then the
+    finished job. A client reconnecting with Last-Event-ID gets only what it missed.
+    """
+    job = _get_job(job_id)
+    return StreamingResponse(job_event_stream(jobs, job, last_event_id), media_type="text/event-stream")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job (409 once it is finished) and return it."""
+    job = _get_job(job_id)
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return (await jobs.cancel(job_id)).to_dict()
+
+
 @app.get("/health")
 async def health():
     """Return service health and whether the agent graph has been initialized."""
     return {"status": "healthy", "agent_initialized": agent_graph is not None}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose service metrics (cancelled runs, tokens, ...) in the Prometheus text format."""
+    return REGISTRY.render()
+
+
 if __name__ == "__main__":
     import uvicorn
 
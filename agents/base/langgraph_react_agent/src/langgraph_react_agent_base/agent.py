@@ -1,56 +1,165 @@
-from typing import Any
+from typing import Any, Sequence
 
+import httpx
 from langchain.agents import create_agent
 from langchain_openai import ChatOpenAI
 
-from langgraph_react_agent_base.tools import dummy_web_search, dummy_math
-from langgraph_react_agent_base.utils import get_env_var
+from agent_commons.cascade import ModelCascade
+from agent_commons.cassette import get_cassette
+from agent_commons.rate_limit import get_rate_limiter
+from agent_commons.settings import SettingsError, get_settings
+from agent_commons.speculation import speculative_tool_names
+from agent_commons.tool_registry import tool_names_from_env
+from langgraph_react_agent_base.callbacks import ToolSpeculationCallbackHandler
+from langgraph_react_agent_base.middleware import (
+    CASCADE_ATTEMPT_TAG,
+    AgentContext,
+    CascadeMiddleware,
+    CassetteMiddleware,
+    DeadlineMiddleware,
+    InputScreenMiddleware,
+    PrecompiledToolsMiddleware,
+    ReturnDirectMiddleware,
+    SpeculativeToolsMiddleware,
+    TimingMiddleware,
+)
+from langgraph_react_agent_base.registry import build_tool_registry
+
+
+def _llm_http_clients(base_url: str, http_clients: dict) -> dict:
+    """HTTP clients of the ChatOpenAI at ``base_url``.
+
+    ``http_clients`` (a cassette's or a transport's) when set, else clients paced by
+    the rate limiter of the backend when it has limits (see agent_commons.rate_limit).
+    """
+    if http_clients:
+        return http_clients
+    limiter = get_rate_limiter(base_url)
+    if limiter is None:
+        return {}
+    return {"http_client": limiter.http_client(), "http_async_client": limiter.async_http_client()}
 
 
 def get_graph_closure(
     model_id: str = None,
     base_url: str = None,
     api_key: str = None,
+    return_direct_template: str = "{content}",
+    tool_names: Sequence[str] | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
 ) -> Any:
     """Build and return a LangGraph ReAct agent with the configured LLM and tools.
 
-    Creates a ChatOpenAI client, wires dummy_web_search and dummy_math tools,
-    and uses create_agent to produce a graph that runs the ReAct loop (reason,
-    act with tools, observe, repeat until a final answer).
+    Creates a ChatOpenAI client, takes the tools from the tool registry (built-in
+    dummy_web_search and calculator plus discovered ones), and uses create_agent
+    to produce a graph that runs the ReAct loop (reason, act with tools,
+    observe, repeat until a final answer). Tools marked
+    return_direct end the loop without another LLM call; their output becomes
+    the final answer. Pass ``context=AgentContext(deadline=...)`` when invoking
+    the graph to budget every model and tool call by the request deadline, and
+    ``AgentContext(timer=...)`` to time them for the Server-Timing header.
+    With CASSETTE_MODE set, LLM and tool traffic is recorded to or replayed from
+    the cassette (see agent_commons.cassette). With CASCADE_MODEL_ID set, model
+    calls go to that small model first and escalate to ``model_id`` when needed
+    (see agent_commons.cascade). With SPECULATIVE_TOOLS on (off while a cassette is
+    in use), model calls stream and async runs start each tool call, except those
+    of SIDE_EFFECT_TOOLS, as soon as its arguments are complete (see
+    agent_commons.speculation). With
+    RATE_LIMIT_* set, requests to each LLM backend are paced to its limits (see
+    agent_commons.rate_limit).
 
     Args:
-        model_id: LLM model identifier (e.g. for OpenAI-compatible API). Uses MODEL_ID env if omitted.
-        base_url: Base URL for the LLM API. Uses BASE_URL env if omitted.
-        api_key: API key for the LLM. Uses API_KEY env if omitted; required for non-local base_url.
+        model_id: LLM model identifier (e.g. for OpenAI-compatible API). Uses the MODEL_ID setting if omitted.
+        base_url: Base URL for the LLM API. Uses the BASE_URL setting if omitted.
+        api_key: API key for the LLM. Uses the API_KEY setting if omitted; required for non-local base_url.
+        return_direct_template: Format string for answers produced by return_direct tools
+            (``{content}`` and ``{tool_name}`` placeholders).
+        tool_names: Registered tools to give the agent. Uses TOOLS env (comma separated)
+            if omitted; all registered tools when neither is set.
+        transport: Transport of the async LLM client instead of the network, e.g. an
+            in-process fake LLM (benchmarks/_fake_llm.py). Takes precedence over a cassette.
 
     Returns:
         A LangGraph agent (CompiledGraph) that accepts {"messages": [...]} and returns updated state.
     """
 
-    if not api_key:
-        api_key = get_env_var("API_KEY")
-    if not base_url:
-        base_url = get_env_var("BASE_URL")
-    if not model_id:
-        model_id = get_env_var("MODEL_ID")
+    settings = get_settings()
+    api_key = api_key or settings.api_key
+    base_url = base_url or settings.base_url
+    model_id = model_id or settings.model_id
+    if not base_url or not model_id:
+        raise SettingsError("BASE_URL and MODEL_ID must be set (environment, .env or SETTINGS_FILE).")
 
     is_local = any(host in base_url for host in ["localhost", "127.0.0.1"])
 
     if not is_local and not api_key:
         raise ValueError("API_KEY is required for non-local environments.")
 
-    tools = [dummy_web_search, dummy_math]
+    # Schemas and validators are built once here, not on every model call
+    registry = build_tool_registry()
+    tool_specs = registry.subset(tool_names or tool_names_from_env())
+    tools = [spec.tool for spec in tool_specs]
+
+    middleware = [
+        InputScreenMiddleware(),
+        TimingMiddleware(),
+        DeadlineMiddleware(),
+        PrecompiledToolsMiddleware(registry),
+        ReturnDirectMiddleware(template=return_direct_template),
+    ]
+    http_clients = {}
+    cassette = get_cassette()
+    if cassette is not None:
+        middleware.append(CassetteMiddleware(cassette))
+        http_clients = {
+            "http_client": cassette.http_client(),
+            "http_async_client": cassette.async_http_client(),
+        }
+    if transport is not None:
+        http_clients["http_async_client"] = httpx.AsyncClient(transport=transport)
+    # Replayed tool calls are answered by the cassette, never started early
+    speculative = speculative_tool_names((tool.name for tool in tools), settings) if cassette is None else ()
+    speculation = {}
+    if speculative:
+        speculative_tools = [tool for tool in tools if tool.name in speculative]
+        middleware.append(SpeculativeToolsMiddleware(speculative_tools, registry))
+        speculation = {"streaming": True, "callbacks": [ToolSpeculationCallbackHandler()]}
 
     chat = ChatOpenAI(
         model=model_id,
         temperature=0.01,
         api_key=api_key,
         base_url=base_url,
+        stream_usage=True,  # report token usage on streamed responses too
+        **speculation,
+        **_llm_http_clients(base_url, http_clients),
     )
 
+    cascade = ModelCascade.from_settings(settings)
+    if cascade is not None:
+        small_chat = ChatOpenAI(
+            model=cascade.small_model,
+            temperature=0.01,
+            api_key=api_key,
+            base_url=cascade.small_base_url or base_url,
+            stream_usage=True,
+            logprobs=cascade.needs_logprobs or None,
+            tags=[CASCADE_ATTEMPT_TAG],
+            # Token log-probabilities are not streamed
+            **({} if cascade.needs_logprobs else speculation),
+            **_llm_http_clients(cascade.small_base_url or base_url, http_clients),
+        )
+        middleware.append(CascadeMiddleware(cascade, small_chat, registry))
+
     system_prompt = """You are a helpful assistant. When you receive a result from a tool, 
         use that information to provide a FINAL answer to the user immediately. 
         Do NOT call tools repeatedly for the same question."""
-    agent = create_agent(model=chat, tools=tools, system_prompt=system_prompt)
+    agent = create_agent(
+        model=chat,
+        tools=tools,
+        system_prompt=system_prompt,
+        middleware=middleware,
+        context_schema=AgentContext,
+    )
 
     return agent
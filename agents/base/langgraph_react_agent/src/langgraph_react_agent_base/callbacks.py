@@ -0,0 +1,59 @@
+from contextvars import ContextVar
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
+
+from agent_commons.speculation import ToolSpeculator
+
+# Speculator of the model call in progress; set by SpeculativeToolsMiddleware
+current_speculator: ContextVar[ToolSpeculator | None] = ContextVar("current_speculator", default=None)
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """Sum the tokens spent by every LLM call of one agent run.
+
+    Pass a fresh instance per run in ``config={"callbacks": [handler]}``. The total
+    stays readable when the run is cancelled half-way, which is what the
+    cancellation metrics need.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.total_tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Add the usage reported with the model response."""
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.total_tokens += usage.get("total_tokens", 0)
+
+
+class ToolSpeculationCallbackHandler(BaseCallbackHandler):
+    """Feed the tool call chunks of a streaming chat model to the current speculator.
+
+    Attach it to the chat model itself (``ChatOpenAI(streaming=True, callbacks=[...])``);
+    it does nothing outside model calls wrapped by SpeculativeToolsMiddleware. It runs
+    inline, on the event loop, so the speculator can start tool calls as tasks.
+    """
+
+    run_inline = True
+
+    def on_llm_new_token(
+        self,
+        token: str,
+        *,
+        chunk: GenerationChunk | ChatGenerationChunk | None = None,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        """Add the streamed tool call slices of the chunk, if any."""
+        speculator = current_speculator.get()
+        message = getattr(chunk, "message", None)
+        if speculator is None or message is None:
+            return
+        for call in getattr(message, "tool_call_chunks", None) or ():
+            speculator.feed(run_id, call.get("index") or 0, call.get("name"), call.get("args") or "")
@@ -0,0 +1,687 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Sequence
+
+import openai
+from langchain.agents.middleware import (
+    AgentMiddleware,
+    AgentState,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.runtime import Runtime
+
+from agent_commons.cascade import ModelCascade
+from agent_commons.cassette import Cassette
+from agent_commons.deadline import ANSWER_NOW_PROMPT, DEADLINE_EXCEEDED_ANSWER, Deadline
+from agent_commons.guardrails import input_screened
+from agent_commons.speculation import ToolSpeculator
+from agent_commons.timing import LLM, TOOL, RequestTimer
+from agent_commons.tool_registry import ToolArgumentsError, ToolRegistry
+from langgraph_react_agent_base.callbacks import current_speculator
+
+# Errors raised when an LLM call runs out of its (deadline derived) timeout
+_TIMEOUT_ERRORS = (asyncio.TimeoutError, TimeoutError, openai.APITimeoutError)
+
+# Tag of the small model of a cascade; its streamed tokens are held until the attempt is accepted
+CASCADE_ATTEMPT_TAG = "cascade_attempt"
+# Custom stream event ({CASCADE_EVENT: ...}) sent after each small-model attempt
+CASCADE_EVENT = "cascade"
+CASCADE_ACCEPTED = "accepted"
+CASCADE_DISCARDED = "discarded"
+
+
+@dataclass
+class AgentContext:
+    """Per-run context, passed as ``context=AgentContext(...)`` to invoke/ainvoke/stream."""
+
+    deadline: Deadline | None = None
+    timer: RequestTimer | None = None
+    # Tool calls of the last model response already started while it streamed, by call id
+    speculative_calls: dict[str, asyncio.Future] = field(default_factory=dict)
+
+
+def _get_deadline(runtime: Any) -> Deadline | None:
+    """Return the request deadline from the LangGraph runtime context, if any."""
+    context = getattr(runtime, "context", None)
+    return getattr(context, "deadline", None)
+
+
+def _get_timer(runtime: Any) -> RequestTimer | None:
+    """Return the request timer from the LangGraph runtime context, if any."""
+    context = getattr(runtime, "context", None)
+    return getattr(context, "timer", None)
+
+
+class ReturnDirectMiddleware(AgentMiddleware):
+    """Turn the output of terminal ("return direct") tools into the final answer.
+
+    create_agent already ends the ReAct loop without another model call once every
+    tool executed in a round has ``return_direct=True``; the run then ends on a
+    ToolMessage. This middleware appends an AIMessage built from those tool outputs,
+    so clients reading the last message get a regular assistant answer.
+    """
+
+    def __init__(self, template: str = "{content}") -> None:
+        """Set the answer template.
+
+        Args:
+            template: Format string for the final answer. Supports ``{content}`` (tool
+                output) and ``{tool_name}`` placeholders; applied per terminal tool output.
+        """
+        super().__init__()
+        self.template = template
+
+    def after_agent(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        """Append the templated tool output(s) as the final AIMessage if the run ended on a tool."""
+        tool_messages = []
+        for message in reversed(state["messages"]):
+            if not isinstance(message, ToolMessage):
+                break
+            tool_messages.append(message)
+
+        if not tool_messages:
+            return None
+
+        answer = "\n".join(
+            self.template.format(content=message.content, tool_name=message.name)
+            for message in reversed(tool_messages)
+        )
+        return {"messages": [AIMessage(content=answer)]}
+
+    async def aafter_agent(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        """Async variant of after_agent."""
+        return self.after_agent(state, runtime)
+
+
+class DeadlineMiddleware(AgentMiddleware):
+    """Budget every model and tool call of a run by the request deadline.
+
+    Regular steps get the remaining budget minus the answer-now margin. Once the
+    margin is reached (or a step runs out of time) the model is called one last
+    time without tools and told to answer with what it has, so the run degrades to
+    a partial answer instead of failing with a timeout. Runs without a deadline in
+    their AgentContext are left untouched.
+    """
+
+    @staticmethod
+    def _answer_now_request(request: ModelRequest, deadline: Deadline) -> ModelRequest:
+        """Rewrite the model request into a final, tool-less call with the whole remaining budget."""
+        system_prompt = f"{request.system_prompt or ''}\n\n{ANSWER_NOW_PROMPT}".strip()
+        return request.override(
+            tools=[],
+            system_message=SystemMessage(content=system_prompt),
+            model_settings={**request.model_settings, "timeout": deadline.timeout()},
+        )
+
+    @staticmethod
+    def _step_request(request: ModelRequest, deadline: Deadline) -> ModelRequest:
+        """Give a regular model call the step budget as its HTTP timeout."""
+        return request.override(
+            model_settings={**request.model_settings, "timeout": deadline.step_timeout()}
+        )
+
+    @staticmethod
+    def _deadline_exceeded() -> ModelResponse:
+        """Final answer used when no time is left for another model call."""
+        return ModelResponse(result=[AIMessage(content=DEADLINE_EXCEEDED_ANSWER)])
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Call the model with the remaining budget, degrading to answer-now near the deadline."""
+        deadline = _get_deadline(request.runtime)
+        if deadline is None:
+            return handler(request)
+
+        if not deadline.answer_now:
+            try:
+                return handler(self._step_request(request, deadline))
+            except _TIMEOUT_ERRORS:
+                pass
+
+        if deadline.expired:
+            return self._deadline_exceeded()
+        try:
+            return handler(self._answer_now_request(request, deadline))
+        except _TIMEOUT_ERRORS:
+            return self._deadline_exceeded()
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """Async variant of wrap_model_call; also cancels the call when its budget runs out."""
+        deadline = _get_deadline(request.runtime)
+        if deadline is None:
+            return await handler(request)
+
+        if not deadline.answer_now:
+            try:
+                return await asyncio.wait_for(
+                    handler(self._step_request(request, deadline)),
+                    timeout=deadline.step_timeout(),
+                )
+            except _TIMEOUT_ERRORS:
+                pass
+
+        if deadline.expired:
+            return self._deadline_exceeded()
+        try:
+            return await asyncio.wait_for(
+                handler(self._answer_now_request(request, deadline)),
+                timeout=deadline.timeout(),
+            )
+        except _TIMEOUT_ERRORS:
+            return self._deadline_exceeded()
+
+    @staticmethod
+    def _skipped(request: ToolCallRequest, reason: str) -> ToolMessage:
+        """Error ToolMessage for a tool call that was not run (or not finished) in time."""
+        tool_call = request.tool_call
+        return ToolMessage(
+            content=f"Tool {tool_call['name']} {reason}: the request deadline was reached.",
+            tool_call_id=tool_call["id"],
+            name=tool_call["name"],
+            status="error",
+        )
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Any],
+    ) -> Any:
+        """Skip tool calls once the deadline is close; the next model call answers directly."""
+        deadline = _get_deadline(request.runtime)
+        if deadline is not None and deadline.answer_now:
+            return self._skipped(request, "was skipped")
+        return handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """Run the tool call within the step budget, skipping it once the deadline is close."""
+        deadline = _get_deadline(request.runtime)
+        if deadline is None:
+            return await handler(request)
+        if deadline.answer_now:
+            return self._skipped(request, "was skipped")
+
+        try:
+            return await asyncio.wait_for(handler(request), timeout=deadline.step_timeout())
+        except asyncio.TimeoutError:
+            return self._skipped(request, "timed out")
+
+
+class PrecompiledToolsMiddleware(AgentMiddleware):
+    """Bind the registry's precompiled tool schemas and validate tool call arguments.
+
+    create_agent binds the tools to the model on every model call, which converts
+    each tool to its OpenAI schema again. This middleware swaps registered tools for
+    the schema dicts built once by the ToolRegistry, which bind without conversion.
+    Tool call arguments are checked with the registry's compiled validators before
+    the tool runs; invalid calls get an error ToolMessage the model can react to.
+    """
+
+    def __init__(self, registry: ToolRegistry[BaseTool]) -> None:
+        """Use the specs of ``registry``.
+
+        Args:
+            registry: Frozen registry holding the agent tools.
+        """
+        super().__init__()
+        self.registry = registry
+
+    def _precompiled_request(self, request: ModelRequest) -> ModelRequest:
+        """Replace registered tools in the request by their precompiled schemas."""
+        if not request.tools:
+            return request
+        tools = []
+        for tool in request.tools:
+            spec = self.registry.get(tool.name) if isinstance(tool, BaseTool) else None
+            tools.append(spec.openai_tool if spec is not None else tool)
+        return request.override(tools=tools)
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Call the model with precompiled tool schemas."""
+        return handler(self._precompiled_request(request))
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """Async variant of wrap_model_call."""
+        return await handler(self._precompiled_request(request))
+
+    def _invalid_arguments(self, request: ToolCallRequest) -> ToolMessage | None:
+        """Error ToolMessage if the call arguments fail validation, else None."""
+        tool_call = request.tool_call
+        spec = self.registry.get(tool_call["name"])
+        if spec is None:
+            return None
+        try:
+            spec.validate(tool_call["args"])
+        except ToolArgumentsError as e:
+            return ToolMessage(
+                content=str(e),
+                tool_call_id=tool_call["id"],
+                name=tool_call["name"],
+                status="error",
+            )
+        return None
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Any],
+    ) -> Any:
+        """Run the tool call if its arguments are valid."""
+        return self._invalid_arguments(request) or handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """Async variant of wrap_tool_call."""
+        return self._invalid_arguments(request) or await handler(request)
+
+
+class CassetteMiddleware(AgentMiddleware):
+    """Record tool calls to a cassette, or answer them from it in replay mode.
+
+    LLM calls are recorded and replayed by the cassette's HTTP client; this middleware
+    covers the tools, so replayed runs neither call external services nor depend on
+    their answers. Add it last, so it only sees calls that passed validation.
+    """
+
+    def __init__(self, cassette: Cassette) -> None:
+        """Use ``cassette``.
+
+        Args:
+            cassette: Cassette in record or replay mode.
+        """
+        super().__init__()
+        self.cassette = cassette
+
+    @staticmethod
+    def _replayed(request: ToolCallRequest, record: Any) -> ToolMessage:
+        tool_call = request.tool_call
+        return ToolMessage(
+            content=record.content,
+            tool_call_id=tool_call["id"],
+            name=tool_call["name"],
+            status="error" if record.is_error else "success",
+        )
+
+    def _record(self, request: ToolCallRequest, result: Any, duration: float) -> None:
+        if isinstance(result, ToolMessage):  # Commands (state updates) are not recorded
+            tool_call = request.tool_call
+            self.cassette.record_tool(
+                tool_call["name"],
+                tool_call["args"],
+                result.content,
+                result.status == "error",
+                duration,
+            )
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Any],
+    ) -> Any:
+        """Answer the tool call from the cassette, or run and record it."""
+        tool_call = request.tool_call
+        if self.cassette.replaying:
+            return self._replayed(
+                request, self.cassette.replay_tool(tool_call["name"], tool_call["args"])
+            )
+        start = time.perf_counter()
+        result = handler(request)
+        self._record(request, result, time.perf_counter() - start)
+        return result
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """Async variant of wrap_tool_call."""
+        tool_call = request.tool_call
+        if self.cassette.replaying:
+            return self._replayed(
+                request, await self.cassette.areplay_tool(tool_call["name"], tool_call["args"])
+            )
+        start = time.perf_counter()
+        result = await handler(request)
+        self._record(request, result, time.perf_counter() - start)
+        return result
+
+
+class InputScreenMiddleware(AgentMiddleware):
+    """Hold tool calls until the guardrail passed the run's input (see agent_commons.guardrails).
+
+    The input is screened while the first model call runs; tools wait for its verdict,
+    so none runs for a flagged input. Add it first, so the wait is not timed as tool
+    time.
+    """
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Any],
+    ) -> Any:
+        """Synchronous runs are not screened."""
+        return handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """Run the tool call once the input passed its screen."""
+        await input_screened()
+        return await handler(request)
+
+
+class TimingMiddleware(AgentMiddleware):
+    """Time every model and tool call of a run on the request timer.
+
+    Add it first (after InputScreenMiddleware), so the measured LLM and tool time
+    includes the other middleware's handling of the call. Runs without a timer in their AgentContext are left untouched.
+    """
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Time the model call as a new ReAct iteration."""
+        timer = _get_timer(request.runtime)
+        if timer is None:
+            return handler(request)
+        with timer.span(LLM):
+            return handler(request)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """Async variant of wrap_model_call."""
+        timer = _get_timer(request.runtime)
+        if timer is None:
+            return await handler(request)
+        with timer.span(LLM):
+            return await handler(request)
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Any],
+    ) -> Any:
+        """Time the tool call."""
+        timer = _get_timer(request.runtime)
+        if timer is None:
+            return handler(request)
+        with timer.span(TOOL):
+            return handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """Async variant of wrap_tool_call."""
+        timer = _get_timer(request.runtime)
+        if timer is None:
+            return await handler(request)
+        with timer.span(TOOL):
+            return await handler(request)
+
+
+class CascadeMiddleware(AgentMiddleware):
+    """Make model calls on a small model first and escalate to the agent's model when needed.
+
+    Routing and escalation follow the ModelCascade (see agent_commons.cascade). The
+    small model must be tagged with CASCADE_ATTEMPT_TAG: in streamed runs
+    (``stream_mode=["messages", "custom"]``) a ``{"cascade": "accepted"}`` or
+    ``{"cascade": "discarded"}`` custom event follows each of its attempts, so the
+    consumer forwards its tokens only once they are known to be the answer.
+    """
+
+    def __init__(
+        self,
+        cascade: ModelCascade,
+        small_model: BaseChatModel,
+        registry: ToolRegistry[BaseTool] | None = None,
+    ) -> None:
+        """Set the routing policy and the small model.
+
+        Args:
+            cascade: When to skip or escalate the small model.
+            small_model: Chat model tried first, tagged with CASCADE_ATTEMPT_TAG.
+            registry: Tools of the agent, to validate the small model's tool calls.
+        """
+        super().__init__()
+        self.cascade = cascade
+        self.small_model = small_model
+        self.registry = registry
+
+    @staticmethod
+    def _user_text(request: ModelRequest) -> str:
+        """Text of the latest user message, scored by the cascade classifier."""
+        for message in reversed(request.messages):
+            if isinstance(message, HumanMessage):
+                return message.text if hasattr(message, "text") else str(message.content)
+        return ""
+
+    @staticmethod
+    def _inspect(response: ModelResponse) -> tuple[list, list[float] | None]:
+        """Tool calls and token log-probabilities of a model response."""
+        message = next((m for m in response.result if isinstance(m, AIMessage)), None)
+        if message is None:
+            return [], None
+        tool_calls = [(call["name"], call["args"]) for call in message.tool_calls]
+        tool_calls += [(call.get("name") or "", None) for call in message.invalid_tool_calls]
+        logprobs = message.response_metadata.get("logprobs") or {}
+        tokens = logprobs.get("content") if isinstance(logprobs, dict) else None
+        return tool_calls, [token["logprob"] for token in tokens] if tokens else None
+
+    @staticmethod
+    def _notify(request: ModelRequest, accepted: bool) -> None:
+        """Tell stream consumers whether the small model's tokens are the answer."""
+        writer = getattr(request.runtime, "stream_writer", None)
+        if writer is not None:
+            writer({CASCADE_EVENT: CASCADE_ACCEPTED if accepted else CASCADE_DISCARDED})
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Call the small model, or the agent's model when the cascade escalates."""
+        attempts = []
+
+        def call_small() -> ModelResponse:
+            attempts.append(None)
+            attempts[0] = handler(request.override(model=self.small_model))
+            return attempts[0]
+
+        try:
+            response = self.cascade.run(
+                self._user_text(request), call_small, lambda: handler(request), self._inspect, self.registry
+            )
+        except BaseException:
+            if attempts:
+                self._notify(request, accepted=False)
+            raise
+        if attempts:
+            self._notify(request, accepted=response is attempts[0])
+        return response
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """Async variant of wrap_model_call."""
+        attempts = []
+
+        async def call_small() -> ModelResponse:
+            attempts.append(None)
+            attempts[0] = await handler(request.override(model=self.small_model))
+            return attempts[0]
+
+        try:
+            response = await self.cascade.arun(
+                self._user_text(request), call_small, lambda: handler(request), self._inspect, self.registry
+            )
+        except BaseException:
+            if attempts:
+                self._notify(request, accepted=False)
+            raise
+        if attempts:
+            self._notify(request, accepted=response is attempts[0])
+        return response
+
+
+def _takes_injected_arguments(tool: BaseTool) -> bool:
+    """Whether the tool gets arguments the model does not provide (state, runtime, ...)."""
+    schema = tool.tool_call_schema
+    if isinstance(schema, dict):
+        visible = schema.get("properties", {})
+    else:
+        visible = schema.model_json_schema().get("properties", {})
+    return set(tool.args) != set(visible)
+
+
+class SpeculativeToolsMiddleware(AgentMiddleware):
+    """Start tool calls while the model is still streaming them (see agent_commons.speculation).
+
+    The agent's chat models must stream (``streaming=True``) and carry a
+    ToolSpeculationCallbackHandler, which feeds their tool call chunks to the
+    speculator of the model call in progress. Tool calls of the final message that
+    were already started are awaited by the tool step instead of being run again;
+    started calls the final message does not contain are cancelled. Only async runs
+    with an AgentContext speculate, and tools taking injected arguments never do.
+    Add it before CascadeMiddleware, so one speculator sees both attempts.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        registry: ToolRegistry[BaseTool] | None = None,
+    ) -> None:
+        """Set the tools that may be started early.
+
+        Args:
+            tools: Tools of the agent.
+            registry: Validates the streamed arguments before a call is started.
+        """
+        super().__init__()
+        # Not "tools": AgentMiddleware.tools are tools the middleware adds to the agent
+        self.tools_by_name = {tool.name: tool for tool in tools if not _takes_injected_arguments(tool)}
+        self.registry = registry
+
+    async def _run_tool(self, name: str, arguments: dict, timer: RequestTimer | None) -> Any:
+        # Run as a tool call, so the result is the ToolMessage the tool step would build;
+        # its call id is replaced by the final one when it is used
+        tool_call = {"type": "tool_call", "id": "speculative", "name": name, "args": arguments}
+        await input_screened()
+        if timer is None:
+            return await self.tools_by_name[name].ainvoke(tool_call)
+        with timer.span(TOOL):
+            return await self.tools_by_name[name].ainvoke(tool_call)
+
+    @staticmethod
+    def _cancel_unused(context: AgentContext) -> None:
+        for task in context.speculative_calls.values():
+            task.cancel()
+        context.speculative_calls.clear()
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Synchronous runs do not speculate."""
+        return handler(request)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """Stream the model call into a speculator and keep the tool calls it started."""
+        context = getattr(request.runtime, "context", None)
+        if not isinstance(context, AgentContext):
+            return await handler(request)
+        # Left over from tool calls the previous round skipped
+        self._cancel_unused(context)
+        timer = context.timer
+        speculator = ToolSpeculator(
+            lambda name, arguments: self._run_tool(name, arguments, timer), self.tools_by_name, self.registry
+        )
+        token = current_speculator.set(speculator)
+        try:
+            response = await handler(request)
+        except BaseException:
+            speculator.cancel()
+            raise
+        finally:
+            current_speculator.reset(token)
+        message = next((m for m in response.result if isinstance(m, AIMessage)), None)
+        tool_calls = message.tool_calls if message is not None else []
+        context.speculative_calls = speculator.settle(
+            (call["id"], call["name"], call["args"]) for call in tool_calls
+        )
+        return response
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Any],
+    ) -> Any:
+        """Synchronous runs do not speculate."""
+        return handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """Await the tool call started while the model streamed, or run it now."""
+        context = getattr(request.runtime, "context", None)
+        task = (
+            context.speculative_calls.pop(request.tool_call["id"], None)
+            if isinstance(context, AgentContext)
+            else None
+        )
+        if task is None:
+            return await handler(request)
+        result = await task
+        if not isinstance(result, ToolMessage):  # e.g. a Command; run it the regular way
+            return await handler(request)
+        return result.model_copy(update={"tool_call_id": request.tool_call["id"]})
+
+    async def aafter_agent(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        """Cancel started tool calls no tool step used."""
+        if isinstance(runtime.context, AgentContext):
+            self._cancel_unused(runtime.context)
+        return None
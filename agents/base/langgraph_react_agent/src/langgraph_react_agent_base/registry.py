@@ -0,0 +1,65 @@
+from typing import Iterable
+
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+from agent_commons.tool_registry import (
+    ToolRegistry,
+    ToolSpec,
+    make_tool_spec,
+    tool_modules_from_env,
+)
+from agent_commons.vector_index import get_vector_index
+from agent_commons.web_search import get_web_search
+from langgraph_react_agent_base.tools import (
+    calculator,
+    document_search,
+    dummy_web_search,
+    web_search,
+)
+
+# Entry point group under which separately installed packages can publish LangChain tools
+ENTRY_POINT_GROUP = "agentic_starter_kits.langgraph_tools"
+
+BUILTIN_TOOLS = [dummy_web_search, calculator]
+
+
+def tool_spec(tool: BaseTool) -> ToolSpec[BaseTool]:
+    """Build the frozen spec (OpenAI schema, validator) of a LangChain tool."""
+    function = convert_to_openai_tool(tool)["function"]
+    args_schema = tool.args_schema
+    if not (isinstance(args_schema, type) and issubclass(args_schema, BaseModel)):
+        args_schema = None  # JSON-schema-only tools are validated by the tool itself
+
+    return make_tool_spec(
+        tool,
+        name=tool.name,
+        description=function.get("description", ""),
+        parameters=function.get("parameters", {"type": "object", "properties": {}}),
+        args_schema=args_schema,
+        return_direct=tool.return_direct,
+    )
+
+
+def build_tool_registry(paths: Iterable[str] | None = None) -> ToolRegistry[BaseTool]:
+    """Registry of the built-in tools plus discovered ones, frozen.
+
+    Args:
+        paths: Extra "module:attribute" tool paths. Defaults to the TOOL_MODULES env var.
+
+    Returns:
+        The frozen tool registry.
+    """
+    registry = ToolRegistry(tool_spec)
+    registry.register_all(BUILTIN_TOOLS)
+    if get_web_search() is not None:
+        # Real search is only offered when a provider is configured (SEARCH_* env vars)
+        registry.register(web_search)
+    if get_vector_index() is not None:
+        # Document retrieval is only offered when an index is configured (VECTOR_INDEX_PATH)
+        registry.register(document_search)
+    registry.discover(
+        ENTRY_POINT_GROUP, tool_modules_from_env() if paths is None else paths
+    )
+    return registry.freeze()
@@ -0,0 +1,70 @@
+from langchain_core.messages import AIMessageChunk, BaseMessage, ToolMessage
+
+
+def format_tool_call_chunks(chunk: AIMessageChunk) -> list[dict]:
+    """Turn the tool-call chunks of one streamed LLM token into OpenAI-style tool_call deltas.
+
+    Every tool call the model emits is reported, keyed by its ``index``. The id and
+    name are only present on the first chunk of a call, later chunks carry just the
+    next slice of the JSON arguments string.
+
+    Args:
+        chunk: Message chunk produced by the chat model in ``stream_mode="messages"``.
+
+    Returns:
+        A list of tool_call delta dicts (empty if the chunk carries no tool calls).
+    """
+    tool_call_deltas = []
+    for tcc in chunk.tool_call_chunks:
+        function = {}
+        if tcc.get("name"):
+            function["name"] = tcc["name"]
+        if tcc.get("args"):
+            function["arguments"] = tcc["args"]
+
+        tool_call_delta = {"index": tcc.get("index") or 0, "function": function}
+        if tcc.get("id"):
+            tool_call_delta["id"] = tcc["id"]
+            tool_call_delta["type"] = "function"
+        tool_call_deltas.append(tool_call_delta)
+
+    return tool_call_deltas
+
+
+def format_message_chunk(message: BaseMessage) -> tuple[dict | None, str | None]:
+    """Turn one item of a LangGraph ``messages`` stream into a choice delta.
+
+    LLM tokens become ``{"role": "assistant", "content": ...}`` deltas, tool-call
+    argument slices become ``tool_calls`` deltas and finished tool outputs are
+    forwarded as ``tool`` deltas as soon as the tool node returns them.
+
+    Args:
+        message: An ``AIMessageChunk`` streamed by the model node or a ``ToolMessage``
+            returned by the tools node.
+
+    Returns:
+        Tuple (delta, finish_reason). ``delta`` is None when there is nothing to send.
+    """
+    if isinstance(message, ToolMessage):
+        return {
+            "role": "tool",
+            "tool_call_id": message.tool_call_id,
+            "name": message.name,
+            "content": message.content,
+        }, None
+
+    if not isinstance(message, AIMessageChunk):
+        return None, None
+
+    finish_reason = message.response_metadata.get("finish_reason")
+    delta = {"role": "assistant"}
+
+    if message.content:
+        delta["content"] = message.content
+    if tool_call_deltas := format_tool_call_chunks(message):
+        delta["tool_calls"] = tool_call_deltas
+
+    if len(delta) == 1 and not finish_reason:
+        return None, None
+
+    return delta, finish_reason
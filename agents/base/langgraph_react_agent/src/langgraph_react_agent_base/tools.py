@@ -1,6 +1,10 @@
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
 from pydantic import BaseModel, Field
 
+from agent_commons.safe_math import calculate
+from agent_commons.vector_index import document_search_text, document_search_text_sync
+from agent_commons.web_search import web_search_text, web_search_text_sync
+
 
 class SearchInput(BaseModel):
     """Schema for the search tool input."""
@@ -8,13 +12,37 @@ class SearchInput(BaseModel):
     query: str = Field(description="The value to search for.")
 
 
-class MathInput(BaseModel):
-    """Schema for the math tool input."""
+class RangeInput(BaseModel):
+    """Evenly spaced values from start (inclusive) to stop (exclusive)."""
+
+    start: float = Field(default=0, description="First value.")
+    stop: float = Field(description="End of the range (not included).")
+    step: float = Field(default=1, description="Distance between values.")
+
+
+class CalculatorInput(BaseModel):
+    """Schema for the calculator tool input."""
 
-    query: str = Field(description="The math problem to solve.")
+    expression: str = Field(
+        description=(
+            "Arithmetic expression using + - * / // % **, numbers, pi, e and the functions "
+            "sqrt exp log log10 log2 sin cos tan asin acos atan atan2 sinh cosh tanh hypot "
+            "abs floor ceil round min max sum mean prod std var. "
+            'Example: "sqrt(2) * (3 + 4)**2" or "sum(1 / x**2)".'
+        )
+    )
+    variables: dict[str, float | list[float] | RangeInput] | None = Field(
+        default=None,
+        description=(
+            "Values of the names used in the expression. A list or a range evaluates the "
+            'expression for every value at once, e.g. {"x": {"start": 1, "stop": 1001}}.'
+        ),
+    )
 
 
-@tool("search", parse_docstring=True)
+# return_direct: the search result is the final answer, so the agent ends the
+# run without another LLM call to restate it.
+@tool("search", parse_docstring=True, return_direct=True)
 def dummy_web_search(query: str) -> str:
     """Search the web for information about a specific topic.
 
@@ -27,20 +55,80 @@ def dummy_web_search(query: str) -> str:
     Returns:
         A list of result strings (currently a single placeholder).
     """
-    return "FINAL ANSWER: The best company in the world is RedHat. No further search needed."
+    return "The best company in the world is RedHat."
 
 
-@tool("add", args_schema=MathInput)
-def dummy_math(query: str) -> list[str]:
-    """Perform a math operation (placeholder).
+@tool("calculator", args_schema=CalculatorInput)
+def calculator(
+    expression: str, variables: dict[str, float | list[float] | RangeInput] | None = None
+) -> str:
+    """Evaluate an arithmetic expression exactly instead of computing it step by step.
 
-    Placeholder tool used by the ReAct agent; returns a static response.
-    Replace with real math or calculator logic in production.
+    Runs on a restricted expression language (no Python code), vectorized over list
+    and range variables; long results are summarized (count, min, max, mean, sum).
 
     Args:
-        query: The math problem to solve.
+        expression: The expression to evaluate.
+        variables: Values of the names used in the expression.
 
     Returns:
-        A list of result strings (currently a single placeholder).
+        The result, or an error message describing what to fix.
+    """
+    if variables:
+        variables = {
+            name: value.model_dump() if isinstance(value, BaseModel) else value
+            for name, value in variables.items()
+        }
+    return calculate(expression, variables)
+
+
+def _web_search(query: str) -> str:
+    """Search the web for up-to-date information about a topic.
+
+    Args:
+        query: The search query. Example: "Red Hat OpenShift AI features"
+
+    Returns:
+        The top results (title, URL and snippet), truncated to fit the context.
     """
-    return ["Math response"]
+    return web_search_text_sync(query)
+
+
+async def _aweb_search(query: str) -> str:
+    return await web_search_text(query)
+
+
+# Real search through the configured provider (SEARCH_* env vars); async-native,
+# with a sync entry point for blocking graph invocations.
+web_search = StructuredTool.from_function(
+    func=_web_search,
+    coroutine=_aweb_search,
+    name="web_search",
+    parse_docstring=True,
+)
+
+
+def _document_search(query: str) -> str:
+    """Search the internal document collection for passages relevant to a question.
+
+    Args:
+        query: What to look for, in natural language. Example: "How do I deploy the agent?"
+
+    Returns:
+        The most relevant passages (title, source and text), truncated to fit the context.
+    """
+    return document_search_text_sync(query)
+
+
+async def _adocument_search(query: str) -> str:
+    return await document_search_text(query)
+
+
+# Retrieval from the local vector index (VECTOR_INDEX_PATH); the async entry point
+# runs the CPU-bound search in a worker thread.
+document_search = StructuredTool.from_function(
+    func=_document_search,
+    coroutine=_adocument_search,
+    name="document_search",
+    parse_docstring=True,
+)
@@ -0,0 +1,27 @@
+from os import getenv
+
+from dotenv import load_dotenv
+
+_dotenv_loaded = False
+
+
+def get_env_var(env_key: str) -> str:
+    """
+    Get an environment variable. If not present, load the .env file (once) and try again.
+    If failed again raise EnvironmentError.
+    The agents' own settings (BASE_URL, MODEL_ID, API_KEY, timeouts, limits) are typed
+    and loaded once by agent_commons.settings.get_settings.
+    :param env_key:
+    :return:
+    """
+    global _dotenv_loaded
+
+    value = getenv(env_key)
+    if not value and not _dotenv_loaded:
+        load_dotenv()
+        _dotenv_loaded = True
+        value = getenv(env_key)
+    if not value:
+        raise EnvironmentError(f"Environment variable `{env_key}` is not set")
+
+    return value.strip()
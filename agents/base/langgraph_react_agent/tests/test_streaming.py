@@ -0,0 +1,32 @@
+from langchain_core.messages import AIMessageChunk, ToolMessage
+
+from agents.base.langgraph_react_agent.src.langgraph_react_agent_base.streaming import (
+    format_message_chunk
+)
+
+
+class TestStreaming:
+    def test_token_delta(self):
+        delta, finish_reason = format_message_chunk(AIMessageChunk(content="Red"))
+        assert delta == {"role": "assistant", "content": "Red"}
+        assert finish_reason is None
+
+    def test_tool_call_deltas_for_every_call(self):
+        chunk = AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"index": 0, "id": "c1", "name": "search", "args": '{"query":'},
+                {"index": 1, "id": "c2", "name": "add", "args": ""},
+            ],
+        )
+        delta, _ = format_message_chunk(chunk)
+        assert [tc["index"] for tc in delta["tool_calls"]] == [0, 1]
+        assert delta["tool_calls"][0]["function"] == {"name": "search", "arguments": '{"query":'}
+
+    def test_tool_output(self):
+        delta, _ = format_message_chunk(ToolMessage(content="RedHat", tool_call_id="c1", name="search"))
+        assert delta["role"] == "tool"
+        assert delta["tool_call_id"] == "c1"
+
+    def test_empty_chunk_is_skipped(self):
+        assert format_message_chunk(AIMessageChunk(content="")) == (None, None)
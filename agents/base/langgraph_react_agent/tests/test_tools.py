@@ -1,5 +1,6 @@
 from agents.base.langgraph_react_agent.src.langgraph_react_agent_base.tools import (
-    dummy_web_search
+    calculator,
+    dummy_web_search,
 )
 
 
@@ -7,4 +8,14 @@ class TestTools:
     def test_dummy_web_search(self):
         query = "RedHat"
         result = dummy_web_search.invoke(query)
-        assert "RedHat" in result[0]  # Check if the result contains 'RedHat'
+        assert "RedHat" in result  # Check if the result contains 'RedHat'
+
+    def test_dummy_web_search_is_return_direct(self):
+        assert dummy_web_search.return_direct
+
+    def test_calculator(self):
+        assert calculator.invoke({"expression": "(3 + 4) * 6"}) == "42"
+        result = calculator.invoke(
+            {"expression": "sum(x**2)", "variables": {"x": {"start": 1, "stop": 11}}}
+        )
+        assert result == "385"
@@ -6,13 +6,94 @@ from typing import Generator, AsyncGenerator
 import nest_asyncio
 from llama_index.core.base.llms.types import ChatMessage
 
+from agent_commons.deadline import DEADLINE_HEADER, Deadline
+from agent_commons.settings import LLM_SETTINGS, Settings, get_settings, on_reload
 from agents.base.llamaindex_websearch_agent.src.llama_index_workflow_agent_base.agent import get_workflow_closure
-from agents.base.llamaindex_websearch_agent.src.llama_index_workflow_agent_base.workflow import (
-    ToolCallEvent,
-    StopEvent,
-    InputEvent,
-    StartEvent,
+from agents.base.llamaindex_websearch_agent.src.llama_index_workflow_agent_base.sessions import (
+    create_session_store,
+    new_messages,
 )
+from agents.base.llamaindex_websearch_agent.src.llama_index_workflow_agent_base.streaming import (
+    EventFormatter,
+)
+
+
+class StreamEventFormatter(EventFormatter):
+    """Deltas of the streamed AI service responses.
+
+    Every tool call gets a delta of its own, tool outputs carry an id, and for the
+    assistant interface (``X-Ai-Interface: assistant``) tool calls and outputs are
+    wrapped in ``step_details``. LLM text is streamed as it is generated, and the
+    end of the answer keeps the LLM's finish reason.
+    """
+
+    def __init__(self, is_assistant: bool = False) -> None:
+        super().__init__()
+        self.is_assistant = is_assistant
+
+    def tool_call_deltas(self, tool_calls) -> list[tuple[dict, str | None]]:
+        deltas = []
+        for tool_call in tool_calls:
+            arguments_str = json.dumps(tool_call.tool_kwargs)
+            if self.is_assistant:
+                delta = {
+                    "role": "assistant",
+                    "step_details": {
+                        "type": "tool_calls",
+                        "tool_calls": [
+                            {
+                                "id": tool_call.tool_id,
+                                "name": tool_call.tool_name,
+                                "args": arguments_str,
+                            }
+                        ],
+                    },
+                }
+            else:
+                delta = {
+                    "role": "assistant",
+                    "tool_calls": [
+                        {
+                            "id": tool_call.tool_id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_call.tool_name,
+                                "arguments": arguments_str,
+                            },
+                        }
+                    ],
+                }
+            deltas.append((delta, "tool_calls"))
+        return deltas
+
+    def tool_output_delta(self, message: ChatMessage) -> tuple[dict, str | None]:
+        tool_call_id = message.additional_kwargs["tool_call_id"]
+        output = {
+            "id": f"tool_call_id_{tool_call_id}",
+            "tool_call_id": tool_call_id,
+            "name": message.additional_kwargs["name"],
+            "content": message.blocks[0].text,
+        }
+        if self.is_assistant:
+            return {"role": "assistant", "step_details": {"type": "tool_response", **output}}, None
+        return {"role": "tool", **output}, None
+
+    @staticmethod
+    def _finish_reason(event) -> str | None:
+        # .raw is a ChatCompletion (or, for a streamed answer, its last chunk) Pydantic
+        # model, so use attribute access
+        try:
+            return event.result["response"].raw.choices[0].finish_reason
+        except (AttributeError, IndexError, KeyError):
+            # Fallback if structure is different (the usage chunk ending a stream has no choices)
+            return None
+
+    def answer_delta(self, event) -> tuple[dict, str | None]:
+        response = event.result["response"]
+        return {"role": "assistant", "content": response.message.blocks[0].text}, self._finish_reason(event)
+
+    def finish_delta(self, event) -> tuple[dict, str | None]:
+        return {"role": "assistant"}, self._finish_reason(event) or "stop"
 
 
 def ai_stream_service(
@@ -41,6 +122,26 @@ def ai_stream_service(
         target=start_loop, args=(persistent_loop,), daemon=True
     ).start()  # We run a persistent loop in a separate daemon thread
 
+    # Chat histories of conversations whose payloads carry a "conversation_id"
+    sessions = create_session_store()
+
+    def llm_settings(settings: Settings) -> tuple:
+        return tuple(getattr(settings, name) for name in LLM_SETTINGS)
+
+    # The workflow closure (tool registry, LLM clients) is built once, not per request;
+    # a settings reload changing the LLM settings swaps in a new one
+    llm = llm_settings(get_settings())
+    workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
+
+    def apply_settings(settings: Settings) -> None:
+        nonlocal llm, workflow
+        sessions.configure(settings)
+        if llm_settings(settings) != llm:
+            workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
+            llm = llm_settings(settings)
+
+    on_reload(apply_settings)
+
     def get_formatted_message(resp: ChatMessage) -> dict | None:
         role = resp.role
         if resp.blocks:
@@ -72,171 +173,88 @@ def ai_stream_service(
                     ],
                 }
 
-    def get_formatted_message_stream(
-            resp: ChatMessage, is_assistant: bool = False
-    ) -> list | None:
-
-        if isinstance(resp, StartEvent):
-            return
-
-        elif isinstance(resp, InputEvent):
-
-            responses = []
-            resp_input = resp.input
-            last_assistant_index = None
-
-            for index, message in enumerate(resp_input):
-                if message.role == "assistant":
-                    last_assistant_index = index
-
-            if last_assistant_index is not None:
-                for event_input in resp_input[last_assistant_index + 1:]:
-
-                    if event_input.role == "tool":
-
-                        tool_call_id = event_input.additional_kwargs["tool_call_id"]
-                        if is_assistant:
-                            to_queue = {
-                                "role": "assistant",
-                                "step_details": {
-                                    "type": "tool_response",
-                                    "id": f"tool_call_id_{tool_call_id}",
-                                    "tool_call_id": tool_call_id,
-                                    "name": event_input.additional_kwargs["name"],
-                                    "content": event_input.blocks[0].text,
-                                },
-                            }
-                        else:
-                            to_queue = {
-                                "role": "tool",
-                                "id": f"tool_call_id_{tool_call_id}",
-                                "tool_call_id": tool_call_id,
-                                "name": event_input.additional_kwargs["name"],
-                                "content": event_input.blocks[0].text,
-                            }
-
-                        responses.append(to_queue)
-
-            return responses
-
-        elif isinstance(resp, ToolCallEvent):
-            # Tool calls
-            responses = []
-            for tool_call in resp.tool_calls:
-                arguments_str = json.dumps(tool_call.tool_kwargs)
-
-                if is_assistant:
-                    to_queue = {
-                        "role": "assistant",
-                        "step_details": {
-                            "type": "tool_calls",
-                            "tool_calls": [
-                                {
-                                    "id": tool_call.tool_id,
-                                    "name": tool_call.tool_name,
-                                    "args": arguments_str,
-                                }
-                            ],
-                        },
-                    }
-                else:
-                    to_queue = {
-                        "role": "assistant",
-                        "tool_calls": [
-                            {
-                                "id": tool_call.tool_id,
-                                "type": "function",
-                                "function": {
-                                    "name": tool_call.tool_name,
-                                    "arguments": arguments_str,
-                                },
-                            }
-                        ],
-                    }
-
-                responses.append(to_queue)
-
-            return responses
-
-        elif isinstance(resp, StopEvent):
-            # Final response
-            resp_result = resp.result
-            resp_response = resp_result["response"]
-            to_queue = {
-                "role": "assistant",
-                "content": resp_response.message.blocks[0].text,
-            }
+    def get_deadline(context) -> Deadline:
+        """Request deadline from the payload "timeout" field or the X-Request-Timeout header."""
+        return Deadline.from_request(
+            header_value=context.get_headers().get(DEADLINE_HEADER),
+            field_value=context.get_json().get("timeout"),
+        )
 
-            return [to_queue]
+    def get_agent(messages: list[dict], deadline: Deadline, chat_history=None):
+        """Agent for the payload messages; a leading system message sets its system prompt."""
+        # As in main.py: the grace lets the workflow return the deadline answer before
+        # its own timeout fires
+        timeout = deadline.remaining() + get_settings().deadline_grace
+        if messages and messages[0]["role"] == "system":
+            agent = workflow(messages[0]["content"], timeout=timeout, chat_history=chat_history)
+            del messages[0]
+        else:
+            agent = workflow(timeout=timeout, chat_history=chat_history)
+        return agent
 
     async def generate_async(context) -> dict:
 
-        workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
-
         payload = context.get_json()
         messages = payload.get("messages", [])
+        deadline = get_deadline(context)
+        conversation_id = payload.get("conversation_id")
+
+        if conversation_id is None:
+            agent = get_agent(messages, deadline)
+            return await agent.run(input=messages, deadline=deadline)
+
+        async with sessions.checkout(conversation_id) as session:
+            if session.value is not None:
+                # The server has the transcript; only the new input is processed
+                messages = new_messages(messages)
+            agent = get_agent(messages, deadline, session.value)
+            result = await agent.run(input=messages, deadline=deadline)
+            session.value = agent.memory.get_all()
+            return result
 
-        if messages and messages[0]["role"] == "system":
-            agent = workflow(messages[0]["content"])
-            del messages[0]
-        else:
-            agent = workflow()
+    async def generate_async_stream(context) -> AsyncGenerator:
 
-        return await agent.run(input=messages)
+        payload = context.get_json()
+        conversation_id = payload.get("conversation_id")
 
-    async def generate_async_stream(context) -> AsyncGenerator:
+        if conversation_id is None:
+            async for chunk in stream_run(context, None):
+                yield chunk
+            return
 
-        workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
+        async with sessions.checkout(conversation_id) as session:
+            async for chunk in stream_run(context, session):
+                yield chunk
+
+    async def stream_run(context, session) -> AsyncGenerator:
 
         payload = context.get_json()
         headers = context.get_headers()
         is_assistant = headers.get("X-Ai-Interface") == "assistant"
 
         messages = payload.get("messages", [])
+        deadline = get_deadline(context)
 
-        if messages and messages[0]["role"] == "system":
-            agent = workflow(messages[0]["content"])
-            del messages[0]
-        else:
-            agent = workflow()
+        chat_history = session.value if session is not None else None
+        if chat_history is not None:
+            messages = new_messages(messages)
+        agent = get_agent(messages, deadline, chat_history)
 
-        handler = agent.run(input=messages)
+        handler = agent.run(input=messages, deadline=deadline)
 
+        # One formatter per run: it only reads the messages new since the last event
+        formatter = StreamEventFormatter(is_assistant)
         async for ev in handler.stream_events():
-            if (messages := get_formatted_message_stream(ev, is_assistant)) is not None:
-                for message in messages:
-                    if isinstance(ev, ToolCallEvent):
-                        yield {
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": message,
-                                    "finish_reason": "tool_calls",
-                                }
-                            ]
-                        }
-                    elif isinstance(ev, StopEvent):
-                        # Access finish_reason from ChatCompletion object (not dict)
-                        # .raw is a ChatCompletion Pydantic model, so use attribute access
-                        try:
-                            finish_reason = ev.result["response"].raw.choices[0].finish_reason
-                        except (AttributeError, IndexError, KeyError):
-                            # Fallback if structure is different
-                            finish_reason = None
-                        yield {
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": message,
-                                    "finish_reason": finish_reason,
-                                }
-                            ]
-                        }
-                    else:
-                        # Tool call result
-                        yield {"choices": [{"index": 0, "delta": message}]}
+            for message, finish_reason in formatter.format(ev):
+                choice = {"index": 0, "delta": message}
+                if finish_reason is not None:
+                    # Tool outputs are sent without a finish reason
+                    choice["finish_reason"] = finish_reason
+                yield {"choices": [choice]}
 
         await handler
+        if session is not None:
+            session.value = agent.memory.get_all()
 
     def generate(context) -> dict:
 
@@ -1,6 +1,6 @@
 from _interactive_chat import InteractiveChat
 from agents.base.llamaindex_websearch_agent.examples.ai_service import ai_stream_service
-from utils import get_env_var
+from agent_commons.settings import get_settings
 
 
 class SimpleContext:
@@ -16,12 +16,10 @@ class SimpleContext:
         return {}
 
 
-base_url = get_env_var("BASE_URL")
-model_id = get_env_var("MODEL_ID")
-
-# Ensure base_url ends with /v1 if provided
-if base_url and not base_url.endswith('/v1'):
-    base_url = base_url.rstrip('/') + '/v1'
+# BASE_URL (normalized to end with /v1) and MODEL_ID from the environment or .env
+settings = get_settings()
+base_url = settings.base_url
+model_id = settings.model_id
 
 stream = True
 context = SimpleContext()
@@ -43,4 +43,7 @@ ROOT_DIR="$(cd "$SCRIPT_DIR/../../.." && pwd)"
 # Copy utils.py to the destination
 cp "$ROOT_DIR/utils.py" "$SCRIPT_DIR/src/llama_index_workflow_agent_base/" && echo "Utils.py copied to destination"
 
+# Copy the shared agent_commons package next to the agent package
+cp -r "$ROOT_DIR/agent_commons" "$SCRIPT_DIR/src/" && echo "agent_commons copied to destination"
+
 echo "Agent initialized successfully"
@@ -1,12 +1,66 @@
+import asyncio
+import contextlib
 import json
 import os
 from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from llama_index.core.llms import ChatMessage
+from llama_index.core.workflow.errors import WorkflowTimeoutError
 from pydantic import BaseModel
 
+from agent_commons.cancellation import (
+    ClientDisconnected,
+    record_cancelled_run,
+    record_completed_run,
+    run_until_disconnect,
+    stream_until_disconnect,
+)
+from agent_commons.cassette import close_cassette
+from agent_commons.deadline import DEADLINE_HEADER, Deadline
+from agent_commons.guardrails import GuardrailTripped, Screening, close_guardrail, get_guardrail, refusal
+from agent_commons.jobs import Job, JobQueue, JobQueueFull, JobRun, job_event_stream
+from agent_commons.loop_monitor import watch_event_loop
+from agent_commons.metrics import REGISTRY
+from agent_commons.scheduler import BATCH, DEFAULT_TENANT, get_scheduler, request_lane
+from agent_commons.semantic_cache import (
+    CACHE_HEADER,
+    HIT,
+    MISS,
+    CacheHit,
+    SemanticCache,
+    cached_event_stream,
+    cached_response,
+    close_semantic_cache,
+    get_semantic_cache,
+    store_when_done,
+)
+from agent_commons.session_store import Session, SessionStore
+from agent_commons.settings import (
+    LLM_SETTINGS,
+    Settings,
+    get_settings,
+    on_reload,
+    watch_settings,
+)
+from agent_commons.timing import (
+    PROFILE_TOKEN_HEADER,
+    QUEUE,
+    SERIALIZE,
+    ProfilerBusy,
+    RequestTimer,
+    profile_request,
+    profiling_allowed,
+    timed_json_response,
+)
+from agent_commons.web_search import close_web_search
+from agent_commons.websocket_chat import TurnRunner, serve_chat_socket
 from llama_index_workflow_agent_base.agent import get_workflow_closure
-from llama_index_workflow_agent_base.utils import get_env_var
+from llama_index_workflow_agent_base.sessions import create_session_store
+from llama_index_workflow_agent_base.streaming import EventFormatter
+from llama_index_workflow_agent_base.workflow import FunctionCallingAgent
 
 
 # Request/Response models
@@ -14,6 +68,17 @@ class ChatRequest(BaseModel):
     """Incoming chat request body for the /chat endpoint."""
 
     message: str
+    timeout: float | None = None  # request budget in seconds; overrides the X-Request-Timeout header
+    stream: bool = False  # stream the run as Server-Sent Events instead of one JSON response
+    conversation_id: str | None = None  # continue this conversation; its history stays in the server
+
+
+class JobRequest(BaseModel):
+    """Incoming body of POST /jobs: a chat request run in the background."""
+
+    message: str
+    timeout: float | None = None  # budget of the run in seconds, from when a worker starts it
+    conversation_id: str | None = None  # continue this conversation, as on /chat
 
 
 class ChatResponse(BaseModel):
@@ -25,32 +90,67 @@ class ChatResponse(BaseModel):
 
 # Global variable for workflow closure (get_agent callable)
 get_agent = None
+# Chat histories of ongoing conversations, by conversation id
+sessions: SessionStore[list[ChatMessage]] | None = None
+# Background runs of POST /jobs
+jobs: JobQueue | None = None
+
+
+def _llm_settings(settings: Settings) -> tuple:
+    return tuple(getattr(settings, name) for name in LLM_SETTINGS)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize the LlamaIndex workflow closure on startup and clear it on shutdown.
 
-    Reads BASE_URL and MODEL_ID from the environment, builds the workflow via
-    get_workflow_closure, and sets the global get_agent for the /chat endpoint.
+    Builds the workflow from the BASE_URL, MODEL_ID and API_KEY settings via
+    get_workflow_closure and sets the global get_agent for the /chat endpoint.
+    Settings are reloaded on SIGHUP and when .env or SETTINGS_FILE change; a
+    reload changing the LLM settings swaps in a new closure (running requests
+    finish on the old one) and new session and job limits apply to the session
+    store and the /jobs queue. The /jobs workers and the event loop monitor
+    start with the app and stop with it.
     """
-    global get_agent
-
-    # Get environment variables
-    base_url = get_env_var("BASE_URL")
-    model_id = get_env_var("MODEL_ID")
-
-    # Ensure base_url ends with /v1 if provided
-    if base_url and not base_url.endswith("/v1"):
-        base_url = base_url.rstrip("/") + "/v1"
-
-    # Get workflow closure (returns a callable that returns an agent)
-    get_agent = get_workflow_closure(model_id=model_id, base_url=base_url)
+    global get_agent, sessions, jobs
+
+    llm = _llm_settings(get_settings())
+    get_agent = get_workflow_closure()
+    sessions = create_session_store()
+    get_scheduler()
+    get_guardrail()
+    jobs = JobQueue.from_env(run_job)
+    await jobs.start()
+
+    def apply_settings(settings: Settings) -> None:
+        global get_agent
+        nonlocal llm
+        sessions.configure(settings)
+        jobs.configure(settings)
+        if _llm_settings(settings) != llm:
+            get_agent = get_workflow_closure()
+            llm = _llm_settings(settings)
+
+    remove_listener = on_reload(apply_settings)
+    watcher = asyncio.create_task(watch_settings())
+    loop_monitor = asyncio.create_task(watch_event_loop())
 
     yield
 
     # Cleanup on shutdown (if needed)
+    for task in (watcher, loop_monitor):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    remove_listener()
+    await jobs.close()
+    jobs = None
     get_agent = None
+    sessions.close()
+    await close_web_search()
+    await close_guardrail()
+    close_cassette()
+    close_semantic_cache()
 
 
 # Create FastAPI app
@@ -64,7 +164,8 @@ app = FastAPI(
 def _get_message_content(msg) -> str:
     """Extract text content from a LlamaIndex ChatMessage."""
     if hasattr(msg, "blocks") and msg.blocks:
-        return (msg.blocks[0].text or "") if msg.blocks else ""
+        # Tool-call messages may have no text block (e.g. only a ToolCallBlock)
+        return next((block.text or "" for block in msg.blocks if hasattr(block, "text")), "")
     if hasattr(msg, "content"):
         if isinstance(msg.content, str):
             return msg.content
@@ -104,6 +205,8 @@ def _message_to_response_dict(msg):
             else:  # dict format (e.g. from additional_kwargs)
                 msg_data["tool_calls"] = []
                 for tc in tool_calls:
+                    if hasattr(tc, "model_dump"):  # OpenAI SDK tool call object
+                        tc = tc.model_dump()
                     fn = tc.get("function", {}) or {}
                     args = fn.get("arguments", "")
                     if isinstance(args, dict):
@@ -129,44 +232,454 @@ def _message_to_response_dict(msg):
     return None  # skip system or unknown
 
 
+def run_answer(messages: list[ChatMessage]) -> tuple[str, list[str]]:
+    """Final answer of a run (empty if it has none) and the names of the tools it called."""
+    tools = [message.additional_kwargs.get("name", "") for message in messages if message.role == "tool"]
+    last = messages[-1] if messages else None
+    if last is not None and last.role == "assistant" and not last.additional_kwargs.get("tool_calls"):
+        return _get_message_content(last), tools
+    return "", tools
+
+
+def format_response_messages(messages: list[ChatMessage]) -> list[dict]:
+    """Map workflow messages to the /chat response format, without system messages."""
+    response_messages = []
+    for message in messages:
+        if getattr(message, "role", None) == "system":
+            continue
+        item = _message_to_response_dict(message)
+        if item is not None:
+            response_messages.append(item)
+    return response_messages
+
+
+async def run_workflow(agent: FunctionCallingAgent, messages: list[dict], deadline: Deadline):
+    """Run the workflow to completion, stopping its steps if the awaiting task is cancelled."""
+    handler = agent.run(input=messages, deadline=deadline)
+    result = asyncio.ensure_future(handler)
+    try:
+        # Shielded: cancelling the handler future itself would not stop the running steps
+        return await asyncio.shield(result)
+    except asyncio.CancelledError:
+        await handler.cancel_run()
+        with contextlib.suppress(Exception):
+            await result
+        raise
+
+
+@asynccontextmanager
+async def conversation_turn(
+    conversation_id: str | None, deadline: Deadline, timer: RequestTimer
+) -> AsyncIterator[tuple[FunctionCallingAgent, Session[list[ChatMessage]] | None]]:
+    """Agent for one chat turn, and the conversation's session when an id is given.
+
+    With a conversation id the agent continues the stored history, so only the new
+    message is processed; set ``session.value`` to the agent's history to keep the
+    turn. Turns of one conversation run one at a time; waiting for the previous
+    turn counts as queue time.
+    """
+    grace = get_settings().deadline_grace
+    if conversation_id is None:
+        yield get_agent(timeout=deadline.remaining() + grace, timer=timer), None
+        return
+
+    async with contextlib.AsyncExitStack() as stack:
+        with timer.span(QUEUE):
+            session = await stack.enter_async_context(sessions.checkout(conversation_id))
+        agent = get_agent(
+            timeout=deadline.remaining() + grace,
+            chat_history=session.value,
+            timer=timer,
+        )
+        yield agent, session
+
+
+async def stream_chat(
+    raw_request: Request,
+    messages: list[dict],
+    deadline: Deadline,
+    timer: RequestTimer,
+    tenant: str,
+    lane: str,
+    screening: Screening,
+    conversation_id: str | None = None,
+    cache: SemanticCache | None = None,
+    audited: CacheHit | None = None,
+) -> AsyncIterator[str]:
+    """Stream the workflow run as Server-Sent Events carrying OpenAI-style chunks.
+
+    LLM tokens, tool calls, tool outputs and the end of the answer are sent as the
+    workflow emits them; the run starts when the scheduler gives the tenant a slot.
+    The run is cancelled when the client disconnects. The headers are gone by the
+    end of the run, so its Server-Timing breakdown is sent as an SSE comment before
+    ``[DONE]``. With a cache, the answer of a completed run is stored in it for the
+    tenant (checked against ``audited``, the hit the run audits). The deltas are
+    screened by ``screening`` (see agent_commons.guardrails).
+    """
+    async with conversation_turn(conversation_id, deadline, timer) as (agent, session):
+        run = screening.stream(stream_deltas(agent, messages, deadline))
+        if cache is not None:
+            run = store_when_done(
+                cache,
+                messages[-1]["content"],
+                run,
+                lambda: None if screening.tripped else run_answer(agent.memory.get_all()),
+                audited,
+                tenant,
+            )
+        deltas = get_scheduler().stream_in_slot(tenant, lane, timer, run)
+        async for chunk in _stream_run(raw_request, agent, deltas, session, screening):
+            yield chunk
+
+
+async def stream_deltas(
+    agent: FunctionCallingAgent, messages: list[dict], deadline: Deadline
+) -> AsyncIterator[tuple[dict, str | None]]:
+    """Run the workflow, yielding the choice deltas of its events (see EventFormatter).
+
+    Closing or cancelling the stream cancels the run.
+    """
+    formatter = EventFormatter()
+    handler = agent.run(input=messages, deadline=deadline)
+    try:
+        async for event in handler.stream_events():
+            with agent.timer.span(SERIALIZE):
+                deltas = formatter.format(event)
+            for delta in deltas:
+                yield delta
+        await handler
+    except BaseException:
+        # Stop the workflow from a separate task, as awaits here may be interrupted
+        asyncio.ensure_future(handler.cancel_run())
+        raise
+
+
+async def _stream_run(
+    raw_request: Request,
+    agent: FunctionCallingAgent,
+    deltas: AsyncIterator[tuple[dict, str | None]],
+    session: Session[list[ChatMessage]] | None,
+    screening: Screening,
+) -> AsyncIterator[str]:
+    try:
+        async for delta, finish_reason in stream_until_disconnect(raw_request, deltas):
+            with agent.timer.span(SERIALIZE):
+                chunk = {"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                data = f"data: {json.dumps(chunk)}\n\n"
+            yield data
+    except ClientDisconnected:
+        record_cancelled_run(agent.total_tokens)
+        return
+    except (asyncio.CancelledError, GeneratorExit):
+        # The server noticed the disconnect first and closed the response
+        record_cancelled_run(agent.total_tokens)
+        raise
+
+    record_completed_run(agent.total_tokens)
+    if session is not None and screening.tripped is None:
+        session.value = agent.memory.get_all()
+    yield f": server-timing {agent.timer.header_value()}\n\n"
+    yield "data: [DONE]\n\n"
+
+
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    raw_request: Request,
+    request_timeout: str | None = Header(default=None, alias=DEADLINE_HEADER),
+    profile: bool = Query(default=False),
+    profile_token: str | None = Header(default=None, alias=PROFILE_TOKEN_HEADER),
+):
     """
     Chat endpoint that accepts a message and returns the agent's response.
 
+    The request budget comes from ``request.timeout`` or the X-Request-Timeout
+    header and is propagated to every workflow step, LLM call and tool call. The
+    run waits for its tenant's turn (X-Tenant-Id header or API key) in the
+    interactive lane, or the batch one with ``X-Priority: batch``; the wait counts
+    towards the budget. If the client disconnects, the run (with its pending LLM
+    and tool calls) is cancelled.
+    With ``request.conversation_id`` the server keeps the conversation history, so
+    each turn sends only its new message. With SEMANTIC_CACHE on, a question
+    without a conversation that is similar enough to one answered before for the
+    tenant gets the cached answer without a run (X-Semantic-Cache: hit), once the
+    message passed the guardrail; the answers of other runs are cached. With SAFETY_CLASSIFIER set, the message is screened while the run
+    starts and the answer once it is done; a flagged one gets a refusal with the
+    ``content_filter`` finish reason. The Server-Timing response header breaks
+    the request down into queue, LLM, tool, serialization and framework time, with
+    LLM and tool time per iteration.
+
     Args:
         request: ChatRequest containing the user message
+        raw_request: The underlying HTTP request, used to detect client disconnects
+        request_timeout: Value of the X-Request-Timeout header (seconds)
+        profile: Add a cProfile report of the run to the response (``?profile=1``)
+        profile_token: Value of the X-Profile-Token header; must match PROFILE_TOKEN to profile
 
     Returns:
-        JSON response with full conversation history including tool calls
+        JSON response with full conversation history including tool calls,
+        or a text/event-stream of chunks when ``request.stream`` is set
     """
     global get_agent
 
+    timer = RequestTimer.from_headers(raw_request.headers)
+
     if get_agent is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
+    if profile and not profiling_allowed(profile_token):
+        raise HTTPException(status_code=403, detail="Profiling needs a valid X-Profile-Token")
+    if profile and request.stream:
+        raise HTTPException(status_code=400, detail="Streamed requests cannot be profiled")
+
+    settings = get_settings()
+    deadline = Deadline.from_request(
+        header_value=request_timeout,
+        field_value=request.timeout,
+        default=settings.request_timeout,
+        maximum=settings.max_request_timeout,
+    )
+
+    messages = [{"role": "user", "content": request.message}]
+    tenant = get_scheduler().tenant(raw_request.headers)
+    lane = request_lane(raw_request.headers)
+
+    screening = Screening(get_guardrail(), messages)
+    # Answers depend on the history of a conversation, and profiled requests always run
+    cache = get_semantic_cache() if request.conversation_id is None and not profile else None
+    hit = await cache.lookup(request.message, tenant) if cache is not None else None
+    # A flagged message is refused by the run below, with the same screen
+    if hit is not None and not hit.audit and await screening.input_passed():
+        if request.stream:
+            return StreamingResponse(
+                cached_event_stream(hit, timer), media_type="text/event-stream", headers={CACHE_HEADER: HIT}
+            )
+        return cached_response(request.message, hit, timer)
+
+    if request.stream:
+        return StreamingResponse(
+            stream_chat(
+                raw_request,
+                messages,
+                deadline,
+                timer,
+                tenant,
+                lane,
+                screening,
+                request.conversation_id,
+                cache,
+                hit,
+            ),
+            media_type="text/event-stream",
+            headers={CACHE_HEADER: MISS} if cache is not None else None,
+        )
+
+    async def run_in_slot(agent: FunctionCallingAgent):
+        async with get_scheduler().slot(tenant, lane, timer):
+            return await screening.run(
+                run_workflow(agent, messages, deadline), lambda _: run_answer(agent.memory.get_all())[0]
+            )
 
     try:
-        agent = get_agent()
-        messages = [{"role": "user", "content": request.message}]
+        async with conversation_turn(request.conversation_id, deadline, timer) as (
+            agent,
+            session,
+        ):
+            with profile_request() if profile else contextlib.nullcontext() as profiled:
+                result = await run_until_disconnect(
+                    raw_request,
+                    asyncio.wait_for(
+                        run_in_slot(agent), timeout=deadline.remaining() + settings.deadline_grace
+                    ),
+                )
+            record_completed_run(agent.total_tokens)
+            if session is not None:
+                # Answer with this turn only; earlier turns are already with the client
+                turn_start = len(session.value or [])
+                session.value = agent.memory.get_all()
+                result = {**result, "messages": session.value[turn_start:]}
+            if cache is not None:
+                await cache.store(
+                    request.message, *run_answer(agent.memory.get_all()), audited=hit, tenant=tenant
+                )
+
+        with timer.span(SERIALIZE):
+            response_messages = format_response_messages((result or {}).get("messages", []))
+
+        response = {"messages": response_messages, "finish_reason": "stop"}
+        if request.conversation_id is not None:
+            response["conversation_id"] = request.conversation_id
+        if profile:
+            response["profile"] = profiled.report
+        json_response = timed_json_response(response, timer)
+        if cache is not None:
+            json_response.headers[CACHE_HEADER] = MISS
+        return json_response
+
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except GuardrailTripped:
+        record_completed_run(agent.total_tokens)
+        response = refusal(request.message)
+        if request.conversation_id is not None:
+            response["conversation_id"] = request.conversation_id
+        return timed_json_response(response, timer)
+    except ClientDisconnected:
+        record_cancelled_run(agent.total_tokens)
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except (WorkflowTimeoutError, asyncio.TimeoutError):
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error processing request: {str(e)}"
+        )
 
-        result = await agent.run(input=messages)
 
-        response_messages = []
+def conversation_turns(tenant: str, lane: str) -> TurnRunner:
+    """Turn runner of one /ws/chat connection, which keeps the conversation's history.
 
-        if result and "messages" in result and len(result["messages"]) > 0:
-            for message in result["messages"]:
-                if getattr(message, "role", None) == "system":
-                    continue
-                item = _message_to_response_dict(message)
-                if item is not None:
-                    response_messages.append(item)
+    A turn continues the history of the turns completed before it; a cancelled or
+    failed turn, or one withheld by the guardrail, leaves it unchanged. Turns are
+    scheduled as runs of ``tenant`` in ``lane``.
+    """
+    history: list[ChatMessage] | None = None
 
-        return {"messages": response_messages, "finish_reason": "stop"}
+    def run_turn(message: str, deadline: Deadline, timer: RequestTimer):
+        agent = get_agent(
+            timeout=deadline.remaining() + get_settings().deadline_grace,
+            chat_history=history,
+            timer=timer,
+        )
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error processing request: {str(e)}"
+        async def deltas() -> AsyncIterator[tuple[dict, str | None]]:
+            nonlocal history
+            messages = [{"role": "user", "content": message}]
+            screening = Screening(get_guardrail(), messages)
+            run = screening.stream(stream_deltas(agent, messages, deadline))
+            async with contextlib.aclosing(run):
+                async for delta in run:
+                    yield delta
+            if screening.tripped is None:
+                history = agent.memory.get_all()
+
+        return get_scheduler().stream_in_slot(tenant, lane, timer, deltas()), agent
+
+    return run_turn
+
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    """
+    Chat over a persistent WebSocket; the conversation stays with the connection.
+
+    Each turn sends only its new message and gets the deltas of the run (tool calls,
+    tool outputs, the answer) as compact JSON frames; a ``{"type": "cancel"}`` frame
+    cancels the running turn. See agent_commons.websocket_chat for the frames.
+    """
+    if get_agent is None:
+        await websocket.close(code=1013, reason="Agent not initialized")
+        return
+    scheduler = get_scheduler()
+    await serve_chat_socket(
+        websocket, conversation_turns(scheduler.tenant(websocket.headers), request_lane(websocket.headers))
+    )
+
+
+async def run_job(run: JobRun) -> AsyncIterator[tuple[dict, str | None]]:
+    """Job runner of /jobs: streams the run as stream_deltas does; its result is the /chat response."""
+    conversation_id = run.request.get("conversation_id")
+    async with conversation_turn(conversation_id, run.deadline, run.timer) as (agent, session):
+        run.usage = agent
+        turn_start = len(session.value or []) if session is not None else 0
+        messages = [{"role": "user", "content": run.request["message"]}]
+        screening = Screening(get_guardrail(), messages)
+        deltas = get_scheduler().stream_in_slot(
+            run.request.get("tenant", DEFAULT_TENANT),
+            run.request.get("lane", BATCH),
+            run.timer,
+            screening.stream(stream_deltas(agent, messages, run.deadline)),
         )
+        async with contextlib.aclosing(deltas):
+            async for delta in deltas:
+                yield delta
+        history = agent.memory.get_all()
+        if session is not None and screening.tripped is None:
+            session.value = history
+
+    if screening.tripped is not None:
+        run.result = refusal(run.request["message"])
+    else:
+        with run.timer.span(SERIALIZE):
+            response_messages = format_response_messages(history[turn_start:])
+        run.result = {"messages": response_messages, "finish_reason": "stop"}
+    if conversation_id is not None:
+        run.result["conversation_id"] = conversation_id
+
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id) if jobs is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest, raw_request: Request):
+    """
+    Queue an agent run and return its job at once, for runs longer than a request may last.
+
+    Poll ``GET /jobs/{id}`` for the status and, once it succeeded, the /chat response;
+    follow ``GET /jobs/{id}/events`` or cancel it with ``DELETE /jobs/{id}``. With
+    ``request.conversation_id`` the job continues that conversation. Jobs run in the
+    scheduler's batch lane unless sent with ``X-Priority: interactive``.
+
+    Args:
+        request: JobRequest containing the user message
+        raw_request: The underlying HTTP request, whose headers tell the tenant
+
+    Returns:
+        The queued job (202, with its URL in the Location header), or 429 when the
+        queue is full
+    """
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    try:
+        job = jobs.submit(
+            {
+                **request.model_dump(),
+                "tenant": get_scheduler().tenant(raw_request.headers),
+                "lane": request_lane(raw_request.headers, default=BATCH),
+            }
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return a job's status and, once it succeeded, its result (the /chat response)."""
+    return _get_job(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str, last_event_id: str | None = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    Follow a job as Server-Sent Events: the /chat stream chunks of its run, then the
+    finished job. A client reconnecting with Last-Event-ID gets only what it missed.
+    """
+    job = _get_job(job_id)
+    return StreamingResponse(job_event_stream(jobs, job, last_event_id), media_type="text/event-stream")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job (409 once it is finished) and return it."""
+    job = _get_job(job_id)
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return (await jobs.cancel(job_id)).to_dict()
 
 
 @app.get("/health")
@@ -175,6 +688,12 @@ async def health():
     return {"status": "healthy", "agent_initialized": get_agent is not None}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose service metrics (cancelled runs, tokens, ...) in the Prometheus text format."""
+    return REGISTRY.render()
+
+
 if __name__ == "__main__":
     import uvicorn
 
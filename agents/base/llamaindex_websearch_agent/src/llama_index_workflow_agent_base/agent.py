@@ -1,36 +1,98 @@
-from typing import Callable
+from typing import Callable, Sequence
 
-from llama_index.core.tools import FunctionTool
+import httpx
+from llama_index.core.llms import ChatMessage
 from llama_index.llms.openai_like import OpenAILike
 
-from llama_index_workflow_agent_base.utils import get_env_var
-from llama_index_workflow_agent_base.tools import dummy_web_search
+from agent_commons.cascade import ModelCascade
+from agent_commons.cassette import get_cassette
+from agent_commons.rate_limit import get_rate_limiter
+from agent_commons.settings import SettingsError, get_settings
+from agent_commons.speculation import speculative_tool_names
+from agent_commons.timing import RequestTimer
+from agent_commons.tool_registry import tool_names_from_env
+from llama_index_workflow_agent_base.registry import build_tool_registry
 from llama_index_workflow_agent_base.workflow import FunctionCallingAgent
 
+# Workflow timeout (seconds) for runs started without a request deadline
+DEFAULT_WORKFLOW_TIMEOUT = 120.0
+
+
+def _llm_http_clients(base_url: str, http_clients: dict) -> dict:
+    """HTTP clients of the OpenAILike at ``base_url``.
+
+    ``http_clients`` (a cassette's or a transport's) when set, else clients paced by
+    the rate limiter of the backend when it has limits (see agent_commons.rate_limit).
+    """
+    if http_clients:
+        return http_clients
+    limiter = get_rate_limiter(base_url)
+    if limiter is None:
+        return {}
+    return {"http_client": limiter.http_client(), "async_http_client": limiter.async_http_client()}
+
 
 def get_workflow_closure(
     model_id: str = None,
     base_url: str = None,
     api_key: str = None,
+    return_direct_template: str = "{content}",
+    tool_names: Sequence[str] | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
 ) -> Callable:
-    """Workflow generator closure."""
+    """Workflow generator closure.
+
+    Tools come from the tool registry, which builds their schemas and validators
+    once; ``tool_names`` (or the TOOLS env var) selects a subset by name. Tools
+    created with ``return_direct=True`` end the run with their output (formatted
+    with return_direct_template) instead of another LLM call. With CASSETTE_MODE
+    set, LLM and tool traffic is recorded to or replayed from the cassette (see
+    agent_commons.cassette). With CASCADE_MODEL_ID set, LLM calls go to that small
+    model first and escalate to ``model_id`` when needed (see agent_commons.cascade).
+    LLM calls are streamed, their text written to the workflow stream as
+    TokenDeltaEvents. With SPECULATIVE_TOOLS on (off while a cassette is in use),
+    tool calls, except those of SIDE_EFFECT_TOOLS, start as soon as their arguments
+    are complete (see agent_commons.speculation). With RATE_LIMIT_* set, requests to each LLM backend
+    are paced to its limits (see agent_commons.rate_limit). ``transport`` replaces
+    the network under the async LLM client, e.g. with an in-process fake LLM
+    (benchmarks/_fake_llm.py).
+    """
 
-    if not api_key:
-        api_key = get_env_var("API_KEY")
-    if not base_url:
-        base_url = get_env_var("BASE_URL")
-    if not model_id:
-        model_id = get_env_var("MODEL_ID")
+    settings = get_settings()
+    api_key = api_key or settings.api_key
+    base_url = base_url or settings.base_url
+    model_id = model_id or settings.model_id
+    if not base_url or not model_id:
+        raise SettingsError("BASE_URL and MODEL_ID must be set (environment, .env or SETTINGS_FILE).")
 
     is_local = any(host in base_url for host in ["localhost", "127.0.0.1"])
 
     if not is_local and not api_key:
         raise ValueError("API_KEY is required for non-local environments.")
 
-    tools = [FunctionTool.from_defaults(dummy_web_search)]
+    registry = build_tool_registry()
+    tools = [spec.tool for spec in registry.subset(tool_names or tool_names_from_env())]
     default_system_prompt = "You are a helpful AI assistant, please respond to the user's query to the best of your ability!"
     context_window = 4096
 
+    http_clients = {}
+    cassette = get_cassette()
+    if cassette is not None:
+        http_clients = {
+            "http_client": cassette.http_client(),
+            "async_http_client": cassette.async_http_client(),
+        }
+    if transport is not None:
+        http_clients["async_http_client"] = httpx.AsyncClient(transport=transport)
+    # Replayed tool calls are answered by the cassette, never started early
+    speculative_tools = (
+        speculative_tool_names((tool.metadata.get_name() for tool in tools), settings)
+        if cassette is None
+        else frozenset()
+    )
+    # Streamed responses report their token usage in the last chunk only when asked to
+    stream_options = {"stream_options": {"include_usage": True}}
+
     client = OpenAILike(
         model=model_id,
         api_key=api_key,
@@ -38,17 +100,55 @@ def get_workflow_closure(
         context_window=context_window,  # Bypass model name validation for custom models
         is_chat_model=True,  # Use chat completions endpoint instead of completions
         is_function_calling_model=True,  # Enable function calling/tools support
+        additional_kwargs=stream_options,
+        **_llm_http_clients(base_url, http_clients),
     )
 
-    def get_agent(system_prompt: str = default_system_prompt) -> FunctionCallingAgent:
-        """Get compiled workflow with overwritten system prompt, if provided"""
+    cascade = ModelCascade.from_settings(settings)
+    small_client = None
+    if cascade is not None:
+        small_client = OpenAILike(
+            model=cascade.small_model,
+            api_key=api_key,
+            api_base=cascade.small_base_url or base_url,
+            context_window=context_window,
+            is_chat_model=True,
+            is_function_calling_model=True,
+            logprobs=cascade.needs_logprobs or None,
+            top_logprobs=1 if cascade.needs_logprobs else 0,
+            additional_kwargs=stream_options,
+            **_llm_http_clients(cascade.small_base_url or base_url, http_clients),
+        )
+
+    def get_agent(
+        system_prompt: str = default_system_prompt,
+        timeout: float | None = DEFAULT_WORKFLOW_TIMEOUT,
+        chat_history: list[ChatMessage] | None = None,
+        timer: RequestTimer | None = None,
+    ) -> FunctionCallingAgent:
+        """Get compiled workflow with overwritten system prompt, if provided.
+
+        ``timeout`` is the hard limit of the whole workflow run; callers with a
+        request deadline pass its remaining budget (plus a grace period).
+        ``chat_history`` continues a stored conversation (see sessions.py); its
+        system prompt is kept and ``system_prompt`` ignored. LLM and tool calls
+        are timed on ``timer`` (for the Server-Timing header) when one is given.
+        """
 
         # Create instance of compiled workflow
         return FunctionCallingAgent(
             llm=client,
             tools=tools,
             system_prompt=system_prompt,
-            timeout=120,
+            return_direct_template=return_direct_template,
+            registry=registry,
+            cassette=cassette,
+            timer=timer,
+            chat_history=chat_history,
+            cascade=cascade,
+            small_llm=small_client,
+            speculative_tools=speculative_tools,
+            timeout=timeout,
             verbose=False,
         )
 
@@ -0,0 +1,57 @@
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from pydantic import PrivateAttr
+
+
+class TokenWindowMemory(ChatMemoryBuffer):
+    """ChatMemoryBuffer whose ``get`` finds the token window in one pass.
+
+    ChatMemoryBuffer.get joins and re-tokenizes the whole remaining history for every
+    message it drops: quadratic in the history length, on the event loop, with a
+    transcript-sized string allocated per step. This memory tokenizes each message
+    once, caches its count and walks the history with running sums; the window it
+    returns is the same, except that counts are summed per message instead of over
+    the joined text (a token or so per message apart).
+    """
+
+    # id(message) -> (message, token count); the message is kept so its id stays unique
+    _token_counts: dict[int, tuple[ChatMessage, int]] = PrivateAttr(default_factory=dict)
+
+    def _message_tokens(self, message: ChatMessage, counts: dict[int, tuple[ChatMessage, int]]) -> int:
+        cached = self._token_counts.get(id(message))
+        if cached is None or cached[0] is not message:
+            cached = (message, len(self.tokenizer_fn(str(message.content))))
+        counts[id(message)] = cached
+        return cached[1]
+
+    def get(self, input: str | None = None, initial_token_count: int = 0, **kwargs) -> list[ChatMessage]:
+        """Most recent messages that fit the token limit, not starting with an assistant or tool message."""
+        chat_history = self.get_all()
+        if initial_token_count > self.token_limit:
+            raise ValueError("Initial token count exceeds token limit")
+        if not chat_history:
+            return []
+
+        # suffix_tokens[i]: tokens of chat_history[i:]
+        suffix_tokens = [0] * (len(chat_history) + 1)
+        counts: dict[int, tuple[ChatMessage, int]] = {}
+        for index in range(len(chat_history) - 1, -1, -1):
+            suffix_tokens[index] = suffix_tokens[index + 1] + self._message_tokens(chat_history[index], counts)
+        # Only messages still in the chat store stay cached, so the cache is bounded by the history
+        self._token_counts = counts
+
+        start = 0
+        while suffix_tokens[start] + initial_token_count > self.token_limit and start < len(chat_history) - 1:
+            start += 1
+            # The window cannot start with an assistant message, nor with tool outputs
+            # separated from the assistant message that requested them
+            while start < len(chat_history) - 1 and chat_history[start].role in (
+                MessageRole.TOOL,
+                MessageRole.ASSISTANT,
+            ):
+                start += 1
+
+        if suffix_tokens[start] + initial_token_count > self.token_limit:
+            # A single message over the limit: let the LLM report it
+            return chat_history[-1:]
+        return chat_history[start:]
@@ -0,0 +1,111 @@
+import copy
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterable
+
+from llama_index.core.tools import FunctionTool
+from llama_index.core.tools.types import (
+    AsyncBaseTool,
+    BaseTool,
+    ToolMetadata,
+    ToolOutput,
+    adapt_to_async_tool,
+)
+
+from agent_commons.tool_registry import (
+    ToolRegistry,
+    ToolSpec,
+    make_tool_spec,
+    tool_modules_from_env,
+)
+from agent_commons.vector_index import get_vector_index
+from agent_commons.web_search import get_web_search
+from llama_index_workflow_agent_base import TOOLS
+from llama_index_workflow_agent_base.tools import document_search, web_search
+
+# Entry point group under which separately installed packages can publish LlamaIndex tools
+ENTRY_POINT_GROUP = "agentic_starter_kits.llama_index_tools"
+
+BUILTIN_TOOLS = TOOLS
+
+
+@dataclass
+class FrozenToolMetadata(ToolMetadata):
+    """ToolMetadata serving an OpenAI tool definition built once instead of per LLM call."""
+
+    openai_tool: dict = field(default_factory=dict, repr=False)
+
+    def get_parameters_dict(self) -> dict:
+        return self.openai_tool["function"]["parameters"]
+
+    def to_openai_tool(self, skip_length_check: bool = False) -> dict[str, Any]:
+        # OpenAI LLMs set "strict" and "additionalProperties" on the returned dict in
+        # place; the values are the same on every call for a given client.
+        return self.openai_tool
+
+
+class PrecompiledTool(AsyncBaseTool):
+    """Wrap a tool so the LLM reads its precompiled schema; calls go to the wrapped tool."""
+
+    def __init__(self, tool: BaseTool, metadata: FrozenToolMetadata) -> None:
+        self.tool = adapt_to_async_tool(tool)
+        self._metadata = metadata
+
+    @property
+    def metadata(self) -> ToolMetadata:
+        return self._metadata
+
+    def call(self, *args: Any, **kwargs: Any) -> ToolOutput:
+        return self.tool.call(*args, **kwargs)
+
+    async def acall(self, *args: Any, **kwargs: Any) -> ToolOutput:
+        return await self.tool.acall(*args, **kwargs)
+
+
+def tool_spec(tool: BaseTool) -> ToolSpec[BaseTool]:
+    """Build the frozen spec (OpenAI schema, validator) of a LlamaIndex tool.
+
+    The spec holds a PrecompiledTool wrapping ``tool``, so agents given
+    ``spec.tool`` never regenerate the schema from the function signature.
+    """
+    metadata = tool.metadata
+    function = metadata.to_openai_tool()["function"]
+    spec = make_tool_spec(
+        tool,
+        name=function["name"],
+        description=function["description"],
+        parameters=function["parameters"],
+        args_schema=metadata.fn_schema,
+        return_direct=metadata.return_direct,
+    )
+    frozen_metadata = FrozenToolMetadata(
+        description=metadata.description,
+        name=metadata.name,
+        fn_schema=metadata.fn_schema,
+        return_direct=metadata.return_direct,
+        # Own copy: the LLM may update it in place, the spec stays as registered
+        openai_tool=copy.deepcopy(spec.openai_tool),
+    )
+    return replace(spec, tool=PrecompiledTool(tool, frozen_metadata))
+
+
+def build_tool_registry(paths: Iterable[str] | None = None) -> ToolRegistry[BaseTool]:
+    """Registry of the built-in tools plus discovered ones, frozen.
+
+    Args:
+        paths: Extra "module:attribute" tool paths. Defaults to the TOOL_MODULES env var.
+
+    Returns:
+        The frozen tool registry.
+    """
+    registry = ToolRegistry(tool_spec)
+    registry.register_all(BUILTIN_TOOLS)
+    if get_web_search() is not None:
+        # Real search is only offered when a provider is configured (SEARCH_* env vars)
+        registry.register(FunctionTool.from_defaults(async_fn=web_search))
+    if get_vector_index() is not None:
+        # Document retrieval is only offered when an index is configured (VECTOR_INDEX_PATH)
+        registry.register(FunctionTool.from_defaults(async_fn=document_search))
+    registry.discover(
+        ENTRY_POINT_GROUP, tool_modules_from_env() if paths is None else paths
+    )
+    return registry.freeze()
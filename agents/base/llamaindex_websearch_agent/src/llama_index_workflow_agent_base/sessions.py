@@ -0,0 +1,46 @@
+import json
+
+from llama_index.core.llms import ChatMessage
+
+from agent_commons.session_store import SessionStore
+
+# Rough per-message overhead (role, ids, object headers) added to the content length
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+def history_size(history: list[ChatMessage]) -> int:
+    """Estimated in-memory size of a chat history, in bytes."""
+    return sum(
+        MESSAGE_OVERHEAD_BYTES + len(message.content or "") + len(message.additional_kwargs) * 100
+        for message in history
+    )
+
+
+def dump_history(history: list[ChatMessage]) -> str:
+    return json.dumps([message.model_dump(mode="json") for message in history])
+
+
+def load_history(data: str) -> list[ChatMessage]:
+    return [ChatMessage.model_validate(message) for message in json.loads(data)]
+
+
+def create_session_store() -> SessionStore[list[ChatMessage]]:
+    """Store of per-conversation chat histories configured from the SESSION_* settings.
+
+    Each conversation keeps its messages (system prompt, user turns, tool calls and
+    outputs, answers) between turns, so a turn only adds the new user message instead
+    of re-parsing and re-adding the whole transcript.
+    """
+    return SessionStore.from_env(history_size, dump_history, load_history)
+
+
+def new_messages(messages: list[dict]) -> list[dict]:
+    """Messages of a payload that follow its last assistant or tool message.
+
+    Lets clients that resend the whole transcript use a session: only the new
+    user input is added to the stored history.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index]["role"] in ("assistant", "tool"):
+            return messages[index + 1 :]
+    return [message for message in messages if message["role"] != "system"]
@@ -0,0 +1,128 @@
+import json
+
+from llama_index.core.llms import ChatMessage
+from llama_index.core.tools import ToolSelection
+from llama_index.core.workflow import Event, StopEvent
+
+from llama_index_workflow_agent_base.workflow import (
+    InputEvent,
+    TokenDeltaEvent,
+    TokenResetEvent,
+    ToolCallEvent,
+)
+
+
+def _message_text(message: ChatMessage) -> str:
+    """Text of the first block of a LlamaIndex ChatMessage (empty if it has none)."""
+    return (message.blocks[0].text or "") if message.blocks else ""
+
+
+class EventFormatter:
+    """Turns the events of one ``handler.stream_events()`` run into choice deltas.
+
+    LLM text is sent token by token as the LLM streams it, tool calls when the LLM
+    step requests them, tool outputs when the next LLM step receives them and the
+    final answer when the workflow stops; when the answer was already streamed,
+    only its finish reason is sent then. When an LLM step runs out of time after
+    streaming text, a reset delta tells the client to drop that text before the
+    step's fallback answer (see FunctionCallingAgent._answer_now).
+
+    Every InputEvent carries the whole chat history, but the only new messages in it
+    are the outputs of the tool calls of the previous ToolCallEvent, appended at its
+    end. The formatter remembers how many calls that was and reads just as many
+    messages from the end of the history, so formatting a run costs time in the
+    number of new messages rather than in the history length. Use one formatter
+    per run.
+
+    Subclasses change the shape of the deltas by overriding ``token_delta``,
+    ``reset_delta``, ``tool_call_deltas``, ``tool_output_delta``, ``answer_delta`` and
+    ``finish_delta``.
+    """
+
+    def __init__(self) -> None:
+        # Tool outputs the next InputEvent brings
+        self._pending_outputs = 0
+        # Whether the current LLM step streamed text
+        self._streamed = False
+
+    def format(self, event: Event) -> list[tuple[dict, str | None]]:
+        """Choice deltas of one event of the run.
+
+        Args:
+            event: An event written to the workflow stream.
+
+        Returns:
+            List of (delta, finish_reason) tuples; empty when there is nothing to send.
+        """
+        if isinstance(event, TokenDeltaEvent):
+            self._streamed = True
+            return [self.token_delta(event.delta)]
+
+        if isinstance(event, TokenResetEvent):
+            self._streamed = False
+            return [self.reset_delta()]
+
+        if isinstance(event, ToolCallEvent):
+            self._pending_outputs = len(event.tool_calls)
+            self._streamed = False
+            return self.tool_call_deltas(event.tool_calls)
+
+        if isinstance(event, InputEvent):
+            pending, self._pending_outputs = self._pending_outputs, 0
+            self._streamed = False
+            if not pending:
+                return []
+            history = event.input
+            return [
+                self.tool_output_delta(message)
+                for message in history[max(len(history) - pending, 0) :]
+                if message.role == "tool"
+            ]
+
+        if isinstance(event, StopEvent) and isinstance(event.result, dict):
+            if event.result.get("response") is None:
+                return []
+            return [self.finish_delta(event) if self._streamed else self.answer_delta(event)]
+
+        return []
+
+    def token_delta(self, text: str) -> tuple[dict, str | None]:
+        """Delta of a slice of streamed LLM text."""
+        return {"role": "assistant", "content": text}, None
+
+    def reset_delta(self) -> tuple[dict, str | None]:
+        """Delta telling the client to drop the text streamed so far by the current LLM step."""
+        return {"role": "assistant", "content": "", "reset": True}, None
+
+    def tool_call_deltas(self, tool_calls: list[ToolSelection]) -> list[tuple[dict, str | None]]:
+        """All tool calls of one LLM step, as a single ``tool_calls`` delta."""
+        deltas = [
+            {
+                "index": index,
+                "id": tool_call.tool_id,
+                "type": "function",
+                "function": {
+                    "name": tool_call.tool_name,
+                    "arguments": json.dumps(tool_call.tool_kwargs),
+                },
+            }
+            for index, tool_call in enumerate(tool_calls)
+        ]
+        return [({"role": "assistant", "tool_calls": deltas}, "tool_calls")]
+
+    def tool_output_delta(self, message: ChatMessage) -> tuple[dict, str | None]:
+        """Delta of a tool output message."""
+        return {
+            "role": "tool",
+            "tool_call_id": message.additional_kwargs.get("tool_call_id", ""),
+            "name": message.additional_kwargs.get("name", ""),
+            "content": _message_text(message),
+        }, None
+
+    def answer_delta(self, event: StopEvent) -> tuple[dict, str | None]:
+        """Delta of the final answer, from a StopEvent carrying a response."""
+        return {"role": "assistant", "content": _message_text(event.result["response"].message)}, "stop"
+
+    def finish_delta(self, event: StopEvent) -> tuple[dict, str | None]:
+        """Delta ending a streamed final answer."""
+        return {"role": "assistant"}, "stop"
@@ -1,3 +1,7 @@
+from agent_commons.vector_index import document_search_text
+from agent_commons.web_search import web_search_text
+
+
 def dummy_web_search(query: str) -> list[str]:
     """
     Web search tool that return static list of strings.
@@ -9,3 +13,29 @@ def dummy_web_search(query: str) -> list[str]:
         Dummy list of web search results.
     """
     return ["RedHat"]
+
+
+async def web_search(query: str) -> str:
+    """
+    Search the web for up-to-date information about a topic.
+
+    Args:
+        query: The search query.
+
+    Returns:
+        The top results (title, URL and snippet), truncated to fit the context.
+    """
+    return await web_search_text(query)
+
+
+async def document_search(query: str) -> str:
+    """
+    Search the internal document collection for passages relevant to a question.
+
+    Args:
+        query: What to look for, in natural language.
+
+    Returns:
+        The most relevant passages (title, source and text), truncated to fit the context.
+    """
+    return await document_search_text(query)
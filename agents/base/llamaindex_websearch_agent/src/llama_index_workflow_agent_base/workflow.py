@@ -1,7 +1,10 @@
-from typing import Any, List
+import asyncio
+import contextlib
+import time
+from typing import Any, Callable, Iterable, List
 
+from llama_index.core.base.llms.types import ChatResponse
 from llama_index.core.llms.function_calling import FunctionCallingLLM
-from llama_index.core.memory import ChatMemoryBuffer
 from llama_index.core.tools import ToolSelection, ToolOutput
 from llama_index.core.tools.types import BaseTool
 from llama_index.core.llms import ChatMessage
@@ -14,13 +17,34 @@ from llama_index.core.workflow import (
     step,
 )
 
+from agent_commons.cascade import ModelCascade
+from agent_commons.cassette import Cassette, CassetteMismatch
+from agent_commons.deadline import ANSWER_NOW_PROMPT, DEADLINE_EXCEEDED_ANSWER, Deadline
+from agent_commons.guardrails import input_screened
+from agent_commons.speculation import ToolSpeculator
+from agent_commons.timing import LLM, TOOL, RequestTimer
+from agent_commons.tool_registry import ToolArgumentsError, ToolRegistry
+from llama_index_workflow_agent_base.memory import TokenWindowMemory
+
 
 class InputEvent(Event):
     input: list[ChatMessage]
+    deadline: Deadline | None = None
 
 
 class ToolCallEvent(Event):
     tool_calls: list[ToolSelection]
+    deadline: Deadline | None = None
+
+
+class TokenDeltaEvent(Event):
+    """Text generated by the LLM, written to the stream as it arrives."""
+
+    delta: str
+
+
+class TokenResetEvent(Event):
+    """Discards the text streamed by an LLM call that ran out of time; its fallback answer follows."""
 
 
 class FunctionCallingAgent(Workflow):
@@ -30,27 +54,216 @@ class FunctionCallingAgent(Workflow):
         llm: FunctionCallingLLM | None = None,
         tools: List[BaseTool] | None = None,
         system_prompt: str | None = None,
+        return_direct_template: str = "{content}",
+        registry: ToolRegistry | None = None,
+        cassette: Cassette | None = None,
+        timer: RequestTimer | None = None,
+        chat_history: list[ChatMessage] | None = None,
+        cascade: ModelCascade | None = None,
+        small_llm: FunctionCallingLLM | None = None,
+        speculative_tools: Iterable[str] = (),
         **kwargs: Any,
     ) -> None:
         super().__init__(*args, **kwargs)
         self.tools = tools or []
+        # Looked up on every tool call, so built once per agent instead of per round
+        self.tools_by_name = {tool.metadata.get_name(): tool for tool in self.tools}
+        # Optional tool registry whose compiled validators check tool call arguments
+        self.registry = registry
+        # Optional cassette recording tool calls, or answering them in replay mode
+        self.cassette = cassette
+        # Optional request timer; LLM and tool calls are timed on it for the Server-Timing header
+        self.timer = timer
+        # Format of the final answer when a round only called return_direct tools
+        self.return_direct_template = return_direct_template
 
         self.llm = llm
-        self.memory = ChatMemoryBuffer.from_defaults(llm=self.llm)
+        # Optional cascade: tool-calling LLM calls try small_llm first, escalating to llm
+        self.cascade = cascade if small_llm is not None else None
+        self.small_llm = small_llm
+        # Tools whose calls start as soon as their arguments are complete in the
+        # streamed LLM response (see agent_commons.speculation); none by default
+        self.speculative_tools = frozenset(speculative_tools)
+        # Tool calls of the last LLM response already started while it streamed, by call id
+        self.speculative_calls: dict[str, asyncio.Future] = {}
+        # History of an ongoing conversation (its system prompt included); copied, as
+        # the memory appends to the list it is given
+        self.memory = TokenWindowMemory.from_defaults(
+            chat_history=list(chat_history or []), llm=self.llm
+        )
 
-        if system_prompt:
+        if system_prompt and not chat_history:
             system_msg = ChatMessage(role="system", content=system_prompt)
             self.memory.put(system_msg)
 
-        self.sources = []
+        # LLM tokens spent by this run so far; readable even if the run gets cancelled
+        self.total_tokens = 0
+
+    async def _answer_now(
+        self,
+        chat_history: list[ChatMessage],
+        deadline: Deadline,
+        emit: Callable[[str], None],
+        discard: Callable[[], None],
+    ) -> ChatResponse:
+        """Final tool-less LLM call made when the request deadline is close.
+
+        The model is told to answer with what it already has; if not even that fits
+        in the remaining budget, a fixed "out of time" answer is returned. The text a
+        timed-out call streamed is dropped with ``discard`` before that answer.
+        """
+        if not deadline.expired:
+            try:
+                return await asyncio.wait_for(
+                    self._stream_chat(
+                        [*chat_history, ChatMessage(role="system", content=ANSWER_NOW_PROMPT)], emit
+                    ),
+                    timeout=deadline.timeout(),
+                )
+            except asyncio.TimeoutError:
+                discard()
+
+        emit(DEADLINE_EXCEEDED_ANSWER)
+        return ChatResponse(
+            message=ChatMessage(role="assistant", content=DEADLINE_EXCEEDED_ANSWER)
+        )
+
+    async def _stream_chat(
+        self, chat_history: list[ChatMessage], emit: Callable[[str], None]
+    ) -> ChatResponse:
+        """Tool-less LLM call, streaming its text to ``emit``."""
+        response = None
+        async for response in await self.llm.astream_chat(chat_history):
+            if response.delta:
+                emit(response.delta)
+        return response
+
+    def _inspect(self, response: ChatResponse) -> tuple[list, list[float] | None]:
+        """Tool calls and token log-probabilities of a small-model response."""
+        tool_calls = [
+            (call.tool_name, call.tool_kwargs)
+            for call in self.small_llm.get_tool_calls_from_response(
+                response, error_on_no_tool_call=False
+            )
+        ]
+        logprobs = [token[0].logprob for token in response.logprobs or [] if token]
+        return tool_calls, logprobs or None
+
+    async def _achat_with_tools(
+        self,
+        chat_history: list[ChatMessage],
+        emit: Callable[[str], None],
+        speculator: ToolSpeculator | None = None,
+    ) -> ChatResponse:
+        """One tool-calling LLM call, through the cascade when there is one.
+
+        The text of the response is streamed to ``emit``. The small model's text is
+        held until the cascade accepts its response, and dropped when the call
+        escalates to the large model. With a speculator, the tool calls are streamed
+        into it too; the tool calls it started are cancelled if the call fails or is
+        cancelled.
+        """
+        try:
+            if self.cascade is None:
+                return await self._tool_chat(self.llm, chat_history, emit, speculator)
+            user_text = next(
+                (message.content or "" for message in reversed(chat_history) if message.role == "user"),
+                "",
+            )
+            held: list[str] = []
+            small_response = None
+
+            async def call_small() -> ChatResponse:
+                nonlocal small_response
+                small_response = await self._tool_chat(self.small_llm, chat_history, held.append, speculator)
+                return small_response
+
+            response = await self.cascade.arun(
+                user_text,
+                call_small,
+                lambda: self._tool_chat(self.llm, chat_history, emit, speculator),
+                self._inspect,
+                self.registry,
+            )
+            if response is small_response:
+                for delta in held:
+                    emit(delta)
+            return response
+        except BaseException:
+            if speculator is not None:
+                speculator.cancel()
+            raise
+
+    async def _tool_chat(
+        self,
+        llm: FunctionCallingLLM,
+        chat_history: list[ChatMessage],
+        emit: Callable[[str], None],
+        speculator: ToolSpeculator | None,
+    ) -> ChatResponse:
+        # Token log-probabilities (for the cascade's confidence check) are not streamed
+        if llm is self.small_llm and self.cascade.needs_logprobs:
+            response = await llm.achat_with_tools(self.tools, chat_history=chat_history)
+            if response.message.content:
+                emit(response.message.content)
+            return response
+        response = None
+        async for response in await llm.astream_chat_with_tools(self.tools, chat_history=chat_history):
+            if response.delta:
+                emit(response.delta)
+            if speculator is None:
+                continue
+            for call in response.message.additional_kwargs.get("tool_calls", []):
+                if call.function is not None:
+                    speculator.update(id(llm), call.index, call.function.name, call.function.arguments)
+        return response
+
+    async def _speculate_tool(self, name: str, arguments: dict) -> ToolOutput:
+        """Tool call started by the speculator."""
+        tool_call = ToolSelection(tool_id=name, tool_name=name, tool_kwargs=arguments)
+        return await self._call_tool(self.tools_by_name[name], tool_call)
+
+    def _span(self, phase: str) -> contextlib.AbstractContextManager:
+        """Time a block on the request timer, if the run has one."""
+        return self.timer.span(phase) if self.timer else contextlib.nullcontext()
+
+    async def _call_tool(self, tool: BaseTool, tool_call: ToolSelection) -> ToolOutput:
+        """Run a tool call once the run's input passed the guardrail; with a cassette, record
+        it or answer it from the recording."""
+        await input_screened()
+        with self._span(TOOL):
+            return await self._run_tool(tool, tool_call)
+
+    async def _run_tool(self, tool: BaseTool, tool_call: ToolSelection) -> ToolOutput:
+        name = tool.metadata.get_name()
+        if self.cassette is None:
+            return await tool.acall(**tool_call.tool_kwargs)
+        if self.cassette.replaying:
+            record = await self.cassette.areplay_tool(name, tool_call.tool_kwargs)
+            return ToolOutput(
+                content=record.content,
+                tool_name=name,
+                raw_input=tool_call.tool_kwargs,
+                raw_output=record.content,
+                is_error=record.is_error,
+            )
+
+        start = time.perf_counter()
+        tool_output = await tool.acall(**tool_call.tool_kwargs)
+        self.cassette.record_tool(
+            name,
+            tool_call.tool_kwargs,
+            tool_output.content,
+            tool_output.is_error,
+            time.perf_counter() - start,
+        )
+        return tool_output
 
     @step
     async def prepare_chat_history(self, ctx: Context, ev: StartEvent) -> InputEvent:
 
         ctx.write_event_to_stream(ev)
 
-        self.sources = []
-
         user_input_messages = ev.input
 
         for user_input in user_input_messages:
@@ -62,7 +275,8 @@ class FunctionCallingAgent(Workflow):
             self.memory.put(ChatMessage(role=user_input["role"], content=content))
 
         chat_history = self.memory.get()
-        return InputEvent(input=chat_history)
+        # Optional request deadline (agent.run(input=..., deadline=...)), handed on to every step
+        return InputEvent(input=chat_history, deadline=ev.get("deadline"))
 
     @step
     async def handle_llm_input(
@@ -71,35 +285,80 @@ class FunctionCallingAgent(Workflow):
 
         ctx.write_event_to_stream(ev)
 
-        chat_history = ev.input
-        response = await self.llm.achat_with_tools(
-            self.tools, chat_history=chat_history
+        # Copy: the event was already written to the stream and must not change under its readers
+        chat_history = list(ev.input)
+        deadline = ev.deadline
+        speculator = (
+            ToolSpeculator(self._speculate_tool, self.speculative_tools, self.registry)
+            if self.speculative_tools
+            else None
         )
+
+        streamed = False
+
+        def emit(delta: str) -> None:
+            nonlocal streamed
+            streamed = True
+            ctx.write_event_to_stream(TokenDeltaEvent(delta=delta))
+
+        def discard() -> None:
+            # Stream readers drop the text of the timed-out call, so the fallback
+            # answer is not appended to it
+            nonlocal streamed
+            if streamed:
+                ctx.write_event_to_stream(TokenResetEvent())
+                streamed = False
+
+        with self._span(LLM):
+            if deadline is None:
+                response = await self._achat_with_tools(chat_history, emit, speculator)
+            elif deadline.answer_now:
+                response = await self._answer_now(chat_history, deadline, emit, discard)
+            else:
+                try:
+                    response = await asyncio.wait_for(
+                        self._achat_with_tools(chat_history, emit, speculator),
+                        timeout=deadline.step_timeout(),
+                    )
+                except asyncio.TimeoutError:
+                    discard()
+                    response = await self._answer_now(chat_history, deadline, emit, discard)
+
+        self.total_tokens += response.additional_kwargs.get("total_tokens", 0)
         self.memory.put(response.message)
 
         tool_calls = self.llm.get_tool_calls_from_response(
             response, error_on_no_tool_call=False
         )
+        if speculator is not None:
+            self.speculative_calls = speculator.settle(
+                (call.tool_id, call.tool_name, call.tool_kwargs) for call in tool_calls
+            )
 
         chat_history.append(response.message)
 
         if not tool_calls:
             return StopEvent(result={"response": response, "messages": chat_history})
         else:
-            return ToolCallEvent(tool_calls=tool_calls)
+            return ToolCallEvent(tool_calls=tool_calls, deadline=deadline)
 
     @step
-    async def handle_tool_calls(self, ctx: Context, ev: ToolCallEvent) -> InputEvent:
+    async def handle_tool_calls(
+        self, ctx: Context, ev: ToolCallEvent
+    ) -> InputEvent | StopEvent:
 
         ctx.write_event_to_stream(ev)
 
         tool_calls = ev.tool_calls
-        tools_by_name = {tool.metadata.get_name(): tool for tool in self.tools}
+        deadline = ev.deadline
 
         tool_msgs = []
+        # Outputs of tools marked return_direct; if every call in this round is one of
+        # them, the run ends here without another LLM round trip
+        direct_answers = []
 
         for tool_call in tool_calls:
-            tool = tools_by_name.get(tool_call.tool_name)
+            tool = self.tools_by_name.get(tool_call.tool_name)
             if not tool:
                 # Tool doesn't exist - use tool_call name for additional_kwargs
                 additional_kwargs = {
@@ -121,9 +380,34 @@ class FunctionCallingAgent(Workflow):
                 "name": tool.metadata.get_name(),
             }
 
+            if deadline is not None and deadline.answer_now:
+                # Not enough time left; the next LLM call answers with what it has
+                tool_msgs.append(
+                    ChatMessage(
+                        role="tool",
+                        content=f"Tool {tool_call.tool_name} was skipped: the request deadline was reached.",
+                        additional_kwargs=additional_kwargs,
+                    )
+                )
+                continue
+
             try:
-                tool_output = tool(**tool_call.tool_kwargs)
-                self.sources.append(tool_output)
+                spec = self.registry.get(tool_call.tool_name) if self.registry else None
+                if spec is not None:
+                    spec.validate(tool_call.tool_kwargs)
+                # Started while the LLM was streaming, if it was; otherwise start it now
+                speculative = self.speculative_calls.pop(tool_call.tool_id, None)
+                tool_output = await asyncio.wait_for(
+                    speculative or self._call_tool(tool, tool_call),
+                    timeout=deadline.step_timeout() if deadline else None,
+                )
+                if tool.metadata.return_direct and not tool_output.is_error:
+                    direct_answers.append(
+                        self.return_direct_template.format(
+                            content=tool_output.content,
+                            tool_name=tool.metadata.get_name(),
+                        )
+                    )
                 tool_msgs.append(
                     ChatMessage(
                         role="tool",
@@ -131,6 +415,24 @@ class FunctionCallingAgent(Workflow):
                         additional_kwargs=additional_kwargs,
                     )
                 )
+            except ToolArgumentsError as e:
+                tool_msgs.append(
+                    ChatMessage(
+                        role="tool",
+                        content=str(e),
+                        additional_kwargs=additional_kwargs,
+                    )
+                )
+            except CassetteMismatch:
+                raise  # a replayed run that diverged from its recording must fail
+            except asyncio.TimeoutError:
+                tool_msgs.append(
+                    ChatMessage(
+                        role="tool",
+                        content=f"Tool {tool_call.tool_name} timed out: the request deadline was reached.",
+                        additional_kwargs=additional_kwargs,
+                    )
+                )
             except Exception as e:
                 tool_msgs.append(
                     ChatMessage(
@@ -140,8 +442,20 @@ class FunctionCallingAgent(Workflow):
                     )
                 )
 
+        # Speculative calls of skipped tool calls
+        for task in self.speculative_calls.values():
+            task.cancel()
+        self.speculative_calls = {}
+
         for msg in tool_msgs:
             self.memory.put(msg)
 
+        if direct_answers and len(direct_answers) == len(tool_calls):
+            response = ChatResponse(
+                message=ChatMessage(role="assistant", content="\n".join(direct_answers))
+            )
+            self.memory.put(response.message)
+            return StopEvent(result={"response": response, "messages": self.memory.get()})
+
         chat_history = self.memory.get()
-        return InputEvent(input=chat_history)
+        return InputEvent(input=chat_history, deadline=deadline)
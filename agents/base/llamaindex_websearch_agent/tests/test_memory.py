@@ -0,0 +1,63 @@
+from llama_index.core.llms import ChatMessage
+from llama_index.core.memory import ChatMemoryBuffer
+
+from agents.base.llamaindex_websearch_agent.src.llama_index_workflow_agent_base.memory import (
+    TokenWindowMemory,
+)
+
+
+def tokenizer(text: str) -> list[str]:
+    """One token per word, so per-message and joined counts agree."""
+    return text.split()
+
+
+def conversation(turns: int) -> list[ChatMessage]:
+    messages = [ChatMessage(role="system", content="be brief")]
+    for turn in range(turns):
+        messages += [
+            ChatMessage(role="user", content=f"question {turn} " + "word " * turn),
+            ChatMessage(role="assistant", content=None, additional_kwargs={"tool_calls": []}),
+            ChatMessage(role="tool", content=f"tool output {turn}"),
+            ChatMessage(role="assistant", content=f"answer {turn} " + "word " * 3),
+        ]
+    return messages
+
+
+class TestTokenWindowMemory:
+    def test_same_window_as_chat_memory_buffer(self):
+        history = conversation(30)
+        for token_limit in (1, 5, 40, 200, 800, 10_000):
+            expected = ChatMemoryBuffer.from_defaults(
+                chat_history=list(history), token_limit=token_limit, tokenizer_fn=tokenizer
+            ).get()
+            memory = TokenWindowMemory.from_defaults(
+                chat_history=list(history), token_limit=token_limit, tokenizer_fn=tokenizer
+            )
+
+            assert memory.get() == expected
+            assert memory.get(initial_token_count=1) == ChatMemoryBuffer.from_defaults(
+                chat_history=list(history), token_limit=token_limit, tokenizer_fn=tokenizer
+            ).get(initial_token_count=1)
+
+    def test_tokenizes_each_message_once(self):
+        calls = []
+        memory = TokenWindowMemory.from_defaults(
+            chat_history=conversation(10),
+            token_limit=50,
+            tokenizer_fn=lambda text: calls.append(text) or tokenizer(text),
+        )
+
+        memory.get()
+        memory.put(ChatMessage(role="user", content="one more"))
+        memory.get()
+
+        assert len(calls) == len(conversation(10)) + 1
+
+    def test_cache_drops_messages_no_longer_stored(self):
+        memory = TokenWindowMemory.from_defaults(chat_history=conversation(10), token_limit=50, tokenizer_fn=tokenizer)
+        memory.get()
+
+        memory.set(conversation(1))
+        memory.get()
+
+        assert len(memory._token_counts) == len(conversation(1))
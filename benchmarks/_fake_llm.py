@@ -0,0 +1,187 @@
+"""Minimal OpenAI-compatible chat completions server for benchmarks; no model involved.
+
+A turn ending with a user message is answered with a call of the first offered tool
+that takes a ``query``; once the tool answered (``rounds`` times), with a text answer.
+Responses stream (Server-Sent Events) when the request asks for it. Run it in its own
+process, so its allocations and CPU time do not show up in the measurements of the agent:
+
+    python benchmarks/_fake_llm.py --port 8790 [--latency 0.05] [--rounds 1]
+
+or from a benchmark, ``with fake_llm_server(latency=0.0) as base_url: ...``. To measure
+the agent without any network I/O, give it a ``FakeLLMTransport`` instead; it answers
+in-process, without latency.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import socket
+import subprocess
+import sys
+import time
+from typing import Iterator
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Size of the final answer, so responses weigh about as much as real ones
+ANSWER_WORDS = 150
+USAGE = {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+
+
+def _tool_rounds(messages: list[dict]) -> int:
+    """Tool calls answered since the last user message."""
+    rounds = 0
+    for message in reversed(messages):
+        if message["role"] == "user":
+            break
+        rounds += message["role"] == "assistant" and bool(message.get("tool_calls"))
+    return rounds
+
+
+def _assistant_message(body: dict, rounds: int = 1) -> dict:
+    messages = body["messages"]
+    last = messages[-1]
+    query_tools = [
+        tool["function"]["name"]
+        for tool in body.get("tools") or []
+        if "query" in tool["function"].get("parameters", {}).get("properties", {})
+    ]
+    if not query_tools or _tool_rounds(messages) >= rounds:
+        return {"role": "assistant", "content": " ".join(["answer"] * ANSWER_WORDS)}
+    user = next(message for message in reversed(messages) if message["role"] == "user")
+    question = user["content"] if isinstance(user["content"], str) else "question"
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": f"call_{len(messages)}",
+                "type": "function",
+                "function": {"name": query_tools[0], "arguments": json.dumps({"query": question[:200]})},
+            }
+        ],
+    }
+
+
+def _chunk(delta: dict, finish_reason: str | None = None, **extra) -> str:
+    choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+    chunk = {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake"}
+    return f"data: {json.dumps({**chunk, 'choices': [choice], **extra})}\n\n"
+
+
+def _completion(message: dict) -> dict:
+    finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+    return {
+        "id": "fake",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "fake",
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": USAGE,
+    }
+
+
+def _events(message: dict) -> Iterator[str]:
+    if message.get("tool_calls"):
+        yield _chunk({**message, "tool_calls": [{**message["tool_calls"][0], "index": 0}]})
+    else:
+        for word in message["content"].split(" "):
+            yield _chunk({"role": "assistant", "content": word + " "})
+    yield _chunk({}, "tool_calls" if message.get("tool_calls") else "stop", usage=USAGE)
+    yield "data: [DONE]\n\n"
+
+
+def create_app(latency: float = 0.0, rounds: int = 1) -> Starlette:
+    """The fake server; every response is delayed by ``latency`` seconds.
+
+    Args:
+        latency: Seconds before each response.
+        rounds: Tool calls made before the text answer of a turn.
+    """
+
+    async def completions(request: Request):
+        body = await request.json()
+        message = _assistant_message(body, rounds)
+        await asyncio.sleep(latency)
+        if not body.get("stream"):
+            return JSONResponse(_completion(message))
+        return StreamingResponse(_events(message), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+
+class FakeLLMTransport(httpx.AsyncBaseTransport):
+    """The fake server as an httpx transport: answers in-process, without latency.
+
+    Its responses are built in the calling process, so they count in its CPU time and
+    allocations; they are small next to the agent framework's own work.
+    """
+
+    def __init__(self, rounds: int = 1) -> None:
+        """Configure the fake.
+
+        Args:
+            rounds: Tool calls made before the text answer of a turn.
+        """
+        self.rounds = rounds
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(await request.aread())
+        message = _assistant_message(body, self.rounds)
+        if not body.get("stream"):
+            return httpx.Response(200, json=_completion(message), request=request)
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content="".join(_events(message)).encode(),
+            request=request,
+        )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def fake_llm_server(latency: float = 0.0, rounds: int = 1) -> Iterator[str]:
+    """Run the fake server in a subprocess; yields its base URL (ending with /v1)."""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--port", str(port), "--latency", str(latency), "--rounds", str(rounds)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), 0.1):
+                break
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("The fake LLM server did not start")
+            time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--rounds", type=int, default=1, help="tool calls before the answer of a turn")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.rounds), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
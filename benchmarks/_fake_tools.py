@@ -0,0 +1,30 @@
+"""A fake tool for the benchmarks: answers instantly, without I/O.
+
+Unlike the built-in ``search`` tool of the LangGraph agent it is not return_direct,
+so the agent goes back to the model after every call, as it does with real tools.
+Register it with ``TOOL_MODULES=_fake_tools:langgraph_tools`` (LangGraph) or
+``TOOL_MODULES=_fake_tools:llama_index_tools`` (LlamaIndex), and select it with
+``tool_names=[TOOL_NAME]``.
+"""
+
+from langchain_core.tools import StructuredTool
+from llama_index.core.tools import FunctionTool
+
+TOOL_NAME = "lookup"
+RESULT = "The starter kit deploys a LangGraph or LlamaIndex agent behind a FastAPI service."
+
+
+def lookup(query: str) -> str:
+    """Look up facts about a topic.
+
+    Args:
+        query: The topic to look up.
+
+    Returns:
+        A fixed fact.
+    """
+    return RESULT
+
+
+langgraph_tools = [StructuredTool.from_function(lookup, name=TOOL_NAME, parse_docstring=True)]
+llama_index_tools = [FunctionTool.from_defaults(lookup, name=TOOL_NAME)]
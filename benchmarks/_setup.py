@@ -0,0 +1,23 @@
+"""Make the agent packages importable when a benchmark is run from a repository checkout.
+
+The agents import ``<package>.utils``, which init.sh copies from the repository root
+at deploy time; here the root ``utils.py`` is aliased instead.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+AGENT_SRC_DIRS = (
+    ROOT_DIR / "agents" / "base" / "langgraph_react_agent" / "src",
+    ROOT_DIR / "agents" / "base" / "llamaindex_websearch_agent" / "src",
+)
+
+for path in (ROOT_DIR, *AGENT_SRC_DIRS):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import utils  # noqa: E402
+
+for package in ("langgraph_react_agent_base", "llama_index_workflow_agent_base"):
+    sys.modules.setdefault(f"{package}.utils", utils)
@@ -0,0 +1,208 @@
+"""Framework overhead of the LangGraph and LlamaIndex agents: CPU time, allocations, throughput.
+
+Runs each agent against an in-process fake LLM (``FakeLLMTransport``: no network, no
+latency) and a fake tool (``_fake_tools.py``), so what is measured is the agents' own
+work: the framework, the middleware or workflow steps, the tool dispatch and the
+parsing of the (streamed) model responses. A run makes ``--iterations`` ReAct
+iterations (a model call answered with a tool call, then the tool call) before the
+model call that answers; ``--concurrency`` runs are started at once, on one event loop.
+
+For each agent, iteration count and concurrency it reports:
+
+- ``cpu_ms_per_run`` and ``cpu_ms_per_step``: process CPU time of a run, and of one of
+  its steps (model calls; a run has iterations + 1), median over ``--repeat`` batches,
+- ``runs_per_s``: throughput of the batches,
+- ``peak_kb_per_run``: peak memory allocated by a batch (tracemalloc), per run,
+  measured in a separate batch since tracing slows everything down.
+
+The CPU time per step should not depend on the number of iterations or on the
+concurrency. Save the results with ``--output`` and compare a later run against them
+with ``--baseline``: metrics more than ``--tolerance`` worse are listed and the script
+exits with status 1, so a dependency upgrade that makes the frameworks slower is caught.
+
+Usage:
+    python benchmarks/bench_framework_overhead.py [--iterations 1 2 5 10] [--concurrency 1 8 64]
+        [--repeat 5] [--json] [--output results.json] [--baseline results.json [--tolerance 0.2]]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import _setup  # noqa: F401  (puts the agent packages on sys.path)
+from _fake_llm import FakeLLMTransport
+from _fake_tools import TOOL_NAME
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from agent_commons.deadline import Deadline
+from agent_commons.settings import SETTINGS_FILE_ENV_VAR, reload_settings
+from agent_commons.tool_registry import TOOL_MODULES_ENV_VAR
+from langgraph_react_agent_base.agent import get_graph_closure
+from langgraph_react_agent_base.middleware import AgentContext
+from llama_index_workflow_agent_base.agent import get_workflow_closure
+
+AGENTS = ("langgraph", "llama_index")
+QUESTION = "What does the starter kit deploy?"
+# Metrics compared with --baseline; higher is worse for all of them
+COMPARED = ("cpu_ms_per_run", "peak_kb_per_run")
+
+# The fake tool of each framework is registered through a settings file, reloaded per runner
+_SETTINGS_FILE = os.path.join(tempfile.mkdtemp(prefix="bench-"), "settings.env")
+os.environ[SETTINGS_FILE_ENV_VAR] = _SETTINGS_FILE
+
+
+def use_tool_modules(value: str) -> None:
+    """Register the tools of ``value`` (TOOL_MODULES) for the agents built next."""
+    with open(_SETTINGS_FILE, "w") as f:
+        f.write(f"{TOOL_MODULES_ENV_VAR}={value}\n")
+    reload_settings()
+
+
+class LangGraphRunner:
+    def __init__(self, iterations: int) -> None:
+        use_tool_modules("_fake_tools:langgraph_tools")
+        self.graph = get_graph_closure(
+            model_id="fake",
+            base_url="http://localhost/v1",
+            api_key="fake",
+            tool_names=[TOOL_NAME],
+            transport=FakeLLMTransport(rounds=iterations),
+        )
+
+    async def run(self) -> int:
+        """Run the agent on the question; returns the number of tool calls it made."""
+        result = await self.graph.ainvoke(
+            {"messages": [HumanMessage(content=QUESTION)]},
+            context=AgentContext(deadline=Deadline.after(60)),
+        )
+        return sum(isinstance(message, ToolMessage) for message in result["messages"])
+
+
+class LlamaIndexRunner:
+    def __init__(self, iterations: int) -> None:
+        use_tool_modules("_fake_tools:llama_index_tools")
+        self.get_agent = get_workflow_closure(
+            model_id="fake",
+            base_url="http://localhost/v1",
+            api_key="fake",
+            tool_names=[TOOL_NAME],
+            transport=FakeLLMTransport(rounds=iterations),
+        )
+
+    async def run(self) -> int:
+        """Run the agent on the question; returns the number of tool calls it made."""
+        agent = self.get_agent(timeout=60)
+        await agent.run(input=[{"role": "user", "content": QUESTION}], deadline=Deadline.after(60))
+        return sum(message.role == "tool" for message in agent.memory.get_all())
+
+
+async def _batch(runner, concurrency: int) -> None:
+    await asyncio.gather(*(runner.run() for _ in range(concurrency)))
+
+
+async def measure(runner, iterations: int, concurrency: int, repeat: int) -> dict:
+    # Warm up (lazily built clients, caches, imports) and check the fake is followed
+    tool_calls = await runner.run()
+    if tool_calls != iterations:
+        raise RuntimeError(f"Expected {iterations} tool calls per run, the agent made {tool_calls}")
+
+    cpu_per_run, wall = [], 0.0
+    for _ in range(repeat):
+        gc.collect()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        await _batch(runner, concurrency)
+        cpu_per_run.append((time.process_time() - cpu_start) / concurrency)
+        wall += time.perf_counter() - wall_start
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        await _batch(runner, concurrency)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    cpu_ms = statistics.median(cpu_per_run) * 1000
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "cpu_ms_per_run": round(cpu_ms, 2),
+        "cpu_ms_per_step": round(cpu_ms / (iterations + 1), 2),
+        "runs_per_s": round(repeat * concurrency / wall, 1),
+        "peak_kb_per_run": round(peak / concurrency / 1024, 1),
+    }
+
+
+async def run(agents: list[str], iterations: list[int], concurrencies: list[int], repeat: int) -> list[dict]:
+    results = []
+    for agent in agents:
+        for count in iterations:
+            runner = LangGraphRunner(count) if agent == "langgraph" else LlamaIndexRunner(count)
+            for concurrency in concurrencies:
+                row = await measure(runner, count, concurrency, repeat)
+                results.append({"agent": agent, **row})
+    return results
+
+
+def regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Metrics of ``results`` more than ``tolerance`` (a fraction) worse than in ``baseline``."""
+    key = lambda row: (row["agent"], row["iterations"], row["concurrency"])  # noqa: E731
+    previous = {key(row): row for row in baseline}
+    found = []
+    for row in results:
+        before = previous.get(key(row))
+        if before is None:
+            continue
+        for metric in COMPARED:
+            if before[metric] > 0 and row[metric] > before[metric] * (1 + tolerance):
+                found.append(
+                    f"{row['agent']} iterations={row['iterations']} concurrency={row['concurrency']}: "
+                    f"{metric} {before[metric]} -> {row[metric]} (+{row[metric] / before[metric] - 1:.0%})"
+                )
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", nargs="+", choices=AGENTS, default=list(AGENTS))
+    parser.add_argument("--iterations", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--repeat", type=int, default=5, help="timed batches per configuration")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown over the baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.agents, args.iterations, args.concurrency, args.repeat))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        columns = list(results[0])
+        print(" | ".join(f"{column:>15}" for column in columns))
+        for row in results:
+            print(" | ".join(f"{row[column]:>15}" for column in columns))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
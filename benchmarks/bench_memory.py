@@ -0,0 +1,156 @@
+"""Memory footprint of concurrent agent requests, measured with tracemalloc.
+
+Runs ``--concurrency`` simultaneous requests through each agent (LLM call, tool call,
+final LLM call, conversion of the result to the /chat response and its JSON encoding)
+on top of a conversation history of ``--history`` messages, against a fake LLM server
+running in another process. Reports the peak traced memory above the idle baseline,
+per request, and what is still allocated once the requests are done (retained).
+
+Peak memory should grow linearly with concurrency: the peak per request must stay
+flat when the concurrency grows, and be proportional to the history size.
+
+Usage:
+    python benchmarks/bench_memory.py [--history 0 50 200] [--concurrency 1 8 32] [--json]
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib.util
+import json
+import tracemalloc
+
+import _setup  # noqa: F401  (puts the agent packages on sys.path)
+from _fake_llm import fake_llm_server
+
+from langchain_core.messages import AIMessage, HumanMessage
+from llama_index.core.llms import ChatMessage
+
+from agent_commons.deadline import Deadline
+from langgraph_react_agent_base.agent import get_graph_closure
+from langgraph_react_agent_base.middleware import AgentContext
+from llama_index_workflow_agent_base.agent import get_workflow_closure
+
+AGENTS = ("langgraph", "llama_index")
+# Characters per history message, about what a paragraph of an answer weighs
+MESSAGE_CHARS = 1000
+QUESTION = "What does the starter kit deploy?"
+
+
+def _load_main(agent_dir: str, name: str):
+    """Import an agent's main.py (the /chat service) under ``name``."""
+    spec = importlib.util.spec_from_file_location(name, _setup.ROOT_DIR / "agents" / "base" / agent_dir / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _history_text(index: int) -> str:
+    return (f"message {index} " + "lorem ipsum dolor sit amet " * 40)[:MESSAGE_CHARS]
+
+
+class LangGraphRunner:
+    def __init__(self, base_url: str) -> None:
+        self.main = _load_main("langgraph_react_agent", "langgraph_main")
+        self.graph = get_graph_closure(model_id="fake", base_url=base_url, api_key="fake")
+
+    @staticmethod
+    def history(size: int) -> list:
+        return [
+            (HumanMessage if index % 2 == 0 else AIMessage)(content=_history_text(index))
+            for index in range(size)
+        ]
+
+    async def request(self, history: list) -> bytes:
+        result = await self.graph.ainvoke(
+            {"messages": [*history, HumanMessage(content=QUESTION)]},
+            context=AgentContext(deadline=Deadline.after(60)),
+        )
+        response = self.main.format_response_messages(result["messages"][len(history) :])
+        return json.dumps({"messages": response, "finish_reason": "stop"}).encode()
+
+
+class LlamaIndexRunner:
+    def __init__(self, base_url: str) -> None:
+        self.main = _load_main("llamaindex_websearch_agent", "llama_index_main")
+        self.get_agent = get_workflow_closure(model_id="fake", base_url=base_url, api_key="fake")
+
+    @staticmethod
+    def history(size: int) -> list:
+        messages = [ChatMessage(role="system", content="You are a helpful AI assistant.")]
+        return messages + [
+            ChatMessage(role="user" if index % 2 == 0 else "assistant", content=_history_text(index))
+            for index in range(size)
+        ]
+
+    async def request(self, history: list) -> bytes:
+        deadline = Deadline.after(60)
+        agent = self.get_agent(timeout=60, chat_history=history)
+        turn_start = len(history)
+        await self.main.run_workflow(agent, [{"role": "user", "content": QUESTION}], deadline)
+        response = self.main.format_response_messages(agent.memory.get_all()[turn_start:])
+        return json.dumps({"messages": response, "finish_reason": "stop"}).encode()
+
+
+async def measure(runner, history_size: int, concurrency: int) -> dict:
+    history = runner.history(history_size)
+    await runner.request(history)  # warm up: lazily built clients, caches, imports
+
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    responses = await asyncio.gather(*(runner.request(history) for _ in range(concurrency)))
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    response_bytes = len(responses[0])
+    del responses
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+
+    return {
+        "history": history_size,
+        "concurrency": concurrency,
+        "peak_kb": round(peak / 1024, 1),
+        "peak_per_request_kb": round(peak / concurrency / 1024, 1),
+        "retained_kb": round(retained / 1024, 1),
+        "response_kb": round(response_bytes / 1024, 1),
+    }
+
+
+async def run(agents: list[str], history_sizes: list[int], concurrencies: list[int], latency: float) -> list[dict]:
+    results = []
+    with fake_llm_server(latency=latency) as base_url:
+        tracemalloc.start()
+        try:
+            for agent in agents:
+                runner = LangGraphRunner(base_url) if agent == "langgraph" else LlamaIndexRunner(base_url)
+                for history_size in history_sizes:
+                    for concurrency in concurrencies:
+                        row = await measure(runner, history_size, concurrency)
+                        results.append({"agent": agent, **row})
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", nargs="+", choices=AGENTS, default=list(AGENTS))
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 50, 200])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM response delay (s)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.agents, args.history, args.concurrency, args.latency))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print(" | ".join(f"{column:>19}" for column in columns))
+    for row in results:
+        print(" | ".join(f"{row[column]:>19}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
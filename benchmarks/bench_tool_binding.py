@@ -0,0 +1,144 @@
+"""Microbenchmark of the per-step cost of handing the tools to the LLM.
+
+Every ReAct step binds the agent tools to the model. Without the tool registry
+that means converting each tool to its OpenAI schema again (LangGraph
+``bind_tools``, LlamaIndex ``_prepare_chat_with_tools``) and, in the LlamaIndex
+workflow, rebuilding the name -> tool map. This script times both variants for
+growing numbers of tools; no LLM is called.
+
+Usage:
+    python benchmarks/bench_tool_binding.py [--tools 2 8 32] [--json]
+"""
+
+import argparse
+import json
+import timeit
+
+import _setup  # noqa: F401  (puts the agent packages on sys.path)
+
+from langchain_core.tools import StructuredTool
+from langchain_openai import ChatOpenAI
+from llama_index.core.tools import FunctionTool
+from llama_index.llms.openai_like import OpenAILike
+from pydantic import Field, create_model
+
+from langgraph_react_agent_base import registry as langgraph_registry
+from llama_index_workflow_agent_base import registry as llama_index_registry
+from agent_commons.tool_registry import ToolRegistry
+
+
+def _args_model(index: int):
+    """Pydantic arguments model of a synthetic tool with a few documented fields."""
+    return create_model(
+        f"Tool{index}Input",
+        query=(str, Field(description="The text to look up.")),
+        limit=(int, Field(default=10, description="Maximum number of results.")),
+        language=(str, Field(default="en", description="Two-letter language code.")),
+    )
+
+
+def _tool_fn(query: str, limit: int = 10, language: str = "en") -> str:
+    return query
+
+
+def make_tools(count: int) -> tuple[list, list]:
+    """``count`` equivalent synthetic tools for LangChain and LlamaIndex."""
+    langchain_tools, llama_index_tools = [], []
+    for index in range(count):
+        description = f"Synthetic tool number {index} used to measure tool binding overhead."
+        args_model = _args_model(index)
+        langchain_tools.append(
+            StructuredTool.from_function(
+                _tool_fn, name=f"tool_{index}", description=description, args_schema=args_model
+            )
+        )
+        llama_index_tools.append(
+            FunctionTool.from_defaults(
+                _tool_fn, name=f"tool_{index}", description=description, fn_schema=args_model
+            )
+        )
+    return langchain_tools, llama_index_tools
+
+
+def _per_call_us(fn, number: int) -> float:
+    """Best-of-5 time of one ``fn()`` call in microseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def run(tool_counts: list[int], number: int) -> list[dict]:
+    chat = ChatOpenAI(model="bench", api_key="bench", base_url="http://localhost:1/v1")
+    llm = OpenAILike(
+        model="bench",
+        api_key="bench",
+        api_base="http://localhost:1/v1",
+        is_chat_model=True,
+        is_function_calling_model=True,
+    )
+
+    results = []
+    for count in tool_counts:
+        langchain_tools, llama_index_tools = make_tools(count)
+
+        langchain_specs = ToolRegistry(langgraph_registry.tool_spec)
+        langchain_specs.register_all(langchain_tools)
+        openai_tools = [spec.openai_tool for spec in langchain_specs.freeze().subset()]
+
+        llama_index_specs = ToolRegistry(llama_index_registry.tool_spec)
+        llama_index_specs.register_all(llama_index_tools)
+        precompiled_tools = [spec.tool for spec in llama_index_specs.freeze().subset()]
+        tools_by_name = {tool.metadata.get_name(): tool for tool in precompiled_tools}
+
+        results.append(
+            {
+                "tools": count,
+                "langgraph_bind_tools_us": _per_call_us(
+                    lambda: chat.bind_tools(langchain_tools), number
+                ),
+                "langgraph_bind_precompiled_us": _per_call_us(
+                    lambda: chat.bind_tools(openai_tools), number
+                ),
+                "llama_index_prepare_tools_us": _per_call_us(
+                    lambda: llm._prepare_chat_with_tools(llama_index_tools, chat_history=[]),
+                    number,
+                ),
+                "llama_index_prepare_precompiled_us": _per_call_us(
+                    lambda: llm._prepare_chat_with_tools(precompiled_tools, chat_history=[]),
+                    number,
+                ),
+                "tools_by_name_rebuild_us": _per_call_us(
+                    lambda: {tool.metadata.get_name(): tool for tool in llama_index_tools},
+                    number,
+                ),
+                "tools_by_name_lookup_us": _per_call_us(
+                    lambda: tools_by_name.get(f"tool_{count - 1}"), number
+                ),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tools", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--number", type=int, default=200, help="calls per timing repeat")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = run(args.tools, args.number)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print(" | ".join(f"{column:>34}" if i else f"{column:>5}" for i, column in enumerate(columns)))
+    for row in results:
+        print(
+            " | ".join(
+                f"{row[column]:>5}" if column == "tools" else f"{row[column]:>34.1f}"
+                for column in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
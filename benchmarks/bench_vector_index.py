@@ -0,0 +1,147 @@
+"""Benchmark document retrieval on the memory-mapped vector index.
+
+Builds a synthetic clustered corpus and compares, per query:
+- in_memory:  the whole float32 matrix read into process memory, one matrix multiply
+              (what loading the embeddings in every worker does);
+- mmap_f32:   VectorIndex, float32, blocked matrix multiply over the memory map;
+- mmap_f16:   the same with float16 storage (half the pages);
+- ivf_f16:    float16 with IVF partitions, ``--nprobe`` partitions searched.
+
+``anon_mb`` is the private (anonymous) memory the variant added to the process;
+memory-mapped pages are file-backed and shared by every worker on the host.
+``recall`` is the share of the exact top-k found.
+
+Usage:
+    python benchmarks/bench_vector_index.py [--rows 200000] [--dim 384] [--json]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import _setup  # noqa: F401  (puts the repository root on sys.path)
+
+import numpy as np
+
+from agent_commons.embedders import Embedder
+from agent_commons.vector_index import VECTORS_FILE, VectorIndex, normalize
+
+
+class CorpusEmbedder(Embedder):
+    """Returns precomputed vectors; document texts are their row numbers."""
+
+    def __init__(self, vectors: np.ndarray) -> None:
+        self.vectors = vectors
+        self.dim = vectors.shape[1]
+        self.name = f"bench-{self.dim}"
+
+    def embed(self, texts):
+        return self.vectors[[int(text) for text in texts]]
+
+
+def clustered_vectors(rows: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(clusters, size=rows)
+    return normalize(centers[labels] + 0.6 * rng.standard_normal((rows, dim), dtype=np.float32))
+
+
+def anon_mb() -> float | None:
+    """Private (anonymous) resident memory of this process, Linux only."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def build(path: Path, embedder: CorpusEmbedder, dtype: str, partitions: int) -> None:
+    index = VectorIndex.create(path, embedder, dtype=dtype)
+    rows = len(embedder.vectors)
+    index.add([str(row) for row in range(rows)])
+    if partitions:
+        index.build_partitions(partitions)
+
+
+def timed_queries(search, queries: np.ndarray) -> tuple[float, list[np.ndarray]]:
+    start = time.perf_counter()
+    ids = [search(query) for query in queries]
+    return (time.perf_counter() - start) / len(queries), ids
+
+
+def run(rows: int, dim: int, queries: int, k: int, partitions: int, nprobe: int) -> list[dict]:
+    vectors = clustered_vectors(rows, dim, clusters=max(partitions, 16))
+    embedder = CorpusEmbedder(vectors)
+    rng = np.random.default_rng(1)
+    query_vectors = normalize(
+        vectors[rng.integers(rows, size=queries)]
+        + 0.3 * rng.standard_normal((queries, dim), dtype=np.float32)
+    )
+    exact = [set(np.argsort(-(vectors @ query))[:k]) for query in query_vectors]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        build(Path(tmp) / "f32", embedder, "float32", 0)
+        build(Path(tmp) / "f16", embedder, "float16", partitions)
+        del vectors, embedder.vectors  # only the indexes hold the corpus from here on
+
+        before = anon_mb()
+        matrix = np.fromfile(Path(tmp) / "f32" / VECTORS_FILE, dtype=np.float32).reshape(rows, dim)
+        loaded = anon_mb()
+        seconds, found = timed_queries(
+            lambda query: np.argpartition(-(matrix @ query), k)[:k], query_vectors
+        )
+        results.append(("in_memory", seconds, found, None if before is None else loaded - before))
+        del matrix
+
+        variants = (("mmap_f32", "f32", rows), ("mmap_f16", "f16", partitions), ("ivf_f16", "f16", nprobe))
+        for variant, directory, probes in variants:
+            before = anon_mb()
+            index = VectorIndex(Path(tmp) / directory, embedder)
+            seconds, found = timed_queries(
+                lambda query: index.search_vectors(query, k, probes)[1][0], query_vectors
+            )
+            after = anon_mb()
+            results.append((variant, seconds, found, None if before is None else after - before))
+            del index
+
+    return [
+        {
+            "variant": variant,
+            "ms_per_query": seconds * 1000,
+            "recall": float(np.mean([len(exact[n] & set(ids)) / k for n, ids in enumerate(found)])),
+            "anon_mb": anon,
+        }
+        for variant, seconds, found, anon in results
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--partitions", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.dim, args.queries, args.k, args.partitions, args.nprobe)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'variant':>10} | {'ms/query':>9} | {'recall':>6} | {'anon MB':>8}")
+    for row in results:
+        anon = "n/a" if row["anon_mb"] is None else f"{row['anon_mb']:.1f}"
+        print(f"{row['variant']:>10} | {row['ms_per_query']:>9.2f} | {row['recall']:>6.2f} | {anon:>8}")
+
+
+if __name__ == "__main__":
+    main()
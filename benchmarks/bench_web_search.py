@@ -0,0 +1,114 @@
+"""Benchmark the web search tool against the local fixture search server.
+
+Compares, for a batch of concurrent tool calls:
+- sync_per_call:   a blocking request with a new connection per call, run on the
+                   event loop (what a ``requests``-based tool does);
+- async_per_call:  an async request with a new client (connection) per call;
+- pooled:          WebSearch with its shared pool and concurrency limit, no cache;
+- pooled_cached:   WebSearch with its cache, every query asked twice.
+
+Usage:
+    python benchmarks/bench_web_search.py [--calls 64] [--latency 0.02] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import _setup  # noqa: F401  (puts the repository root on sys.path)
+
+import httpx
+import uvicorn
+
+from agent_commons.search_fixture import create_app
+from agent_commons.web_search import SearxNGProvider, WebSearch
+
+
+def start_fixture(port: int, latency: float) -> uvicorn.Server:
+    """Run the fixture search server in a background thread."""
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(latency=latency), port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def sync_per_call(base_url: str, queries: list[str]) -> None:
+    async def call(query: str) -> None:
+        with httpx.Client() as client:
+            client.get(f"{base_url}/search", params={"q": query, "format": "json"}).json()
+
+    await asyncio.gather(*(call(query) for query in queries))
+
+
+async def async_per_call(base_url: str, queries: list[str]) -> None:
+    async def call(query: str) -> None:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{base_url}/search", params={"q": query, "format": "json"})
+            response.json()
+
+    await asyncio.gather(*(call(query) for query in queries))
+
+
+async def pooled(search: WebSearch, queries: list[str]) -> None:
+    await asyncio.gather(*(search.search_text(query) for query in queries))
+
+
+async def timed(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def run(calls: int, latency: float, concurrency: int, port: int) -> list[dict]:
+    start_fixture(port, latency)
+    base_url = f"http://127.0.0.1:{port}"
+    queries = [f"query {i}" for i in range(calls)]
+
+    uncached = WebSearch(SearxNGProvider(base_url, max_concurrency=concurrency), cache_ttl=0)
+    cached = WebSearch(SearxNGProvider(base_url, max_concurrency=concurrency))
+    await pooled(uncached, queries[:4])  # warm up the pool
+
+    results = [
+        {"variant": "sync_per_call", "seconds": await timed(sync_per_call(base_url, queries))},
+        {"variant": "async_per_call", "seconds": await timed(async_per_call(base_url, queries))},
+        {"variant": "pooled", "seconds": await timed(pooled(uncached, queries))},
+        {"variant": "pooled_cached", "seconds": await timed(pooled(cached, queries + queries))},
+    ]
+    for result in results:
+        result["calls"] = calls * 2 if result["variant"] == "pooled_cached" else calls
+        result["calls_per_second"] = result["calls"] / result["seconds"]
+
+    await uncached.aclose()
+    await cached.aclose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=64, help="concurrent tool calls")
+    parser.add_argument("--latency", type=float, default=0.02, help="fixture seconds per search")
+    parser.add_argument("--concurrency", type=int, default=16, help="provider concurrency limit")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.calls, args.latency, args.concurrency, args.port))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'variant':>15} | {'calls':>6} | {'seconds':>8} | {'calls/s':>9}")
+    for row in results:
+        print(
+            f"{row['variant']:>15} | {row['calls']:>6} | {row['seconds']:>8.3f} | "
+            f"{row['calls_per_second']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Per-turn overhead of a conversation over /ws/chat versus repeated /chat POSTs.
+
+Serves each agent with uvicorn and runs a ``--turns`` turn conversation twice: as
+one ``POST /chat`` per turn (over a keep-alive connection, with a JSON or a streamed
+answer), and as chat frames over one /ws/chat connection, which always streams. The LLM is a fake server in another process answering after
+``--latency`` seconds, so the difference between the two is the per-turn cost of
+the transport and of setting up the turn. Reports the mean and p95 time per turn and
+the bytes sent and received per turn.
+
+The LlamaIndex POSTs continue a server-side session (``conversation_id``), as the
+WebSocket does. LangGraph's /chat has no conversation state, so its POST turns each
+start a new conversation and its WebSocket turns carry a growing history; its
+WebSocket numbers are therefore an upper bound.
+
+Usage:
+    python benchmarks/bench_websocket.py [--turns 20] [--latency 0] [--json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import statistics
+import threading
+import time
+from typing import Iterator
+
+import _setup  # noqa: F401  (puts the agent packages on sys.path)
+from _fake_llm import _free_port, fake_llm_server
+
+import httpx
+import uvicorn
+import websockets
+
+AGENTS = {
+    "langgraph": "langgraph_react_agent",
+    "llama_index": "llamaindex_websearch_agent",
+}
+
+
+def _load_main(agent_dir: str, name: str):
+    """Import an agent's main.py (the /chat service) under ``name``."""
+    spec = importlib.util.spec_from_file_location(name, _setup.ROOT_DIR / "agents" / "base" / agent_dir / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def serve(app) -> Iterator[str]:
+    """Run ``app`` with uvicorn in a background thread; yields its host:port."""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.01)
+        yield f"127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def _summary(transport: str, times: list[float], sent: int, received: int) -> dict:
+    turns = len(times)
+    return {
+        "transport": transport,
+        "turns": turns,
+        "mean_ms": round(statistics.mean(times) * 1000, 2),
+        "p95_ms": round(sorted(times)[max(int(turns * 0.95) - 1, 0)] * 1000, 2),
+        "sent_bytes_per_turn": round(sent / turns),
+        "received_bytes_per_turn": round(received / turns),
+    }
+
+
+async def post_turns(address: str, turns: int, conversation_id: str | None, stream: bool) -> dict:
+    times, sent, received = [], 0, 0
+    async with httpx.AsyncClient(base_url=f"http://{address}", timeout=60) as client:
+        for turn in range(turns + 1):  # the first turn warms up
+            body = {"message": f"What is RedHat? ({turn})", "stream": stream}
+            if conversation_id is not None:
+                body["conversation_id"] = f"{conversation_id}-{stream}"
+            start = time.perf_counter()
+            response = await client.post("/chat", json=body)
+            response.raise_for_status()
+            if turn:
+                times.append(time.perf_counter() - start)
+                sent += len(json.dumps(body))
+                received += len(response.content)
+    return _summary("post_sse" if stream else "post", times, sent, received)
+
+
+async def websocket_turns(address: str, turns: int) -> dict:
+    times, sent, received = [], 0, 0
+    async with websockets.connect(f"ws://{address}/ws/chat", max_size=None) as websocket:
+        for turn in range(turns + 1):
+            frame = json.dumps({"type": "chat", "message": f"What is RedHat? ({turn})"}, separators=(",", ":"))
+            start = time.perf_counter()
+            await websocket.send(frame)
+            turn_received = 0
+            while True:
+                data = await websocket.recv()
+                turn_received += len(data)
+                reply = json.loads(data)
+                if reply["t"] != "d":
+                    break
+            if reply["t"] != "done":
+                raise RuntimeError(f"Turn failed: {reply}")
+            if turn:
+                times.append(time.perf_counter() - start)
+                sent += len(frame)
+                received += turn_received
+    return _summary("websocket", times, sent, received)
+
+
+async def measure(address: str, agent: str, turns: int) -> list[dict]:
+    conversation_id = "bench" if agent == "llama_index" else None
+    return [
+        await post_turns(address, turns, conversation_id, stream=False),
+        await post_turns(address, turns, conversation_id, stream=True),
+        await websocket_turns(address, turns),
+    ]
+
+
+def run(agents: list[str], turns: int, latency: float) -> list[dict]:
+    results = []
+    with fake_llm_server(latency=latency) as base_url:
+        os.environ.update(BASE_URL=base_url, MODEL_ID="fake", API_KEY="fake")
+        for agent in agents:
+            main = _load_main(AGENTS[agent], f"{agent}_main")
+            with serve(main.app) as address:
+                for row in asyncio.run(measure(address, agent, turns)):
+                    results.append({"agent": agent, **row})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", nargs="+", choices=list(AGENTS), default=list(AGENTS))
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LLM response delay (s)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = run(args.agents, args.turns, args.latency)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print(" | ".join(f"{column:>23}" for column in columns))
+    for row in results:
+        print(" | ".join(f"{row[column]!s:>23}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""pytest-benchmark suite for the formatting of agent runs into /chat responses.
+
+Covers, over synthetic histories of 10 to 10,000 messages:
+
+- the LlamaIndex stream formatters (``EventFormatter`` of main.py and the AI
+  service's ``StreamEventFormatter``), formatting the events of a run with three
+  tool rounds on top of the history; their time should not grow with the history,
+- the LlamaIndex ``format_response_messages`` (``_message_to_response_dict`` per
+  message) and the LangGraph ``format_response_messages`` of /chat, which are
+  linear in the history.
+
+Needs pytest-benchmark, a dev dependency of both agents (``poetry install --with dev``);
+skipped without it.
+
+Usage:
+    python -m pytest benchmarks/test_formatting_benchmark.py --benchmark-only
+"""
+
+import importlib.util
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import _setup  # noqa: E402  (puts the agent packages on sys.path)
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage  # noqa: E402
+from llama_index.core.llms import ChatMessage, ChatResponse  # noqa: E402
+from llama_index.core.tools import ToolSelection  # noqa: E402
+from llama_index.core.workflow import StopEvent  # noqa: E402
+
+from agents.base.llamaindex_websearch_agent.examples.ai_service import StreamEventFormatter  # noqa: E402
+from llama_index_workflow_agent_base.streaming import EventFormatter  # noqa: E402
+from llama_index_workflow_agent_base.workflow import InputEvent, ToolCallEvent  # noqa: E402
+
+HISTORY_SIZES = (10, 100, 1_000, 10_000)
+TOOL_ROUNDS = 3
+CALLS_PER_ROUND = 2
+
+
+def _load_main(agent_dir: str, name: str):
+    """Import an agent's main.py (the /chat service) under ``name``."""
+    spec = importlib.util.spec_from_file_location(name, _setup.ROOT_DIR / "agents" / "base" / agent_dir / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _tool_output(call_id: str) -> ChatMessage:
+    return ChatMessage(
+        role="tool",
+        content=f"output of {call_id}",
+        additional_kwargs={"tool_call_id": call_id, "name": "web_search"},
+    )
+
+
+def llama_index_history(size: int) -> list[ChatMessage]:
+    """``size`` messages of past turns: question, tool call, tool output, answer."""
+    messages = []
+    for index in range(size):
+        kind = index % 4
+        if kind == 0:
+            messages.append(ChatMessage(role="user", content=f"question {index}"))
+        elif kind == 1:
+            messages.append(
+                ChatMessage(
+                    role="assistant",
+                    content=None,
+                    additional_kwargs={
+                        "tool_calls": [
+                            {
+                                "id": f"call{index}",
+                                "type": "function",
+                                "function": {"name": "web_search", "arguments": '{"query": "q"}'},
+                            }
+                        ]
+                    },
+                )
+            )
+        elif kind == 2:
+            messages.append(_tool_output(f"call{index - 1}"))
+        else:
+            messages.append(ChatMessage(role="assistant", content=f"answer {index}"))
+    return messages
+
+
+def langgraph_history(size: int) -> list:
+    messages = []
+    for index in range(size):
+        kind = index % 4
+        if kind == 0:
+            messages.append(HumanMessage(content=f"question {index}"))
+        elif kind == 1:
+            messages.append(
+                AIMessage(
+                    content="",
+                    tool_calls=[{"id": f"call{index}", "name": "web_search", "args": {"query": "q"}}],
+                )
+            )
+        elif kind == 2:
+            messages.append(ToolMessage(content=f"output {index}", tool_call_id=f"call{index - 1}", name="web_search"))
+        else:
+            messages.append(AIMessage(content=f"answer {index}"))
+    return messages
+
+
+def run_events(size: int) -> list:
+    """Events of a run with TOOL_ROUNDS tool rounds, continuing a ``size`` message history."""
+    history = llama_index_history(size) + [ChatMessage(role="user", content="question")]
+    events = [InputEvent(input=history)]
+    for round_ in range(TOOL_ROUNDS):
+        calls = [
+            ToolSelection(tool_id=f"r{round_}c{call}", tool_name="web_search", tool_kwargs={"query": "q"})
+            for call in range(CALLS_PER_ROUND)
+        ]
+        history = history + [ChatMessage(role="assistant", content=None)]
+        history = history + [_tool_output(call.tool_id) for call in calls]
+        events += [ToolCallEvent(tool_calls=calls), InputEvent(input=history)]
+    answer = ChatResponse(message=ChatMessage(role="assistant", content="answer"))
+    events.append(StopEvent(result={"response": answer, "messages": history}))
+    return events
+
+
+def format_run(formatter, events: list) -> int:
+    return sum(len(formatter.format(event)) for event in events)
+
+
+@pytest.fixture(scope="module")
+def llama_index_main():
+    return _load_main("llamaindex_websearch_agent", "llama_index_main")
+
+
+@pytest.fixture(scope="module")
+def langgraph_main():
+    return _load_main("langgraph_react_agent", "langgraph_main")
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def test_event_formatter(benchmark, size):
+    events = run_events(size)
+    deltas = benchmark(lambda: format_run(EventFormatter(), events))
+    # A delta per round of tool calls, per tool output and for the answer
+    assert deltas == TOOL_ROUNDS * (1 + CALLS_PER_ROUND) + 1
+
+
+@pytest.mark.parametrize("is_assistant", (False, True), ids=("chat", "assistant"))
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def test_ai_service_stream_formatter(benchmark, size, is_assistant):
+    events = run_events(size)
+    deltas = benchmark(lambda: format_run(StreamEventFormatter(is_assistant), events))
+    assert deltas == TOOL_ROUNDS * 2 * CALLS_PER_ROUND + 1
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def test_llama_index_response_messages(benchmark, llama_index_main, size):
+    history = llama_index_history(size)
+    response = benchmark(llama_index_main.format_response_messages, history)
+    assert len(response) == size
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def test_langgraph_response_messages(benchmark, langgraph_main, size):
+    history = langgraph_history(size)
+    response = benchmark(langgraph_main.format_response_messages, history)
+    assert len(response) == size